@@ -0,0 +1,109 @@
+// Benchmark processo singolo vs cluster: avvia server.js con CLUSTER_WORKERS=1 e con
+// un worker per core, misura richieste/secondo e p99 su GET /api/tables/qr/:qrCode e
+// verifica che SIGTERM dreni le richieste in corso (nessun errore di connessione).
+//
+// Uso: MONGODB_BENCH_URI=mongodb://localhost:27017/qr-tavoli-bench \
+//        node benchmarks/cluster.bench.js --workers 1,8 --duration 10000 --concurrency 128
+const os = require('os');
+const path = require('path');
+const { spawn } = require('child_process');
+const mongoose = require('mongoose');
+const { parseArgs, httpLoad, requestJson, connect, disconnect, BENCH_URI } = require('./lib');
+const { seedTables } = require('./fixtures');
+
+const args = parseArgs({
+  workers: `1,${os.cpus().length}`,
+  duration: 10000,
+  concurrency: 128,
+  tables: 1000,
+  port: 3900
+});
+
+const waitReady = async (port, child, timeoutMs = 60000) => {
+  const deadline = Date.now() + timeoutMs;
+
+  while (Date.now() < deadline) {
+    if (child.exitCode !== null) {
+      throw new Error(`server terminato con codice ${child.exitCode}`);
+    }
+
+    try {
+      const response = await requestJson({ port, path: '/health' });
+      if (response.status === 200) return;
+    } catch (error) {
+      // Non ancora in ascolto
+    }
+
+    await new Promise((resolve) => setTimeout(resolve, 200));
+  }
+
+  throw new Error('server non pronto in tempo');
+};
+
+const runMode = async (workers) => {
+  const port = args.port;
+  const child = spawn(process.execPath, [path.join(__dirname, '..', 'server.js')], {
+    env: {
+      ...process.env,
+      NODE_ENV: 'production',
+      PORT: String(port),
+      MONGODB_URI: BENCH_URI,
+      CLUSTER_WORKERS: String(workers),
+      RATE_LIMIT_ENABLED: 'false'
+    },
+    stdio: ['ignore', 'ignore', 'inherit']
+  });
+  const exited = new Promise((resolve) => child.once('exit', resolve));
+
+  await waitReady(port, child);
+
+  const result = await httpLoad({
+    port,
+    concurrency: args.concurrency,
+    durationMs: args.duration,
+    request: (i) => ({ path: `/api/tables/qr/TABLE_${(i % args.tables) + 1}` })
+  });
+
+  // Shutdown sotto carico: le richieste già accettate devono completare
+  const drainLoad = httpLoad({
+    port,
+    concurrency: args.concurrency,
+    durationMs: 1000,
+    request: (i) => ({ path: `/api/tables/qr/TABLE_${(i % args.tables) + 1}` })
+  });
+  await new Promise((resolve) => setTimeout(resolve, 500));
+  const stopStart = Date.now();
+  child.kill('SIGTERM');
+  const drain = await drainLoad;
+  const exitCode = await exited;
+
+  return {
+    workers,
+    rps: result.rps,
+    p50Ms: result.p50Ms,
+    p99Ms: result.p99Ms,
+    errors: Object.entries(result.statuses).filter(([status]) => status !== '200').reduce((sum, [, n]) => sum + n, 0),
+    drainStatuses: JSON.stringify(drain.statuses),
+    shutdownMs: Date.now() - stopStart,
+    exitCode
+  };
+};
+
+const run = async () => {
+  await connect();
+  await mongoose.connection.db.dropDatabase();
+  await seedTables(args.tables);
+  await disconnect();
+
+  const results = [];
+  for (const workers of String(args.workers).split(',').map(Number)) {
+    results.push(await runMode(workers));
+  }
+
+  console.table(results);
+};
+
+run().catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
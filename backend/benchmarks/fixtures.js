@@ -0,0 +1,78 @@
+// Fixture condivise dai benchmark HTTP: dati di prova e app Express in un processo figlio
+const mongoose = require('mongoose');
+const { connect } = require('./lib');
+const config = require('../src/config/config');
+
+// insertMany lean non applica i default dello schema: il tenant va indicato
+exports.seedTables = async (count, offset = 0, tenant = config.TENANCY.defaultTenant) => {
+  const Table = require('../src/models/Table');
+  const batchSize = 10000;
+
+  for (let start = 0; start < count; start += batchSize) {
+    const size = Math.min(batchSize, count - start);
+    await Table.insertMany(Array.from({ length: size }, (_, i) => {
+      const tableNumber = offset + start + i + 1;
+      return {
+        tenant,
+        tableNumber,
+        name: `Tavolo ${tableNumber}`,
+        qrCode: `TABLE_${tableNumber}`,
+        points: Math.floor(Math.random() * 1000),
+        lastPointsUpdate: new Date(Date.now() - Math.floor(Math.random() * 1e9))
+      };
+    }), { lean: true });
+  }
+};
+
+exports.seedCashier = () => {
+  const User = require('../src/models/User');
+
+  return User.create({
+    username: 'benchcashier',
+    email: 'bench@test.com',
+    password: 'Bench123',
+    firstName: 'Bench',
+    lastName: 'Cashier',
+    role: 'cashier'
+  });
+};
+
+// Da chiamare nel processo figlio: pulisce il DB, crea cassiere e tavoli (più eventuali
+// dati aggiuntivi con seed()), avvia l'app su porta effimera e notifica il padre con
+// { port, token }. Al messaggio 'stop' esegue onStop() e invia al padre { commands, ...risultato }.
+exports.serveApp = async ({ tables = 50, seed = async () => {}, onStop = async () => ({}) } = {}) => {
+  const app = require('../src/app');
+  const User = require('../src/models/User');
+  const Table = require('../src/models/Table');
+  const PointTransaction = require('../src/models/PointTransaction');
+
+  const counter = await connect();
+  await Promise.all([User.deleteMany({}), Table.deleteMany({}), PointTransaction.deleteMany({})]);
+
+  const cashier = await exports.seedCashier();
+  await exports.seedTables(tables);
+  await seed({ cashier });
+  counter.reset();
+
+  const server = app.listen(0, () => {
+    process.send({ port: server.address().port, token: cashier.getSignedJwtToken() });
+  });
+
+  process.on('message', async (message) => {
+    if (message !== 'stop') return;
+
+    const commands = { total: counter.commands, ...counter.byName };
+    const result = await onStop();
+    process.send({ commands, ...result });
+    await mongoose.connection.close();
+    process.exit(0);
+  });
+
+  return server;
+};
+
+// Lato padre: chiede al figlio di fermarsi e attende il riepilogo
+exports.stopServer = (child) => new Promise((resolve) => {
+  child.once('message', resolve);
+  child.send('stop');
+});
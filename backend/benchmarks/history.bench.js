@@ -0,0 +1,140 @@
+// Benchmark delle pagine di storico (storico tavolo, attività cassiere, lista
+// transazioni): latenza e comandi Mongo per pagina in tre fasi sugli stessi dati.
+//   populate   implementazione precedente, riprodotta: find + populate di Table/User
+//   fallback   codice attuale su transazioni non ancora migrate (istantanee lette
+//              da Table/User in una query per modello, come il populate)
+//   snapshot   codice attuale dopo npm run transactions:snapshots: una sola query
+// Riporta anche la durata della migrazione.
+//
+// Uso: MONGODB_BENCH_URI=mongodb://localhost:27017/qr-tavoli-bench \
+//        node benchmarks/history.bench.js --tables 200 --transactions 50000 --iterations 1000
+const mongoose = require('mongoose');
+const { parseArgs, connect, disconnect, summarize } = require('./lib');
+const { seedTables, seedCashier } = require('./fixtures');
+
+const args = parseArgs({ tables: 200, transactions: 50000, iterations: 1000, batch: 1000 });
+
+const Table = require('../src/models/Table');
+const PointTransaction = require('../src/models/PointTransaction');
+const User = require('../src/models/User');
+const config = require('../src/config/config');
+const { TRANSACTION_FIELDS } = require('../src/utils/serializers');
+const { backfillSnapshots } = require('../src/utils/backfillSnapshots');
+const tableController = require('../src/controllers/tableController');
+const pointsController = require('../src/controllers/pointsController');
+
+const tenant = config.TENANCY.defaultTenant;
+
+// Invoca un controller con req/res finti; la risposta viene serializzata come da Express
+const callController = (handler, req) => new Promise((resolve, reject) => {
+  const res = {
+    statusCode: 200,
+    status(code) {
+      this.statusCode = code;
+      return this;
+    },
+    json(body) {
+      const payload = JSON.stringify(body);
+      if (this.statusCode !== 200) reject(new Error(`status ${this.statusCode}: ${payload}`));
+      resolve(payload.length);
+    }
+  };
+  handler({ params: {}, query: {}, tenant, ...req }, res);
+});
+
+// Implementazione precedente (populate), riprodotta per il confronto
+const populated = {
+  history: async ({ tableId }) => JSON.stringify(await PointTransaction.find({ tenant, table: tableId })
+    .select(TRANSACTION_FIELDS)
+    .populate('assignedBy', 'username firstName lastName')
+    .sort({ createdAt: -1, _id: -1 })
+    .limit(10)
+    .lean()).length,
+  userActivity: async ({ userId }) => JSON.stringify(await PointTransaction.find({ tenant, assignedBy: userId })
+    .select(TRANSACTION_FIELDS)
+    .populate('table', 'tableNumber name')
+    .sort({ createdAt: -1, _id: -1 })
+    .limit(10)
+    .lean()).length,
+  transactions: async () => JSON.stringify(await PointTransaction.find({ tenant })
+    .select(TRANSACTION_FIELDS)
+    .populate('table', 'tableNumber name')
+    .populate('assignedBy', 'username firstName lastName')
+    .sort({ createdAt: -1, _id: -1 })
+    .limit(21)
+    .lean()).length
+};
+
+const current = {
+  history: ({ tableId }) => callController(tableController.getTableHistory, { params: { id: tableId } }),
+  userActivity: async ({ userId }) => JSON.stringify(await PointTransaction.getUserActivity(userId, 10, tenant)).length,
+  transactions: () => callController(pointsController.getTransactions, { query: {} })
+};
+
+const measure = async (fn, params, counter) => {
+  for (let i = 0; i < 20; i++) await fn(params);
+
+  const latencies = [];
+  counter.reset();
+
+  for (let i = 0; i < args.iterations; i++) {
+    const start = process.hrtime.bigint();
+    await fn(params);
+    latencies.push(Number(process.hrtime.bigint() - start) / 1e6);
+  }
+
+  const { p50Ms, p99Ms, meanMs } = summarize(latencies);
+  return { meanMs, p50Ms, p99Ms, commandsPerPage: +(counter.commands / args.iterations).toFixed(2) };
+};
+
+const run = async () => {
+  const counter = await connect();
+  await mongoose.connection.db.dropDatabase();
+
+  const cashier = await seedCashier();
+  await seedTables(args.tables);
+  const tables = await Table.find({}).select('_id').lean();
+  const now = Date.now();
+
+  // Transazioni scritte prima delle istantanee
+  await PointTransaction.collection.insertMany(Array.from({ length: args.transactions }, (_, i) => ({
+    tenant,
+    table: tables[i % tables.length]._id,
+    assignedBy: cashier._id,
+    points: 1 + (i % 100),
+    type: 'EARNED',
+    metadata: {},
+    createdAt: new Date(now - i * 1000),
+    updatedAt: new Date(now - i * 1000)
+  })));
+  await PointTransaction.syncIndexes();
+  await User.syncIndexes();
+
+  const target = tables[Math.floor(tables.length / 2)];
+  const params = { tableId: String(target._id), userId: String(cashier._id) };
+  const results = [];
+
+  const phase = async (mode, impl) => {
+    for (const endpoint of Object.keys(current)) {
+      results.push({ endpoint, mode, ...await measure(impl[endpoint], params, counter) });
+    }
+  };
+
+  await phase('populate', populated);
+  await phase('fallback', current);
+
+  const start = Date.now();
+  const updated = await backfillSnapshots({ batchSize: args.batch });
+  const backfillMs = Date.now() - start;
+
+  await phase('snapshot', current);
+
+  console.table(results.sort((a, b) => a.endpoint.localeCompare(b.endpoint)));
+  console.log(`Migrazione: ${updated} transazioni in ${backfillMs}ms (lotti da ${args.batch})`);
+  await disconnect();
+};
+
+run().catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
@@ -0,0 +1,82 @@
+// Benchmark classifica pubblica: richieste/secondo su GET /api/tables/leaderboard con
+// il motore in memoria e con la query Mongo, a 50, 5.000 e 500.000 tavoli.
+// Riporta anche le operazioni/secondo di rankOf() sul motore.
+//
+// Uso: MONGODB_BENCH_URI=mongodb://localhost:27017/qr-tavoli-bench \
+//        node benchmarks/leaderboard.bench.js --sizes 50,5000,500000 --duration 10000
+const { parseArgs, httpLoad, spawnServer } = require('./lib');
+const { serveApp, stopServer } = require('./fixtures');
+
+const args = parseArgs({ sizes: '50,5000,500000', duration: 10000, concurrency: 64, limit: 20, child: 'false' });
+
+const runServer = async () => {
+  const leaderboard = require('../src/utils/leaderboard').forTenant();
+  const Table = require('../src/models/Table');
+
+  await serveApp({
+    tables: Number(process.env.BENCH_TABLES),
+    onStop: async () => {
+      if (process.env.LEADERBOARD_ENGINE === 'false') return {};
+
+      // Microbenchmark in-process della posizione di un tavolo
+      const ids = (await Table.find({}).select('_id').limit(10000).lean()).map(t => t._id);
+      const lookups = 200000;
+      const start = process.hrtime.bigint();
+      for (let i = 0; i < lookups; i++) {
+        await leaderboard.rankOf(ids[i % ids.length]);
+      }
+      const elapsedMs = Number(process.hrtime.bigint() - start) / 1e6;
+
+      return { rankOpsPerSec: Math.round(lookups / (elapsedMs / 1000)), loadMs: leaderboard.getMetrics().lastLoadMs };
+    }
+  });
+
+  if (process.env.LEADERBOARD_ENGINE !== 'false') {
+    await leaderboard.load();
+  }
+};
+
+const runMode = async (tables, engine) => {
+  const { child, port } = await spawnServer(__filename, ['--child', 'true'], {
+    NODE_ENV: 'production',
+    RATE_LIMIT_ENABLED: 'false',
+    LEADERBOARD_ENGINE: String(engine),
+    BENCH_TABLES: String(tables)
+  });
+
+  const result = await httpLoad({
+    port,
+    concurrency: args.concurrency,
+    durationMs: args.duration,
+    request: () => ({ path: `/api/tables/leaderboard?limit=${args.limit}` })
+  });
+
+  const summary = await stopServer(child);
+
+  return {
+    tables,
+    mode: engine ? 'engine' : 'mongo',
+    rps: result.rps,
+    p50Ms: result.p50Ms,
+    p99Ms: result.p99Ms,
+    mongoCommandsPerRequest: +(summary.commands.total / result.requests).toFixed(3),
+    rankOpsPerSec: summary.rankOpsPerSec || '-',
+    loadMs: summary.loadMs ? +summary.loadMs.toFixed(1) : '-'
+  };
+};
+
+const run = async () => {
+  const results = [];
+
+  for (const tables of args.sizes.split(',').map(Number)) {
+    results.push(await runMode(tables, false));
+    results.push(await runMode(tables, true));
+  }
+
+  console.table(results);
+};
+
+(args.child === 'true' ? runServer() : run()).catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
@@ -0,0 +1,169 @@
+// Benchmark letture lean: per ogni endpoint di lettura confronta l'implementazione
+// precedente (documenti Mongoose idratati con virtual, serializzati con toJSON) con
+// quella attuale (controller con .lean() e proiezioni). Riporta byte allocati per
+// richiesta (heap young generation ampia, nessuna GC durante la misura) e pause GC
+// totali/massime durante un carico prolungato.
+//
+// Uso: MONGODB_BENCH_URI=mongodb://localhost:27017/qr-tavoli-bench \
+//        node benchmarks/leanReads.bench.js --tables 200 --transactions 20000 --iterations 500
+const { fork } = require('child_process');
+const { PerformanceObserver } = require('perf_hooks');
+const mongoose = require('mongoose');
+const { parseArgs, connect, disconnect } = require('./lib');
+const { seedTables, seedCashier } = require('./fixtures');
+
+const args = parseArgs({ tables: 200, transactions: 20000, iterations: 500, gcIterations: 3000 });
+
+// Misure affidabili solo con gc() esposto e semi-space grande: riavvia con i flag giusti
+if (typeof global.gc !== 'function') {
+  const child = fork(__filename, process.argv.slice(2), {
+    execArgv: ['--expose-gc', '--max-semi-space-size=256'],
+    // Cache risposte disattivata: si misura la lettura, non il buffer già pronto
+    env: { ...process.env, LEADERBOARD_ENGINE: 'false', RESPONSE_CACHE_ENABLED: 'false' }
+  });
+  child.on('exit', (code) => process.exit(code));
+  return;
+}
+
+const Table = require('../src/models/Table');
+const PointTransaction = require('../src/models/PointTransaction');
+const User = require('../src/models/User');
+const config = require('../src/config/config');
+const tableController = require('../src/controllers/tableController');
+const pointsController = require('../src/controllers/pointsController');
+
+// Invoca un controller con req/res finti; la risposta viene serializzata come da Express
+const callController = (handler, req) => new Promise((resolve, reject) => {
+  const res = {
+    statusCode: 200,
+    status(code) {
+      this.statusCode = code;
+      return this;
+    },
+    json(body) {
+      const payload = JSON.stringify(body);
+      if (this.statusCode !== 200) reject(new Error(`status ${this.statusCode}: ${payload}`));
+      resolve(payload.length);
+    }
+  };
+  handler({ params: {}, query: {}, tenant: config.TENANCY.defaultTenant, ...req }, res);
+});
+
+// Implementazioni precedenti (documenti idratati), riprodotte per il confronto
+const hydrated = {
+  leaderboard: async () => {
+    const tables = await Table.getLeaderboard().limit(20);
+    return JSON.stringify(tables.map((table, index) => ({
+      ...table.toObject(),
+      position: index + 1,
+      medal: index < 3 ? ['🥇', '🥈', '🥉'][index] : null
+    }))).length;
+  },
+  tables: async () => JSON.stringify(await Table.find({ isActive: true })
+    .sort({ points: -1, _id: -1 })
+    .limit(21)
+    .select('tableNumber name qrCode points lastPointsUpdate createdAt')).length,
+  table: async ({ id }) => JSON.stringify(await Table.findById(id)).length,
+  tableByQR: async ({ qrCode }) => {
+    const table = await Table.findByQR(qrCode);
+    const betterTables = await Table.countAhead(table);
+    return JSON.stringify({ ...table.toObject(), position: betterTables + 1 }).length;
+  },
+  history: async ({ id }) => JSON.stringify(await PointTransaction.find({ table: id })
+    .populate('assignedBy', 'username firstName lastName')
+    .sort({ createdAt: -1 })
+    .limit(10)).length,
+  transactions: async () => JSON.stringify(await PointTransaction.find({})
+    .populate('table', 'tableNumber name')
+    .populate('assignedBy', 'username firstName lastName')
+    .sort({ createdAt: -1, _id: -1 })
+    .limit(21)).length
+};
+
+const lean = {
+  leaderboard: () => callController(tableController.getLeaderboard, { query: { limit: 20 } }),
+  tables: () => callController(tableController.getTables, {}),
+  table: ({ id }) => callController(tableController.getTable, { params: { id } }),
+  tableByQR: ({ qrCode }) => callController(tableController.getTableByQR, { params: { qrCode } }),
+  history: ({ id }) => callController(tableController.getTableHistory, { params: { id } }),
+  transactions: () => callController(pointsController.getTransactions, { query: {} })
+};
+
+// Byte allocati per richiesta: heap usato prima/dopo, senza GC in mezzo
+const allocationsPerRequest = async (fn, params) => {
+  for (let i = 0; i < 20; i++) await fn(params);
+
+  global.gc();
+  const before = process.memoryUsage().heapUsed;
+  for (let i = 0; i < args.iterations; i++) await fn(params);
+  const after = process.memoryUsage().heapUsed;
+
+  return (after - before) / args.iterations;
+};
+
+// Pause GC (numero, totale, massima) durante un carico più lungo
+const gcPauses = async (fn, params) => {
+  const pauses = [];
+  const observer = new PerformanceObserver((list) => {
+    for (const entry of list.getEntries()) pauses.push(entry.duration);
+  });
+
+  global.gc();
+  observer.observe({ entryTypes: ['gc'] });
+  const start = process.hrtime.bigint();
+  for (let i = 0; i < args.gcIterations; i++) await fn(params);
+  const elapsedMs = Number(process.hrtime.bigint() - start) / 1e6;
+  await new Promise((resolve) => setImmediate(resolve));
+  observer.disconnect();
+
+  return {
+    gcCount: pauses.length,
+    gcTotalMs: +pauses.reduce((sum, ms) => sum + ms, 0).toFixed(1),
+    gcMaxMs: +Math.max(0, ...pauses).toFixed(2),
+    reqPerSec: Math.round(args.gcIterations / (elapsedMs / 1000))
+  };
+};
+
+const run = async () => {
+  await connect();
+  await mongoose.connection.db.dropDatabase();
+
+  const cashier = await seedCashier();
+  await seedTables(args.tables);
+  const tables = await Table.find({}).select('_id').lean();
+  const now = Date.now();
+
+  await PointTransaction.collection.insertMany(Array.from({ length: args.transactions }, (_, i) => ({
+    tenant: config.TENANCY.defaultTenant,
+    table: tables[i % tables.length]._id,
+    assignedBy: cashier._id,
+    points: 1 + (i % 100),
+    type: 'EARNED',
+    metadata: {},
+    createdAt: new Date(now - i * 1000),
+    updatedAt: new Date(now - i * 1000)
+  })));
+  await PointTransaction.syncIndexes();
+  await User.syncIndexes();
+
+  const target = await Table.findOne({ tableNumber: Math.ceil(args.tables / 2) }).lean();
+  const params = { id: String(target._id), qrCode: target.qrCode };
+  const results = [];
+
+  for (const endpoint of Object.keys(lean)) {
+    for (const [mode, impl] of [['hydrated', hydrated], ['lean', lean]]) {
+      const bytes = await allocationsPerRequest(impl[endpoint], params);
+      const gc = await gcPauses(impl[endpoint], params);
+
+      results.push({ endpoint, mode, kbPerRequest: +(bytes / 1024).toFixed(1), ...gc });
+    }
+  }
+
+  console.table(results);
+  await disconnect();
+};
+
+run().catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
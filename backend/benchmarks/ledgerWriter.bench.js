@@ -0,0 +1,73 @@
+// Load test del ledger write-behind: scansioni/secondo sostenute da un singolo processo
+// Node su POST /api/points/add con PointTransaction.create sincrono e con write-behind.
+//
+// Uso: MONGODB_BENCH_URI=mongodb://localhost:27017/qr-tavoli-bench \
+//        node benchmarks/ledgerWriter.bench.js --duration 15000 --concurrency 64
+const path = require('path');
+const { parseArgs, httpLoad, spawnServer } = require('./lib');
+const { serveApp, stopServer } = require('./fixtures');
+
+const args = parseArgs({ duration: 15000, concurrency: 64, tables: 50, child: 'false' });
+
+const runServer = async () => {
+  const ledger = require('../src/utils/ledgerWriter');
+  const PointTransaction = require('../src/models/PointTransaction');
+
+  await serveApp({
+    tables: args.tables,
+    onStop: async () => {
+      await ledger.stop();
+      return {
+        transactions: await PointTransaction.countDocuments(),
+        ledger: ledger.getMetrics()
+      };
+    }
+  });
+  await ledger.start();
+};
+
+const runMode = async (writeBehind) => {
+  const { child, port, token } = await spawnServer(__filename, ['--child', 'true'], {
+    NODE_ENV: 'production',
+    RATE_LIMIT_ENABLED: 'false',
+    LEDGER_WRITE_BEHIND: String(writeBehind),
+    LEDGER_SPILL_DIR: path.join(__dirname, '.ledger-spill')
+  });
+
+  const result = await httpLoad({
+    port,
+    concurrency: args.concurrency,
+    durationMs: args.duration,
+    request: (i) => ({
+      method: 'POST',
+      path: '/api/points/add',
+      headers: { Authorization: `Bearer ${token}` },
+      body: { qrCode: `TABLE_${(i % args.tables) + 1}`, points: 1 }
+    })
+  });
+
+  const summary = await stopServer(child);
+
+  return {
+    mode: writeBehind ? 'write-behind' : 'sync create',
+    scansPerSec: result.rps,
+    p50Ms: result.p50Ms,
+    p99Ms: result.p99Ms,
+    ok: result.statuses[200] || 0,
+    persisted: summary.transactions,
+    flushes: summary.ledger.flushes,
+    avgFlushMs: +summary.ledger.avgFlushMs.toFixed(2)
+  };
+};
+
+const run = async () => {
+  const results = [];
+  results.push(await runMode(false));
+  results.push(await runMode(true));
+  console.table(results);
+};
+
+(args.child === 'true' ? runServer() : run()).catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
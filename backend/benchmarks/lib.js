@@ -0,0 +1,202 @@
+// Utility condivise dai benchmark: connessione Mongo, conteggio round trip, percentili
+const mongoose = require('mongoose');
+
+exports.BENCH_URI = process.env.MONGODB_BENCH_URI || 'mongodb://localhost:27017/qr-tavoli-bench';
+
+// Legge argomenti "--chiave valore" dalla riga di comando sovrascrivendo i default
+exports.parseArgs = (defaults = {}) => {
+  const args = { ...defaults };
+  const argv = process.argv.slice(2);
+
+  for (let i = 0; i < argv.length; i++) {
+    if (!argv[i].startsWith('--')) continue;
+
+    const key = argv[i].slice(2);
+    const value = argv[i + 1] && !argv[i + 1].startsWith('--') ? argv[++i] : 'true';
+    args[key] = typeof defaults[key] === 'number' ? Number(value) : value;
+  }
+
+  return args;
+};
+
+// Connette a Mongo con il monitoraggio comandi attivo e conta i round trip
+exports.connect = async (uri = exports.BENCH_URI, options = {}) => {
+  await mongoose.connect(uri, { monitorCommands: true, ...options });
+
+  const counter = {
+    commands: 0,
+    byName: {},
+    reset() {
+      this.commands = 0;
+      this.byName = {};
+    }
+  };
+
+  mongoose.connection.getClient().on('commandStarted', (event) => {
+    counter.commands++;
+    counter.byName[event.commandName] = (counter.byName[event.commandName] || 0) + 1;
+  });
+
+  return counter;
+};
+
+exports.disconnect = () => mongoose.connection.close();
+
+// Calcola il percentile p (0-100) di un array di latenze in ms
+exports.percentile = (values, p) => {
+  if (!values.length) return 0;
+
+  const sorted = [...values].sort((a, b) => a - b);
+  const index = Math.min(sorted.length - 1, Math.ceil((p / 100) * sorted.length) - 1);
+  return sorted[Math.max(0, index)];
+};
+
+// Riassume un array di latenze in ms
+exports.summarize = (latencies) => {
+  const total = latencies.reduce((sum, value) => sum + value, 0);
+
+  return {
+    count: latencies.length,
+    meanMs: +(total / (latencies.length || 1)).toFixed(2),
+    p50Ms: +exports.percentile(latencies, 50).toFixed(2),
+    p99Ms: +exports.percentile(latencies, 99).toFixed(2),
+    maxMs: +Math.max(0, ...latencies).toFixed(2)
+  };
+};
+
+// Esegue fn(i) per i = 0..total-1 con al massimo `concurrency` chiamate in volo
+exports.runConcurrent = async (total, concurrency, fn) => {
+  const latencies = [];
+  let next = 0;
+
+  const worker = async () => {
+    while (next < total) {
+      const i = next++;
+      const start = process.hrtime.bigint();
+      await fn(i);
+      latencies.push(Number(process.hrtime.bigint() - start) / 1e6);
+    }
+  };
+
+  const start = process.hrtime.bigint();
+  await Promise.all(Array.from({ length: Math.min(concurrency, total) }, worker));
+  const elapsedMs = Number(process.hrtime.bigint() - start) / 1e6;
+
+  return {
+    latencies,
+    elapsedMs,
+    opsPerSec: Math.round(total / (elapsedMs / 1000))
+  };
+};
+
+// Genera carico HTTP keep-alive per `durationMs` con `concurrency` richieste in volo.
+// `request(i)` ritorna { method, path, headers, body, group } per la richiesta i-esima;
+// con `group` le latenze sono riassunte anche per gruppo (es. per tenant).
+exports.httpLoad = async ({ port, host = '127.0.0.1', concurrency = 50, durationMs = 10000, request }) => {
+  const http = require('http');
+  const agent = new http.Agent({ keepAlive: true, maxSockets: concurrency });
+  const latencies = [];
+  const grouped = new Map();
+  const statuses = {};
+  const deadline = Date.now() + durationMs;
+  let sent = 0;
+
+  const send = (spec) => new Promise((resolve) => {
+    const body = spec.body ? JSON.stringify(spec.body) : null;
+    const start = process.hrtime.bigint();
+
+    const req = http.request({
+      host,
+      port,
+      agent,
+      method: spec.method || 'GET',
+      path: spec.path,
+      headers: {
+        ...(body && { 'Content-Type': 'application/json', 'Content-Length': Buffer.byteLength(body) }),
+        ...spec.headers
+      }
+    }, (res) => {
+      res.resume();
+      res.on('end', () => {
+        const ms = Number(process.hrtime.bigint() - start) / 1e6;
+        latencies.push(ms);
+        if (spec.group !== undefined) {
+          if (!grouped.has(spec.group)) grouped.set(spec.group, []);
+          grouped.get(spec.group).push(ms);
+        }
+        statuses[res.statusCode] = (statuses[res.statusCode] || 0) + 1;
+        resolve();
+      });
+    });
+
+    req.on('error', () => {
+      statuses.error = (statuses.error || 0) + 1;
+      resolve();
+    });
+    req.end(body);
+  });
+
+  const worker = async () => {
+    while (Date.now() < deadline) {
+      await send(request(sent++));
+    }
+  };
+
+  const start = Date.now();
+  await Promise.all(Array.from({ length: concurrency }, worker));
+  agent.destroy();
+
+  return {
+    requests: latencies.length,
+    rps: Math.round(latencies.length / ((Date.now() - start) / 1000)),
+    statuses,
+    groups: Object.fromEntries([...grouped].map(([group, values]) => [group, exports.summarize(values)])),
+    ...exports.summarize(latencies)
+  };
+};
+
+// Singola richiesta JSON: risolve con { status, headers, body, ms }
+exports.requestJson = ({ port, host = '127.0.0.1', method = 'GET', path, token, body, agent }) => new Promise((resolve, reject) => {
+  const http = require('http');
+  const payload = body ? JSON.stringify(body) : null;
+  const start = process.hrtime.bigint();
+
+  const req = http.request({
+    host,
+    port,
+    method,
+    path,
+    agent,
+    headers: {
+      ...(token && { Authorization: `Bearer ${token}` }),
+      ...(payload && { 'Content-Type': 'application/json', 'Content-Length': Buffer.byteLength(payload) })
+    }
+  }, (res) => {
+    let data = '';
+    res.setEncoding('utf8');
+    res.on('data', (chunk) => { data += chunk; });
+    res.on('end', () => resolve({
+      status: res.statusCode,
+      headers: res.headers,
+      body: data ? JSON.parse(data) : null,
+      ms: Number(process.hrtime.bigint() - start) / 1e6
+    }));
+  });
+
+  req.on('error', reject);
+  req.end(payload);
+});
+
+// Avvia uno script figlio che stampa su IPC { port, ... } quando è pronto.
+// Con stdout 'pipe' l'output del figlio è letto dal padre (child.stdout), come farebbe
+// un raccoglitore di log
+exports.spawnServer = (script, args = [], env = {}, { stdout = 'ignore' } = {}) => new Promise((resolve, reject) => {
+  const { fork } = require('child_process');
+  const child = fork(script, args, {
+    env: { ...process.env, ...env },
+    stdio: ['ignore', stdout, 'inherit', 'ipc']
+  });
+
+  child.once('message', (message) => resolve({ child, ...message }));
+  child.once('exit', (code) => reject(new Error(`server exited with code ${code}`)));
+});
@@ -0,0 +1,109 @@
+// Soak test dello stream SSE: apre N iscritti inattivi su GET /api/tables/stream
+// (default 10.000) verso un solo processo e riporta la memoria per connessione,
+// poi misura il tempo di consegna di un aggiornamento punti a tutti gli iscritti.
+//
+// Serve un limite di file descriptor adeguato (client e server sulla stessa macchina):
+//   ulimit -n 65536
+//   MONGODB_BENCH_URI=mongodb://localhost:27017/qr-tavoli-bench \
+//     node --expose-gc benchmarks/liveStream.bench.js --subscribers 10000 --rounds 5
+const http = require('http');
+const { parseArgs, percentile, spawnServer, requestJson } = require('./lib');
+const { serveApp, stopServer } = require('./fixtures');
+
+const args = parseArgs({ subscribers: 10000, rounds: 5, openConcurrency: 500, child: 'false' });
+
+const memory = () => {
+  if (global.gc) global.gc();
+  const { rss, heapUsed } = process.memoryUsage();
+  return { rss, heapUsed };
+};
+
+const runServer = async () => {
+  const liveUpdates = require('../src/utils/liveUpdates');
+  let baseline = null;
+
+  await serveApp({
+    tables: 50,
+    onStop: async () => ({ baseline, loaded: memory(), liveUpdates: liveUpdates.getMetrics() })
+  });
+
+  baseline = memory();
+};
+
+// Apre un iscritto e risolve al primo evento 'ready'
+const subscribe = (port, onTables) => new Promise((resolve, reject) => {
+  const req = http.get({ host: '127.0.0.1', port, path: '/api/tables/stream', agent: false }, (res) => {
+    res.setEncoding('utf8');
+    res.on('data', (chunk) => {
+      if (chunk.includes('event: ready')) resolve(req);
+      if (chunk.includes('event: tables')) onTables();
+    });
+  });
+  req.on('error', reject);
+});
+
+const run = async () => {
+  const { child, port, token } = await spawnServer(__filename, ['--child', 'true'], {
+    NODE_ENV: 'production',
+    RATE_LIMIT_ENABLED: 'false',
+    LIVE_MAX_CLIENTS: String(args.subscribers + 100)
+  });
+
+  // Consegna: per ogni round, latenza dal POST alla ricezione su ogni iscritto
+  let round = null;
+  const onTables = () => {
+    if (!round) return;
+    round.latencies.push(Number(process.hrtime.bigint() - round.start) / 1e6);
+    if (round.latencies.length === args.subscribers) round.done();
+  };
+
+  const openStart = Date.now();
+  const subscribers = [];
+  for (let i = 0; i < args.subscribers; i += args.openConcurrency) {
+    const size = Math.min(args.openConcurrency, args.subscribers - i);
+    subscribers.push(...await Promise.all(Array.from({ length: size }, () => subscribe(port, onTables))));
+  }
+  const openMs = Date.now() - openStart;
+
+  const rounds = [];
+  for (let r = 0; r < args.rounds; r++) {
+    const latencies = [];
+    const delivered = new Promise((resolve) => {
+      round = { start: process.hrtime.bigint(), latencies, done: resolve };
+    });
+
+    await requestJson({ port, token, method: 'POST', path: '/api/points/add', body: { qrCode: 'TABLE_1', points: 1 } });
+    await Promise.race([delivered, new Promise(resolve => setTimeout(resolve, 15000))]);
+    round = null;
+
+    latencies.sort((a, b) => a - b);
+    rounds.push({
+      round: r + 1,
+      delivered: latencies.length,
+      p50Ms: +percentile(latencies, 50).toFixed(1),
+      p99Ms: +percentile(latencies, 99).toFixed(1),
+      lastMs: +(latencies[latencies.length - 1] || 0).toFixed(1)
+    });
+  }
+
+  const summary = await stopServer(child);
+  subscribers.forEach((req) => req.destroy());
+
+  const perConnection = (key) =>
+    Math.round((summary.loaded[key] - summary.baseline[key]) / args.subscribers);
+
+  console.table(rounds);
+  console.table([{
+    subscribers: args.subscribers,
+    openMs,
+    rssPerConnectionBytes: perConnection('rss'),
+    heapPerConnectionBytes: perConnection('heapUsed'),
+    gcExposed: process.execArgv.includes('--expose-gc'),
+    backpressured: summary.liveUpdates.backpressured
+  }]);
+};
+
+(args.child === 'true' ? runServer() : run()).catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
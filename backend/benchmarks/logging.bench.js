@@ -0,0 +1,93 @@
+// Benchmark del logging sul percorso di autenticazione con errori: ogni richiesta
+// porta un token non valido (GET /api/auth/me → 401), quindi una riga "Invalid token"
+// più la riga di accesso HTTP. Lo stdout del server è una pipe letta dal padre, come
+// con un raccoglitore di log. Modalità, alternate per --rounds giri:
+//   console   scrittura sincrona di ogni riga (LOG_TRANSPORT=sync, nessun campionamento),
+//             equivalente ai vecchi console.log/console.error
+//   buffered  trasporto asincrono con buffer, nessun campionamento
+//   sampled   trasporto asincrono e campionamento di default (auth.token=0.01)
+// Con --slowReader true il padre legge la pipe a scatti: una destinazione lenta blocca
+// le scritture sincrone, mentre il buffer asincrono assorbe (o scarta) le righe.
+//
+// Uso: MONGODB_BENCH_URI=mongodb://localhost:27017/qr-tavoli-bench \
+//        node benchmarks/logging.bench.js --duration 10000 --rounds 3
+const { parseArgs, httpLoad, spawnServer } = require('./lib');
+const { serveApp, stopServer } = require('./fixtures');
+
+const args = parseArgs({ duration: 10000, concurrency: 64, rounds: 3, slowReader: 'false', child: 'false' });
+
+const MODES = {
+  console: { LOG_TRANSPORT: 'sync', LOG_SAMPLING: '' },
+  buffered: { LOG_TRANSPORT: 'async', LOG_SAMPLING: '' },
+  sampled: { LOG_TRANSPORT: 'async' }
+};
+
+const runServer = async () => {
+  await serveApp({
+    tables: 10,
+    onStop: async () => ({ logging: require('../src/utils/logger').getMetrics() })
+  });
+};
+
+const runOnce = async (mode) => {
+  const { LOG_SAMPLING, ...env } = MODES[mode];
+  const { child, port } = await spawnServer(__filename, ['--child', 'true'], {
+    NODE_ENV: 'production',
+    RATE_LIMIT_ENABLED: 'false',
+    ...env,
+    // Senza LOG_SAMPLING il figlio usa il campionamento di default
+    ...(LOG_SAMPLING !== undefined && { LOG_SAMPLING })
+  }, { stdout: 'pipe' });
+
+  let logBytes = 0;
+  child.stdout.on('data', (chunk) => {
+    logBytes += chunk.length;
+
+    if (args.slowReader === 'true') {
+      child.stdout.pause();
+      setTimeout(() => child.stdout.resume(), 5);
+    }
+  });
+
+  const result = await httpLoad({
+    port,
+    concurrency: args.concurrency,
+    durationMs: args.duration,
+    request: () => ({ path: '/api/auth/me', headers: { Authorization: 'Bearer not-a-valid-token' } })
+  });
+
+  const { logging } = await stopServer(child);
+  return { ...result, logBytes, logging };
+};
+
+const run = async () => {
+  const totals = Object.fromEntries(Object.keys(MODES).map(mode => [mode, { rps: 0, p50: 0, p99: 0, bytes: 0, requests: 0, dropped: 0 }]));
+
+  for (let round = 0; round < args.rounds; round++) {
+    for (const mode of Object.keys(MODES)) {
+      const result = await runOnce(mode);
+      const total = totals[mode];
+      total.rps += result.rps / args.rounds;
+      total.p50 += result.p50Ms / args.rounds;
+      total.p99 += result.p99Ms / args.rounds;
+      total.bytes += result.logBytes;
+      total.requests += result.requests;
+      total.dropped += result.logging.dropped;
+    }
+  }
+
+  console.table(Object.entries(totals).map(([mode, total]) => ({
+    mode,
+    rps: Math.round(total.rps),
+    p50Ms: +total.p50.toFixed(2),
+    p99Ms: +total.p99.toFixed(2),
+    logBytesPerRequest: Math.round(total.bytes / Math.max(1, total.requests)),
+    droppedLines: total.dropped,
+    vsConsole: `${((total.rps / totals.console.rps - 1) * 100).toFixed(1)}%`
+  })));
+};
+
+(args.child === 'true' ? runServer() : run()).catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
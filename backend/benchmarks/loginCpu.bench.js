@@ -0,0 +1,102 @@
+// Regressione CPU del login: ogni login riuscito deve costare al più un bcrypt compare
+// (nessun hash, nessun save dell'utente). Misura la CPU del processo server (worker
+// inclusi) per login e la confronta con quella di un compare isolato; esce con codice 1
+// se il rapporto supera --maxRatio o se durante i login viene calcolato un hash.
+//
+// Uso: MONGODB_BENCH_URI=mongodb://localhost:27017/qr-tavoli-bench \
+//        node benchmarks/loginCpu.bench.js --logins 30 --rounds 12
+const http = require('http');
+const { parseArgs, spawnServer, requestJson, summarize } = require('./lib');
+const { serveApp, stopServer } = require('./fixtures');
+
+const args = parseArgs({ logins: 30, rounds: 12, maxRatio: 1.5, child: 'false' });
+
+const cpuMs = (usage) => (usage.user + usage.system) / 1000;
+
+const runServer = async () => {
+  const bcrypt = require('bcryptjs');
+  const passwordHasher = require('../src/utils/passwordHasher');
+  let baseline;
+
+  await serveApp({
+    tables: 1,
+    seed: async () => {
+      // Costo di riferimento: un compare sul thread corrente, a freddo e a regime
+      const hash = bcrypt.hashSync('Bench123', args.rounds);
+      bcrypt.compareSync('Bench123', hash);
+      const start = process.cpuUsage();
+      for (let i = 0; i < 3; i++) bcrypt.compareSync('Bench123', hash);
+      const compareCpuMs = cpuMs(process.cpuUsage(start)) / 3;
+
+      baseline = { compareCpuMs, hasher: passwordHasher.getMetrics() };
+    },
+    onStop: async () => {
+      const hasher = passwordHasher.getMetrics();
+
+      return {
+        cpuMs: cpuMs(process.cpuUsage(baseline.cpu)),
+        compareCpuMs: baseline.compareCpuMs,
+        hashes: hasher.hashes - baseline.hasher.hashes,
+        compares: hasher.compares - baseline.hasher.compares
+      };
+    }
+  });
+
+  // Da qui conta solo la CPU spesa servendo i login
+  baseline.cpu = process.cpuUsage();
+  baseline.hasher = passwordHasher.getMetrics();
+};
+
+const run = async () => {
+  const { child, port } = await spawnServer(__filename, ['--child', 'true', '--rounds', String(args.rounds)], {
+    NODE_ENV: 'production',
+    RATE_LIMIT_ENABLED: 'false',
+    BCRYPT_ROUNDS: String(args.rounds)
+  });
+
+  const agent = new http.Agent({ keepAlive: true });
+  const latencies = [];
+
+  for (let i = 0; i < args.logins; i++) {
+    const response = await requestJson({
+      port,
+      agent,
+      method: 'POST',
+      path: '/api/auth/login',
+      body: { email: 'bench@test.com', password: 'Bench123' }
+    });
+
+    if (response.status !== 200) {
+      throw new Error(`login ${i} fallito con status ${response.status}`);
+    }
+    latencies.push(response.ms);
+  }
+
+  agent.destroy();
+  const summary = await stopServer(child);
+  const cpuPerLoginMs = summary.cpuMs / args.logins;
+  const ratio = cpuPerLoginMs / summary.compareCpuMs;
+
+  console.table([{
+    logins: args.logins,
+    rounds: args.rounds,
+    ...summarize(latencies),
+    cpuPerLoginMs: +cpuPerLoginMs.toFixed(1),
+    compareCpuMs: +summary.compareCpuMs.toFixed(1),
+    ratio: +ratio.toFixed(2),
+    hashes: summary.hashes,
+    compares: summary.compares
+  }]);
+
+  if (summary.hashes > 0 || summary.compares !== args.logins || ratio > args.maxRatio) {
+    console.error(`❌ Login oltre il budget: ${summary.hashes} hash, ${summary.compares} compare, rapporto ${ratio.toFixed(2)} (max ${args.maxRatio})`);
+    process.exit(1);
+  }
+
+  console.log('✅ Login entro il costo di un bcrypt compare');
+};
+
+(args.child === 'true' ? runServer() : run()).catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
@@ -0,0 +1,95 @@
+// Benchmark overhead delle metriche: stesso carico HTTP con METRICS_ENABLED=false e
+// true (istogramma per route, monitorCommands del driver, campionatore lag, GC),
+// alternati per --rounds giri per ridurre il rumore. Endpoint: classifica servita
+// dalla cache risposte (il caso più veloce, dove l'overhead relativo è massimo) e
+// ricerca QR con la cache disattivata (una query Mongo per richiesta).
+// Riporta anche il costo di una singola observe() dell'istogramma.
+//
+// Uso: MONGODB_BENCH_URI=mongodb://localhost:27017/qr-tavoli-bench \
+//        node benchmarks/metrics.bench.js --tables 1000 --duration 10000 --rounds 3
+const { parseArgs, httpLoad, spawnServer } = require('./lib');
+const { serveApp, stopServer } = require('./fixtures');
+const { MetricsRegistry } = require('../src/utils/metrics');
+
+const args = parseArgs({ tables: 1000, duration: 10000, concurrency: 64, rounds: 3, child: 'false' });
+
+const ENDPOINTS = {
+  leaderboard: { path: '/api/tables/leaderboard?limit=20', env: {} },
+  qr: { path: null, env: { RESPONSE_CACHE_ENABLED: 'false' } }
+};
+
+const runServer = async () => {
+  await serveApp({ tables: args.tables });
+
+  // Come server.js: collector di processo attivi solo con le metriche
+  require('../src/utils/metrics').start();
+};
+
+const runOnce = async (endpoint, enabled) => {
+  const { child, port } = await spawnServer(__filename, ['--child', 'true', '--tables', String(args.tables)], {
+    NODE_ENV: 'production',
+    RATE_LIMIT_ENABLED: 'false',
+    METRICS_ENABLED: String(enabled),
+    ...ENDPOINTS[endpoint].env
+  });
+
+  const result = await httpLoad({
+    port,
+    concurrency: args.concurrency,
+    durationMs: args.duration,
+    request: (i) => ({ path: ENDPOINTS[endpoint].path || `/api/tables/qr/TABLE_${1 + (i % args.tables)}` })
+  });
+
+  await stopServer(child);
+  return result;
+};
+
+const observeCost = () => {
+  const registry = new MetricsRegistry({ enabled: true });
+  const iterations = 1e6;
+  const start = process.hrtime.bigint();
+
+  for (let i = 0; i < iterations; i++) {
+    registry.httpDuration.observe({ method: 'GET', route: '/api/tables/leaderboard', status: 200 }, (i % 100) / 1000);
+  }
+
+  return Number(process.hrtime.bigint() - start) / iterations;
+};
+
+const run = async () => {
+  const results = [];
+
+  for (const endpoint of Object.keys(ENDPOINTS)) {
+    const totals = { false: { rps: 0, p50: 0, p99: 0 }, true: { rps: 0, p50: 0, p99: 0 } };
+
+    for (let round = 0; round < args.rounds; round++) {
+      for (const enabled of [false, true]) {
+        const result = await runOnce(endpoint, enabled);
+        totals[enabled].rps += result.rps / args.rounds;
+        totals[enabled].p50 += result.p50Ms / args.rounds;
+        totals[enabled].p99 += result.p99Ms / args.rounds;
+      }
+    }
+
+    for (const enabled of [false, true]) {
+      results.push({
+        endpoint,
+        metrics: enabled ? 'on' : 'off',
+        rps: Math.round(totals[enabled].rps),
+        p50Ms: +totals[enabled].p50.toFixed(2),
+        p99Ms: +totals[enabled].p99.toFixed(2),
+        throughputCostPct: enabled
+          ? +((1 - totals.true.rps / totals.false.rps) * 100).toFixed(2)
+          : '-'
+      });
+    }
+  }
+
+  console.table(results);
+  console.log(`observe(): ${observeCost().toFixed(0)} ns per chiamata`);
+};
+
+(args.child === 'true' ? runServer() : run()).catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
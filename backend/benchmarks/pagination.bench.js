@@ -0,0 +1,143 @@
+// Benchmark paginazione di GET /api/points/transactions su un ledger di 5M transazioni:
+// latenza di una pagina a profondità crescente con skip (?page=N) e con cursore
+// keyset (?cursor=...), costo del totale esatto (withTotal) rispetto alla stima,
+// e tempo per scorrere in sequenza le prime pagine con il cursore.
+//
+// Uso: MONGODB_BENCH_URI=mongodb://localhost:27017/qr-tavoli-bench \
+//        node benchmarks/pagination.bench.js --transactions 5000000 --limit 20
+const http = require('http');
+const { parseArgs, connect, disconnect, percentile, spawnServer } = require('./lib');
+const { serveApp, stopServer } = require('./fixtures');
+const config = require('../src/config/config');
+
+const args = parseArgs({
+  transactions: 5000000,
+  limit: 20,
+  depths: '1,100,1000,10000,100000,250000',
+  walk: 500,
+  repeat: 5,
+  child: 'false'
+});
+
+const SORT_KEYS = [['createdAt', -1], ['_id', -1]];
+
+// Inserimento diretto sulla collection: niente validazione né hook, solo volume
+const seedTransactions = async ({ cashier }) => {
+  const Table = require('../src/models/Table');
+  const PointTransaction = require('../src/models/PointTransaction');
+  const tables = await Table.find({}).select('_id').lean();
+  const batchSize = 10000;
+  const now = Date.now();
+
+  for (let start = 0; start < args.transactions; start += batchSize) {
+    const size = Math.min(batchSize, args.transactions - start);
+    await PointTransaction.collection.insertMany(Array.from({ length: size }, (_, i) => {
+      const createdAt = new Date(now - Math.floor(Math.random() * 365 * 24 * 3600 * 1000));
+      return {
+        tenant: config.TENANCY.defaultTenant,
+        table: tables[(start + i) % tables.length]._id,
+        assignedBy: cashier._id,
+        points: 1 + ((start + i) % 100),
+        type: 'EARNED',
+        metadata: {},
+        createdAt,
+        updatedAt: createdAt
+      };
+    }), { ordered: false });
+  }
+};
+
+const get = (port, token, query) => new Promise((resolve, reject) => {
+  const start = process.hrtime.bigint();
+  http.get({
+    host: '127.0.0.1',
+    port,
+    path: `/api/points/transactions?${new URLSearchParams(query)}`,
+    headers: { Authorization: `Bearer ${token}` }
+  }, (res) => {
+    let body = '';
+    res.setEncoding('utf8');
+    res.on('data', (chunk) => { body += chunk; });
+    res.on('end', () => resolve({
+      ms: Number(process.hrtime.bigint() - start) / 1e6,
+      body: JSON.parse(body)
+    }));
+  }).on('error', reject);
+});
+
+const median = async (fn) => {
+  const samples = [];
+  for (let i = 0; i < args.repeat; i++) {
+    samples.push((await fn()).ms);
+  }
+  return +percentile(samples, 50).toFixed(2);
+};
+
+const run = async () => {
+  const { child, port, token } = await spawnServer(__filename, ['--child', 'true'], {
+    NODE_ENV: 'production',
+    RATE_LIMIT_ENABLED: 'false'
+  });
+
+  // Cursore all'inizio della pagina N calcolato fuori misura dal processo padre
+  await connect();
+  const PointTransaction = require('../src/models/PointTransaction');
+  const { encodeCursor, keysetSort } = require('../src/utils/helpers');
+
+  const cursorForPage = async (page) => {
+    if (page === 1) return null;
+    const [last] = await PointTransaction.find({})
+      .sort(keysetSort(SORT_KEYS))
+      .skip((page - 1) * args.limit - 1)
+      .limit(1)
+      .select('createdAt')
+      .lean();
+    return last ? encodeCursor(last, SORT_KEYS) : null;
+  };
+
+  const depths = [];
+  for (const page of args.depths.split(',').map(Number)) {
+    if ((page - 1) * args.limit >= args.transactions) continue;
+
+    const cursor = await cursorForPage(page);
+    depths.push({
+      page,
+      skipMs: await median(() => get(port, token, { page, limit: args.limit })),
+      cursorMs: await median(() => get(port, token, { limit: args.limit, ...(cursor && { cursor }) }))
+    });
+  }
+
+  const totals = {
+    estimatedTotalMs: await median(() => get(port, token, { limit: args.limit })),
+    exactTotalMs: await median(() => get(port, token, { limit: args.limit, withTotal: true }))
+  };
+
+  // Scorrimento sequenziale con il cursore
+  const walkStart = Date.now();
+  let cursor = null;
+  for (let i = 0; i < args.walk; i++) {
+    const { body } = await get(port, token, { limit: args.limit, ...(cursor && { cursor }) });
+    cursor = body.pagination.nextCursor;
+    if (!cursor) break;
+  }
+  const walkMs = Date.now() - walkStart;
+
+  await stopServer(child);
+  await disconnect();
+
+  console.table(depths);
+  console.table([{
+    transactions: args.transactions,
+    ...totals,
+    walkPages: args.walk,
+    walkMsPerPage: +(walkMs / args.walk).toFixed(2)
+  }]);
+};
+
+(args.child === 'true'
+  ? serveApp({ tables: 50, seed: seedTransactions })
+  : run()
+).catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
@@ -0,0 +1,105 @@
+// Benchmark login sotto carico di scansioni QR: durante una raffica di login misura
+// lag dell'event loop e p99 di GET /api/tables/qr/:qrCode, con bcrypt sul thread
+// principale (PASSWORD_WORKERS=0) e nel pool di worker thread.
+//
+// Uso: MONGODB_BENCH_URI=mongodb://localhost:27017/qr-tavoli-bench \
+//        node benchmarks/passwordHashing.bench.js --logins 40 --loginConcurrency 8 --duration 10000
+const http = require('http');
+const { parseArgs, httpLoad, spawnServer, requestJson, summarize } = require('./lib');
+const { serveApp, stopServer } = require('./fixtures');
+
+const args = parseArgs({
+  duration: 10000,
+  concurrency: 16,
+  logins: 40,
+  loginConcurrency: 8,
+  rounds: 12,
+  tables: 50,
+  child: 'false'
+});
+
+const runServer = () => {
+  const { monitorEventLoopDelay } = require('perf_hooks');
+  const passwordHasher = require('../src/utils/passwordHasher');
+  const histogram = monitorEventLoopDelay({ resolution: 10 });
+  histogram.enable();
+
+  return serveApp({
+    tables: args.tables,
+    onStop: async () => ({
+      loopLagP99Ms: histogram.percentile(99) / 1e6,
+      loopLagMaxMs: histogram.max / 1e6,
+      passwordHasher: passwordHasher.getMetrics()
+    })
+  });
+};
+
+const runMode = async (workers) => {
+  const { child, port } = await spawnServer(__filename, ['--child', 'true'], {
+    NODE_ENV: 'production',
+    RATE_LIMIT_ENABLED: 'false',
+    BCRYPT_ROUNDS: String(args.rounds),
+    PASSWORD_WORKERS: String(workers),
+    PASSWORD_MAX_QUEUE: '1000'
+  });
+
+  // Raffica di login in parallelo alle scansioni, avviata a metà del carico
+  const agent = new http.Agent({ keepAlive: true });
+  const loginLatencies = [];
+  const loginStatuses = {};
+
+  const logins = new Promise((resolve) => setTimeout(resolve, args.duration / 4)).then(async () => {
+    let next = 0;
+    const worker = async () => {
+      while (next++ < args.logins) {
+        const response = await requestJson({
+          port,
+          agent,
+          method: 'POST',
+          path: '/api/auth/login',
+          body: { email: 'bench@test.com', password: 'Bench123' }
+        });
+        loginLatencies.push(response.ms);
+        loginStatuses[response.status] = (loginStatuses[response.status] || 0) + 1;
+      }
+    };
+    await Promise.all(Array.from({ length: args.loginConcurrency }, worker));
+  });
+
+  const scans = await httpLoad({
+    port,
+    concurrency: args.concurrency,
+    durationMs: args.duration,
+    request: (i) => ({ path: `/api/tables/qr/TABLE_${(i % args.tables) + 1}` })
+  });
+
+  await logins;
+  agent.destroy();
+  const summary = await stopServer(child);
+  const loginSummary = summarize(loginLatencies);
+
+  return {
+    mode: workers ? `worker pool (${workers})` : 'main thread',
+    scanRps: scans.rps,
+    scanP50Ms: scans.p50Ms,
+    scanP99Ms: scans.p99Ms,
+    loopLagP99Ms: +summary.loopLagP99Ms.toFixed(1),
+    loopLagMaxMs: +summary.loopLagMaxMs.toFixed(1),
+    loginP50Ms: loginSummary.p50Ms,
+    loginP99Ms: loginSummary.p99Ms,
+    loginStatuses: JSON.stringify(loginStatuses)
+  };
+};
+
+const run = async () => {
+  const workers = Math.max(1, Math.min(4, require('os').cpus().length - 1));
+  const results = [];
+  results.push(await runMode(0));
+  results.push(await runMode(workers));
+  console.table(results);
+};
+
+(args.child === 'true' ? runServer() : run()).catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
@@ -0,0 +1,94 @@
+// Benchmark assegnazione punti: percorso legacy (find + save + create) contro $inc atomico.
+// Misura round trip Mongo per scansione, latenza p99 e aggiornamenti persi sotto
+// scansioni concorrenti sugli stessi tavoli.
+//
+// Uso: MONGODB_BENCH_URI=mongodb://localhost:27017/qr-tavoli-bench \
+//        node benchmarks/pointsAtomic.bench.js --scans 2000 --concurrency 50 --tables 5
+const mongoose = require('mongoose');
+const Table = require('../src/models/Table');
+const PointTransaction = require('../src/models/PointTransaction');
+const { parseArgs, connect, disconnect, runConcurrent, summarize } = require('./lib');
+
+const args = parseArgs({ scans: 2000, concurrency: 50, tables: 5, points: 5 });
+
+// Sequenza originale di pointsController.addPoints
+const legacyScan = async (qrCode, userId) => {
+  const table = await Table.findByQR(qrCode);
+  const previousPoints = table.points;
+
+  await table.addPoints(args.points, userId);
+
+  // Il vecchio hook pre-save rileggeva il tavolo quando previousPoints era 0
+  if (!previousPoints) {
+    await Table.findById(table._id);
+  }
+
+  await PointTransaction.create({
+    table: table._id,
+    assignedBy: userId,
+    points: args.points,
+    type: 'EARNED',
+    metadata: { previousPoints, newPoints: table.points }
+  });
+};
+
+// Nuova sequenza: un solo findOneAndUpdate + insert della transazione
+const atomicScan = async (qrCode, userId) => {
+  const table = await Table.applyPointsDeltaByQR(qrCode, args.points);
+
+  await PointTransaction.create({
+    table: table._id,
+    assignedBy: userId,
+    points: args.points,
+    type: 'EARNED',
+    metadata: {
+      previousPoints: table.points - args.points,
+      newPoints: table.points
+    }
+  });
+};
+
+const run = async () => {
+  const counter = await connect();
+  const userId = new mongoose.Types.ObjectId();
+
+  await Table.deleteMany({});
+  await PointTransaction.deleteMany({});
+  await Table.insertMany(Array.from({ length: args.tables }, (_, i) => ({
+    tableNumber: i + 1,
+    name: `Tavolo ${i + 1}`,
+    qrCode: `TABLE_${i + 1}`
+  })));
+
+  const results = [];
+
+  for (const [mode, scan] of [['legacy', legacyScan], ['atomic', atomicScan]]) {
+    await Table.updateMany({}, { $set: { points: 0 } });
+    counter.reset();
+
+    const { latencies, opsPerSec } = await runConcurrent(args.scans, args.concurrency, (i) =>
+      scan(`TABLE_${(i % args.tables) + 1}`, userId)
+    );
+    const commands = counter.commands;
+
+    const [{ total = 0 } = {}] = await Table.aggregate([
+      { $group: { _id: null, total: { $sum: '$points' } } }
+    ]);
+
+    results.push({
+      mode,
+      ...summarize(latencies),
+      opsPerSec,
+      roundTripsPerScan: +(commands / args.scans).toFixed(2),
+      lostUpdates: (args.scans * args.points - total) / args.points
+    });
+  }
+
+  console.table(results);
+  await disconnect();
+};
+
+run().catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
@@ -0,0 +1,96 @@
+// Benchmark batch punti: 1.000 assegnazioni con una sola POST /api/points/batch
+// rispetto a 1.000 chiamate POST /api/points/add (in sequenza e in parallelo).
+// Riporta tempo totale, round trip Mongo e scritture per operazione.
+//
+// Uso: MONGODB_BENCH_URI=mongodb://localhost:27017/qr-tavoli-bench \
+//        node benchmarks/pointsBatch.bench.js --items 1000 --tables 200 --rounds 5
+const http = require('http');
+const { parseArgs, percentile, runConcurrent, spawnServer, requestJson } = require('./lib');
+const { serveApp, stopServer } = require('./fixtures');
+
+const args = parseArgs({ items: 1000, tables: 200, rounds: 5, concurrency: 32, child: 'false' });
+
+const qrCodeFor = (i) => `TABLE_${(i % args.tables) + 1}`;
+
+const singleCalls = async (port, token, concurrency) => {
+  const agent = new http.Agent({ keepAlive: true, maxSockets: concurrency });
+  const start = Date.now();
+  let failed = 0;
+
+  await runConcurrent(args.items, concurrency, async (i) => {
+    const { status } = await requestJson({
+      port,
+      token,
+      agent,
+      method: 'POST',
+      path: '/api/points/add',
+      body: { qrCode: qrCodeFor(i), points: 1 }
+    });
+    if (status !== 200) failed++;
+  });
+
+  agent.destroy();
+  return { ms: Date.now() - start, failed };
+};
+
+const batchCall = async (port, token, round) => {
+  const { status, body, ms } = await requestJson({
+    port,
+    token,
+    method: 'POST',
+    path: '/api/points/batch',
+    body: {
+      batchId: `bench-${process.pid}-${round}`,
+      items: Array.from({ length: args.items }, (_, i) => ({ qrCode: qrCodeFor(i), points: 1 }))
+    }
+  });
+
+  return { ms, failed: status === 200 ? body.data.summary.failed : args.items };
+};
+
+const runMode = async (mode) => {
+  const { child, port, token } = await spawnServer(__filename, ['--child', 'true'], {
+    NODE_ENV: 'production',
+    RATE_LIMIT_ENABLED: 'false'
+  });
+
+  const timings = [];
+  let failed = 0;
+
+  for (let round = 0; round < args.rounds; round++) {
+    const result = mode === 'batch'
+      ? await batchCall(port, token, round)
+      : await singleCalls(port, token, mode === 'single (sequential)' ? 1 : args.concurrency);
+
+    timings.push(result.ms);
+    failed += result.failed;
+  }
+
+  const summary = await stopServer(child);
+  const operations = args.items * args.rounds;
+
+  return {
+    mode,
+    items: args.items,
+    p50Ms: +percentile(timings, 50).toFixed(1),
+    maxMs: +Math.max(...timings).toFixed(1),
+    opsPerSec: Math.round(args.items / (percentile(timings, 50) / 1000)),
+    mongoCommandsPerItem: +(summary.commands.total / operations).toFixed(3),
+    failed
+  };
+};
+
+const run = async () => {
+  const results = [];
+
+  for (const mode of ['single (sequential)', `single (concurrency ${args.concurrency})`, 'batch']) {
+    results.push(await runMode(mode));
+  }
+
+  console.table(results);
+};
+
+(args.child === 'true' ? serveApp({ tables: args.tables }) : run()).catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
@@ -0,0 +1,70 @@
+// Microbenchmark della cache principal su POST /api/points/add (route protetta):
+// confronta throughput, p99 e letture della collection users con e senza cache.
+//
+// Uso: MONGODB_BENCH_URI=mongodb://localhost:27017/qr-tavoli-bench \
+//        node benchmarks/principalCache.bench.js --duration 10000 --concurrency 32
+const { parseArgs, httpLoad, spawnServer } = require('./lib');
+const { serveApp, stopServer } = require('./fixtures');
+
+const args = parseArgs({ duration: 10000, concurrency: 32, tables: 50, child: 'false' });
+
+const runServer = () => {
+  const mongoose = require('mongoose');
+  const principalCache = require('../src/utils/principalCache');
+  let userReads = 0;
+
+  return serveApp({
+    tables: args.tables,
+    onStop: async () => ({ userReads, principalCache: principalCache.getMetrics() })
+  }).then(() => {
+    mongoose.connection.getClient().on('commandStarted', (event) => {
+      if (event.commandName === 'find' && event.command.find === 'users') {
+        userReads++;
+      }
+    });
+  });
+};
+
+const runMode = async (ttlMs) => {
+  const { child, port, token } = await spawnServer(__filename, ['--child', 'true'], {
+    NODE_ENV: 'production',
+    RATE_LIMIT_ENABLED: 'false',
+    PRINCIPAL_CACHE_TTL_MS: String(ttlMs)
+  });
+
+  const result = await httpLoad({
+    port,
+    concurrency: args.concurrency,
+    durationMs: args.duration,
+    request: (i) => ({
+      method: 'POST',
+      path: '/api/points/add',
+      headers: { Authorization: `Bearer ${token}` },
+      body: { qrCode: `TABLE_${(i % args.tables) + 1}`, points: 1 }
+    })
+  });
+
+  const summary = await stopServer(child);
+
+  return {
+    mode: ttlMs ? `cache (ttl ${ttlMs}ms)` : 'no cache',
+    rps: result.rps,
+    p50Ms: result.p50Ms,
+    p99Ms: result.p99Ms,
+    userReadsPerRequest: +(summary.userReads / result.requests).toFixed(3),
+    mongoCommandsPerRequest: +(summary.commands.total / result.requests).toFixed(2),
+    hitRatio: +summary.principalCache.hitRatio.toFixed(3)
+  };
+};
+
+const run = async () => {
+  const results = [];
+  results.push(await runMode(0));
+  results.push(await runMode(30000));
+  console.table(results);
+};
+
+(args.child === 'true' ? runServer() : run()).catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
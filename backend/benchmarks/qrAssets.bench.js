@@ -0,0 +1,87 @@
+// Benchmark generazione massiva dei QR: rigenera i PNG di --tables tavoli con il ciclo
+// sequenziale originale (QRCode.toFile uno alla volta) e con la pipeline qrAssets a
+// freddo (cache su disco vuota) e a caldo (stessi codici: nessun nuovo rendering),
+// per ciascun numero di worker in --workers. Non serve MongoDB.
+//
+// Uso: node benchmarks/qrAssets.bench.js --tables 1000 --workers 0,2,4
+const os = require('os');
+const path = require('path');
+const fs = require('fs').promises;
+const QRCode = require('qrcode');
+const { parseArgs } = require('./lib');
+const { QRAssetPipeline } = require('../src/utils/qrAssets');
+const { mapLimit } = require('../src/utils/helpers');
+
+const args = parseArgs({ tables: 1000, workers: '0,2,4', concurrency: 16 });
+
+const tables = Array.from({ length: args.tables }, (_, i) => ({
+  tableNumber: i + 1,
+  qrCode: `TABLE_${i + 1}`
+}));
+
+const elapsed = (start) => +(Number(process.hrtime.bigint() - start) / 1e6).toFixed(1);
+
+// Ciclo originale di generateTableQRCodes: un await per tavolo, nessuna cache
+const runSequential = async (outputDir) => {
+  const start = process.hrtime.bigint();
+
+  for (const table of tables) {
+    await QRCode.toFile(path.join(outputDir, `table-${table.tableNumber}.png`), table.qrCode, {
+      type: 'png',
+      margin: 1,
+      color: { dark: '#000000', light: '#FFFFFF' }
+    });
+  }
+
+  return { ms: elapsed(start), renders: tables.length };
+};
+
+// Stessa logica di generateTableQRCodes su una pipeline dedicata (cache e worker isolati)
+const runPipeline = async (pipeline, outputDir) => {
+  const before = pipeline.stats.renders;
+  const start = process.hrtime.bigint();
+
+  await mapLimit(tables, args.concurrency, async (table) => {
+    const asset = await pipeline.file(table.qrCode, { format: 'png' });
+    await fs.copyFile(asset.path, path.join(outputDir, `table-${table.tableNumber}.png`));
+  });
+
+  return { ms: elapsed(start), renders: pipeline.stats.renders - before };
+};
+
+const run = async () => {
+  const root = await fs.mkdtemp(path.join(os.tmpdir(), 'qr-bench-'));
+  const outputDir = path.join(root, 'out');
+  await fs.mkdir(outputDir);
+
+  const results = [];
+  const baseline = await runSequential(outputDir);
+  results.push({ mode: 'sequential', workers: '-', ...baseline, tablesPerSec: Math.round(args.tables / (baseline.ms / 1000)) });
+
+  for (const workers of String(args.workers).split(',').map(Number)) {
+    const cacheDir = path.join(root, `cache-${workers}`);
+
+    for (const mode of ['cold', 'warm']) {
+      // Istanza nuova a ogni giro: a caldo conta solo la cache su disco
+      const pipeline = new QRAssetPipeline({ workers, cacheDir, concurrency: args.concurrency });
+      const result = await runPipeline(pipeline, outputDir);
+      await pipeline.stop();
+
+      results.push({
+        mode,
+        workers,
+        ...result,
+        tablesPerSec: Math.round(args.tables / (result.ms / 1000)),
+        speedup: +(baseline.ms / result.ms).toFixed(1)
+      });
+    }
+  }
+
+  console.table(results);
+  await fs.rm(root, { recursive: true, force: true });
+};
+
+run().catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
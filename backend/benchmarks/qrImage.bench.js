@@ -0,0 +1,92 @@
+// Benchmark endpoint immagini QR (GET /api/tables/:id/qr.png): con la LRU delle
+// immagini il rendering si paga una volta per codice, non una per richiesta.
+// Modalità: "same" (sempre lo stesso tavolo), "all" (tutti i tavoli a rotazione),
+// "variants" (--variants dimensioni diverse per tavolo), "304" (If-None-Match).
+// Riporta rendering effettivi per richiesta e throughput.
+//
+// Uso: MONGODB_BENCH_URI=mongodb://localhost:27017/qr-tavoli-bench \
+//        node benchmarks/qrImage.bench.js --tables 100 --duration 10000
+const { parseArgs, httpLoad, requestJson, spawnServer } = require('./lib');
+const { serveApp, stopServer } = require('./fixtures');
+
+const args = parseArgs({ tables: 100, duration: 10000, concurrency: 32, variants: 4, child: 'false' });
+
+// Solo gli header: il corpo è un PNG, non JSON
+const headersOf = (port, path) => new Promise((resolve, reject) => {
+  require('http').get({ host: '127.0.0.1', port, path }, (res) => {
+    res.resume();
+    resolve(res.headers);
+  }).on('error', reject);
+});
+
+const runServer = async () => {
+  const qrAssets = require('../src/utils/qrAssets');
+
+  await serveApp({
+    tables: args.tables,
+    onStop: async () => ({ qr: qrAssets.getMetrics() })
+  });
+};
+
+const runMode = async (mode) => {
+  const { child, port, token } = await spawnServer(__filename, ['--child', 'true', '--tables', String(args.tables)], {
+    NODE_ENV: 'production',
+    RATE_LIMIT_ENABLED: 'false'
+  });
+
+  const { body } = await requestJson({ port, path: `/api/tables?limit=${Math.min(100, args.tables)}`, token });
+  const ids = body.data.map(table => table._id);
+
+  let etag = null;
+  if (mode === '304') {
+    etag = (await headersOf(port, `/api/tables/${ids[0]}/qr.png`)).etag;
+  }
+
+  const result = await httpLoad({
+    port,
+    concurrency: args.concurrency,
+    durationMs: args.duration,
+    request: (i) => {
+      switch (mode) {
+        case 'all':
+          return { path: `/api/tables/${ids[i % ids.length]}/qr.png` };
+        case 'variants':
+          return { path: `/api/tables/${ids[i % ids.length]}/qr.png?size=${128 + 64 * (i % args.variants)}` };
+        case '304':
+          return { path: `/api/tables/${ids[0]}/qr.png`, headers: { 'If-None-Match': etag } };
+        default:
+          return { path: `/api/tables/${ids[0]}/qr.png` };
+      }
+    }
+  });
+
+  const { qr } = await stopServer(child);
+  const distinct = { same: 1, '304': 1, all: ids.length, variants: ids.length * args.variants }[mode];
+
+  return {
+    mode,
+    requests: result.requests,
+    rps: result.rps,
+    p50Ms: result.p50Ms,
+    p99Ms: result.p99Ms,
+    distinctImages: distinct,
+    renders: qr.renders,
+    rendersPerRequest: +(qr.renders / result.requests).toFixed(4),
+    imageHitRatio: +qr.images.hitRatio.toFixed(3)
+  };
+};
+
+const run = async () => {
+  const results = [];
+
+  for (const mode of ['same', 'all', 'variants', '304']) {
+    results.push(await runMode(mode));
+  }
+
+  console.table(results);
+};
+
+(args.child === 'true' ? runServer() : run()).catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
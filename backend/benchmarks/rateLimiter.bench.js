@@ -0,0 +1,82 @@
+// Throughput del rate limiter: hit/secondo e latenza p99 di store.hit() per gli store
+// memory, cluster (worker → primario via IPC) e mongo. Nel caso cluster verifica anche
+// che i worker condividano i contatori: la chiave comune deve contare tutti gli hit.
+//
+// Uso: MONGODB_BENCH_URI=mongodb://localhost:27017/qr-tavoli-bench \
+//        node benchmarks/rateLimiter.bench.js --hits 200000 --keys 1000 --workers 4
+const cluster = require('cluster');
+const { parseArgs, runConcurrent, summarize, connect, disconnect } = require('./lib');
+const { MemoryRateLimitStore, ClusterRateLimitStore, MongoRateLimitStore } = require('../src/utils/rateLimitStore');
+
+const args = parseArgs({ hits: 200000, mongoHits: 20000, keys: 1000, concurrency: 64, workers: 4 });
+const WINDOW_MS = 60 * 60 * 1000;
+
+const measure = async (store, hits) => {
+  const result = await runConcurrent(hits, args.concurrency, (i) => store.hit(`bench:${i % args.keys}`, WINDOW_MS));
+  const { p50Ms, p99Ms } = summarize(result.latencies);
+  return { hits, opsPerSec: result.opsPerSec, p50Ms, p99Ms };
+};
+
+// Worker del cluster: hit sulle proprie chiavi più una chiave condivisa, poi riporta
+const runWorker = async () => {
+  const store = new ClusterRateLimitStore();
+  const hits = Math.floor(args.hits / args.workers);
+  const result = await measure(store, hits);
+
+  await Promise.all(Array.from({ length: 100 }, () => store.hit('bench:shared', WINDOW_MS)));
+
+  process.send({ type: 'bench:result', result, fallbacks: store.getMetrics().fallbacks });
+  process.disconnect();
+};
+
+const runCluster = () => new Promise((resolve) => {
+  const store = ClusterRateLimitStore.serve(cluster);
+  const results = [];
+  const start = process.hrtime.bigint();
+
+  cluster.on('message', (worker, message) => {
+    if (message.type !== 'bench:result') return;
+    results.push(message);
+
+    if (results.length === args.workers) {
+      const elapsedMs = Number(process.hrtime.bigint() - start) / 1e6;
+      const shared = store.hitSync('bench:shared', WINDOW_MS).count - 1;
+
+      resolve({
+        store: `cluster (${args.workers} worker)`,
+        hits: results.reduce((sum, r) => sum + r.result.hits, 0),
+        opsPerSec: Math.round(results.reduce((sum, r) => sum + r.result.hits + 100, 0) / (elapsedMs / 1000)),
+        p50Ms: Math.max(...results.map(r => r.result.p50Ms)),
+        p99Ms: Math.max(...results.map(r => r.result.p99Ms)),
+        sharedKeyCount: `${shared}/${args.workers * 100}`,
+        fallbacks: results.reduce((sum, r) => sum + r.fallbacks, 0)
+      });
+    }
+  });
+
+  for (let i = 0; i < args.workers; i++) {
+    cluster.fork();
+  }
+});
+
+const run = async () => {
+  const results = [];
+
+  results.push({ store: 'memory', ...(await measure(new MemoryRateLimitStore(), args.hits)) });
+  results.push(await runCluster());
+
+  await connect();
+  const mongoStore = new MongoRateLimitStore();
+  await mongoStore.reset();
+  results.push({ store: 'mongo', ...(await measure(mongoStore, args.mongoHits)) });
+  await mongoStore.reset();
+  await disconnect();
+
+  console.table(results);
+  process.exit(0);
+};
+
+(cluster.isWorker ? runWorker() : run()).catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
@@ -0,0 +1,91 @@
+// Benchmark cache risposte pubbliche: richieste/secondo su classifica e ricerca QR
+// senza cache, con cache (200 dal buffer serializzato) e con revalidazione
+// If-None-Match (304). La modalità churn applica punti a un tavolo ogni --writeMs
+// millisecondi per misurare hit ratio e byte risparmiati con classifica in movimento.
+//
+// Uso: MONGODB_BENCH_URI=mongodb://localhost:27017/qr-tavoli-bench \
+//        node benchmarks/responseCache.bench.js --tables 5000 --duration 10000
+const { parseArgs, httpLoad, requestJson, spawnServer } = require('./lib');
+const { serveApp, stopServer } = require('./fixtures');
+
+const args = parseArgs({ tables: 5000, duration: 10000, concurrency: 64, limit: 20, writeMs: 100, child: 'false' });
+
+const runServer = async () => {
+  const responseCache = require('../src/utils/responseCache');
+  const Table = require('../src/models/Table');
+  let timer = null;
+
+  await serveApp({
+    tables: args.tables,
+    onStop: async () => {
+      clearInterval(timer);
+      return { cache: responseCache.getMetrics() };
+    }
+  });
+
+  const writeMs = Number(process.env.BENCH_WRITE_MS);
+  if (writeMs > 0) {
+    timer = setInterval(() => {
+      const tableNumber = 1 + Math.floor(Math.random() * args.tables);
+      Table.applyPointsDelta({ tableNumber }, 1).catch(() => {});
+    }, writeMs);
+  }
+};
+
+const runMode = async (mode, endpoint) => {
+  const { child, port } = await spawnServer(__filename, ['--child', 'true', '--tables', String(args.tables)], {
+    NODE_ENV: 'production',
+    RATE_LIMIT_ENABLED: 'false',
+    RESPONSE_CACHE_ENABLED: String(mode !== 'off'),
+    BENCH_WRITE_MS: mode === 'churn' ? String(args.writeMs) : '0'
+  });
+
+  const path = endpoint === 'leaderboard'
+    ? `/api/tables/leaderboard?limit=${args.limit}`
+    : `/api/tables/qr/TABLE_${Math.ceil(args.tables / 2)}`;
+
+  // Revalidazione: il client ripresenta l'ETag della prima risposta (in churn invecchia subito)
+  let etag = null;
+  if (mode === '304' || mode === 'churn') {
+    etag = (await requestJson({ port, path })).headers.etag;
+  }
+
+  const result = await httpLoad({
+    port,
+    concurrency: args.concurrency,
+    durationMs: args.duration,
+    request: () => ({ path, headers: etag ? { 'If-None-Match': etag } : {} })
+  });
+
+  const summary = await stopServer(child);
+  const cache = summary.cache;
+
+  return {
+    endpoint,
+    mode,
+    rps: result.rps,
+    p50Ms: result.p50Ms,
+    p99Ms: result.p99Ms,
+    notModified: result.statuses[304] || 0,
+    mongoCommandsPerRequest: +(summary.commands.total / result.requests).toFixed(3),
+    hitRatio: mode === 'off' ? '-' : +cache.hitRatio.toFixed(3),
+    bytesSavedKb: mode === 'off' ? '-' : Math.round(cache.bytesSaved / 1024)
+  };
+};
+
+const run = async () => {
+  const results = [];
+
+  for (const endpoint of ['leaderboard', 'qr']) {
+    for (const mode of ['off', '200', '304', 'churn']) {
+      results.push(await runMode(mode, endpoint));
+    }
+  }
+
+  console.table(results);
+};
+
+(args.child === 'true' ? runServer() : run()).catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
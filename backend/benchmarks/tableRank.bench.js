@@ -0,0 +1,85 @@
+// Benchmark scansione QR: richieste/secondo su GET /api/tables/qr/:qrCode con la
+// posizione calcolata dal motore classifica (rank O(log n)) e con countDocuments
+// sull'indice di rank, da 10 a 100.000 tavoli.
+//
+// Uso: MONGODB_BENCH_URI=mongodb://localhost:27017/qr-tavoli-bench \
+//        node benchmarks/tableRank.bench.js --sizes 10,1000,10000,100000 --duration 10000
+const { parseArgs, httpLoad, spawnServer } = require('./lib');
+const { serveApp, stopServer } = require('./fixtures');
+
+const args = parseArgs({ sizes: '10,1000,10000,100000', duration: 10000, concurrency: 64, child: 'false' });
+
+const runServer = async () => {
+  const leaderboard = require('../src/utils/leaderboard');
+  const Table = require('../src/models/Table');
+
+  await serveApp({
+    tables: Number(process.env.BENCH_TABLES),
+    onStop: async () => {
+      // Chiavi esaminate da un singolo conteggio di rank (tavolo a metà classifica), con
+      // il piano scelto dal planner come in Table.countAhead
+      const table = await Table.findOne({}).sort({ points: -1 }).skip(Math.floor(Number(process.env.BENCH_TABLES) / 2)).lean();
+      const explain = await Table.find({
+        tenant: table.tenant,
+        isActive: true,
+        $or: [
+          { points: { $gt: table.points } },
+          { points: table.points, lastPointsUpdate: { $lt: table.lastPointsUpdate } }
+        ]
+      })
+        .select('_id')
+        .explain('executionStats');
+      const stats = explain.executionStats || {};
+
+      return { keysExamined: stats.totalKeysExamined };
+    }
+  });
+
+  if (process.env.LEADERBOARD_ENGINE !== 'false') {
+    await leaderboard.load();
+  }
+};
+
+const runMode = async (tables, engine) => {
+  const { child, port } = await spawnServer(__filename, ['--child', 'true'], {
+    NODE_ENV: 'production',
+    RATE_LIMIT_ENABLED: 'false',
+    LEADERBOARD_ENGINE: String(engine),
+    BENCH_TABLES: String(tables)
+  });
+
+  const result = await httpLoad({
+    port,
+    concurrency: args.concurrency,
+    durationMs: args.duration,
+    request: (i) => ({ path: `/api/tables/qr/TABLE_${(i % tables) + 1}` })
+  });
+
+  const summary = await stopServer(child);
+
+  return {
+    tables,
+    mode: engine ? 'engine' : 'countDocuments',
+    rps: result.rps,
+    p50Ms: result.p50Ms,
+    p99Ms: result.p99Ms,
+    mongoCommandsPerRequest: +(summary.commands.total / result.requests).toFixed(3),
+    countKeysExamined: summary.keysExamined ?? '-'
+  };
+};
+
+const run = async () => {
+  const results = [];
+
+  for (const tables of args.sizes.split(',').map(Number)) {
+    results.push(await runMode(tables, false));
+    results.push(await runMode(tables, true));
+  }
+
+  console.table(results);
+};
+
+(args.child === 'true' ? runServer() : run()).catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
@@ -0,0 +1,98 @@
+// Benchmark multi-ristorante: lo stesso processo serve un solo tenant oppure --tenants
+// tenant con --tables tavoli ciascuno. Il carico alterna classifica (X-Tenant) e ricerca
+// QR con prefisso ("tenant:TABLE_n") su tenant casuali, mentre il processo applica
+// punti ogni --writeMs millisecondi. Confronta il p99 per tenant con il caso a tenant
+// singolo: con indici prefissati dal tenant e motori classifica separati deve restare
+// invariato.
+//
+// Uso: MONGODB_BENCH_URI=mongodb://localhost:27017/qr-tavoli-bench \
+//        node benchmarks/tenants.bench.js --tenants 200 --tables 50 --duration 20000
+const { parseArgs, httpLoad, spawnServer, percentile } = require('./lib');
+const { serveApp, stopServer, seedTables } = require('./fixtures');
+
+const args = parseArgs({ tenants: 200, tables: 50, duration: 20000, concurrency: 64, limit: 20, writeMs: 20, child: 'false' });
+
+const tenantName = (i) => `bench-${i}`;
+
+const runServer = async () => {
+  const Table = require('../src/models/Table');
+  const leaderboard = require('../src/utils/leaderboard');
+  const tenants = Number(process.env.BENCH_TENANTS);
+  let timer = null;
+
+  await serveApp({
+    tables: 0,
+    seed: async () => {
+      for (let i = 0; i < tenants; i++) {
+        await seedTables(args.tables, 0, tenantName(i));
+      }
+      await leaderboard.load();
+    },
+    onStop: async () => {
+      clearInterval(timer);
+      return { leaderboard: leaderboard.getMetrics() };
+    }
+  });
+
+  timer = setInterval(() => {
+    const tenant = tenantName(Math.floor(Math.random() * tenants));
+    const tableNumber = 1 + Math.floor(Math.random() * args.tables);
+    Table.applyPointsDelta({ tenant, tableNumber }, 1).catch(() => {});
+  }, args.writeMs);
+};
+
+const runMode = async (tenants) => {
+  const { child, port } = await spawnServer(__filename, [
+    '--child', 'true',
+    '--tables', String(args.tables),
+    '--writeMs', String(args.writeMs)
+  ], {
+    NODE_ENV: 'production',
+    RATE_LIMIT_ENABLED: 'false',
+    BENCH_TENANTS: String(tenants)
+  });
+
+  const result = await httpLoad({
+    port,
+    concurrency: args.concurrency,
+    durationMs: args.duration,
+    request: (i) => {
+      const tenant = tenantName(Math.floor(Math.random() * tenants));
+      const tableNumber = 1 + Math.floor(Math.random() * args.tables);
+
+      return i % 2 === 0
+        ? { path: `/api/tables/leaderboard?limit=${args.limit}`, headers: { 'X-Tenant': tenant }, group: tenant }
+        : { path: `/api/tables/qr/${tenant}:TABLE_${tableNumber}`, group: tenant };
+    }
+  });
+
+  const summary = await stopServer(child);
+  const p99s = Object.values(result.groups).map(group => group.p99Ms);
+
+  return {
+    tenants,
+    rps: result.rps,
+    p50Ms: result.p50Ms,
+    p99Ms: result.p99Ms,
+    tenantP99MedianMs: +percentile(p99s, 50).toFixed(2),
+    tenantP99WorstMs: +Math.max(...p99s).toFixed(2),
+    errors: result.requests - (result.statuses[200] || 0),
+    engines: summary.leaderboard.tenants,
+    mongoCommandsPerRequest: +(summary.commands.total / result.requests).toFixed(3)
+  };
+};
+
+const run = async () => {
+  const results = [];
+
+  for (const tenants of [1, args.tenants]) {
+    results.push(await runMode(tenants));
+  }
+
+  console.table(results);
+};
+
+(args.child === 'true' ? runServer() : run()).catch((error) => {
+  console.error(error);
+  process.exit(1);
+});
@@ -1,136 +1,107 @@
-
- // Entry point dell’app: avvia il server, gestisce errori globali, collega Express e DB
-const express = require('express');
+ // Entry point dell’app: avvia il server (processo singolo o cluster), attende il DB
+ // prima di accettare richieste e in shutdown drena le richieste in corso
 require('dotenv').config();
+const cluster = require('cluster');
+const mongoose = require('mongoose');
+const config = require('./src/config/config');
+const { supervise, relayTableEvents, poolSizePerWorker } = require('./src/utils/clusterSupervisor');
 
-// Crea app direttamente qui (non importare da src/app)
-const app = express();
 const PORT = process.env.PORT || 3000;
-
-// Middleware base
-app.use(express.json());
-app.use(express.urlencoded({ extended: true }));
-
-// CORS manuale
-app.use((req, res, next) => {
-  res.header('Access-Control-Allow-Origin', '*');
-  res.header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS');
-  res.header('Access-Control-Allow-Headers', 'Origin, X-Requested-With, Content-Type, Accept, Authorization');
-  
-  if (req.method === 'OPTIONS') {
-    res.sendStatus(200);
-  } else {
-    next();
+const clustered = config.CLUSTER.workers > 1;
+
+const startServer = async () => {
+  const app = require('./src/app');
+  const connectDB = require('./src/config/database');
+  const ledger = require('./src/utils/ledgerWriter');
+  const statsRollups = require('./src/utils/statsRollups');
+  const liveUpdates = require('./src/utils/liveUpdates');
+  const passwordHasher = require('./src/utils/passwordHasher');
+  const qrAssets = require('./src/utils/qrAssets');
+  const tableEvents = require('./src/utils/tableEvents');
+  const metrics = require('./src/utils/metrics');
+  const healthCheck = require('./src/utils/healthCheck');
+  const tracer = require('./src/utils/tracing');
+  const logger = require('./src/utils/logger');
+
+  if (clustered) {
+    relayTableEvents(tableEvents);
   }
-});
 
-// Routes di base
-app.get('/', (req, res) => {
-  res.json({
-    message: '🍽️ QR Tavoli API',
-    version: '1.0.0',
-    status: 'running'
-  });
-});
+  // Lag dell'event loop e pause GC per /metrics
+  metrics.start();
 
-app.get('/health', (req, res) => {
-  res.status(200).json({
-    status: 'OK',
-    timestamp: new Date().toISOString(),
-    service: 'QR Tavoli API'
-  });
-});
+  // In ascolto solo a DB pronto (ledger recuperato, classifica caricata)
+  await connectDB(clustered ? { maxPoolSize: poolSizePerWorker() } : {});
 
-// API Routes per il frontend
-app.get('/api/tables/leaderboard', (req, res) => {
-  res.json({
-    success: true,
-    data: [
-      { id: 1, name: "Tavolo 1", points: 85, position: 1, medal: "🥇" },
-      { id: 2, name: "Tavolo VIP", points: 72, position: 2, medal: "🥈" },
-      { id: 3, name: "Tavolo 3", points: 65, position: 3, medal: "🥉" },
-      { id: 4, name: "Tavolo Famiglia", points: 45, position: 4 },
-      { id: 5, name: "Tavolo 5", points: 32, position: 5 }
-    ]
+  const server = app.listen(PORT, '0.0.0.0', () => {
+    console.log(`🚀 Server running on port ${PORT}${clustered ? ` (worker ${process.pid})` : ''}`);
+    console.log(`📱 QR Tavoli API ready!`);
   });
-});
 
-app.get('/api/tables/qr/:qrCode', (req, res) => {
-  const { qrCode } = req.params;
-  
-  const mockTable = {
-    id: parseInt(qrCode.replace('TABLE_', '')),
-    name: `Tavolo ${qrCode.replace('TABLE_', '')}`,
-    points: Math.floor(Math.random() * 100),
-    qrCode: qrCode,
-    position: Math.floor(Math.random() * 10) + 1
-  };
-  
-  res.json({
-    success: true,
-    data: mockTable
-  });
-});
+  let draining = false;
 
-app.post('/api/points/add', (req, res) => {
-  const { qrCode, points } = req.body;
-  
-  res.json({
-    success: true,
-    message: `${points} punti aggiunti con successo`,
-    data: {
-      table: {
-        qrCode: qrCode,
-        points: parseInt(points),
-        newTotal: Math.floor(Math.random() * 100) + parseInt(points)
-      }
+  // Durante il drenaggio le risposte chiudono la connessione keep-alive
+  server.on('request', (req, res) => {
+    if (draining) {
+      res.setHeader('Connection', 'close');
     }
   });
-});
 
-app.put('/api/tables/:id/name', (req, res) => {
-  const { name } = req.body;
-  const { id } = req.params;
-  
-  res.json({
-    success: true,
-    message: 'Nome tavolo aggiornato con successo',
-    data: {
-      id: id,
-      name: name
+  const shutdown = async (signal, exitCode = 0) => {
+    if (draining) return;
+    draining = true;
+    // /ready risponde 503 da subito: il load balancer smette di inviare richieste
+    healthCheck.setDraining();
+    console.log(`🛑 ${signal}: stop nuove connessioni, drenaggio richieste in corso`);
+
+    const timeout = setTimeout(() => {
+      console.error('⏱️  Drenaggio oltre il timeout, chiusura forzata delle connessioni');
+      server.closeAllConnections();
+    }, config.CLUSTER.shutdownTimeoutMs);
+    timeout.unref();
+
+    try {
+      // Gli stream SSE non finiscono da soli: i client si riconnettono a un altro worker
+      liveUpdates.close();
+      await new Promise((resolve) => {
+        server.close(resolve);
+        server.closeIdleConnections();
+      });
+
+      await ledger.stop();
+      await statsRollups.stop();
+      await passwordHasher.stop();
+      await qrAssets.stop();
+      await tracer.close();
+      await mongoose.connection.close();
+      await logger.close();
+    } catch (error) {
+      console.error('❌ Shutdown error:', error.message);
+      exitCode = 1;
     }
-  });
-});
 
-// 404 handler
-app.use('*', (req, res) => {
-  res.status(404).json({
-    success: false,
-    message: 'Endpoint non trovato'
-  });
-});
+    process.exit(exitCode);
+  };
 
-// Error handler
-app.use((err, req, res, next) => {
-  console.error('❌ Error:', err.stack);
-  res.status(500).json({
-    success: false,
-    message: 'Errore interno del server'
-  });
-});
+  process.on('SIGTERM', () => shutdown('SIGTERM'));
+  process.on('SIGINT', () => shutdown('SIGINT'));
 
-// Avvio server
-app.listen(PORT, '0.0.0.0', () => {
-  console.log(`🚀 Server running on port ${PORT}`);
-  console.log(`📱 QR Tavoli API ready!`);
-});
+  process.on('uncaughtException', (err) => {
+    console.error('❌ Uncaught Exception:', err);
+    shutdown('uncaughtException', 1);
+  });
+};
 
 // Gestione errori
 process.on('unhandledRejection', (err) => {
-  console.log('❌ Unhandled Promise Rejection:', err.message);
-});
-
-process.on('uncaughtException', (err) => {
-  console.log('❌ Uncaught Exception:', err.message);
+  console.log('❌ Unhandled Promise Rejection:', err && err.message);
 });
 
+if (clustered && cluster.isPrimary) {
+  supervise();
+} else {
+  startServer().catch((error) => {
+    console.error('❌ Avvio fallito:', error.message);
+    process.exit(1);
+  });
+}
@@ -4,52 +4,92 @@ const express = require('express');
 const cors = require('cors');
 const helmet = require('helmet');
 const morgan = require('morgan');
-const rateLimit = require('express-rate-limit');
+const config = require('./config/config');
+// Prima di route e modelli: il plugin mongoose del tracing vale solo per gli schemi compilati dopo
+const tracer = require('./utils/tracing');
+const logger = require('./utils/logger');
+const { rateLimiter } = require('./middleware/rateLimiter');
+const { resolveTenant } = require('./middleware/tenant');
+const { httpMetrics, metricsEndpoint } = require('./middleware/metrics');
+const { liveness, readiness } = require('./controllers/healthController');
 
 // Import routes
 const authRoutes = require('./routes/auth');
 const tableRoutes = require('./routes/tables');
 const pointsRoutes = require('./routes/points');
+const systemRoutes = require('./routes/system');
 
 const app = express();
 
 // Security middleware
 app.use(helmet());
 
-// Rate limiting
-const limiter = rateLimit({
-  windowMs: 15 * 60 * 1000, // 15 minuti
-  max: 100, // limite di 100 richieste per IP per finestra
-  message: 'Troppe richieste da questo IP, riprova tra 15 minuti.'
-});
-app.use(limiter);
+// Request id (X-Request-Id) in ogni riga di log della richiesta
+app.use(logger.middleware());
+
+// Tracing: span radice della richiesta (campionamento, traceparent W3C, X-Trace-Id)
+app.use(tracer.middleware());
+
+// Metriche Prometheus: latenza per route registrata a fine risposta; lo scrape è
+// prima del rate limiting, così Prometheus non riceve mai 429
+if (config.METRICS.enabled) {
+  app.use(httpMetrics);
+  app.get('/metrics', metricsEndpoint);
+}
+
+// Probe del load balancer: liveness e readiness (risultato in cache per HEALTH_CACHE_MS),
+// prima di tenant e rate limiting
+app.get('/health', liveness);
+app.get('/ready', readiness);
+
+// Tenant della richiesta (token, QR, header X-Tenant)
+app.use(resolveTenant);
+
+// Rate limiting (budget per route e tenant, per utente o per IP)
+if (config.RATE_LIMIT.enabled) {
+  app.use(rateLimiter);
+}
 
 // CORS configuration
 app.use(cors({
   origin: process.env.FRONTEND_URL || 'http://localhost:3000',
-  credentials: true
+  credentials: true,
+  exposedHeaders: ['ETag', 'Idempotent-Replayed', 'Retry-After', 'RateLimit-Limit', 'RateLimit-Remaining', 'RateLimit-Reset', 'X-Request-Id', 'X-Trace-Id']
 }));
 
 // Body parsing middleware
 app.use(express.json({ limit: '10mb' }));
 app.use(express.urlencoded({ extended: true }));
 
-// Logging
-app.use(morgan(process.env.NODE_ENV === 'production' ? 'combined' : 'dev'));
-
-// Health check endpoint
-app.get('/health', (req, res) => {
-  res.status(200).json({
-    status: 'OK',
-    timestamp: new Date().toISOString(),
-    service: 'QR Tavoli API'
-  });
-});
+// Logging: una riga per richiesta (con request id e trace id) sul logger asincrono,
+// categoria http
+const httpLog = logger.child('http');
+morgan.token('id', (req) => req.id || '-');
+morgan.token('trace', (req) => req.traceId || '-');
+app.use(morgan(process.env.NODE_ENV === 'production'
+  ? `${morgan.combined} req=:id trace=:trace`
+  : ':method :url :status :response-time ms - :res[content-length] req=:id trace=:trace', {
+  stream: { write: (line) => httpLog.info(line.trimEnd()) }
+}));
 
 // API Routes
 app.use('/api/auth', authRoutes);
 app.use('/api/tables', tableRoutes);
 app.use('/api/points', pointsRoutes);
+app.use('/api/system', systemRoutes);
+
+// Uno span per ogni middleware e controller delle route API
+tracer.nameHandlers(
+  require('./middleware/auth'),
+  require('./middleware/roleCheck'),
+  require('./middleware/validation'),
+  require('./middleware/idempotency'),
+  require('./controllers/authController'),
+  require('./controllers/tableController'),
+  require('./controllers/pointsController'),
+  require('./controllers/systemController')
+);
+[authRoutes, tableRoutes, pointsRoutes, systemRoutes].forEach(router => tracer.instrumentRouter(router));
 
 // Root endpoint
 app.get('/', (req, res) => {
@@ -70,7 +110,7 @@ app.use('*', (req, res) => {
 
 // Global error handler
 app.use((err, req, res, next) => {
-  console.error('❌ Error:', err.stack);
+  httpLog.error('Unhandled error', { error: err });
 
   res.status(err.status || 500).json({
     success: false,
@@ -9,10 +9,41 @@ module.exports = {
   MAX_POINTS_PER_TRANSACTION: 100,
   MIN_POINTS_PER_TRANSACTION: 1,
 
-  // Configurazioni tavoli
-  MAX_TABLES: 50,
+  // Asset QR: worker thread per il rendering (0 = thread principale), cache su disco
+  // indirizzata per contenuto (payload + opzioni), LRU in memoria per SVG e data URL
+  // e rendering in parallelo massimi nelle generazioni massive. imageCacheMax limita le
+  // immagini (PNG/SVG, comprese le varianti di dimensione e colore) servite via HTTP
+  QR_ASSETS: {
+    workers: process.env.QR_WORKERS !== undefined
+      ? parseInt(process.env.QR_WORKERS)
+      : Math.max(1, Math.min(4, require('os').cpus().length - 1)),
+    cacheDir: process.env.QR_CACHE_DIR || './data/qr',
+    memoryMax: parseInt(process.env.QR_MEMORY_CACHE_MAX) || 2000,
+    imageCacheMax: parseInt(process.env.QR_IMAGE_CACHE_MAX) || 1000,
+    concurrency: parseInt(process.env.QR_RENDER_CONCURRENCY) || 16
+  },
+
+  // Configurazioni tavoli (limite per singolo ristorante)
+  MAX_TABLES: parseInt(process.env.MAX_TABLES) || 50,
   DEFAULT_TABLE_POINTS: 0,
 
+  // Multi-ristorante: tenant dei dati senza tenant esplicito (installazioni a
+  // ristorante singolo, dati precedenti) e header delle richieste pubbliche senza token
+  TENANCY: {
+    defaultTenant: (process.env.DEFAULT_TENANT || 'default').toLowerCase(),
+    header: 'X-Tenant',
+    // Ristoranti tenuti in memoria (classifiche, versioni della cache di risposta)
+    maxTenants: parseInt(process.env.MAX_TENANTS, 10) || 1000,
+    // Intervallo minimo tra due riletture dei ristoranti esistenti per un tenant sconosciuto
+    registryRefreshMs: parseInt(process.env.TENANT_REGISTRY_REFRESH_MS, 10) || 10000
+  },
+
+  // Paginazione: il totale stimato per ristorante (senza ?withTotal) è un conteggio
+  // rinnovato al più ogni estimateTtlMs, non uno per richiesta
+  PAGINATION: {
+    estimateTtlMs: parseInt(process.env.PAGINATION_ESTIMATE_TTL_MS) || 60 * 1000
+  },
+
   // Ruoli utente
   USER_ROLES: {
     CUSTOMER: 'customer',
@@ -20,18 +51,200 @@ module.exports = {
     ADMIN: 'admin'
   },
 
-  // Rate limiting
+  // Password: costo bcrypt (un cambio rigenera l'hash al login successivo),
+  // worker thread dedicati e operazioni massime in coda
+  PASSWORD: {
+    rounds: parseInt(process.env.BCRYPT_ROUNDS) || 12,
+    workers: process.env.PASSWORD_WORKERS !== undefined
+      ? parseInt(process.env.PASSWORD_WORKERS)
+      : Math.max(1, Math.min(4, require('os').cpus().length - 1)),
+    maxQueue: parseInt(process.env.PASSWORD_MAX_QUEUE) || 64
+  },
+
+  // Rate limiting a finestra scorrevole per budget di route, contato per utente
+  // autenticato o per IP. Store: memory (un processo), cluster (worker dello stesso
+  // host, contatori nel primario), mongo (più host)
   RATE_LIMIT: {
-    windowMs: 15 * 60 * 1000, // 15 minuti
-    max: 100 // max 100 richieste per IP per finestra
+    enabled: process.env.RATE_LIMIT_ENABLED !== 'false',
+    store: process.env.RATE_LIMIT_STORE || 'memory',
+    budgets: {
+      // Login e registrazione, sempre per IP
+      login: {
+        windowMs: 15 * 60 * 1000,
+        max: parseInt(process.env.RATE_LIMIT_LOGIN_MAX) || 20
+      },
+      // Classifica, stream e scansione QR dei clienti
+      public: {
+        windowMs: 60 * 1000,
+        max: parseInt(process.env.RATE_LIMIT_PUBLIC_MAX) || 600
+      },
+      // Mutazioni (punti, tavoli, profilo)
+      writes: {
+        windowMs: 60 * 1000,
+        max: parseInt(process.env.RATE_LIMIT_WRITES_MAX) || 300
+      },
+      // Resto dell'API
+      api: {
+        windowMs: 15 * 60 * 1000,
+        max: parseInt(process.env.RATE_LIMIT_MAX) || 1000
+      }
+    }
+  },
+
+  // Classifica in memoria (LEADERBOARD_RESYNC_MS > 0 riallinea periodicamente da Mongo)
+  LEADERBOARD: {
+    engine: process.env.LEADERBOARD_ENGINE !== 'false',
+    resyncMs: parseInt(process.env.LEADERBOARD_RESYNC_MS) || 0
+  },
+
+  // Cache risposte pubbliche (classifica, ricerca QR) con ETag e 304.
+  // max-age per browser, s-maxage/stale-while-revalidate per CDN e proxy condivisi
+  RESPONSE_CACHE: {
+    enabled: process.env.RESPONSE_CACHE_ENABLED !== 'false',
+    max: parseInt(process.env.RESPONSE_CACHE_MAX) || 5000,
+    maxAge: parseInt(process.env.RESPONSE_CACHE_MAX_AGE) || 0,
+    sMaxAge: process.env.RESPONSE_CACHE_S_MAXAGE !== undefined
+      ? parseInt(process.env.RESPONSE_CACHE_S_MAXAGE)
+      : 2,
+    staleWhileRevalidate: process.env.RESPONSE_CACHE_SWR !== undefined
+      ? parseInt(process.env.RESPONSE_CACHE_SWR)
+      : 10
+  },
+
+  // Stream SSE classifica/tavoli: finestra di accorpamento e limiti per connessione
+  LIVE: {
+    maxClients: parseInt(process.env.LIVE_MAX_CLIENTS) || 20000,
+    coalesceMs: parseInt(process.env.LIVE_COALESCE_MS) || 250,
+    heartbeatMs: parseInt(process.env.LIVE_HEARTBEAT_MS) || 25 * 1000,
+    maxPending: parseInt(process.env.LIVE_MAX_PENDING) || 500,
+    retryMs: 5000
+  },
+
+  // Statistiche: fuso orario dei giorni, flush dei rollup, intervalli ammessi
+  STATS: {
+    timeZone: process.env.STATS_TIMEZONE || 'Europe/Rome',
+    rollupFlushMs: parseInt(process.env.STATS_ROLLUP_FLUSH_MS) || 1000,
+    // Spill locale delle transazioni non ancora nei rollup, recuperato all'avvio.
+    // spillId identifica il processo (host e slot del worker) nei bucket
+    spillDir: process.env.STATS_SPILL_DIR || './data/stats',
+    spillId: process.env.STATS_SPILL_ID || `${require('os').hostname()}-${process.env.LEDGER_SPILL_ID || 'main'}`,
+    userStatsDefaultDays: 30,
+    maxRangeDays: 366
+  },
+
+  // Batch punti: elementi massimi per richiesta, marker di idempotenza per tavolo
+  BATCH: {
+    maxItems: parseInt(process.env.BATCH_MAX_ITEMS) || 1000,
+    markers: 20
+  },
+
+  // Idempotency-Key sulle mutazioni punti: store (memory | mongo), durata delle
+  // risposte registrate, attesa massima su una richiesta in corso altrove
+  IDEMPOTENCY: {
+    store: process.env.IDEMPOTENCY_STORE || 'memory',
+    ttlMs: parseInt(process.env.IDEMPOTENCY_TTL_MS) || 24 * 60 * 60 * 1000,
+    max: parseInt(process.env.IDEMPOTENCY_MAX) || 10000,
+    lockTimeoutMs: 30 * 1000,
+    pollMs: 50
+  },
+
+  // Cache principal JWT: TTL = staleness massima dopo modifiche da altri processi
+  PRINCIPAL_CACHE: {
+    max: parseInt(process.env.PRINCIPAL_CACHE_MAX) || 5000,
+    ttlMs: process.env.PRINCIPAL_CACHE_TTL_MS !== undefined
+      ? parseInt(process.env.PRINCIPAL_CACHE_TTL_MS)
+      : 30 * 1000
+  },
+
+  // Ledger transazioni: write-behind con flush a soglia di dimensione o tempo
+  LEDGER: {
+    writeBehind: process.env.LEDGER_WRITE_BEHIND === 'true',
+    batchSize: parseInt(process.env.LEDGER_BATCH_SIZE) || 500,
+    flushIntervalMs: parseInt(process.env.LEDGER_FLUSH_INTERVAL_MS) || 200,
+    maxQueue: parseInt(process.env.LEDGER_MAX_QUEUE) || 50000,
+    spillDir: process.env.LEDGER_SPILL_DIR || './data/ledger',
+    spillId: process.env.LEDGER_SPILL_ID || 'main'
+  },
+
+  // Modalità cluster: CLUSTER_WORKERS=auto avvia un worker per core (1 = processo singolo).
+  // In shutdown ogni worker smette di accettare connessioni e attende le richieste in
+  // corso fino a shutdownTimeoutMs
+  CLUSTER: {
+    workers: process.env.CLUSTER_WORKERS === 'auto'
+      ? require('os').cpus().length
+      : parseInt(process.env.CLUSTER_WORKERS) || 1,
+    shutdownTimeoutMs: parseInt(process.env.SHUTDOWN_TIMEOUT_MS) || 10 * 1000,
+    restartDelayMs: 1000
   },
 
   // Configurazioni database
+  // (in cluster maxPoolSize è il budget totale, diviso tra i worker)
   DB_OPTIONS: {
-    useNewUrlParser: true,
-    useUnifiedTopology: true,
-    maxPoolSize: 10,
-    serverSelectionTimeoutMS: 5000,
-    socketTimeoutMS: 45000,
+    maxPoolSize: parseInt(process.env.DB_MAX_POOL_SIZE) || 10,
+    minPoolSize: parseInt(process.env.DB_MIN_POOL_SIZE) || 0,
+    serverSelectionTimeoutMS: parseInt(process.env.DB_SERVER_SELECTION_TIMEOUT_MS) || 5000,
+    socketTimeoutMS: parseInt(process.env.DB_SOCKET_TIMEOUT_MS) || 45000
+  },
+
+  // Log della durata dei comandi Mongo su una frazione delle query (0 = disattivo)
+  DB_DEBUG: {
+    sampleRate: parseFloat(process.env.DB_DEBUG_SAMPLE_RATE) || 0
+  },
+
+  // Readiness (/ready): soglie oltre le quali il processo esce dal bilanciamento e
+  // durata della cache del risultato (le probe non generano più di un ping per cacheMs)
+  HEALTH: {
+    cacheMs: parseInt(process.env.HEALTH_CACHE_MS) || 1000,
+    pingTimeoutMs: parseInt(process.env.HEALTH_PING_TIMEOUT_MS) || 1000,
+    maxPingMs: parseInt(process.env.HEALTH_MAX_PING_MS) || 250,
+    maxPoolWaitQueue: process.env.HEALTH_MAX_POOL_WAIT !== undefined
+      ? parseInt(process.env.HEALTH_MAX_POOL_WAIT)
+      : 20,
+    maxEventLoopLagMs: parseInt(process.env.HEALTH_MAX_EVENT_LOOP_LAG_MS) || 200,
+    maxLedgerQueue: parseInt(process.env.HEALTH_MAX_LEDGER_QUEUE) || 40000
+  },
+
+  // Metriche Prometheus su /metrics: istogrammi HTTP e Mongo, lag dell'event loop
+  // (campionato ogni lagSampleMs), pause GC, contatori di dominio. Con token impostato
+  // lo scrape richiede "Authorization: Bearer <token>"
+  METRICS: {
+    enabled: process.env.METRICS_ENABLED !== 'false',
+    token: process.env.METRICS_TOKEN || null,
+    lagSampleMs: parseInt(process.env.METRICS_LAG_SAMPLE_MS) || 500
+  },
+
+  // Tracing delle richieste (span per middleware, controller e comandi Mongo):
+  // campionata una frazione sampleRate delle richieste, più quelle lente (>= slowMs,
+  // 0 = solo campionamento) o in errore. Export su file JSON lines (OTLP) o console
+  TRACING: {
+    enabled: process.env.TRACING_ENABLED === 'true',
+    serviceName: process.env.TRACE_SERVICE_NAME || 'qr-tavoli-api',
+    sampleRate: process.env.TRACE_SAMPLE_RATE !== undefined
+      ? parseFloat(process.env.TRACE_SAMPLE_RATE)
+      : 0.01,
+    slowMs: process.env.TRACE_SLOW_MS !== undefined
+      ? parseInt(process.env.TRACE_SLOW_MS)
+      : 500,
+    exporter: process.env.TRACE_EXPORTER === 'console' ? 'console' : 'file',
+    file: process.env.TRACE_FILE || './data/traces.jsonl'
+  },
+
+  // Log strutturati JSON: livello minimo, campionamento per categoria
+  // ("categoria=frazione,..."), trasporto asincrono con buffer (flush ogni flushMs o
+  // oltre bufferSize caratteri, righe scartate oltre maxBufferSize) su stdout o file
+  LOGGING: {
+    level: process.env.LOG_LEVEL || 'info',
+    transport: process.env.LOG_TRANSPORT === 'sync' ? 'sync' : 'async',
+    file: process.env.LOG_FILE || null,
+    sampling: Object.fromEntries((process.env.LOG_SAMPLING !== undefined
+      ? process.env.LOG_SAMPLING
+      : 'auth.token=0.01,auth.login=0.1')
+      .split(',')
+      .map(rule => rule.split('='))
+      .filter(([category, rate]) => category && !isNaN(parseFloat(rate)))
+      .map(([category, rate]) => [category.trim(), parseFloat(rate)])),
+    flushMs: parseInt(process.env.LOG_FLUSH_MS) || 100,
+    bufferSize: parseInt(process.env.LOG_BUFFER_SIZE) || 64 * 1024,
+    maxBufferSize: parseInt(process.env.LOG_MAX_BUFFER_SIZE) || 8 * 1024 * 1024
   }
 };
@@ -1,69 +1,102 @@
 
-// Definisce costanti, parametri operativi e i ruoli supportati
-module.exports = {
-  JWT_SECRET: process.env.JWT_SECRET || 'your-secret-key-change-in-production',
-  JWT_EXPIRE: process.env.JWT_EXPIRE || '24h',
-
-  // Configurazioni QR
-  QR_CODE_PREFIX: 'TABLE_',
-  MAX_POINTS_PER_TRANSACTION: 1000,
-  MIN_POINTS_PER_TRANSACTION: 1,
-
-  // Configurazioni tavoli
-  MAX_TABLES: 50,
-  DEFAULT_TABLE_POINTS: 0,
-
-  // Ruoli utente
-  USER_ROLES: {
-    CUSTOMER: 'customer',
-    CASHIER: 'cashier',
-    ADMIN: 'admin'
-  },
-
-  // Rate limiting
-  RATE_LIMIT: {
-    windowMs: 15 * 60 * 1000, // 15 minuti
-    max: 100 // max 100 richieste per IP per finestra
-  },
-
-  // Configurazioni database
-  DB_OPTIONS: {
-    useNewUrlParser: true,
-    useUnifiedTopology: true,
-    maxPoolSize: 10,
-    serverSelectionTimeoutMS: 5000,
-    socketTimeoutMS: 45000,
+// Factory della connessione Mongo, usata da server, seed, script e test: applica le
+// opzioni del pool da config/env e collega le metriche del pool (poolMetrics).
+// connectDB() in più prepara i componenti del server (ledger, classifica).
+const mongoose = require('mongoose');
+const poolMetrics = require('../utils/poolMetrics');
+const metrics = require('../utils/metrics');
+const config = require('./config');
+const log = require('../utils/logger').child('db');
+
+// Opzioni del driver: DB_OPTIONS (con override da env) più quelle del chiamante
+const connectionOptions = (overrides = {}) => ({
+  ...config.DB_OPTIONS,
+  // Eventi dei comandi: log a campione e istogramma delle durate per /metrics
+  ...((config.DB_DEBUG.sampleRate > 0 || config.METRICS.enabled) && { monitorCommands: true }),
+  ...overrides
+});
+
+let listenersAttached = false;
+let connecting = null;
+
+const attachConnectionListeners = () => {
+  if (listenersAttached) return;
+  listenersAttached = true;
+
+  mongoose.connection.on('error', (error) => {
+    log.error('MongoDB connection error', { error });
+  });
+
+  mongoose.connection.on('disconnected', () => {
+    log.warn('MongoDB disconnected');
+  });
+};
+
+// Il client del driver è creato qui, non da mongoose.connect, per collegare le
+// metriche prima dell'handshake (connessioni iniziali e primi heartbeat inclusi):
+// un client nuovo per ogni connessione, quindi un solo set di listener per client.
+// Se la connessione è già aperta (o in apertura) viene riusata.
+const connect = (uri = process.env.MONGODB_URI, overrides = {}) => {
+  attachConnectionListeners();
+
+  if (mongoose.connection.readyState === mongoose.STATES.connected) {
+    return Promise.resolve(mongoose);
+  }
+
+  if (!connecting) {
+    connecting = (async () => {
+      const client = new mongoose.mongo.MongoClient(uri, connectionOptions(overrides));
+      poolMetrics.attach(client, { debugSampleRate: config.DB_DEBUG.sampleRate });
+      metrics.attachMongo(client);
+
+      const start = process.hrtime.bigint();
+      await client.connect();
+      poolMetrics.recordInitialSelection(Number(process.hrtime.bigint() - start) / 1e6);
+
+      mongoose.connection.setClient(client);
+      return mongoose;
+    })().finally(() => {
+      connecting = null;
+    });
   }
+
+  return connecting;
 };
-const mongoose = require('mongoose');
 
-const connectDB = async () => {
+// options: opzioni del driver aggiuntive (es. maxPoolSize per worker in cluster)
+const connectDB = async (options = {}) => {
+  const ledger = require('../utils/ledgerWriter');
+  const statsRollups = require('../utils/statsRollups');
+  const leaderboard = require('../utils/leaderboard');
+
   try {
-    const conn = await mongoose.connect(process.env.MONGODB_URI, {
-      useNewUrlParser: true,
-      useUnifiedTopology: true,
+    const conn = await connect(process.env.MONGODB_URI, options);
+
+    log.info('MongoDB connected', {
+      host: conn.connection.host,
+      maxPoolSize: connectionOptions(options).maxPoolSize
     });
 
-    console.log(`🗄️  MongoDB Connected: ${conn.connection.host}`);
+    // Riapplica gli incrementi rimasti nello spill dei rollup, poi reinserisce le
+    // transazioni rimaste nello spill del ledger (che aggiornano i rollup)
+    await statsRollups.start();
+    await ledger.start();
 
-    // Log per debugging in development
-    if (process.env.NODE_ENV === 'development') {
-      mongoose.set('debug', true);
+    // Carica le classifiche in memoria (una per ristorante) una volta all'avvio
+    if (config.LEADERBOARD.engine) {
+      await leaderboard.load();
     }
 
-    // Event listeners
-    mongoose.connection.on('error', (err) => {
-      console.error('❌ MongoDB connection error:', err);
-    });
+    return conn;
 
-    mongoose.connection.on('disconnected', () => {
-      console.log('🔌 MongoDB disconnected');
-    });
-    
   } catch (error) {
-    console.error('❌ MongoDB connection error:', error.message);
-    process.exit(1);
+    // Il chiamante decide: il server esce e il supervisore lo riavvia
+    log.error('MongoDB connection error', { error });
+    throw error;
   }
 };
 
 module.exports = connectDB;
+module.exports.connect = connect;
+module.exports.connectionOptions = connectionOptions;
+module.exports.getPoolMetrics = () => poolMetrics.getMetrics();
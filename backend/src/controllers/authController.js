@@ -3,6 +3,19 @@
 const User = require('../models/User');
 const jwt = require('jsonwebtoken');
 const config = require('../config/config');
+const passwordHasher = require('../utils/passwordHasher');
+const metrics = require('../utils/metrics');
+const logger = require('../utils/logger');
+
+const log = logger.child('auth');
+// Login falliti: campionati (LOG_SAMPLING), i contatori esatti sono su /metrics
+const loginLog = logger.child('auth.login');
+
+// Pool password saturo: il client può riprovare a breve
+const hasherBusy = (res) => res.status(503).set('Retry-After', '1').json({
+  success: false,
+  message: 'Servizio momentaneamente occupato, riprova tra poco'
+});
 
 // @desc    Registra nuovo utente
 // @route   POST /api/auth/register
@@ -11,8 +24,9 @@ exports.register = async (req, res) => {
   try {
     const { username, email, password, firstName, lastName, role } = req.body;
 
-    // Controllo se utente esiste già
+    // Controllo se utente esiste già nel ristorante (tenant da header X-Tenant o default)
     const existingUser = await User.findOne({
+      tenant: req.tenant,
       $or: [{ email }, { username }]
     });
 
@@ -25,6 +39,7 @@ exports.register = async (req, res) => {
 
     // Crea utente
     const user = await User.create({
+      tenant: req.tenant,
       username,
       email,
       password,
@@ -49,7 +64,11 @@ exports.register = async (req, res) => {
     });
 
   } catch (error) {
-    console.error('Register error:', error);
+    if (error.code === passwordHasher.BUSY) {
+      return hasherBusy(res);
+    }
+
+    log.error('Register error', { error });
 
     // Gestione errori di duplicazione MongoDB
     if (error.code === 11000) {
@@ -74,10 +93,12 @@ exports.login = async (req, res) => {
   try {
     const { email, password } = req.body;
 
-    // Trova utente con password inclusa
-    const user = await User.findOne({ email }).select('+password');
+    // Trova utente del ristorante con password inclusa
+    const user = await User.findOne({ tenant: req.tenant, email }).select('+password');
 
     if (!user) {
+      metrics.logins.inc({ result: 'invalid' });
+      loginLog.warn('Login failed', { result: 'invalid', tenant: req.tenant, ip: req.ip });
       return res.status(401).json({
         success: false,
         message: 'Credenziali non valide'
@@ -86,6 +107,8 @@ exports.login = async (req, res) => {
 
     // Controllo se utente è attivo
     if (!user.isActive) {
+      metrics.logins.inc({ result: 'disabled' });
+      loginLog.warn('Login failed', { result: 'disabled', tenant: req.tenant, ip: req.ip });
       return res.status(401).json({
         success: false,
         message: 'Account disattivato. Contattare l\'amministratore.'
@@ -96,15 +119,24 @@ exports.login = async (req, res) => {
     const isMatch = await user.matchPassword(password);
 
     if (!isMatch) {
+      metrics.logins.inc({ result: 'invalid' });
+      loginLog.warn('Login failed', { result: 'invalid', tenant: req.tenant, ip: req.ip });
       return res.status(401).json({
         success: false,
         message: 'Credenziali non valide'
       });
     }
 
-    // Aggiorna ultimo login
-    user.lastLogin = new Date();
-    await user.save();
+    // Aggiorna ultimo login con un update mirato: nessun hook di save, nessun bcrypt
+    const update = { lastLogin: new Date() };
+
+    // Costo bcrypt cambiato: rigenera l'hash ora che la password in chiaro è nota
+    if (user.needsRehash()) {
+      update.password = await passwordHasher.hash(password);
+    }
+
+    await User.updateOne({ _id: user._id }, { $set: update });
+    user.lastLogin = update.lastLogin;
 
     // Genera token
     const token = user.getSignedJwtToken();
@@ -112,6 +144,8 @@ exports.login = async (req, res) => {
     // Rimuovi password dalla risposta
     user.password = undefined;
 
+    metrics.logins.inc({ result: 'success' });
+
     res.json({
       success: true,
       message: 'Login effettuato con successo',
@@ -122,7 +156,11 @@ exports.login = async (req, res) => {
     });
 
   } catch (error) {
-    console.error('Login error:', error);
+    if (error.code === passwordHasher.BUSY) {
+      return hasherBusy(res);
+    }
+
+    log.error('Login error', { error });
     res.status(500).json({
       success: false,
       message: 'Errore durante il login'
@@ -142,7 +180,7 @@ exports.getMe = async (req, res) => {
       data: user
     });
   } catch (error) {
-    console.error('Get me error:', error);
+    log.error('Get me error', { error });
     res.status(500).json({
       success: false,
       message: 'Errore nel recupero profilo utente'
@@ -181,7 +219,7 @@ exports.updateProfile = async (req, res) => {
     });
 
   } catch (error) {
-    console.error('Update profile error:', error);
+    log.error('Update profile error', { error });
     res.status(500).json({
       success: false,
       message: 'Errore nell\'aggiornamento del profilo'
@@ -218,7 +256,11 @@ exports.changePassword = async (req, res) => {
     });
 
   } catch (error) {
-    console.error('Change password error:', error);
+    if (error.code === passwordHasher.BUSY) {
+      return hasherBusy(res);
+    }
+
+    log.error('Change password error', { error });
     res.status(500).json({
       success: false,
       message: 'Errore nel cambio password'
@@ -0,0 +1,41 @@
+
+// Probe per load balancer e orchestratori: liveness (il processo risponde) e
+// readiness (il processo può servire traffico: DB, pool, event loop, ledger)
+const healthCheck = require('../utils/healthCheck');
+const log = require('../utils/logger').child('health');
+
+// @desc    Liveness: nessuna dipendenza esterna, risponde finché l'event loop gira
+// @route   GET /health
+// @access  Public
+exports.liveness = (req, res) => {
+  res.set('Cache-Control', 'no-store');
+  res.status(200).json({
+    status: 'OK',
+    timestamp: new Date().toISOString(),
+    service: 'QR Tavoli API',
+    pid: process.pid,
+    uptime: process.uptime()
+  });
+};
+
+// @desc    Readiness: 200 se tutte le verifiche rientrano nelle soglie, altrimenti 503
+// @route   GET /ready
+// @access  Public
+exports.readiness = async (req, res) => {
+  try {
+    const result = await healthCheck.check();
+
+    res.set('Cache-Control', 'no-store');
+    res.status(result.status === 'ready' ? 200 : 503).json({
+      ...result,
+      ageMs: Date.now() - result.checkedAt
+    });
+
+  } catch (error) {
+    log.error('Readiness check error', { error });
+    res.status(503).json({
+      status: 'not_ready',
+      message: 'Verifica readiness fallita'
+    });
+  }
+};
@@ -2,17 +2,38 @@
 // Gestisce assegnazione/riscatto/reset punti, statistiche, transazioni
 const Table = require('../models/Table');
 const PointTransaction = require('../models/PointTransaction');
+const ledger = require('../utils/ledgerWriter');
+const statsRollups = require('../utils/statsRollups');
+const {
+  paginate,
+  encodeCursor,
+  decodeCursor,
+  keysetFilter,
+  keysetSort,
+  countTotal
+} = require('../utils/helpers');
+const { TRANSACTION_FIELDS, tableSnapshot, cashierSnapshot, serializeTransaction } = require('../utils/serializers');
+const { parseQR } = require('../utils/tenants');
 const config = require('../config/config');
+const log = require('../utils/logger').child('points');
+
+// QR scansionato dal cassiere: valido solo per il suo ristorante (prefisso del QR
+// assente o uguale al tenant del token)
+const qrForTenant = (payload, tenant) => {
+  const parsed = parseQR(payload, tenant);
+  return parsed && parsed.tenant === tenant ? parsed.qrCode : null;
+};
 
 // @desc    Aggiungi punti a un tavolo
 // @route   POST /api/points/add
 // @access  Private (Cashier/Admin)
 exports.addPoints = async (req, res) => {
   try {
-    const { qrCode, points, description } = req.body;
+    const { points, description } = req.body;
+    const qrCode = qrForTenant(req.body.qrCode, req.tenant);
 
-    // Trova tavolo tramite QR code
-    const table = await Table.findByQR(qrCode);
+    // Aggiorna i punti con un unico $inc atomico sull'indice QR
+    const table = qrCode && await Table.applyPointsDeltaByQR(qrCode, points, req.tenant);
 
     if (!table) {
       return res.status(404).json({
@@ -21,16 +42,16 @@ exports.addPoints = async (req, res) => {
       });
     }
 
-    // Salva i punti precedenti per la transazione
-    const previousPoints = table.points;
+    // Punti precedenti ricavati dalla stessa operazione
+    const previousPoints = table.points - points;
 
-    // Aggiungi punti al tavolo
-    await table.addPoints(points, req.user.id);
-
-    // Crea record della transazione
-    const transaction = await PointTransaction.create({
+    // Registra la transazione (write-behind se abilitato)
+    const transaction = await ledger.record({
+      tenant: req.tenant,
       table: table._id,
       assignedBy: req.user.id,
+      tableSnapshot: tableSnapshot(table),
+      assignedBySnapshot: cashierSnapshot(req.user),
       points: points,
       type: 'EARNED',
       description: description || `Punti assegnati da ${req.user.fullName}`,
@@ -41,11 +62,8 @@ exports.addPoints = async (req, res) => {
       }
     });
 
-    // Popola i dati per la risposta
-    await transaction.populate([
-      { path: 'table', select: 'tableNumber name points' },
-      { path: 'assignedBy', select: 'username firstName lastName' }
-    ]);
+    // Tavolo e cassiere dalle istantanee appena scritte: nessun populate
+    const transactionData = serializeTransaction(transaction.toObject());
 
     res.json({
       success: true,
@@ -58,12 +76,12 @@ exports.addPoints = async (req, res) => {
           points: table.points,
           previousPoints
         },
-        transaction
+        transaction: transactionData
       }
     });
 
   } catch (error) {
-    console.error('Add points error:', error);
+    log.error('Add points error', { error });
     res.status(500).json({
       success: false,
       message: 'Errore nell\'assegnazione punti'
@@ -79,24 +97,25 @@ exports.addPointsToTable = async (req, res) => {
     const { points, description } = req.body;
     const { tableId } = req.params;
 
-    const table = await Table.findById(tableId);
+    // Aggiungi punti con un'unica operazione atomica
+    const table = await Table.applyPointsDelta({ _id: tableId, tenant: req.tenant }, points);
 
-    if (!table || !table.isActive) {
+    if (!table) {
       return res.status(404).json({
         success: false,
         message: 'Tavolo non trovato'
       });
     }
 
-    const previousPoints = table.points;
-
-    // Aggiungi punti
-    await table.addPoints(points, req.user.id);
+    const previousPoints = table.points - points;
 
-    // Crea transazione
-    const transaction = await PointTransaction.create({
+    // Registra transazione
+    const transaction = await ledger.record({
+      tenant: req.tenant,
       table: table._id,
       assignedBy: req.user.id,
+      tableSnapshot: tableSnapshot(table),
+      assignedBySnapshot: cashierSnapshot(req.user),
       points: points,
       type: 'EARNED',
       description: description || `Punti assegnati da ${req.user.fullName}`,
@@ -123,7 +142,7 @@ exports.addPointsToTable = async (req, res) => {
     });
 
   } catch (error) {
-    console.error('Add points to table error:', error);
+    log.error('Add points to table error', { error });
     res.status(500).json({
       success: false,
       message: 'Errore nell\'assegnazione punti'
@@ -136,35 +155,38 @@ exports.addPointsToTable = async (req, res) => {
 // @access  Private (Cashier/Admin)
 exports.redeemPoints = async (req, res) => {
   try {
-    const { qrCode, points, description } = req.body;
+    const { points, description } = req.body;
+    const qrCode = qrForTenant(req.body.qrCode, req.tenant);
 
-    const table = await Table.findByQR(qrCode);
+    // Sottrai punti solo se il saldo è sufficiente (controllo e update atomici)
+    const table = qrCode && await Table.applyPointsDeltaByQR(qrCode, -points, req.tenant);
 
     if (!table) {
-      return res.status(404).json({
-        success: false,
-        message: 'QR code non valido o tavolo non trovato'
-      });
-    }
+      // Distingue tavolo inesistente da saldo insufficiente (solo in caso di errore)
+      const existing = qrCode && await Table.findByQR(qrCode, req.tenant).select('points');
+
+      if (!existing) {
+        return res.status(404).json({
+          success: false,
+          message: 'QR code non valido o tavolo non trovato'
+        });
+      }
 
-    if (table.points < points) {
       return res.status(400).json({
         success: false,
-        message: `Punti insufficienti. Disponibili: ${table.points}, richiesti: ${points}`
+        message: `Punti insufficienti. Disponibili: ${existing.points}, richiesti: ${points}`
       });
     }
 
-    const previousPoints = table.points;
-
-    // Sottrai punti
-    table.points -= points;
-    table.lastPointsUpdate = new Date();
-    await table.save();
+    const previousPoints = table.points + points;
 
-    // Crea transazione
-    const transaction = await PointTransaction.create({
+    // Registra transazione
+    const transaction = await ledger.record({
+      tenant: req.tenant,
       table: table._id,
       assignedBy: req.user.id,
+      tableSnapshot: tableSnapshot(table),
+      assignedBySnapshot: cashierSnapshot(req.user),
       points: points,
       type: 'REDEEMED',
       description: description || `Punti riscattati da ${req.user.fullName}`,
@@ -191,7 +213,7 @@ exports.redeemPoints = async (req, res) => {
     });
 
   } catch (error) {
-    console.error('Redeem points error:', error);
+    log.error('Redeem points error', { error });
     res.status(500).json({
       success: false,
       message: 'Errore nel riscatto punti'
@@ -199,6 +221,147 @@ exports.redeemPoints = async (req, res) => {
   }
 };
 
+// @desc    Assegna o riscatta punti su più tavoli in un'unica richiesta
+// @route   POST /api/points/batch
+// @access  Private (Cashier/Admin)
+exports.addPointsBatch = async (req, res) => {
+  try {
+    const { batchId, items } = req.body;
+
+    // Risolve tutti i tavoli (QR o ID) del ristorante con una sola query
+    const itemQR = items.map(item => (item.tableId ? null : qrForTenant(item.qrCode, req.tenant)));
+    const qrCodes = [...new Set(itemQR.filter(Boolean))];
+    const tableIds = [...new Set(items.filter(item => item.tableId).map(item => item.tableId))];
+
+    const tables = await Table.find({
+      tenant: req.tenant,
+      $or: [{ qrCode: { $in: qrCodes } }, { _id: { $in: tableIds } }]
+    }).select('_id qrCode').lean();
+
+    const idByQR = new Map(tables.map(table => [table.qrCode, String(table._id)]));
+    const results = new Array(items.length);
+    const changes = new Map();
+
+    items.forEach((item, index) => {
+      const type = item.type || 'EARNED';
+      const tableId = item.tableId || idByQR.get(itemQR[index]);
+
+      results[index] = { index, status: 'not_found', qrCode: item.qrCode, tableId, points: item.points, type };
+
+      if (tableId) {
+        const change = { index, delta: type === 'REDEEMED' ? -item.points : item.points };
+        changes.set(tableId, (changes.get(tableId) || []).concat(change));
+      }
+    });
+
+    // bulkWrite sui tavoli: una scrittura per tavolo, idempotente sul batchId
+    const outcomes = await Table.applyPointsBatch(batchId, changes, {
+      markers: config.BATCH.markers,
+      tenant: req.tenant
+    });
+
+    // Stesso batchId con variazioni diverse: non è un retry
+    if ([...outcomes.values()].some(outcome => outcome.status === 'mismatch')) {
+      return res.status(422).json({
+        success: false,
+        message: 'batchId già usato per un batch con variazioni diverse'
+      });
+    }
+
+    // Transazioni già registrate da un tentativo precedente dello stesso batch
+    const existing = await PointTransaction.find({ tenant: req.tenant, batchId }).select('_id batchIndex').lean();
+    const recorded = new Map(existing.map(transaction => [transaction.batchIndex, transaction._id]));
+
+    const now = new Date();
+    const transactions = [];
+
+    for (const [tableId, outcome] of outcomes) {
+      for (const change of outcome.items) {
+        const result = results[change.index];
+        result.tableId = tableId;
+
+        if (outcome.status === 'not_found' || outcome.status === 'conflict') {
+          result.status = outcome.status;
+          continue;
+        }
+
+        result.table = {
+          id: outcome.table._id,
+          tableNumber: outcome.table.tableNumber,
+          name: outcome.table.name
+        };
+        result.previousPoints = change.previousPoints;
+        result.newPoints = change.newPoints;
+
+        if (!change.accepted) {
+          result.status = 'insufficient_points';
+          continue;
+        }
+
+        result.status = outcome.status;
+
+        if (recorded.has(change.index)) {
+          result.transaction = recorded.get(change.index);
+          continue;
+        }
+
+        const item = items[change.index];
+        const transaction = new PointTransaction({
+          tenant: req.tenant,
+          table: tableId,
+          assignedBy: req.user.id,
+          tableSnapshot: tableSnapshot(outcome.table),
+          assignedBySnapshot: cashierSnapshot(req.user),
+          points: item.points,
+          type: result.type,
+          description: item.description || (result.type === 'REDEEMED'
+            ? `Punti riscattati da ${req.user.fullName}`
+            : `Punti assegnati da ${req.user.fullName}`),
+          batchId,
+          batchIndex: change.index,
+          metadata: {
+            previousPoints: change.previousPoints,
+            newPoints: change.newPoints,
+            timestamp: now
+          },
+          createdAt: now,
+          updatedAt: now
+        });
+
+        result.transaction = transaction._id;
+        transactions.push(transaction.toObject({ depopulate: true, virtuals: false }));
+      }
+    }
+
+    // Un solo insertMany; i duplicati di un retry concorrente sono ignorati
+    await ledger.insert(transactions, { lean: true });
+
+    const summary = { total: items.length, applied: 0, replayed: 0, failed: 0 };
+    results.forEach(result => {
+      if (result.status === 'applied') summary.applied++;
+      else if (result.status === 'replayed') summary.replayed++;
+      else summary.failed++;
+    });
+
+    res.json({
+      success: true,
+      message: `${summary.applied + summary.replayed} operazioni su ${summary.total} applicate`,
+      data: {
+        batchId,
+        summary,
+        results
+      }
+    });
+
+  } catch (error) {
+    log.error('Batch points error', { error });
+    res.status(500).json({
+      success: false,
+      message: 'Errore nell\'elaborazione del batch punti'
+    });
+  }
+};
+
 // @desc    Ottieni tutte le transazioni
 // @route   GET /api/points/transactions
 // @access  Private (Cashier/Admin)
@@ -207,40 +370,67 @@ exports.getTransactions = async (req, res) => {
     const { 
       page = 1, 
       limit = 20, 
+      cursor,
+      withTotal = false,
       type, 
       tableId, 
       userId 
     } = req.query;
 
-    const query = {};
+    const query = { tenant: req.tenant };
 
     if (type) query.type = type;
     if (tableId) query.table = tableId;
     if (userId) query.assignedBy = userId;
 
-    const transactions = await PointTransaction.find(query)
-      .populate('table', 'tableNumber name')
-      .populate('assignedBy', 'username firstName lastName')
-      .sort({ createdAt: -1 })
-      .limit(limit * 1)
-      .skip((page - 1) * limit);
+    // Keyset su (createdAt, _id): usa gli indici { createdAt, _id } e
+    // { table/assignedBy, createdAt, _id } senza scorrere le pagine precedenti
+    const sortKeys = [['createdAt', -1], ['_id', -1]];
+    const pagination = paginate(page, limit);
+    const after = cursor ? decodeCursor(cursor, sortKeys, PointTransaction) : null;
+
+    if (cursor && !after) {
+      return res.status(400).json({
+        success: false,
+        message: 'Cursore di paginazione non valido'
+      });
+    }
+
+    const find = PointTransaction.find(after ? { ...query, ...keysetFilter(sortKeys, after) } : query)
+      .select(TRANSACTION_FIELDS)
+      .sort(keysetSort(sortKeys))
+      .limit(pagination.limit + 1)
+      .lean();
+
+    if (!after) {
+      find.skip(pagination.skip);
+    }
+
+    const [results, { total, estimated }] = await Promise.all([
+      find,
+      countTotal(PointTransaction, query, withTotal === true || withTotal === 'true', { tenant: req.tenant })
+    ]);
 
-    const total = await PointTransaction.countDocuments(query);
+    const hasMore = results.length > pagination.limit;
+    const transactions = await PointTransaction.withSnapshots(results.slice(0, pagination.limit));
 
     res.json({
       success: true,
       count: transactions.length,
       pagination: {
-        page: parseInt(page),
-        limit: parseInt(limit),
+        ...(!after && { page: pagination.page }),
+        limit: pagination.limit,
         total,
-        pages: Math.ceil(total / limit)
+        totalEstimated: estimated,
+        pages: total === null ? null : Math.ceil(total / pagination.limit),
+        hasMore,
+        nextCursor: hasMore ? encodeCursor(transactions[transactions.length - 1], sortKeys) : null
       },
       data: transactions
     });
 
   } catch (error) {
-    console.error('Get transactions error:', error);
+    log.error('Get transactions error', { error });
     res.status(500).json({
       success: false,
       message: 'Errore nel recupero transazioni'
@@ -253,31 +443,38 @@ exports.getTransactions = async (req, res) => {
 // @access  Private (Cashier/Admin)
 exports.getDailyStats = async (req, res) => {
   try {
-    const { date } = req.query;
-    const targetDate = date ? new Date(date) : new Date();
+    const { tableId, unit = 'day' } = req.query;
 
-    const stats = await PointTransaction.getDailyStats(targetDate);
+    // Giorni nel fuso del ristorante (?tz=, default config.STATS.timeZone),
+    // letti dai rollup orari: costo proporzionale ai giorni, non alle transazioni
+    const range = statsRollups.resolveRange(req.query, 1);
 
-    // Formatta statistiche
-    const formattedStats = {
-      date: targetDate.toISOString().split('T')[0],
-      totalTransactions: 0,
-      pointsEarned: 0,
-      pointsRedeemed: 0,
-      netPoints: 0
-    };
-
-    stats.forEach(stat => {
-      formattedStats.totalTransactions += stat.transactionCount;
+    if (!range) {
+      return res.status(400).json({
+        success: false,
+        message: `Intervallo date non valido (massimo ${config.STATS.maxRangeDays} giorni)`
+      });
+    }
 
-      if (stat._id === 'EARNED') {
-        formattedStats.pointsEarned = stat.totalPoints;
-      } else if (stat._id === 'REDEEMED') {
-        formattedStats.pointsRedeemed = stat.totalPoints;
-      }
+    const { totals, periods } = await statsRollups.getStats({
+      tenant: req.tenant,
+      dimension: tableId ? 'table' : 'all',
+      key: tableId || null,
+      from: range.from,
+      to: range.to,
+      timeZone: range.timeZone,
+      unit
     });
 
-    formattedStats.netPoints = formattedStats.pointsEarned - formattedStats.pointsRedeemed;
+    // Formatta statistiche
+    const formattedStats = {
+      date: range.fromDay,
+      from: range.fromDay,
+      to: range.toDay,
+      timeZone: range.timeZone,
+      ...totals,
+      periods
+    };
 
     res.json({
       success: true,
@@ -285,7 +482,7 @@ exports.getDailyStats = async (req, res) => {
     });
 
   } catch (error) {
-    console.error('Get daily stats error:', error);
+    log.error('Get daily stats error', { error });
     res.status(500).json({
       success: false,
       message: 'Errore nel recupero statistiche'
@@ -308,32 +505,44 @@ exports.getUserStats = async (req, res) => {
       });
     }
 
-    const stats = await PointTransaction.aggregate([
-      {
-        $match: { assignedBy: mongoose.Types.ObjectId(userId) }
-      },
-      {
-        $group: {
-          _id: '$type',
-          totalPoints: { $sum: '$points' },
-          transactionCount: { $sum: 1 }
-        }
-      }
-    ]);
+    // Intervallo limitato (default ultimi giorni) invece dell'intero storico
+    const range = statsRollups.resolveRange(req.query, config.STATS.userStatsDefaultDays);
+
+    if (!range) {
+      return res.status(400).json({
+        success: false,
+        message: `Intervallo date non valido (massimo ${config.STATS.maxRangeDays} giorni)`
+      });
+    }
 
-    // Attività recente
-    const recentActivity = await PointTransaction.getUserActivity(userId, 10);
+    const [{ byType }, recentActivity] = await Promise.all([
+      statsRollups.getStats({
+        tenant: req.tenant,
+        dimension: 'cashier',
+        key: userId,
+        from: range.from,
+        to: range.to,
+        timeZone: range.timeZone
+      }),
+      // Attività recente
+      PointTransaction.getUserActivity(userId, 10, req.tenant)
+    ]);
 
     res.json({
       success: true,
       data: {
-        stats,
+        stats: byType,
+        range: {
+          from: range.fromDay,
+          to: range.toDay,
+          timeZone: range.timeZone
+        },
         recentActivity
       }
     });
 
   } catch (error) {
-    console.error('Get user stats error:', error);
+    log.error('Get user stats error', { error });
     res.status(500).json({
       success: false,
       message: 'Errore nel recupero statistiche utente'
@@ -349,7 +558,8 @@ exports.resetTablePoints = async (req, res) => {
     const { tableId } = req.params;
     const { reason } = req.body;
 
-    const table = await Table.findById(tableId);
+    // Reset punti a 0: il documento ritornato contiene il saldo precedente
+    const table = await Table.resetPoints(tableId, req.tenant);
 
     if (!table) {
       return res.status(404).json({
@@ -360,15 +570,13 @@ exports.resetTablePoints = async (req, res) => {
 
     const previousPoints = table.points;
 
-    // Reset punti a 0
-    table.points = 0;
-    table.lastPointsUpdate = new Date();
-    await table.save();
-
-    // Crea transazione di adjustment
-    await PointTransaction.create({
+    // Registra transazione di adjustment
+    await ledger.record({
+      tenant: req.tenant,
       table: table._id,
       assignedBy: req.user.id,
+      tableSnapshot: tableSnapshot(table),
+      assignedBySnapshot: cashierSnapshot(req.user),
       points: previousPoints,
       type: 'ADJUSTMENT',
       description: `Reset punti: ${reason || 'Nessuna ragione specificata'}`,
@@ -393,7 +601,7 @@ exports.resetTablePoints = async (req, res) => {
     });
 
   } catch (error) {
-    console.error('Reset table points error:', error);
+    log.error('Reset table points error', { error });
     res.status(500).json({
       success: false,
       message: 'Errore nel reset punti tavolo'
@@ -0,0 +1,56 @@
+
+// Espone lo stato interno dei componenti (ledger, cache) per diagnostica
+const ledger = require('../utils/ledgerWriter');
+const principalCache = require('../utils/principalCache');
+const leaderboard = require('../utils/leaderboard');
+const tenantRegistry = require('../utils/tenantRegistry');
+const liveUpdates = require('../utils/liveUpdates');
+const responseCache = require('../utils/responseCache');
+const statsRollups = require('../utils/statsRollups');
+const { idempotency } = require('../middleware/idempotency');
+const passwordHasher = require('../utils/passwordHasher');
+const qrAssets = require('../utils/qrAssets');
+const healthCheck = require('../utils/healthCheck');
+const tracer = require('../utils/tracing');
+const { rateLimiter } = require('../middleware/rateLimiter');
+const { getPoolMetrics } = require('../config/database');
+const logger = require('../utils/logger');
+
+const log = logger.child('system');
+
+// @desc    Statistiche runtime dei componenti interni
+// @route   GET /api/system/stats
+// @access  Private (Admin)
+exports.getSystemStats = async (req, res) => {
+  try {
+    res.json({
+      success: true,
+      data: {
+        pid: process.pid,
+        uptime: process.uptime(),
+        ledger: ledger.getMetrics(),
+        principalCache: principalCache.getMetrics(),
+        leaderboard: leaderboard.getMetrics(),
+        tenants: tenantRegistry.getMetrics(),
+        liveUpdates: liveUpdates.getMetrics(),
+        responseCache: responseCache.getMetrics(),
+        statsRollups: statsRollups.getMetrics(),
+        idempotency: idempotency.getMetrics(),
+        passwordHasher: passwordHasher.getMetrics(),
+        qrAssets: qrAssets.getMetrics(),
+        health: healthCheck.getMetrics(),
+        tracing: tracer.getMetrics(),
+        logging: logger.getMetrics(),
+        rateLimiter: rateLimiter.getMetrics(),
+        databasePool: getPoolMetrics()
+      }
+    });
+
+  } catch (error) {
+    log.error('Get system stats error', { error });
+    res.status(500).json({
+      success: false,
+      message: 'Errore nel recupero statistiche di sistema'
+    });
+  }
+};
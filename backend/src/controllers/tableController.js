@@ -2,32 +2,73 @@
 // Gestisce CRUD tavoli, classifica, ricerca QR, cambio nome, storico punti
 const Table = require('../models/Table');
 const PointTransaction = require('../models/PointTransaction');
-
-// @desc    Ottieni classifica tavoli
+const leaderboard = require('../utils/leaderboard');
+const liveUpdates = require('../utils/liveUpdates');
+const responseCache = require('../utils/responseCache');
+const config = require('../config/config');
+const { parseQR, qrPayload } = require('../utils/tenants');
+const qrAssets = require('../utils/qrAssets');
+const metrics = require('../utils/metrics');
+const { streamZip, streamPdf } = require('../utils/qrSheets');
+const {
+  TABLE_FIELDS,
+  serializeTable,
+  withPosition,
+  rankTables
+} = require('../utils/serializers');
+const {
+  paginate,
+  encodeCursor,
+  decodeCursor,
+  keysetFilter,
+  keysetSort,
+  countTotal
+} = require('../utils/helpers');
+const log = require('../utils/logger').child('tables');
+
+// @desc    Ottieni classifica tavoli del ristorante
 // @route   GET /api/tables/leaderboard
 // @access  Public
 exports.getLeaderboard = async (req, res) => {
   try {
-    const { limit = 20 } = req.query;
-
-    const tables = await Table.getLeaderboard()
-      .limit(parseInt(limit));
+    const limit = parseInt(req.query.limit || 20);
+    const engine = leaderboard.forTenant(req.tenant);
+
+    const build = async () => {
+      let ranking;
+
+      if (config.LEADERBOARD.engine) {
+        // Classifica servita dal motore in memoria, senza query a Mongo
+        ranking = await engine.top(limit);
+      } else {
+        const tables = await Table.getLeaderboard(req.tenant)
+          .limit(limit)
+          .lean();
+
+        // Posizioni e medaglie in un solo passaggio
+        ranking = rankTables(tables);
+      }
+
+      return {
+        success: true,
+        count: ranking.length,
+        data: ranking
+      };
+    };
 
-    // Aggiungi posizioni alla classifica
-    const leaderboard = tables.map((table, index) => ({
-      ...table.toObject(),
-      position: index + 1,
-      medal: index < 3 ? ['🥇', '🥈', '🥉'][index] : null
-    }));
+    if (!responseCache.enabled) {
+      return res.json(await build());
+    }
 
-    res.json({
-      success: true,
-      count: leaderboard.length,
-      data: leaderboard
+    // JSON già serializzato per ogni valore di limit, invalidato a ogni modifica
+    const entry = await responseCache.get(`leaderboard:${limit}`, build, {
+      tenant: req.tenant,
+      revision: config.LEADERBOARD.engine ? engine.revision : 0
     });
+    responseCache.send(req, res, entry);
 
   } catch (error) {
-    console.error('Get leaderboard error:', error);
+    log.error('Get leaderboard error', { error });
     res.status(500).json({
       success: false,
       message: 'Errore nel recupero classifica'
@@ -35,6 +76,44 @@ exports.getLeaderboard = async (req, res) => {
   }
 };
 
+// @desc    Verifica la classifica in memoria rispetto al database
+// @route   GET /api/tables/leaderboard/check
+// @access  Private (Admin)
+exports.checkLeaderboard = async (req, res) => {
+  try {
+    const result = await leaderboard.forTenant(req.tenant).verify();
+
+    res.status(result.consistent ? 200 : 409).json({
+      success: result.consistent,
+      data: result
+    });
+
+  } catch (error) {
+    log.error('Check leaderboard error', { error });
+    res.status(500).json({
+      success: false,
+      message: 'Errore nella verifica classifica'
+    });
+  }
+};
+
+// @desc    Aggiornamenti in tempo reale di classifica e tavoli (Server-Sent Events)
+// @route   GET /api/tables/stream
+// @access  Public
+exports.streamTables = (req, res) => {
+  try {
+    liveUpdates.subscribe(req, res);
+  } catch (error) {
+    log.error('Stream tables error', { error });
+    if (!res.headersSent) {
+      res.status(500).json({
+        success: false,
+        message: 'Errore nell\'apertura dello stream'
+      });
+    }
+  }
+};
+
 // @desc    Ottieni tutti i tavoli
 // @route   GET /api/tables
 // @access  Private (Cashier/Admin)
@@ -44,33 +123,62 @@ exports.getTables = async (req, res) => {
       page = 1, 
       limit = 10, 
       sort = '-points',
+      cursor,
+      withTotal = false,
       isActive = true 
     } = req.query;
 
-    const query = { isActive: isActive === 'true' };
+    // Nessun altro filtro: la query stessa è lo scope del totale stimato
+    const query = { tenant: req.tenant, isActive: String(isActive) === 'true' };
+
+    // Keyset sul campo di ordinamento con _id come spareggio univoco
+    const direction = sort.startsWith('-') ? -1 : 1;
+    const sortKeys = [[sort.replace(/^-/, ''), direction], ['_id', direction]];
+    const pagination = paginate(page, limit);
+    const after = cursor ? decodeCursor(cursor, sortKeys, Table) : null;
+
+    if (cursor && !after) {
+      return res.status(400).json({
+        success: false,
+        message: 'Cursore di paginazione non valido'
+      });
+    }
+
+    const find = Table.find(after ? { ...query, ...keysetFilter(sortKeys, after) } : query)
+      .sort(keysetSort(sortKeys))
+      .limit(pagination.limit + 1)
+      .select('tableNumber name qrCode points lastPointsUpdate createdAt')
+      .lean();
+
+    if (!after) {
+      find.skip(pagination.skip);
+    }
 
-    const tables = await Table.find(query)
-      .sort(sort)
-      .limit(limit * 1)
-      .skip((page - 1) * limit)
-      .select('tableNumber name qrCode points lastPointsUpdate createdAt');
+    const [results, { total, estimated }] = await Promise.all([
+      find,
+      countTotal(Table, query, withTotal === true || withTotal === 'true', query)
+    ]);
 
-    const total = await Table.countDocuments(query);
+    const hasMore = results.length > pagination.limit;
+    const tables = results.slice(0, pagination.limit);
 
     res.json({
       success: true,
       count: tables.length,
       pagination: {
-        page: parseInt(page),
-        limit: parseInt(limit),
+        ...(!after && { page: pagination.page }),
+        limit: pagination.limit,
         total,
-        pages: Math.ceil(total / limit)
+        totalEstimated: estimated,
+        pages: total === null ? null : Math.ceil(total / pagination.limit),
+        hasMore,
+        nextCursor: hasMore ? encodeCursor(tables[tables.length - 1], sortKeys) : null
       },
-      data: tables
+      data: tables.map(serializeTable)
     });
 
   } catch (error) {
-    console.error('Get tables error:', error);
+    log.error('Get tables error', { error });
     res.status(500).json({
       success: false,
       message: 'Errore nel recupero tavoli'
@@ -83,7 +191,9 @@ exports.getTables = async (req, res) => {
 // @access  Private
 exports.getTable = async (req, res) => {
   try {
-    const table = await Table.findById(req.params.id);
+    const table = await Table.findOne({ _id: req.params.id, tenant: req.tenant })
+      .select(TABLE_FIELDS)
+      .lean();
 
     if (!table) {
       return res.status(404).json({
@@ -94,11 +204,11 @@ exports.getTable = async (req, res) => {
 
     res.json({
       success: true,
-      data: table
+      data: serializeTable(table)
     });
 
   } catch (error) {
-    console.error('Get table error:', error);
+    log.error('Get table error', { error });
 
     if (error.kind === 'ObjectId') {
       return res.status(404).json({
@@ -119,45 +229,149 @@ exports.getTable = async (req, res) => {
 // @access  Public
 exports.getTableByQR = async (req, res) => {
   try {
-    const { qrCode } = req.params;
+    // Il prefisso del QR indica il ristorante; senza prefisso vale quello della richiesta
+    const { tenant, qrCode } = parseQR(req.params.qrCode, req.tenant) || {};
+    const engine = leaderboard.forTenant(tenant);
+
+    const build = async () => {
+      if (!qrCode) {
+        return null;
+      }
+
+      const table = await Table.findByQR(qrCode, tenant)
+        .select(TABLE_FIELDS)
+        .lean();
+
+      if (!table) {
+        return null;
+      }
+
+      // Posizione in classifica: rank O(log n) dal motore in memoria,
+      // altrimenti conteggio sull'indice di rank
+      const rank = config.LEADERBOARD.engine ? await engine.rankOf(table._id) : null;
+      const betterTables = rank ? rank - 1 : await Table.countAhead(table);
+
+      return {
+        success: true,
+        data: withPosition(table, betterTables + 1)
+      };
+    };
 
-    const table = await Table.findByQR(qrCode);
+    const entry = responseCache.enabled && qrCode
+      ? await responseCache.get(`qr:${qrCode}`, build, {
+        tenant,
+        revision: config.LEADERBOARD.engine ? engine.revision : 0
+      })
+      : await build();
 
-    if (!table) {
+    metrics.scans.inc({ result: entry ? 'found' : 'not_found' });
+
+    if (!entry) {
       return res.status(404).json({
         success: false,
         message: 'QR code non valido o tavolo non trovato'
       });
     }
 
-    // Calcola posizione in classifica
-    const betterTables = await Table.countDocuments({
-      isActive: true,
-      $or: [
-        { points: { $gt: table.points } },
-        { 
-          points: table.points, 
-          lastPointsUpdate: { $lt: table.lastPointsUpdate }
-        }
-      ]
+    // Senza cache entry è direttamente il payload
+    if (!responseCache.enabled) {
+      return res.json(entry);
+    }
+
+    responseCache.send(req, res, entry);
+
+  } catch (error) {
+    log.error('Get table by QR error', { error });
+    res.status(500).json({
+      success: false,
+      message: 'Errore nella ricerca tramite QR code'
     });
+  }
+};
+
+// Un anno: l'URL identifica un'immagine che non cambia (QR e tenant del tavolo sono fissi)
+const QR_IMAGE_CACHE_CONTROL = 'public, max-age=31536000, immutable';
+
+// @desc    Immagine QR del tavolo (PNG o SVG) con varianti ?size, ?margin, ?dark, ?light
+// @route   GET /api/tables/:id/qr.:format (png|svg)
+// @access  Public
+exports.getTableQRImage = async (req, res) => {
+  try {
+    const table = await Table.findOne({ _id: req.params.id, tenant: req.tenant, isActive: true })
+      .select('tenant tableNumber qrCode')
+      .lean();
+
+    if (!table) {
+      return res.status(404).json({
+        success: false,
+        message: 'Tavolo non trovato'
+      });
+    }
 
-    const tableWithPosition = {
-      ...table.toObject(),
-      position: betterTables + 1,
-      medal: betterTables < 3 ? ['🥇', '🥈', '🥉'][betterTables] : null
+    const { size, margin, dark, light } = req.query;
+    const payload = qrPayload(table);
+    const options = {
+      format: req.params.format,
+      ...(size && { width: size }),
+      ...(margin !== undefined && { margin }),
+      color: {
+        ...(dark && { dark: `#${dark.toUpperCase()}` }),
+        ...(light && { light: `#${light.toUpperCase()}` })
+      }
     };
 
-    res.json({
-      success: true,
-      data: tableWithPosition
+    // L'ETag dipende solo da payload e opzioni: chi ha già l'immagine riceve 304
+    // senza che venga disegnata
+    res.set({
+      ETag: qrAssets.etagFor(payload, options),
+      'Cache-Control': QR_IMAGE_CACHE_CONTROL
     });
+    res.vary(config.TENANCY.header);
+
+    if (req.fresh) {
+      return res.status(304).end();
+    }
+
+    const image = await qrAssets.image(payload, options);
+    res.type(req.params.format).send(image.body);
 
   } catch (error) {
-    console.error('Get table by QR error:', error);
+    log.error('Get table QR image error', { error });
     res.status(500).json({
       success: false,
-      message: 'Errore nella ricerca tramite QR code'
+      message: 'Errore nella generazione del QR code'
+    });
+  }
+};
+
+// @desc    QR di tutti i tavoli del ristorante: archivio ZIP di PNG o foglio PDF da stampare
+// @route   GET /api/tables/qr-sheet.:format (zip|pdf)
+// @access  Private (Admin)
+exports.getQRSheet = async (req, res) => {
+  try {
+    const { format } = req.params;
+    const tables = await Table.find({ tenant: req.tenant, isActive: true })
+      .select('tenant tableNumber name qrCode')
+      .sort({ tableNumber: 1 })
+      .lean();
+
+    // Content-Type dall'estensione (application/zip, application/pdf)
+    res.attachment(`qr-tavoli-${req.tenant}.${format}`);
+    res.set('Cache-Control', 'no-store');
+
+    await (format === 'zip' ? streamZip(res, tables) : streamPdf(res, tables));
+
+  } catch (error) {
+    log.error('Get QR sheet error', { error });
+
+    // Streaming già iniziato: si può solo interrompere la risposta
+    if (res.headersSent) {
+      return res.destroy(error);
+    }
+
+    res.status(500).json({
+      success: false,
+      message: 'Errore nella generazione dei QR code'
     });
   }
 };
@@ -169,8 +383,12 @@ exports.createTable = async (req, res) => {
   try {
     const { tableNumber, name } = req.body;
 
-    // Controllo se numero tavolo già esiste
-    const existingTable = await Table.findOne({ tableNumber });
+    // Controllo se numero tavolo già esiste nel ristorante
+    const [existingTable, activeTables] = await Promise.all([
+      Table.exists({ tenant: req.tenant, tableNumber }),
+      Table.countDocuments({ tenant: req.tenant, isActive: true })
+    ]);
+
     if (existingTable) {
       return res.status(400).json({
         success: false,
@@ -178,7 +396,15 @@ exports.createTable = async (req, res) => {
       });
     }
 
+    if (activeTables >= config.MAX_TABLES) {
+      return res.status(400).json({
+        success: false,
+        message: `Numero massimo di tavoli raggiunto (${config.MAX_TABLES})`
+      });
+    }
+
     const table = await Table.create({
+      tenant: req.tenant,
       tableNumber,
       name: name || `Tavolo ${tableNumber}`,
       createdBy: req.user.id
@@ -191,7 +417,7 @@ exports.createTable = async (req, res) => {
     });
 
   } catch (error) {
-    console.error('Create table error:', error);
+    log.error('Create table error', { error });
 
     if (error.code === 11000) {
       return res.status(400).json({
@@ -214,7 +440,7 @@ exports.updateTableName = async (req, res) => {
   try {
     const { name } = req.body;
 
-    const table = await Table.findById(req.params.id);
+    const table = await Table.findOne({ _id: req.params.id, tenant: req.tenant });
 
     if (!table) {
       return res.status(404).json({
@@ -232,7 +458,7 @@ exports.updateTableName = async (req, res) => {
     });
 
   } catch (error) {
-    console.error('Update table name error:', error);
+    log.error('Update table name error', { error });
     res.status(500).json({
       success: false,
       message: 'Errore nell\'aggiornamento nome tavolo'
@@ -245,7 +471,7 @@ exports.updateTableName = async (req, res) => {
 // @access  Private (Admin)
 exports.deleteTable = async (req, res) => {
   try {
-    const table = await Table.findById(req.params.id);
+    const table = await Table.findOne({ _id: req.params.id, tenant: req.tenant });
 
     if (!table) {
       return res.status(404).json({
@@ -264,7 +490,7 @@ exports.deleteTable = async (req, res) => {
     });
 
   } catch (error) {
-    console.error('Delete table error:', error);
+    log.error('Delete table error', { error });
     res.status(500).json({
       success: false,
       message: 'Errore nell\'eliminazione tavolo'
@@ -281,7 +507,8 @@ exports.getTableHistory = async (req, res) => {
 
     const history = await PointTransaction.getTableHistory(
       req.params.id, 
-      parseInt(limit)
+      parseInt(limit),
+      req.tenant
     );
 
     res.json({
@@ -291,7 +518,7 @@ exports.getTableHistory = async (req, res) => {
     });
 
   } catch (error) {
-    console.error('Get table history error:', error);
+    log.error('Get table history error', { error });
     res.status(500).json({
       success: false,
       message: 'Errore nel recupero storico tavolo'
@@ -2,7 +2,31 @@
 // Protegge le route: verifica token JWT e recupera utente in sessione 
 const jwt = require('jsonwebtoken');
 const User = require('../models/User');
+const principalCache = require('../utils/principalCache');
 const config = require('../config/config');
+const logger = require('../utils/logger');
+
+const log = logger.child('auth');
+// Token non validi: frequenti sotto attacco, campionati (LOG_SAMPLING)
+const tokenLog = logger.child('auth.token');
+
+// Recupera il principal dalla cache o, in caso di miss, con una lettura proiettata
+const loadPrincipal = async (userId) => {
+  const cached = principalCache.get(userId);
+  if (cached) {
+    return cached;
+  }
+
+  const user = await User.findById(userId)
+    .select(principalCache.FIELDS)
+    .lean();
+
+  if (!user) {
+    return null;
+  }
+
+  return principalCache.set(userId, principalCache.toPrincipal(user));
+};
 
 // Middleware per proteggere le route
 exports.protect = async (req, res, next) => {
@@ -29,8 +53,8 @@ exports.protect = async (req, res, next) => {
       // Verifica token
       const decoded = jwt.verify(token, config.JWT_SECRET);
 
-      // Trova utente e controlla se è attivo
-      const user = await User.findById(decoded.id);
+      // Trova utente (cache principal) e controlla se è attivo
+      const user = await loadPrincipal(decoded.id);
 
       if (!user || !user.isActive) {
         return res.status(401).json({
@@ -39,11 +63,13 @@ exports.protect = async (req, res, next) => {
         });
       }
 
-      // Aggiungi utente alla request
+      // Aggiungi utente alla request: il tenant è quello dell'utente, non dell'header
       req.user = user;
+      req.tenant = user.tenant;
       next();
 
     } catch (error) {
+      tokenLog.warn('Invalid token', { reason: error.name, ip: req.ip });
       return res.status(401).json({
         success: false,
         message: 'Token non valido.'
@@ -51,7 +77,7 @@ exports.protect = async (req, res, next) => {
     }
 
   } catch (error) {
-    console.error('Auth middleware error:', error);
+    log.error('Auth middleware error', { error });
     return res.status(500).json({
       success: false,
       message: 'Errore interno del server'
@@ -71,14 +97,15 @@ exports.optionalAuth = async (req, res, next) => {
     if (token) {
       try {
         const decoded = jwt.verify(token, config.JWT_SECRET);
-        const user = await User.findById(decoded.id);
+        const user = await loadPrincipal(decoded.id);
 
         if (user && user.isActive) {
           req.user = user;
+          req.tenant = user.tenant;
         }
       } catch (error) {
-        // Token invalido, ma continuiamo senza errore
-        console.log('Optional auth: invalid token');
+        // Token invalido, ma continuiamo senza errore (log a campione, categoria auth.token)
+        tokenLog.warn('Optional auth: invalid token', { reason: error.name });
       }
     }
 
@@ -87,3 +114,5 @@ exports.optionalAuth = async (req, res, next) => {
     next();
   }
 };
+
+exports.loadPrincipal = loadPrincipal;
@@ -0,0 +1,124 @@
+
+// Idempotency-Key sulle mutazioni dei punti: la prima richiesta con una chiave viene
+// eseguita e la sua risposta registrata; i retry con la stessa chiave (anche in
+// parallelo) ricevono la stessa risposta senza toccare Table o PointTransaction.
+// La chiave vale per utente e route; riusarla con un corpo diverso è un errore.
+const crypto = require('crypto');
+const { MemoryIdempotencyStore, MongoIdempotencyStore } = require('../utils/idempotencyStore');
+const config = require('../config/config');
+const log = require('../utils/logger').child('idempotency');
+
+const KEY_PATTERN = /^[\x21-\x7e]{1,255}$/;
+const MAX_ATTEMPTS = 3;
+
+const fingerprintOf = (req) => crypto
+  .createHash('sha256')
+  .update(JSON.stringify(req.body || {}))
+  .digest('base64');
+
+const replay = (res, record) => {
+  res.set('Idempotent-Replayed', 'true');
+  res.status(record.statusCode).type('application/json').send(record.body);
+};
+
+exports.createIdempotency = ({ store }) => {
+  const stats = { executed: 0, replayed: 0, mismatches: 0, conflicts: 0 };
+
+  // Esegue il controller registrando la risposta prima di inviarla
+  const execute = (req, res, next, key, fingerprint) => {
+    const json = res.json.bind(res);
+    let settled = false;
+
+    res.json = (body) => {
+      res.json = json;
+      settled = true;
+
+      const record = { fingerprint, statusCode: res.statusCode, body: JSON.stringify(body) };
+      const settle = res.statusCode >= 500 ? store.release(key) : store.complete(key, record);
+
+      settle
+        .catch((error) => log.error('Idempotency store error', { error }))
+        .finally(() => json(body));
+
+      return res;
+    };
+
+    // Risposta mai inviata (connessione chiusa, errore non gestito): libera la chiave
+    res.on('close', () => {
+      if (!settled) {
+        settled = true;
+        store.release(key).catch(() => {});
+      }
+    });
+
+    stats.executed++;
+    next();
+  };
+
+  const middleware = async (req, res, next) => {
+    const idempotencyKey = req.get('Idempotency-Key');
+
+    if (idempotencyKey === undefined) {
+      return next();
+    }
+
+    if (!KEY_PATTERN.test(idempotencyKey)) {
+      return res.status(400).json({
+        success: false,
+        message: 'Idempotency-Key non valida (1-255 caratteri ASCII stampabili)'
+      });
+    }
+
+    const key = `${req.user.id}:${req.method}:${req.baseUrl}${req.path}:${idempotencyKey}`;
+    const fingerprint = fingerprintOf(req);
+
+    try {
+      for (let attempt = 0; attempt < MAX_ATTEMPTS; attempt++) {
+        const entry = await store.begin(key, fingerprint);
+
+        if (entry.status === 'new') {
+          return execute(req, res, next, key, fingerprint);
+        }
+
+        const recordFingerprint = entry.status === 'done' ? entry.record.fingerprint : entry.fingerprint;
+        if (recordFingerprint !== fingerprint) {
+          stats.mismatches++;
+          return res.status(422).json({
+            success: false,
+            message: 'Idempotency-Key già usata per una richiesta diversa'
+          });
+        }
+
+        const record = entry.status === 'done' ? entry.record : await entry.wait();
+        if (record) {
+          stats.replayed++;
+          return replay(res, record);
+        }
+
+        // Il tentativo in corso è fallito senza risposta registrata: si riprova
+      }
+
+      stats.conflicts++;
+      res.status(409).json({
+        success: false,
+        message: 'Richiesta con la stessa Idempotency-Key ancora in elaborazione'
+      });
+
+    } catch (error) {
+      log.error('Idempotency error', { error });
+      res.status(500).json({
+        success: false,
+        message: 'Errore nella gestione della Idempotency-Key'
+      });
+    }
+  };
+
+  middleware.getMetrics = () => ({ ...store.getMetrics(), ...stats });
+  return middleware;
+};
+
+const store = config.IDEMPOTENCY.store === 'mongo'
+  ? new MongoIdempotencyStore()
+  : new MemoryIdempotencyStore();
+
+exports.idempotency = exports.createIdempotency({ store });
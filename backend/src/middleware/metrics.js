@@ -0,0 +1,63 @@
+
+// Metriche HTTP (istogramma di latenza per route, metodo e stato) ed endpoint /metrics
+// per Prometheus. La route è il template Express ("/api/tables/:id"), non l'URL:
+// la cardinalità delle serie resta limitata al numero di route.
+const crypto = require('crypto');
+const metrics = require('../utils/metrics');
+const poolMetrics = require('../utils/poolMetrics');
+const ledger = require('../utils/ledgerWriter');
+const liveUpdates = require('../utils/liveUpdates');
+const passwordHasher = require('../utils/passwordHasher');
+const config = require('../config/config');
+
+// Stato dei componenti, letto solo allo scrape
+metrics.gauge('mongodb_pool_connections_in_use', 'Connessioni Mongo in uso', [],
+  () => poolMetrics.checkedOut);
+metrics.gauge('mongodb_pool_wait_queue_length', 'Richieste in attesa di una connessione Mongo', [],
+  () => poolMetrics.waiting.length);
+metrics.gauge('qr_ledger_queue_depth', 'Transazioni in coda nel ledger write-behind', [],
+  () => ledger.queue.length);
+metrics.gauge('qr_live_clients', 'Client SSE connessi allo stream tavoli', [],
+  () => liveUpdates.clients.size);
+metrics.gauge('qr_password_queue_depth', 'Operazioni bcrypt in coda', [],
+  () => passwordHasher.queueDepth);
+
+const routeOf = (req) => (req.route ? `${req.baseUrl}${req.route.path}` : 'unmatched');
+
+exports.httpMetrics = (req, res, next) => {
+  const start = process.hrtime.bigint();
+
+  res.once('finish', () => {
+    metrics.httpDuration.observe(
+      { method: req.method, route: routeOf(req), status: res.statusCode },
+      Number(process.hrtime.bigint() - start) / 1e9
+    );
+  });
+
+  next();
+};
+
+// Con METRICS_TOKEN impostato lo scrape richiede "Authorization: Bearer <token>"
+const authorized = (req) => {
+  const { token } = config.METRICS;
+  if (!token) return true;
+
+  const given = Buffer.from(req.get('authorization') || '');
+  const expected = Buffer.from(`Bearer ${token}`);
+  return given.length === expected.length && crypto.timingSafeEqual(given, expected);
+};
+
+// @desc    Metriche in formato Prometheus
+// @route   GET /metrics
+// @access  Public (o Bearer METRICS_TOKEN)
+exports.metricsEndpoint = (req, res) => {
+  if (!authorized(req)) {
+    return res.status(401).json({
+      success: false,
+      message: 'Token metriche non valido'
+    });
+  }
+
+  res.set('Content-Type', 'text/plain; version=0.0.4; charset=utf-8');
+  res.send(metrics.render());
+};
@@ -0,0 +1,105 @@
+
+// Rate limiting per budget di route, a finestra scorrevole su uno store intercambiabile
+// (memory | cluster | mongo). Le richieste autenticate sono contate per utente, le
+// altre per IP: un ristorante dietro un unico IP non esaurisce il budget dei cassieri.
+// I contatori per utente sono separati per tenant: il traffico di un ristorante non
+// consuma il budget degli altri. Quelli per IP no: cambiare X-Tenant non apre un
+// budget nuovo.
+const config = require('../config/config');
+const { bearerClaims, isPublicRead } = require('./tenant');
+const { defaultTenant } = require('../utils/tenants');
+const {
+  MemoryRateLimitStore,
+  ClusterRateLimitStore,
+  MongoRateLimitStore
+} = require('../utils/rateLimitStore');
+const log = require('../utils/logger').child('rateLimit');
+
+const WRITE_METHODS = new Set(['POST', 'PUT', 'PATCH', 'DELETE']);
+
+// Budget della richiesta: login/registrazione, letture pubbliche, scritture, resto dell'API
+const budgetFor = (req) => {
+  if (req.method === 'POST' && /^\/api\/auth\/(login|register)\/?$/.test(req.path)) {
+    return 'login';
+  }
+
+  if (isPublicRead(req)) {
+    return 'public';
+  }
+
+  return WRITE_METHODS.has(req.method) ? 'writes' : 'api';
+};
+
+// Principal dal token Bearer (verificato: un id falso non apre un budget nuovo),
+// separato per ristorante, altrimenti IP
+const keyFor = (req, budget) => {
+  const claims = budget !== 'login' ? bearerClaims(req) : null;
+
+  if (claims && claims.id) {
+    const tenant = claims.tenant || defaultTenant();
+    return `${budget}:${tenant}:user:${claims.id}`;
+  }
+
+  return `${budget}:ip:${req.ip}`;
+};
+
+const createStore = (type) => {
+  if (type === 'mongo') return new MongoRateLimitStore();
+  if (type === 'cluster') return new ClusterRateLimitStore();
+  return new MemoryRateLimitStore();
+};
+
+exports.createRateLimiter = ({ store, budgets = config.RATE_LIMIT.budgets, skip = [] } = {}) => {
+  const stats = { allowed: 0, limited: {}, storeErrors: 0 };
+
+  const middleware = async (req, res, next) => {
+    if (skip.includes(req.path)) {
+      return next();
+    }
+
+    const budget = budgetFor(req);
+    const { windowMs, max } = budgets[budget];
+    let result;
+
+    try {
+      result = await store.hit(keyFor(req, budget), windowMs);
+    } catch (error) {
+      // Store non raggiungibile: meglio servire la richiesta che bloccare il servizio
+      stats.storeErrors++;
+      log.error('Rate limit store error', { error });
+      return next();
+    }
+
+    const resetSeconds = Math.ceil(result.resetMs / 1000);
+    res.set({
+      'RateLimit-Limit': String(max),
+      'RateLimit-Remaining': String(Math.max(0, Math.floor(max - result.count))),
+      'RateLimit-Reset': String(resetSeconds)
+    });
+
+    if (result.count > max) {
+      stats.limited[budget] = (stats.limited[budget] || 0) + 1;
+      res.set('Retry-After', String(resetSeconds));
+      return res.status(429).json({
+        success: false,
+        message: `Troppe richieste, riprova tra ${resetSeconds} secondi.`
+      });
+    }
+
+    stats.allowed++;
+    next();
+  };
+
+  middleware.store = store;
+  middleware.reset = () => store.reset();
+  middleware.getMetrics = () => ({ ...store.getMetrics(), ...stats });
+  return middleware;
+};
+
+exports.budgetFor = budgetFor;
+exports.keyFor = keyFor;
+
+exports.rateLimiter = exports.createRateLimiter({
+  store: createStore(config.RATE_LIMIT.store),
+  skip: ['/health']
+});
@@ -1,6 +1,7 @@
 
 // Verifica permessi utente: controllo ruoli, autorizzazioni granulari
 const config = require('../config/config');
+const log = require('../utils/logger').child('auth');
 
 // Middleware per controllare ruoli specifici
 exports.authorize = (...roles) => {
@@ -64,7 +65,7 @@ exports.canModifyTable = async (req, res, next) => {
     });
 
   } catch (error) {
-    console.error('Role check error:', error);
+    log.error('Role check error', { error });
     return res.status(500).json({
       success: false,
       message: 'Errore nel controllo autorizzazioni'
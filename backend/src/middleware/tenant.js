@@ -0,0 +1,91 @@
+
+// Risolve il tenant della richiesta prima di rate limiting e routing.
+// Ordine: claim del token JWT, prefisso del QR scansionato (GET /api/tables/qr/:qrCode),
+// header X-Tenant o ?tenant= per le letture pubbliche, tenant di default.
+// Le letture pubbliche (classifica, stream, QR) ignorano il token: le loro risposte
+// sono in cache condivise (CDN) che distinguono solo URL e X-Tenant, quindi il tenant
+// deve dipendere solo da quelli.
+// Le letture pubbliche accettano solo ristoranti esistenti (404 altrimenti): un tenant
+// inventato non deve creare stato in memoria.
+// Sulle route protette req.tenant viene poi fissato dal principal (auth.protect).
+const jwt = require('jsonwebtoken');
+const config = require('../config/config');
+const { defaultTenant, normalizeTenant, parseQR } = require('../utils/tenants');
+const tenantRegistry = require('../utils/tenantRegistry');
+const log = require('../utils/logger').child('tenants');
+
+const QR_ROUTE = /^\/api\/tables\/qr\/([^/]+)\/?$/;
+const PUBLIC_ROUTE = /^\/api\/tables\/(leaderboard\/?$|stream\/?$|qr\/|[^/]+\/qr\.)/;
+
+// Letture pubbliche senza autenticazione, servite con Cache-Control public
+const isPublicRead = (req) => req.method === 'GET' && PUBLIC_ROUTE.test(req.path);
+
+// Claim del token Bearer verificato (null se assente o non valido), calcolati una
+// sola volta per richiesta: li riusa il rate limiter
+const bearerClaims = (req) => {
+  if (req.claims !== undefined) {
+    return req.claims;
+  }
+
+  req.claims = null;
+  const header = req.headers.authorization;
+
+  if (header && header.startsWith('Bearer ')) {
+    try {
+      req.claims = jwt.verify(header.slice(7), config.JWT_SECRET);
+    } catch (error) {
+      // Token non valido: la route protetta risponderà 401
+    }
+  }
+
+  return req.claims;
+};
+
+const requestedTenant = (req) => {
+  const claims = isPublicRead(req) ? null : bearerClaims(req);
+  if (claims && claims.tenant) {
+    return claims.tenant;
+  }
+
+  const qrRoute = req.method === 'GET' && QR_ROUTE.exec(req.path);
+  if (qrRoute) {
+    const parsed = parseQR(decodeURIComponent(qrRoute[1]), null);
+    if (parsed && parsed.tenant) return parsed.tenant;
+  }
+
+  return req.get(config.TENANCY.header) || req.query.tenant || defaultTenant();
+};
+
+exports.resolveTenant = async (req, res, next) => {
+  const tenant = normalizeTenant(requestedTenant(req));
+
+  if (!tenant) {
+    return res.status(400).json({
+      success: false,
+      message: 'Ristorante (tenant) non valido'
+    });
+  }
+
+  if (isPublicRead(req)) {
+    try {
+      if (!(await tenantRegistry.isKnown(tenant))) {
+        return res.status(404).json({
+          success: false,
+          message: 'Ristorante non trovato'
+        });
+      }
+    } catch (error) {
+      log.error('Tenant lookup error', { error, tenant });
+      return res.status(500).json({
+        success: false,
+        message: 'Errore nella verifica del ristorante'
+      });
+    }
+  }
+
+  req.tenant = tenant;
+  next();
+};
+
+exports.bearerClaims = bearerClaims;
+exports.isPublicRead = isPublicRead;
@@ -2,6 +2,8 @@
 // Valida e sanitizza input delle richieste API (express-validator, custom)
 const { body, param, query, validationResult } = require('express-validator');
 const config = require('../config/config');
+const { isValidTimeZone, isHourAlignedTimeZone } = require('../utils/helpers');
+const { QR_PATTERN } = require('../utils/tenants');
 
 // Middleware per gestire errori di validazione
 exports.handleValidationErrors = (req, res, next) => {
@@ -99,15 +101,16 @@ exports.validateUpdateTableName = [
 exports.validateQRCode = [
   body('qrCode')
     .trim()
-    .matches(/^TABLE_\d+$/)
-    .withMessage('Codice QR non valido (formato: TABLE_numero)')
+    .matches(QR_PATTERN)
+    .withMessage('Codice QR non valido (formato: [ristorante:]TABLE_numero)')
 ];
 
 // Validazioni per punti
 exports.validateAddPoints = [
   body('points')
     .isInt({ min: config.MIN_POINTS_PER_TRANSACTION, max: config.MAX_POINTS_PER_TRANSACTION })
-    .withMessage(`Punti devono essere tra ${config.MIN_POINTS_PER_TRANSACTION} e ${config.MAX_POINTS_PER_TRANSACTION}`),
+    .withMessage(`Punti devono essere tra ${config.MIN_POINTS_PER_TRANSACTION} e ${config.MAX_POINTS_PER_TRANSACTION}`)
+    .toInt(),
 
   body('description')
     .optional()
@@ -116,13 +119,83 @@ exports.validateAddPoints = [
     .withMessage('Descrizione non può superare i 200 caratteri')
 ];
 
+// Batch punti: stesse regole di validateQRCode/validateAddPoints per ogni elemento
+exports.validateBatchPoints = [
+  body('batchId')
+    .isString()
+    .trim()
+    .matches(/^[\w-]{8,100}$/)
+    .withMessage('batchId richiesto (8-100 caratteri alfanumerici, - o _)'),
+
+  body('items')
+    .isArray({ min: 1, max: config.BATCH.maxItems })
+    .withMessage(`Il batch deve contenere da 1 a ${config.BATCH.maxItems} elementi`),
+
+  body('items.*')
+    .custom(item => Boolean(item && (item.qrCode || item.tableId)))
+    .withMessage('Ogni elemento richiede qrCode o tableId'),
+
+  body('items.*.qrCode')
+    .optional()
+    .trim()
+    .matches(QR_PATTERN)
+    .withMessage('Codice QR non valido (formato: [ristorante:]TABLE_numero)'),
+
+  body('items.*.tableId')
+    .optional()
+    .isMongoId()
+    .withMessage('ID tavolo non valido'),
+
+  body('items.*.points')
+    .isInt({ min: config.MIN_POINTS_PER_TRANSACTION, max: config.MAX_POINTS_PER_TRANSACTION })
+    .withMessage(`Punti devono essere tra ${config.MIN_POINTS_PER_TRANSACTION} e ${config.MAX_POINTS_PER_TRANSACTION}`)
+    .toInt(),
+
+  body('items.*.type')
+    .optional()
+    .isIn(['EARNED', 'REDEEMED'])
+    .withMessage('Tipo non valido (EARNED o REDEEMED)'),
+
+  body('items.*.description')
+    .optional()
+    .trim()
+    .isLength({ max: 200 })
+    .withMessage('Descrizione non può superare i 200 caratteri')
+];
+
 // Validazioni parametri URL
+// Le route usano sia :tableId (punti) sia :id (tavoli)
 exports.validateTableId = [
-  param('tableId')
+  param(['tableId', 'id'])
+    .optional()
     .isMongoId()
     .withMessage('ID tavolo non valido')
 ];
 
+// Varianti dell'immagine QR: lato in pixel, margine in moduli, colori esadecimali RRGGBB
+exports.validateQRImage = [
+  param('id')
+    .isMongoId()
+    .withMessage('ID tavolo non valido'),
+
+  query('size')
+    .optional()
+    .isInt({ min: 64, max: 1024 })
+    .withMessage('Dimensione deve essere tra 64 e 1024 pixel')
+    .toInt(),
+
+  query('margin')
+    .optional()
+    .isInt({ min: 0, max: 10 })
+    .withMessage('Margine deve essere tra 0 e 10')
+    .toInt(),
+
+  query(['dark', 'light'])
+    .optional()
+    .matches(/^[0-9a-fA-F]{6}$/)
+    .withMessage('Colore non valido (formato: RRGGBB)')
+];
+
 exports.validateUserId = [
   param('userId')
     .isMongoId()
@@ -130,6 +203,37 @@ exports.validateUserId = [
 ];
 
 // Validazioni query parameters
+// Statistiche: giorni YYYY-MM-DD interpretati nel fuso tz (default config.STATS.timeZone)
+exports.validateStatsQuery = [
+  query(['date', 'from', 'to'])
+    .optional()
+    .isDate({ format: 'YYYY-MM-DD', strictMode: true })
+    .withMessage('Data non valida (formato YYYY-MM-DD)'),
+
+  query('tz')
+    .optional()
+    .custom(isValidTimeZone)
+    .withMessage('Fuso orario non valido')
+    .bail()
+    .custom(isHourAlignedTimeZone)
+    .withMessage('Fuso orario non supportato: le statistiche richiedono un offset di ore intere'),
+
+  query('unit')
+    .optional()
+    .isIn(['day', 'hour'])
+    .withMessage('Unità non valida (day o hour)'),
+
+  query('tableId')
+    .optional()
+    .isMongoId()
+    .withMessage('ID tavolo non valido'),
+
+  param('userId')
+    .optional()
+    .isMongoId()
+    .withMessage('ID utente non valido')
+];
+
 exports.validatePagination = [
   query('page')
     .optional()
@@ -143,8 +247,19 @@ exports.validatePagination = [
 
   query('sort')
     .optional()
-    .isIn(['points', 'name', 'createdAt', 'lastPointsUpdate'])
-    .withMessage('Ordinamento non valido')
+    .matches(/^-?(points|name|createdAt|lastPointsUpdate)$/)
+    .withMessage('Ordinamento non valido'),
+
+  query('cursor')
+    .optional()
+    .isBase64({ urlSafe: true })
+    .withMessage('Cursore di paginazione non valido'),
+
+  query('withTotal')
+    .optional()
+    .isBoolean()
+    .withMessage('withTotal deve essere true o false')
+    .toBoolean()
 ];
 
 // Sanitizzazione input
@@ -153,6 +268,15 @@ exports.sanitizeHtml = (req, res, next) => {
     if (typeof value === 'string') {
       return value.replace(/<script\b[^<]*(?:(?!<\/script>)<[^<]*)*<\/script>/gi, '');
     }
+    // Anche nei valori annidati (es. elementi di un batch)
+    if (Array.isArray(value)) {
+      return value.map(sanitizeValue);
+    }
+    if (value && typeof value === 'object') {
+      Object.keys(value).forEach(key => {
+        value[key] = sanitizeValue(value[key]);
+      });
+    }
     return value;
   };
 
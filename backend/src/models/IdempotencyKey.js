@@ -0,0 +1,33 @@
+
+// Modello chiavi di idempotenza: risposta registrata per (utente, route, chiave).
+// Il documento scade da solo (indice TTL su expiresAt).
+const mongoose = require('mongoose');
+
+const IdempotencyKeySchema = new mongoose.Schema({
+  // utente:metodo:route:chiave
+  _id: {
+    type: String
+  },
+  fingerprint: {
+    type: String,
+    required: true
+  },
+  state: {
+    type: String,
+    enum: ['pending', 'done'],
+    default: 'pending'
+  },
+  statusCode: Number,
+  // Corpo JSON già serializzato: la risposta ripetuta è identica all'originale
+  body: String,
+  expiresAt: {
+    type: Date,
+    required: true
+  }
+}, {
+  versionKey: false
+});
+
+IdempotencyKeySchema.index({ expiresAt: 1 }, { expireAfterSeconds: 0 });
+
+module.exports = mongoose.model('IdempotencyKey', IdempotencyKeySchema);
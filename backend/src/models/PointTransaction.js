@@ -1,8 +1,21 @@
 
 // Modello transazione: tracking storico punti, metadati, tipo transazione
 const mongoose = require('mongoose');
+const statsRollups = require('../utils/statsRollups');
+const config = require('../config/config');
+const { zonedDay, zonedMidnight, addDays } = require('../utils/helpers');
+const { TRANSACTION_FIELDS, tableSnapshot, cashierSnapshot, needsCashierSnapshot, serializeTransaction } = require('../utils/serializers');
+const log = require('../utils/logger').child('points');
 
 const PointTransactionSchema = new mongoose.Schema({
+  // Ristorante del tavolo: prefisso di tutti gli indici
+  tenant: {
+    type: String,
+    required: true,
+    lowercase: true,
+    immutable: true,
+    default: () => config.TENANCY.defaultTenant
+  },
   table: {
     type: mongoose.Schema.ObjectId,
     ref: 'Table',
@@ -13,6 +26,18 @@ const PointTransactionSchema = new mongoose.Schema({
     ref: 'User',
     required: [true, 'Utente assegnatore richiesto']
   },
+  // Istantanee scritte con la transazione e mai aggiornate: lo storico mostra tavolo
+  // e cassiere com'erano al momento e si legge con una query, senza populate.
+  // Le transazioni precedenti si completano con npm run transactions:snapshots
+  tableSnapshot: {
+    tableNumber: Number,
+    name: String
+  },
+  assignedBySnapshot: {
+    username: String,
+    firstName: String,
+    lastName: String
+  },
   points: {
     type: Number,
     required: [true, 'Punti richiesti'],
@@ -31,6 +56,9 @@ const PointTransactionSchema = new mongoose.Schema({
     trim: true,
     maxlength: [200, 'Descrizione non può superare i 200 caratteri']
   },
+  // Batch di provenienza (POST /api/points/batch) e posizione dell'elemento
+  batchId: String,
+  batchIndex: Number,
   metadata: {
     previousPoints: Number,
     newPoints: Number,
@@ -43,15 +71,23 @@ const PointTransactionSchema = new mongoose.Schema({
   timestamps: true
 });
 
-// Indici per performance e query
-PointTransactionSchema.index({ table: 1, createdAt: -1 });
-PointTransactionSchema.index({ assignedBy: 1, createdAt: -1 });
-PointTransactionSchema.index({ type: 1 });
-PointTransactionSchema.index({ createdAt: -1 });
+// Indici per performance e query, prefissati dal tenant
+// _id in coda: spareggio della paginazione keyset su (createdAt, _id)
+PointTransactionSchema.index({ tenant: 1, table: 1, createdAt: -1, _id: -1 });
+PointTransactionSchema.index({ tenant: 1, assignedBy: 1, createdAt: -1, _id: -1 });
+PointTransactionSchema.index({ tenant: 1, type: 1, createdAt: -1, _id: -1 });
+PointTransactionSchema.index({ tenant: 1, createdAt: -1, _id: -1 });
+// Un solo movimento per elemento di batch: i retry non duplicano le transazioni
+PointTransactionSchema.index(
+  { tenant: 1, batchId: 1, batchIndex: 1 },
+  { unique: true, partialFilterExpression: { batchId: { $exists: true } } }
+);
 
-// Middleware pre-save per calcolare metadata
+// Middleware pre-save per calcolare metadata.
+// Il lookup del tavolo serve solo se il chiamante non ha già fornito i valori
+// (previousPoints può essere legittimamente 0).
 PointTransactionSchema.pre('save', async function(next) {
-  if (this.isNew && !this.metadata.previousPoints) {
+  if (this.isNew && this.metadata.previousPoints == null) {
     try {
       const Table = mongoose.model('Table');
       const table = await Table.findById(this.table);
@@ -61,35 +97,90 @@ PointTransactionSchema.pre('save', async function(next) {
         this.metadata.newPoints = table.points + (this.type === 'EARNED' ? this.points : -this.points);
       }
     } catch (error) {
-      console.error('Error calculating metadata:', error);
+      log.error('Error calculating metadata', { error });
     }
   }
   next();
 });
 
+// Rollup statistiche: ogni nuova transazione incrementa i contatori orari
+PointTransactionSchema.pre('save', function(next) {
+  this.$locals.wasNew = this.isNew;
+  next();
+});
+
+PointTransactionSchema.post('save', function(doc) {
+  if (doc.$locals.wasNew) {
+    statsRollups.record(doc);
+  }
+});
+
+PointTransactionSchema.post('insertMany', function(docs) {
+  statsRollups.record(docs);
+});
+
 // Metodi statici
-PointTransactionSchema.statics.getTableHistory = function(tableId, limit = 10) {
-  return this.find({ table: tableId })
-    .populate('assignedBy', 'username firstName lastName')
-    .sort({ createdAt: -1 })
-    .limit(limit);
+// Letture lean: oggetti semplici pronti per la risposta JSON
+// Transazioni lean con tavolo e cassiere dalle istantanee. Solo le transazioni scritte
+// prima delle istantanee, o con l'istantanea del cassiere senza firstName/lastName
+// (non ancora migrate), richiedono una query su Table o User
+PointTransactionSchema.statics.withSnapshots = async function(transactions) {
+  const missingTables = [...new Set(transactions.filter(t => !t.tableSnapshot).map(t => String(t.table)))];
+  const missingUsers = [...new Set(transactions.filter(t => needsCashierSnapshot(t.assignedBySnapshot)).map(t => String(t.assignedBy)))];
+
+  const [tables, users] = await Promise.all([
+    missingTables.length
+      ? mongoose.model('Table').find({ _id: { $in: missingTables } }).select('tableNumber name').lean()
+      : [],
+    missingUsers.length
+      ? mongoose.model('User').find({ _id: { $in: missingUsers } }).select('username firstName lastName').lean()
+      : []
+  ]);
+
+  const tableById = new Map(tables.map(table => [String(table._id), tableSnapshot(table)]));
+  const userById = new Map(users.map(user => [String(user._id), cashierSnapshot(user)]));
+
+  return transactions.map(transaction => serializeTransaction({
+    ...transaction,
+    tableSnapshot: transaction.tableSnapshot || tableById.get(String(transaction.table)),
+    assignedBySnapshot: needsCashierSnapshot(transaction.assignedBySnapshot)
+      ? userById.get(String(transaction.assignedBy)) || transaction.assignedBySnapshot
+      : transaction.assignedBySnapshot
+  }));
 };
 
-PointTransactionSchema.statics.getUserActivity = function(userId, limit = 20) {
-  return this.find({ assignedBy: userId })
-    .populate('table', 'tableNumber name')
-    .sort({ createdAt: -1 })
-    .limit(limit);
+PointTransactionSchema.statics.getTableHistory = async function(tableId, limit = 10, tenant = config.TENANCY.defaultTenant) {
+  const transactions = await this.find({ tenant, table: tableId })
+    .select(TRANSACTION_FIELDS)
+    .sort({ createdAt: -1, _id: -1 })
+    .limit(limit)
+    .lean();
+
+  return this.withSnapshots(transactions);
+};
+
+PointTransactionSchema.statics.getUserActivity = async function(userId, limit = 20, tenant = config.TENANCY.defaultTenant) {
+  const transactions = await this.find({ tenant, assignedBy: userId })
+    .select(TRANSACTION_FIELDS)
+    .sort({ createdAt: -1, _id: -1 })
+    .limit(limit)
+    .lean();
+
+  return this.withSnapshots(transactions);
 };
 
-PointTransactionSchema.statics.getDailyStats = function(date = new Date()) {
-  const startDate = new Date(date.setHours(0, 0, 0, 0));
-  const endDate = new Date(date.setHours(23, 59, 59, 999));
+// Aggregazione diretta sulle transazioni di un giorno nel fuso indicato.
+// Le API leggono i rollup (statsRollups); questa resta per verifiche puntuali.
+PointTransactionSchema.statics.getDailyStats = function(date = new Date(), timeZone = config.STATS.timeZone, tenant = config.TENANCY.defaultTenant) {
+  const day = typeof date === 'string' ? date : zonedDay(date, timeZone);
+  const startDate = zonedMidnight(day, timeZone);
+  const endDate = zonedMidnight(addDays(day, 1), timeZone);
 
   return this.aggregate([
     {
       $match: {
-        createdAt: { $gte: startDate, $lte: endDate }
+        tenant,
+        createdAt: { $gte: startDate, $lt: endDate }
       }
     },
     {
@@ -0,0 +1,25 @@
+
+// Modello contatori rate limit: un documento per chiave e finestra fissa.
+// Le finestre vecchie scadono da sole (indice TTL su expiresAt).
+const mongoose = require('mongoose');
+
+const RateLimitCounterSchema = new mongoose.Schema({
+  // chiave|inizioFinestra
+  _id: {
+    type: String
+  },
+  count: {
+    type: Number,
+    default: 0
+  },
+  expiresAt: {
+    type: Date,
+    required: true
+  }
+}, {
+  versionKey: false
+});
+
+RateLimitCounterSchema.index({ expiresAt: 1 }, { expireAfterSeconds: 0 });
+
+module.exports = mongoose.model('RateLimitCounter', RateLimitCounterSchema);
@@ -0,0 +1,105 @@
+
+// Modello rollup statistiche: contatori orari (UTC) per tipo transazione e tenant,
+// su tre dimensioni: totale ristorante, singolo cassiere, singolo tavolo.
+// Le statistiche di un intervallo di giorni leggono O(ore) documenti invece di
+// riaggregare le transazioni.
+const mongoose = require('mongoose');
+const config = require('../config/config');
+
+const StatsRollupSchema = new mongoose.Schema({
+  // Chiave deterministica tenant|dimension|key|type|bucket: upsert e backfill idempotenti
+  _id: {
+    type: String
+  },
+  tenant: {
+    type: String,
+    required: true,
+    default: () => config.TENANCY.defaultTenant
+  },
+  dimension: {
+    type: String,
+    enum: ['all', 'cashier', 'table'],
+    required: true
+  },
+  key: {
+    type: mongoose.Schema.ObjectId,
+    default: null
+  },
+  type: {
+    type: String,
+    enum: ['EARNED', 'REDEEMED', 'ADJUSTMENT'],
+    required: true
+  },
+  // Inizio dell'ora UTC
+  bucket: {
+    type: Date,
+    required: true
+  },
+  count: {
+    type: Number,
+    default: 0
+  },
+  points: {
+    type: Number,
+    default: 0
+  },
+  // Ultimo flush applicato da ogni processo (spillId → seq): rende idempotente il
+  // recupero dello spill dopo un crash
+  applied: {
+    type: Map,
+    of: Number
+  }
+}, {
+  versionKey: false
+});
+
+StatsRollupSchema.index({ tenant: 1, dimension: 1, key: 1, bucket: 1 });
+
+StatsRollupSchema.statics.rollupId = function(tenant, dimension, key, type, bucket) {
+  return `${tenant}|${dimension}|${key || '*'}|${type}|${bucket.toISOString()}`;
+};
+
+// Somma i bucket orari di [from, to) raggruppandoli per giorno (o ora) nel fuso indicato.
+// Solo fusi con offset di ore intere (validateStatsQuery rifiuta gli altri): con
+// Asia/Kolkata un bucket orario cavalca la mezzanotte locale.
+StatsRollupSchema.statics.summarize = function({
+  tenant = config.TENANCY.defaultTenant,
+  dimension = 'all',
+  key = null,
+  from,
+  to,
+  timeZone,
+  unit = 'day'
+}) {
+  return this.aggregate([
+    {
+      $match: {
+        tenant,
+        dimension,
+        key: key ? new mongoose.Types.ObjectId(String(key)) : null,
+        bucket: { $gte: from, $lt: to }
+      }
+    },
+    {
+      $group: {
+        _id: {
+          period: {
+            $dateToString: {
+              date: '$bucket',
+              format: unit === 'hour' ? '%Y-%m-%dT%H:00' : '%Y-%m-%d',
+              timezone: timeZone
+            }
+          },
+          type: '$type'
+        },
+        transactionCount: { $sum: '$count' },
+        totalPoints: { $sum: '$points' }
+      }
+    },
+    {
+      $sort: { '_id.period': 1 }
+    }
+  ]);
+};
+
+module.exports = mongoose.model('StatsRollup', StatsRollupSchema);
@@ -1,12 +1,22 @@
 
 //Modello tavoli: definisce struttura, attributi (punti, QR, nome), metodi
+const crypto = require('crypto');
 const mongoose = require('mongoose');
+const tableEvents = require('../utils/tableEvents');
+const config = require('../config/config');
 
 const TableSchema = new mongoose.Schema({
+  // Ristorante di appartenenza: numero tavolo e QR sono univoci dentro il tenant
+  tenant: {
+    type: String,
+    required: true,
+    lowercase: true,
+    immutable: true,
+    default: () => config.TENANCY.defaultTenant
+  },
   tableNumber: {
     type: Number,
     required: [true, 'Numero tavolo richiesto'],
-    unique: true,
     min: [1, 'Il numero del tavolo deve essere maggiore di 0']
   },
   name: {
@@ -18,7 +28,6 @@ const TableSchema = new mongoose.Schema({
   qrCode: {
     type: String,
     required: [true, 'Codice QR richiesto'],
-    unique: true,
     uppercase: true
   },
   points: {
@@ -37,6 +46,17 @@ const TableSchema = new mongoose.Schema({
   createdBy: {
     type: mongoose.Schema.ObjectId,
     ref: 'User'
+  },
+  // Ultimi batch di punti applicati (idempotenza di POST /api/points/batch)
+  recentBatches: {
+    type: [{
+      _id: false,
+      batchId: String,
+      previousPoints: Number,
+      // Impronta delle variazioni applicate al tavolo: un replay diverso viene rifiutato
+      hash: String
+    }],
+    select: false
   }
 }, {
   timestamps: true,
@@ -44,10 +64,12 @@ const TableSchema = new mongoose.Schema({
   toObject: { virtuals: true }
 });
 
-// Indici per performance
-TableSchema.index({ tableNumber: 1 });
-TableSchema.index({ qrCode: 1 });
-TableSchema.index({ points: -1 }); // Per classifiche
+// Indici per performance, tutti prefissati dal tenant
+TableSchema.index({ tenant: 1, tableNumber: 1 }, { unique: true });
+TableSchema.index({ tenant: 1, qrCode: 1 }, { unique: true });
+// Indice di rank: copre la classifica di un ristorante (filtro isActive + ordinamento)
+// e il conteggio dei tavoli davanti a un tavolo dato
+TableSchema.index({ tenant: 1, isActive: 1, points: -1, lastPointsUpdate: 1 });
 
 // Virtual per formattazione QR code
 TableSchema.virtual('formattedQR').get(function() {
@@ -62,15 +84,262 @@ TableSchema.pre('save', function(next) {
   next();
 });
 
-// Metodi statici
-TableSchema.statics.getLeaderboard = function() {
-  return this.find({ isActive: true })
+// Notifica le modifiche ai componenti in memoria (classifica, cache).
+// Se l'evento non porta lo stato completo il tavolo viene riletto.
+const EVENT_FIELDS = ['tenant', 'tableNumber', 'name', 'points', 'lastPointsUpdate', 'isActive'];
+const BULK_EVENT_THRESHOLD = 1000;
+
+const publishTable = (table) => {
+  if (EVENT_FIELDS.every(field => table[field] !== undefined)) {
+    tableEvents.emit('changed', table);
+  } else {
+    tableEvents.emit('stale', table._id, table.tenant);
+  }
+};
+
+// Tenant di un filtro di query, se è un valore semplice
+const filterTenant = (filter) => (typeof filter.tenant === 'string' ? filter.tenant : undefined);
+
+const publishQuery = function() {
+  const filter = this.getFilter();
+
+  if (filter._id && mongoose.isValidObjectId(filter._id)) {
+    tableEvents.emit('stale', filter._id, filterTenant(filter));
+  } else {
+    tableEvents.emit('invalidated', filterTenant(filter));
+  }
+};
+
+TableSchema.post('save', function(doc) {
+  publishTable(doc.toObject({ virtuals: false }));
+});
+
+TableSchema.post('insertMany', function(docs) {
+  if (docs.length > BULK_EVENT_THRESHOLD) {
+    return tableEvents.emit('invalidated');
+  }
+
+  docs.forEach(doc => publishTable(doc.toObject ? doc.toObject({ virtuals: false }) : doc));
+});
+
+TableSchema.post('findOneAndUpdate', function(result) {
+  if (!result) return;
+
+  const options = this.getOptions();
+  if (options.new || options.returnDocument === 'after') {
+    publishTable(result);
+  } else {
+    tableEvents.emit('stale', result._id, result.tenant);
+  }
+});
+
+TableSchema.post(['updateOne', 'replaceOne', 'deleteOne', 'findOneAndDelete'], { document: false, query: true }, publishQuery);
+
+TableSchema.post(['updateMany', 'deleteMany'], { document: false, query: true }, function() {
+  tableEvents.emit('invalidated', filterTenant(this.getFilter()));
+});
+
+// Metodi statici (tenant omesso = tenant di default)
+TableSchema.statics.getLeaderboard = function(tenant = config.TENANCY.defaultTenant) {
+  return this.find({ tenant, isActive: true })
     .sort({ points: -1, lastPointsUpdate: 1 })
     .select('tableNumber name points lastPointsUpdate');
 };
 
-TableSchema.statics.findByQR = function(qrCode) {
-  return this.findOne({ qrCode: qrCode.toUpperCase(), isActive: true });
+TableSchema.statics.findByQR = function(qrCode, tenant = config.TENANCY.defaultTenant) {
+  return this.findOne({ tenant, qrCode: qrCode.toUpperCase(), isActive: true });
+};
+
+// Numero di tavoli attivi davanti in classifica nel suo ristorante. Nessun hint:
+// il planner sceglie l'indice di rank, e se l'indice manca o è in costruzione il
+// conteggio resta possibile invece di fallire
+TableSchema.statics.countAhead = function(table) {
+  return this.countDocuments({
+    tenant: table.tenant || config.TENANCY.defaultTenant,
+    isActive: true,
+    $or: [
+      { points: { $gt: table.points } },
+      {
+        points: table.points,
+        lastPointsUpdate: { $lt: table.lastPointsUpdate }
+      }
+    ]
+  });
+};
+
+// Applica una variazione di punti con un unico $inc atomico.
+// Ritorna il tavolo aggiornato (lean) oppure null se il tavolo non esiste,
+// non è attivo o, per variazioni negative, non ha punti sufficienti.
+TableSchema.statics.applyPointsDelta = function(filter, delta) {
+  const query = { ...filter, isActive: true };
+
+  if (delta < 0) {
+    query.points = { $gte: -delta };
+  }
+
+  return this.findOneAndUpdate(
+    query,
+    {
+      $inc: { points: delta },
+      $set: { lastPointsUpdate: new Date() }
+    },
+    {
+      new: true,
+      projection: 'tenant tableNumber name qrCode points lastPointsUpdate isActive'
+    }
+  ).lean();
+};
+
+// Variazione atomica tramite QR code (usa l'indice univoco su tenant + qrCode)
+TableSchema.statics.applyPointsDeltaByQR = function(qrCode, delta, tenant = config.TENANCY.defaultTenant) {
+  return this.applyPointsDelta({ tenant, qrCode: qrCode.toUpperCase() }, delta);
+};
+
+// Azzera i punti in un'unica operazione e ritorna il documento precedente
+TableSchema.statics.resetPoints = function(tableId, tenant = config.TENANCY.defaultTenant) {
+  return this.findOneAndUpdate(
+    { _id: tableId, tenant },
+    { $set: { points: 0, lastPointsUpdate: new Date() } },
+    {
+      new: false,
+      projection: 'tenant tableNumber name qrCode points lastPointsUpdate isActive'
+    }
+  ).lean();
+};
+
+// Esito in ordine delle variazioni di un batch su un tavolo: le variazioni che
+// porterebbero il saldo sotto zero vengono scartate, le altre applicate in sequenza
+const walkBatch = (points, changes) => {
+  let balance = points;
+
+  const items = changes.map(change => {
+    const previousPoints = balance;
+    const accepted = balance + change.delta >= 0;
+
+    if (accepted) {
+      balance += change.delta;
+    }
+
+    return { ...change, accepted, previousPoints, newPoints: balance };
+  });
+
+  return { items, newPoints: balance };
+};
+
+// Impronta delle variazioni di un batch su un tavolo (indice e delta, in ordine)
+const batchHash = (changes) => crypto.createHash('sha1')
+  .update(JSON.stringify(changes.map(({ index, delta }) => [index, delta])))
+  .digest('base64url');
+
+const BATCH_FIELDS = 'tenant tableNumber name qrCode points lastPointsUpdate isActive recentBatches';
+
+// Applica le variazioni di un batch (Map tableId -> [{ index, delta }]) con un
+// bulkWrite, al massimo una volta per tavolo: il marker in recentBatches rende
+// idempotenti i retry e conserva il saldo di partenza per ricostruire l'esito.
+// Concorrenza ottimistica sul saldo letto: i tavoli modificati nel frattempo
+// vengono riletti e ritentati. Ritorna Map tableId -> { status, table, items }.
+// I tavoli di un altro tenant risultano not_found. Un marker con lo stesso batchId ma
+// variazioni diverse risulta mismatch: se capita alla prima lettura nessun tavolo
+// viene scritto.
+TableSchema.statics.applyPointsBatch = async function(batchId, changes, {
+  markers = 20,
+  maxRounds = 3,
+  tenant = config.TENANCY.defaultTenant
+} = {}) {
+  const outcomes = new Map();
+  let pending = [...changes.keys()];
+
+  const hashes = new Map([...changes].map(([id, tableChanges]) => [id, batchHash(tableChanges)]));
+
+  // Marker senza impronta (scritti prima del campo hash): accettati
+  const replay = ({ recentBatches, ...table }, marker, status) => {
+    const id = String(table._id);
+
+    if (marker.hash && marker.hash !== hashes.get(id)) {
+      outcomes.set(id, { status: 'mismatch', items: changes.get(id) });
+      return;
+    }
+
+    const { items, newPoints } = walkBatch(marker.previousPoints, changes.get(id));
+    outcomes.set(id, { status, table: { ...table, points: newPoints }, items });
+  };
+
+  for (let round = 0; round < maxRounds && pending.length; round++) {
+    const tables = await this.find({ tenant, _id: { $in: pending } }).select(BATCH_FIELDS).lean();
+    const byId = new Map(tables.map(table => [String(table._id), table]));
+    const planned = new Map();
+    const operations = [];
+    const now = new Date();
+
+    for (const id of pending) {
+      const table = byId.get(id);
+
+      if (!table || !table.isActive) {
+        outcomes.set(id, { status: 'not_found', items: changes.get(id) });
+        continue;
+      }
+
+      const marker = (table.recentBatches || []).find(entry => entry.batchId === batchId);
+      if (marker) {
+        replay(table, marker, 'replayed');
+        continue;
+      }
+
+      const { items, newPoints } = walkBatch(table.points, changes.get(id));
+      const update = {
+        $push: {
+          recentBatches: { $each: [{ batchId, previousPoints: table.points, hash: hashes.get(id) }], $slice: -markers }
+        }
+      };
+
+      if (newPoints !== table.points) {
+        update.$set = { points: newPoints, lastPointsUpdate: now };
+      }
+
+      planned.set(id, { table, items, newPoints, lastPointsUpdate: update.$set ? now : table.lastPointsUpdate });
+      operations.push({
+        updateOne: {
+          filter: { _id: table._id, isActive: true, points: table.points, 'recentBatches.batchId': { $ne: batchId } },
+          update
+        }
+      });
+    }
+
+    if (round === 0 && [...outcomes.values()].some(outcome => outcome.status === 'mismatch')) {
+      return outcomes;
+    }
+
+    if (operations.length) {
+      const result = await this.bulkWrite(operations, { ordered: false });
+
+      if (result.modifiedCount === operations.length) {
+        for (const [id, plan] of planned) {
+          const { recentBatches, ...table } = plan.table;
+          const updated = { ...table, points: plan.newPoints, lastPointsUpdate: plan.lastPointsUpdate };
+
+          outcomes.set(id, { status: 'applied', table: updated, items: plan.items });
+          publishTable(updated);
+        }
+      } else {
+        // Qualche guardia non ha trovato il documento: chi ha il marker è stato
+        // aggiornato (da questa o da un'altra richiesta con lo stesso batchId)
+        const marked = await this.find({ _id: { $in: [...planned.keys()] }, 'recentBatches.batchId': batchId })
+          .select(BATCH_FIELDS)
+          .lean();
+
+        for (const table of marked) {
+          const marker = table.recentBatches.find(entry => entry.batchId === batchId);
+          replay(table, marker, 'applied');
+          tableEvents.emit('stale', table._id, table.tenant);
+        }
+      }
+    }
+
+    pending = pending.filter(id => !outcomes.has(id));
+  }
+
+  pending.forEach(id => outcomes.set(id, { status: 'conflict', items: changes.get(id) }));
+  return outcomes;
 };
 
 // Metodi d'istanza
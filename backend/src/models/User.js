@@ -1,15 +1,23 @@
 
 // Modello utente: struttura dati, hash password, JWT, ruoli
 const mongoose = require('mongoose');
-const bcrypt = require('bcryptjs');
 const jwt = require('jsonwebtoken');
 const config = require('../config/config');
+const principalCache = require('../utils/principalCache');
+const passwordHasher = require('../utils/passwordHasher');
 
 const UserSchema = new mongoose.Schema({
+  // Ristorante di appartenenza: username ed email sono univoci dentro il tenant
+  tenant: {
+    type: String,
+    required: true,
+    lowercase: true,
+    immutable: true,
+    default: () => config.TENANCY.defaultTenant
+  },
   username: {
     type: String,
     required: [true, 'Username richiesto'],
-    unique: true,
     trim: true,
     minlength: [3, 'Username deve avere almeno 3 caratteri'],
     maxlength: [20, 'Username non può superare i 20 caratteri']
@@ -17,7 +25,6 @@ const UserSchema = new mongoose.Schema({
   email: {
     type: String,
     required: [true, 'Email richiesta'],
-    unique: true,
     lowercase: true,
     match: [
       /^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$/,
@@ -61,26 +68,53 @@ const UserSchema = new mongoose.Schema({
   timestamps: true
 });
 
-// Indici
-UserSchema.index({ email: 1 });
-UserSchema.index({ username: 1 });
-UserSchema.index({ role: 1 });
+// Indici, prefissati dal tenant
+UserSchema.index({ tenant: 1, email: 1 }, { unique: true });
+UserSchema.index({ tenant: 1, username: 1 }, { unique: true });
+UserSchema.index({ tenant: 1, role: 1 });
 
-// Middleware pre-save per hash password
-UserSchema.pre('save', async function(next) {
-  // Solo se la password è stata modificata
+// Middleware pre-save per hash password: solo su una password nuova o modificata,
+// le altre modifiche (profilo, lastLogin) non toccano bcrypt
+UserSchema.pre('save', async function() {
   if (!this.isModified('password')) {
-    next();
+    return;
+  }
+
+  // Hash nel pool di worker con il costo configurato (BCRYPT_ROUNDS)
+  this.password = await passwordHasher.hash(this.password);
+});
+
+// Invalidazione della cache principal su ogni modifica dell'utente
+// (profilo, password, disattivazione)
+UserSchema.post('save', function(doc) {
+  principalCache.invalidate(doc._id);
+});
+
+UserSchema.post(['findOneAndUpdate', 'findOneAndDelete'], function(doc) {
+  if (doc) {
+    principalCache.invalidate(doc._id);
   }
+});
+
+UserSchema.post(['updateOne', 'updateMany', 'deleteOne', 'deleteMany'], { document: false, query: true }, function() {
+  const { _id } = this.getFilter();
 
-  // Hash password con costo 12
-  const salt = await bcrypt.genSalt(12);
-  this.password = await bcrypt.hash(this.password, salt);
+  // Filtro su un singolo _id: invalida solo quello, altrimenti svuota la cache
+  if (_id && mongoose.isValidObjectId(_id)) {
+    principalCache.invalidate(_id);
+  } else {
+    principalCache.clear();
+  }
 });
 
 // Metodo per confrontare password
 UserSchema.methods.matchPassword = async function(enteredPassword) {
-  return await bcrypt.compare(enteredPassword, this.password);
+  return await passwordHasher.compare(enteredPassword, this.password);
+};
+
+// Hash generato con un costo diverso da quello configurato
+UserSchema.methods.needsRehash = function() {
+  return passwordHasher.needsRehash(this.password);
 };
 
 // Metodo per generare JWT token
@@ -88,6 +122,7 @@ UserSchema.methods.getSignedJwtToken = function() {
   return jwt.sign(
     { 
       id: this._id,
+      tenant: this.tenant,
       role: this.role,
       username: this.username
     },
@@ -102,8 +137,8 @@ UserSchema.virtual('fullName').get(function() {
 });
 
 // Metodi statici
-UserSchema.statics.findActiveByRole = function(role) {
-  return this.find({ role, isActive: true });
+UserSchema.statics.findActiveByRole = function(role, tenant = config.TENANCY.defaultTenant) {
+  return this.find({ tenant, role, isActive: true });
 };
 
 module.exports = mongoose.model('User', UserSchema);
@@ -4,6 +4,7 @@ const express = require('express');
 const {
   addPoints,
   addPointsToTable,
+  addPointsBatch,
   redeemPoints,
   getTransactions,
   getDailyStats,
@@ -12,12 +13,15 @@ const {
 } = require('../controllers/pointsController');
 
 const { protect } = require('../middleware/auth');
+const { idempotency } = require('../middleware/idempotency');
 const { authorize, requireAdmin, requireCashier } = require('../middleware/roleCheck');
 const {
   validateAddPoints,
+  validateBatchPoints,
   validateQRCode,
   validateTableId,
   validatePagination,
+  validateStatsQuery,
   handleValidationErrors,
   sanitizeHtml
 } = require('../middleware/validation');
@@ -34,6 +38,7 @@ router.post('/add',
   validateQRCode,
   validateAddPoints,
   handleValidationErrors,
+  idempotency,
   addPoints
 );
 
@@ -47,9 +52,23 @@ router.post('/table/:tableId',
   validateTableId,
   validateAddPoints,
   handleValidationErrors,
+  idempotency,
   addPointsToTable
 );
 
+// @route   POST /api/points/batch
+// @desc    Assegna/riscatta punti su più tavoli (idempotente sul batchId)
+// @access  Private (Cashier/Admin)
+router.post('/batch',
+  protect,
+  requireCashier,
+  sanitizeHtml,
+  validateBatchPoints,
+  handleValidationErrors,
+  idempotency,
+  addPointsBatch
+);
+
 // @route   POST /api/points/redeem
 // @desc    Riscatta punti (sottrai)
 // @access  Private (Cashier/Admin)
@@ -60,6 +79,7 @@ router.post('/redeem',
   validateQRCode,
   validateAddPoints,
   handleValidationErrors,
+  idempotency,
   redeemPoints
 );
 
@@ -72,6 +92,7 @@ router.post('/reset/:tableId',
   sanitizeHtml,
   validateTableId,
   handleValidationErrors,
+  idempotency,
   resetTablePoints
 );
 
@@ -87,11 +108,13 @@ router.get('/transactions',
 );
 
 // @route   GET /api/points/stats/daily
-// @desc    Statistiche punti giornaliere
+// @desc    Statistiche punti giornaliere (?date o ?from&to, ?tz, ?tableId, ?unit)
 // @access  Private (Cashier/Admin)
 router.get('/stats/daily',
   protect,
   authorize('cashier', 'admin'),
+  validateStatsQuery,
+  handleValidationErrors,
   getDailyStats
 );
 
@@ -100,6 +123,8 @@ router.get('/stats/daily',
 // @access  Private
 router.get('/stats/user/:userId?',
   protect,
+  validateStatsQuery,
+  handleValidationErrors,
   getUserStats
 );
 
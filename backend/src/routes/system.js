@@ -0,0 +1,16 @@
+
+// Espone endpoint di diagnostica interna (/api/system/stats)
+const express = require('express');
+const { getSystemStats } = require('../controllers/systemController');
+
+const { protect } = require('../middleware/auth');
+const { requireAdmin } = require('../middleware/roleCheck');
+
+const router = express.Router();
+
+// @route   GET /api/system/stats
+// @desc    Metriche runtime (coda ledger, cache, ...)
+// @access  Private (Admin)
+router.get('/stats', protect, requireAdmin, getSystemStats);
+
+module.exports = router;
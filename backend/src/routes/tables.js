@@ -3,9 +3,13 @@
 const express = require('express');
 const {
   getLeaderboard,
+  checkLeaderboard,
+  streamTables,
   getTables,
   getTable,
   getTableByQR,
+  getQRSheet,
+  getTableQRImage,
   createTable,
   updateTableName,
   deleteTable,
@@ -18,6 +22,7 @@ const {
   validateCreateTable,
   validateUpdateTableName,
   validateTableId,
+  validateQRImage,
   validatePagination,
   handleValidationErrors,
   sanitizeHtml
@@ -34,11 +39,34 @@ router.get('/leaderboard',
   getLeaderboard
 );
 
+// @route   GET /api/tables/leaderboard/check
+// @desc    Confronta la classifica in memoria con il database
+// @access  Private (Admin)
+router.get('/leaderboard/check',
+  protect,
+  requireAdmin,
+  checkLeaderboard
+);
+
+// @route   GET /api/tables/stream
+// @desc    Stream SSE delle modifiche ai tavoli (delta accorpati)
+// @access  Public
+router.get('/stream', streamTables);
+
 // @route   GET /api/tables/qr/:qrCode
 // @desc    Trova tavolo tramite QR code
 // @access  Public
 router.get('/qr/:qrCode', getTableByQR);
 
+// @route   GET /api/tables/qr-sheet.zip | /api/tables/qr-sheet.pdf
+// @desc    QR di tutti i tavoli: archivio PNG o foglio PDF da stampare (streaming)
+// @access  Private (Admin)
+router.get('/qr-sheet.:format(zip|pdf)',
+  protect,
+  requireAdmin,
+  getQRSheet
+);
+
 // @route   GET /api/tables
 // @desc    Ottieni tutti i tavoli
 // @access  Private (Cashier/Admin)
@@ -60,6 +88,15 @@ router.get('/:id',
   getTable
 );
 
+// @route   GET /api/tables/:id/qr.png | /api/tables/:id/qr.svg
+// @desc    Immagine QR del tavolo, cacheabile come immutabile
+// @access  Public
+router.get('/:id/qr.:format(png|svg)',
+  validateQRImage,
+  handleValidationErrors,
+  getTableQRImage
+);
+
 // @route   GET /api/tables/:id/history
 // @desc    Ottieni storico transazioni tavolo
 // @access  Private (Cashier/Admin)
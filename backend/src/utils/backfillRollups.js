@@ -0,0 +1,48 @@
+
+// Ricostruisce i rollup statistiche dalle transazioni esistenti.
+// Uso: npm run rollups:backfill -- [--tenant slug] [--from 2024-01-01] [--to 2025-01-01]
+// Senza tenant vale il ristorante di default; senza date ricostruisce tutto lo storico. Da lanciare a traffico fermo o su
+// intervalli passati: sovrascrive i contatori delle ore comprese.
+const mongoose = require('mongoose');
+require('dotenv').config();
+const { connect } = require('../config/database');
+const config = require('../config/config');
+
+const statsRollups = require('./statsRollups');
+
+const readArg = (name) => {
+  const index = process.argv.indexOf(`--${name}`);
+  return index !== -1 ? process.argv[index + 1] : undefined;
+};
+
+const runBackfill = async () => {
+  try {
+    await connect();
+    console.log('🗄️  MongoDB Connected for rollup backfill');
+
+    const from = readArg('from') ? new Date(readArg('from')) : new Date(0);
+    const to = readArg('to') ? new Date(readArg('to')) : new Date();
+    const tenant = readArg('tenant') || config.TENANCY.defaultTenant;
+
+    if (isNaN(from) || isNaN(to) || from > to) {
+      throw new Error('Intervallo non valido: usare --from e --to in formato YYYY-MM-DD');
+    }
+
+    const start = Date.now();
+    const rollups = await statsRollups.backfill({ tenant, from, to });
+
+    console.log(`✅ Rollup di "${tenant}" ricostruiti: ${rollups} bucket orari in ${Date.now() - start}ms`);
+    await mongoose.connection.close();
+    process.exit(0);
+  } catch (error) {
+    console.error('❌ Backfill error:', error);
+    process.exit(1);
+  }
+};
+
+// Esegui se chiamato direttamente
+if (require.main === module) {
+  runBackfill();
+}
+
+module.exports = { runBackfill };
@@ -0,0 +1,110 @@
+// Completa le transazioni scritte prima delle istantanee (tableSnapshot e
+// assignedBySnapshot) con numero e nome attuali del tavolo e con username, firstName e
+// lastName del cassiere; aggiunge firstName/lastName anche alle istantanee del
+// cassiere scritte nella prima versione (username e displayName). Procede a lotti in ordine di _id: per ogni lotto una query su Table, una
+// su User e un bulkWrite; rilanciabile, tocca solo le transazioni senza istantanea.
+// Uso: npm run transactions:snapshots -- [--batch 1000]
+const mongoose = require('mongoose');
+require('dotenv').config();
+const { connect } = require('../config/database');
+
+const Table = require('../models/Table');
+const User = require('../models/User');
+const PointTransaction = require('../models/PointTransaction');
+const { tableSnapshot, cashierSnapshot, needsCashierSnapshot } = require('./serializers');
+
+const readArg = (name) => {
+  const index = process.argv.indexOf(`--${name}`);
+  return index !== -1 ? process.argv[index + 1] : undefined;
+};
+
+const MISSING = {
+  $or: [
+    { tableSnapshot: { $exists: false } },
+    { assignedBySnapshot: { $exists: false } },
+    { 'assignedBySnapshot.username': { $exists: true }, 'assignedBySnapshot.firstName': { $exists: false } }
+  ]
+};
+
+// Utente eliminato: istantanea vuota, o quella esistente con nome nullo, così la
+// transazione non è riletta
+const cashierFallback = (snapshot) => (snapshot
+  ? { username: snapshot.username, firstName: null, lastName: null }
+  : {});
+
+const backfillSnapshots = async ({ batchSize = 1000, onBatch = () => {} } = {}) => {
+  let lastId = null;
+  let updated = 0;
+
+  for (;;) {
+    const transactions = await PointTransaction.find(lastId ? { ...MISSING, _id: { $gt: lastId } } : MISSING)
+      .select('table assignedBy tableSnapshot assignedBySnapshot')
+      .sort({ _id: 1 })
+      .limit(batchSize)
+      .lean();
+
+    if (transactions.length === 0) break;
+    lastId = transactions[transactions.length - 1]._id;
+
+    const [tables, users] = await Promise.all([
+      Table.find({ _id: { $in: [...new Set(transactions.map(t => String(t.table)))] } })
+        .select('tableNumber name')
+        .lean(),
+      User.find({ _id: { $in: [...new Set(transactions.map(t => String(t.assignedBy)))] } })
+        .select('username firstName lastName')
+        .lean()
+    ]);
+
+    const tableById = new Map(tables.map(table => [String(table._id), tableSnapshot(table)]));
+    const userById = new Map(users.map(user => [String(user._id), cashierSnapshot(user)]));
+
+    // Tavolo eliminato: istantanea vuota, così la transazione non è riletta
+    const operations = transactions.map(transaction => ({
+      updateOne: {
+        filter: { _id: transaction._id },
+        update: {
+          $set: {
+            tableSnapshot: transaction.tableSnapshot || tableById.get(String(transaction.table)) || {},
+            assignedBySnapshot: needsCashierSnapshot(transaction.assignedBySnapshot)
+              ? userById.get(String(transaction.assignedBy)) || cashierFallback(transaction.assignedBySnapshot)
+              : transaction.assignedBySnapshot
+          }
+        }
+      }
+    }));
+
+    const { modifiedCount } = await PointTransaction.collection.bulkWrite(operations, { ordered: false });
+    updated += modifiedCount;
+    onBatch({ batch: transactions.length, updated });
+  }
+
+  return updated;
+};
+
+const runBackfill = async () => {
+  try {
+    await connect();
+    console.log('🗄️  MongoDB Connected for transaction snapshot backfill');
+
+    const batchSize = parseInt(readArg('batch')) || 1000;
+    const start = Date.now();
+    const updated = await backfillSnapshots({
+      batchSize,
+      onBatch: ({ updated }) => console.log(`📸 ${updated} transazioni completate`)
+    });
+
+    console.log(`✅ Istantanee scritte su ${updated} transazioni in ${Date.now() - start}ms`);
+    await mongoose.connection.close();
+    process.exit(0);
+  } catch (error) {
+    console.error('❌ Snapshot backfill error:', error);
+    process.exit(1);
+  }
+};
+
+// Esegui se chiamato direttamente
+if (require.main === module) {
+  runBackfill();
+}
+
+module.exports = { backfillSnapshots, runBackfill };
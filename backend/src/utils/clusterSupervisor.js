@@ -0,0 +1,126 @@
+
+// Modalità cluster: il processo primario avvia un worker per core, li riavvia se
+// cadono e inoltra tra i worker gli eventi dei tavoli, così classifica in memoria e
+// stream SSE di ogni worker vedono anche le modifiche fatte dagli altri.
+// Ogni worker ha uno slot stabile (WORKER_SLOT): un worker riavviato riprende lo
+// spill del ledger e dei rollup statistiche del predecessore.
+const cluster = require('cluster');
+const config = require('../config/config');
+const { ClusterRateLimitStore } = require('./rateLimitStore');
+
+const TABLE_EVENT = 'table-event';
+
+// Connessioni Mongo per worker: il budget DB_OPTIONS.maxPoolSize diviso tra i worker
+const poolSizePerWorker = (workers = config.CLUSTER.workers) =>
+  Math.max(2, Math.ceil(config.DB_OPTIONS.maxPoolSize / Math.max(1, workers)));
+
+// Lato primario
+const supervise = ({ workers = config.CLUSTER.workers, env = {} } = {}) => {
+  const slots = new Map();
+  let shuttingDown = false;
+
+  if (config.RATE_LIMIT.store === 'cluster') {
+    ClusterRateLimitStore.serve(cluster);
+  }
+
+  const fork = (slot) => {
+    const worker = cluster.fork({
+      ...env,
+      WORKER_SLOT: String(slot),
+      LEDGER_SPILL_ID: `${config.LEDGER.spillId}-${slot}`
+    });
+
+    worker.startedAt = Date.now();
+    slots.set(worker.id, slot);
+  };
+
+  cluster.on('message', (worker, message) => {
+    if (!message || message.type !== TABLE_EVENT) return;
+
+    for (const other of Object.values(cluster.workers)) {
+      if (other.id !== worker.id && other.isConnected()) {
+        other.send(message);
+      }
+    }
+  });
+
+  cluster.on('exit', (worker, code, signal) => {
+    const slot = slots.get(worker.id);
+    slots.delete(worker.id);
+
+    if (shuttingDown) {
+      if (!Object.keys(cluster.workers).length) {
+        console.log('👋 Tutti i worker terminati');
+        process.exit(0);
+      }
+      return;
+    }
+
+    // Crash in avvio (es. DB non raggiungibile): attesa prima di riprovare
+    const crashedEarly = Date.now() - worker.startedAt < config.CLUSTER.restartDelayMs * 5;
+    const delay = crashedEarly ? config.CLUSTER.restartDelayMs : 0;
+
+    console.error(`❌ Worker ${worker.process.pid} (slot ${slot}) terminato (${signal || code}), riavvio tra ${delay}ms`);
+    setTimeout(() => {
+      if (!shuttingDown) fork(slot);
+    }, delay);
+  });
+
+  const shutdown = (signal) => {
+    if (shuttingDown) return;
+    shuttingDown = true;
+
+    console.log(`🛑 ${signal}: drenaggio dei worker in corso`);
+    for (const worker of Object.values(cluster.workers)) {
+      worker.process.kill('SIGTERM');
+    }
+
+    if (!Object.keys(cluster.workers).length) {
+      process.exit(0);
+    }
+
+    // I worker hanno già un timeout di drenaggio: questo copre i worker bloccati
+    setTimeout(() => {
+      console.error('⏱️  Worker non terminati in tempo, uscita forzata');
+      process.exit(1);
+    }, config.CLUSTER.shutdownTimeoutMs * 2).unref();
+  };
+
+  process.on('SIGTERM', () => shutdown('SIGTERM'));
+  process.on('SIGINT', () => shutdown('SIGINT'));
+
+  console.log(`🧩 Primario ${process.pid}: avvio ${workers} worker (pool Mongo ${poolSizePerWorker(workers)} per worker)`);
+  for (let slot = 0; slot < workers; slot++) {
+    fork(slot);
+  }
+};
+
+// Lato worker: inoltra al primario gli eventi locali e riemette quelli degli altri worker.
+// Le modifiche arrivano come 'stale' (solo id): ogni worker rilegge lo stato dal DB, così
+// eventi di worker diversi consegnati fuori ordine non lasciano una classifica vecchia.
+const relayTableEvents = (tableEvents) => {
+  let relaying = false;
+
+  const forward = (event, ...args) => {
+    if (relaying || !process.connected) return;
+    process.send({ type: TABLE_EVENT, event, args });
+  };
+
+  // Il tenant viaggia con l'evento: ogni worker aggiorna solo le strutture di quel ristorante
+  tableEvents.on('changed', (table) => forward('stale', String(table._id), table.tenant));
+  tableEvents.on('stale', (tableId, tenant) => forward('stale', String(tableId), tenant));
+  tableEvents.on('invalidated', (tenant) => forward('invalidated', tenant));
+
+  process.on('message', (message) => {
+    if (!message || message.type !== TABLE_EVENT) return;
+
+    relaying = true;
+    try {
+      tableEvents.emit(message.event, ...(message.args || []));
+    } finally {
+      relaying = false;
+    }
+  });
+};
+
+module.exports = { supervise, relayTableEvents, poolSizePerWorker };
@@ -0,0 +1,144 @@
+
+// Readiness del processo: ping Mongo (latenza), saturazione del pool, lag dell'event
+// loop e profondità della coda del ledger write-behind, confrontati con le soglie di
+// config.HEALTH. Il risultato resta valido per cacheMs e le verifiche concorrenti ne
+// condividono una sola: qualunque sia la frequenza delle probe del load balancer, il
+// processo fa al massimo un ping ogni cacheMs, anche durante un incidente.
+// In drenaggio (shutdown) il processo risulta subito non pronto.
+const mongoose = require('mongoose');
+const { monitorEventLoopDelay } = require('perf_hooks');
+const poolMetrics = require('./poolMetrics');
+const ledger = require('./ledgerWriter');
+const config = require('../config/config');
+
+const CONNECTION_STATES = ['disconnected', 'connected', 'connecting', 'disconnecting'];
+
+class HealthCheck {
+  constructor(options = {}) {
+    this.options = { ...config.HEALTH, ...options };
+    this.draining = false;
+    this.result = null;
+    this.checking = null;
+    this.eventLoop = null;
+    this.stats = { checks: 0, cached: 0, notReady: 0 };
+  }
+
+  setDraining(draining = true) {
+    this.draining = draining;
+  }
+
+  // p99 del ritardo dell'event loop dall'ultima verifica
+  eventLoopLagMs() {
+    if (!this.eventLoop) {
+      this.eventLoop = monitorEventLoopDelay({ resolution: 10 });
+      this.eventLoop.enable();
+      return 0;
+    }
+
+    const lag = this.eventLoop.percentile(99) / 1e6;
+    this.eventLoop.reset();
+    return lag;
+  }
+
+  async pingMongo() {
+    const state = CONNECTION_STATES[mongoose.connection.readyState] || 'unknown';
+
+    if (mongoose.connection.readyState !== 1) {
+      return { ok: false, state };
+    }
+
+    const start = process.hrtime.bigint();
+    let timer;
+
+    try {
+      await Promise.race([
+        mongoose.connection.db.admin().ping(),
+        new Promise((resolve, reject) => {
+          timer = setTimeout(() => reject(new Error('ping timeout')), this.options.pingTimeoutMs);
+        })
+      ]);
+
+      const latencyMs = Number(process.hrtime.bigint() - start) / 1e6;
+      return { ok: latencyMs <= this.options.maxPingMs, state, latencyMs: +latencyMs.toFixed(2) };
+    } catch (error) {
+      return { ok: false, state, error: error.message };
+    } finally {
+      clearTimeout(timer);
+    }
+  }
+
+  pool() {
+    const client = mongoose.connection.readyState === 1 ? mongoose.connection.getClient() : null;
+    const max = (client && client.options.maxPoolSize) || config.DB_OPTIONS.maxPoolSize;
+    const waitQueue = poolMetrics.waiting.length;
+
+    return {
+      ok: waitQueue <= this.options.maxPoolWaitQueue,
+      inUse: poolMetrics.checkedOut,
+      max,
+      saturation: +(poolMetrics.checkedOut / max).toFixed(2),
+      waitQueue
+    };
+  }
+
+  async run() {
+    const mongo = await this.pingMongo();
+    const lagMs = this.eventLoopLagMs();
+    const queueDepth = ledger.queue.length;
+
+    const checks = {
+      mongo,
+      pool: this.pool(),
+      eventLoop: { ok: lagMs <= this.options.maxEventLoopLagMs, lagMs: +lagMs.toFixed(2) },
+      ledger: { ok: queueDepth <= this.options.maxLedgerQueue, queueDepth, max: this.options.maxLedgerQueue }
+    };
+
+    const ready = Object.values(checks).every(check => check.ok);
+    this.stats.checks++;
+    if (!ready) this.stats.notReady++;
+
+    return {
+      status: ready ? 'ready' : 'not_ready',
+      draining: false,
+      checkedAt: Date.now(),
+      checks
+    };
+  }
+
+  // Ultimo risultato se più recente di cacheMs, altrimenti una nuova verifica condivisa
+  async check() {
+    // In drenaggio nessuna verifica: il bilanciatore deve smettere subito di inviare traffico
+    if (this.draining) {
+      return { status: 'not_ready', draining: true, checkedAt: Date.now(), checks: {} };
+    }
+
+    if (this.result && Date.now() - this.result.checkedAt < this.options.cacheMs) {
+      this.stats.cached++;
+      return this.result;
+    }
+
+    if (!this.checking) {
+      this.checking = this.run()
+        .then((result) => {
+          this.result = result;
+          return result;
+        })
+        .finally(() => {
+          this.checking = null;
+        });
+    }
+
+    return this.checking;
+  }
+
+  getMetrics() {
+    return {
+      draining: this.draining,
+      lastStatus: this.result ? this.result.status : null,
+      ...this.stats
+    };
+  }
+}
+
+module.exports = new HealthCheck();
+module.exports.HealthCheck = HealthCheck;
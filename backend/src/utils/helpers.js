@@ -1,6 +1,9 @@
 
 // Fornisce funzioni di utility (formattazione, validazione, paginazione, sanitizzazione)
 const crypto = require('crypto');
+const logger = require('./logger');
+const LRUCache = require('./lruCache');
+const config = require('../config/config');
 
 // Genera ID univoco
 exports.generateUniqueId = (length = 8) => {
@@ -21,6 +24,80 @@ exports.formatDateIT = (date) => {
   return new Intl.DateTimeFormat('it-IT', options).format(new Date(date));
 };
 
+// Verifica che il fuso orario IANA sia supportato (es. 'Europe/Rome')
+exports.isValidTimeZone = (timeZone) => {
+  try {
+    new Intl.DateTimeFormat('en-US', { timeZone });
+    return true;
+  } catch (error) {
+    return false;
+  }
+};
+
+// Giorno 'YYYY-MM-DD' di un istante nel fuso indicato
+exports.zonedDay = (date, timeZone) => {
+  return new Intl.DateTimeFormat('en-CA', {
+    year: 'numeric',
+    month: '2-digit',
+    day: '2-digit',
+    timeZone
+  }).format(new Date(date));
+};
+
+// Differenza in ms tra l'ora locale del fuso e UTC in un dato istante
+const timeZoneOffset = (date, timeZone) => {
+  const parts = Object.fromEntries(new Intl.DateTimeFormat('en-US', {
+    year: 'numeric',
+    month: 'numeric',
+    day: 'numeric',
+    hour: 'numeric',
+    minute: 'numeric',
+    second: 'numeric',
+    hourCycle: 'h23',
+    timeZone
+  }).formatToParts(date).map(part => [part.type, Number(part.value)]));
+
+  const localAsUtc = Date.UTC(parts.year, parts.month - 1, parts.day, parts.hour, parts.minute, parts.second);
+  return localAsUtc - Math.floor(date.getTime() / 1000) * 1000;
+};
+
+// Fuso con offset di ore intere da un anno fa a un anno da oggi (ora legale inclusa):
+// i rollup delle statistiche sono orari, un offset di 30 o 45 minuti sposterebbe parte
+// delle transazioni sul giorno sbagliato (es. Asia/Kolkata, Australia/Lord_Howe)
+const WEEK_MS = 7 * 24 * 60 * 60 * 1000;
+const hourAlignedZones = new Map();
+
+exports.isHourAlignedTimeZone = (timeZone) => {
+  if (!hourAlignedZones.has(timeZone)) {
+    const now = Date.now();
+    let aligned = true;
+
+    for (let time = now - 53 * WEEK_MS; aligned && time <= now + 53 * WEEK_MS; time += WEEK_MS) {
+      aligned = timeZoneOffset(new Date(time), timeZone) % (60 * 60 * 1000) === 0;
+    }
+
+    hourAlignedZones.set(timeZone, aligned);
+  }
+
+  return hourAlignedZones.get(timeZone);
+};
+
+// Mezzanotte del giorno 'YYYY-MM-DD' nel fuso indicato, come istante assoluto
+exports.zonedMidnight = (day, timeZone) => {
+  const [year, month, date] = day.split('-').map(Number);
+  const guess = Date.UTC(year, month - 1, date);
+
+  // Secondo passaggio: l'offset può cambiare tra stima e risultato (ora legale)
+  const first = guess - timeZoneOffset(new Date(guess), timeZone);
+  return new Date(guess - timeZoneOffset(new Date(first), timeZone));
+};
+
+// Somma giorni a una data 'YYYY-MM-DD'
+exports.addDays = (day, days) => {
+  const [year, month, date] = day.split('-').map(Number);
+  return new Date(Date.UTC(year, month - 1, date + days)).toISOString().split('T')[0];
+};
+
 // Valida codice QR tavolo
 exports.validateTableQR = (qrCode) => {
   const qrRegex = /^TABLE_\d+$/;
@@ -115,6 +192,118 @@ exports.paginate = (page = 1, limit = 10) => {
   };
 };
 
+// Paginazione keyset: il cursore è opaco (JSON base64url) e contiene i valori
+// delle chiavi di ordinamento dell'ultimo elemento della pagina.
+// sortKeys: [[campo, direzione], ...], l'ultima chiave deve essere univoca (_id)
+exports.encodeCursor = (doc, sortKeys) => {
+  const values = sortKeys.map(([field]) => doc[field]);
+  return Buffer.from(JSON.stringify(values)).toString('base64url');
+};
+
+// Valore del cursore compatibile con il tipo del campo nello schema: un cursore
+// manomesso non deve arrivare alla query (CastError o operatori iniettati)
+const CURSOR_VALUE_CHECKS = {
+  ObjectId: (value) => typeof value === 'string' && /^[0-9a-f]{24}$/i.test(value),
+  Date: (value) => typeof value === 'string' && !Number.isNaN(Date.parse(value)),
+  Number: (value) => Number.isFinite(value),
+  String: (value) => typeof value === 'string'
+};
+
+const validCursorValue = (Model, field, value) => {
+  const path = Model.schema.path(field);
+  const check = path && CURSOR_VALUE_CHECKS[path.instance];
+  return Boolean(check) && check(value);
+};
+
+// Ritorna i valori del cursore o null se malformato o non coerente con lo schema
+exports.decodeCursor = (cursor, sortKeys, Model) => {
+  let values;
+
+  try {
+    values = JSON.parse(Buffer.from(cursor, 'base64url').toString('utf8'));
+  } catch (error) {
+    return null;
+  }
+
+  if (!Array.isArray(values) || values.length !== sortKeys.length) {
+    return null;
+  }
+
+  return sortKeys.every(([field], index) => validCursorValue(Model, field, values[index])) ? values : null;
+};
+
+// Filtro "dopo il cursore" per un ordinamento composto, es. (createdAt desc, _id desc):
+// { $or: [{ createdAt: { $lt: c } }, { createdAt: c, _id: { $lt: id } }] }
+// I valori (stringhe ISO, ObjectId esadecimali) sono convertiti dallo schema Mongoose.
+exports.keysetFilter = (sortKeys, values) => ({
+  $or: sortKeys.map(([field, direction], index) => {
+    const condition = {};
+
+    sortKeys.slice(0, index).forEach(([previousField], previousIndex) => {
+      condition[previousField] = values[previousIndex];
+    });
+    condition[field] = { [direction < 0 ? '$lt' : '$gt']: values[index] };
+
+    return condition;
+  })
+});
+
+// Oggetto sort Mongoose dalle chiavi keyset
+exports.keysetSort = (sortKeys) => Object.fromEntries(sortKeys);
+
+// Stime dei totali per scope (es. { tenant }): contate al più una volta ogni
+// estimateTtlMs e servite dalla cache; una stima scaduta resta valida mentre il nuovo
+// conteggio gira in background. Solo la prima richiesta di uno scope attende il conteggio
+const estimates = new LRUCache({ max: 10000 });
+
+const estimateCount = (Model, scope) => {
+  const key = `${Model.modelName}:${JSON.stringify(scope)}`;
+  let entry = estimates.get(key);
+
+  if (!entry) {
+    entry = { total: null, refreshedAt: 0, refreshing: null };
+    estimates.set(key, entry);
+  }
+
+  if (!entry.refreshing && Date.now() - entry.refreshedAt >= config.PAGINATION.estimateTtlMs) {
+    const refresh = Model.countDocuments(scope).then((total) => {
+      entry.total = total;
+      entry.refreshedAt = Date.now();
+      return total;
+    });
+
+    entry.refreshing = refresh;
+    refresh
+      .catch((error) => logger.log('error', 'pagination', 'Count estimate error', { model: Model.modelName, error }))
+      .finally(() => {
+        entry.refreshing = null;
+      });
+  }
+
+  return entry.total !== null ? entry.total : entry.refreshing;
+};
+
+// Totale per la paginazione: esatto su richiesta, altrimenti stimato. Senza scope la
+// stima viene dai metadati della collection (costo costante); con uno scope (es.
+// { tenant }) dal conteggio in cache dello scope. La stima vale solo per la query
+// senza altri filtri: con filtri oltre lo scope il totale è null (non noto)
+exports.countTotal = async (Model, query, exact = false, scope = null) => {
+  if (exact) {
+    return { total: await Model.countDocuments(query), estimated: false };
+  }
+
+  const filtered = Object.keys(query).some(key => !scope || query[key] !== scope[key]);
+  if (filtered) {
+    return { total: null, estimated: true };
+  }
+
+  const total = scope
+    ? await estimateCount(Model, scope)
+    : await Model.estimatedDocumentCount();
+
+  return { total, estimated: true };
+};
+
 // Calcola statistiche classifica
 exports.calculateLeaderboardStats = (tables) => {
   if (!tables || tables.length === 0) {
@@ -150,24 +339,29 @@ exports.debounce = (func, wait) => {
   };
 };
 
-// Log formattato per development
-exports.devLog = (message, data = null, type = 'info') => {
-  if (process.env.NODE_ENV === 'development') {
-    const colors = {
-      info: '\x1b[36m',    // Cyan
-      success: '\x1b[32m', // Green
-      warning: '\x1b[33m', // Yellow
-      error: '\x1b[31m',   // Red
-      reset: '\x1b[0m'     // Reset
-    };
+// Applica fn a ogni elemento con al massimo `limit` chiamate in corso; i risultati
+// mantengono l'ordine di items
+exports.mapLimit = async (items, limit, fn) => {
+  const results = new Array(items.length);
+  let next = 0;
 
-    const color = colors[type] || colors.info;
-    const timestamp = new Date().toISOString();
+  const worker = async () => {
+    while (next < items.length) {
+      const i = next++;
+      results[i] = await fn(items[i], i);
+    }
+  };
 
-    console.log(`${color}[${timestamp}] ${message}${colors.reset}`);
+  await Promise.all(Array.from({ length: Math.max(1, Math.min(limit, items.length)) }, worker));
+  return results;
+};
 
-    if (data) {
-      console.log(data);
-    }
+// Log per development: ora sul logger strutturato (categoria dev). I tipi del vecchio
+// log a colori sono mappati sui livelli
+const DEV_LOG_LEVELS = { info: 'info', success: 'info', warning: 'warn', error: 'error' };
+
+exports.devLog = (message, data = null, type = 'info') => {
+  if (process.env.NODE_ENV === 'development') {
+    logger.log(DEV_LOG_LEVELS[type] || 'info', 'dev', message, data ? { data } : undefined);
   }
 };
@@ -0,0 +1,195 @@
+
+// Store delle chiavi di idempotenza.
+// begin(key, fingerprint) ritorna:
+//   { status: 'new' }                          la richiesta va eseguita (chiave acquisita)
+//   { status: 'done', record }                 risposta già registrata da ripetere
+//   { status: 'pending', fingerprint, wait }   in esecuzione altrove: wait() risolve con il
+//                                              record, o null se il primo tentativo è fallito
+// complete(key, record) registra la risposta; release(key) libera la chiave (errore 5xx).
+const LRUCache = require('./lruCache');
+const IdempotencyKey = require('../models/IdempotencyKey');
+const config = require('../config/config');
+
+const DUPLICATE_KEY = 11000;
+
+// Store in memoria: valido per un singolo processo
+class MemoryIdempotencyStore {
+  constructor(options = {}) {
+    this.options = { ...config.IDEMPOTENCY, ...options };
+    this.responses = new LRUCache({ max: this.options.max, ttlMs: this.options.ttlMs });
+    this.inFlight = new Map();
+  }
+
+  async begin(key, fingerprint) {
+    const record = this.responses.get(key);
+    if (record) {
+      return { status: 'done', record };
+    }
+
+    const pending = this.inFlight.get(key);
+    if (pending) {
+      return { status: 'pending', fingerprint: pending.fingerprint, wait: () => pending.promise };
+    }
+
+    let resolve;
+    const promise = new Promise((done) => { resolve = done; });
+    this.inFlight.set(key, { fingerprint, promise, resolve });
+
+    return { status: 'new' };
+  }
+
+  async complete(key, record) {
+    this.responses.set(key, record);
+    this.settle(key, record);
+  }
+
+  async release(key) {
+    this.settle(key, null);
+  }
+
+  settle(key, record) {
+    const pending = this.inFlight.get(key);
+
+    if (pending) {
+      this.inFlight.delete(key);
+      pending.resolve(record);
+    }
+  }
+
+  getMetrics() {
+    return {
+      store: 'memory',
+      responses: this.responses.size,
+      inFlight: this.inFlight.size
+    };
+  }
+}
+
+// Store Mongo: condiviso tra processi. Davanti c'è lo store in memoria, così i
+// duplicati nello stesso processo non interrogano il database.
+class MongoIdempotencyStore {
+  constructor(options = {}) {
+    this.options = { ...config.IDEMPOTENCY, ...options };
+    this.local = new MemoryIdempotencyStore(this.options);
+    this.polling = new Map();
+  }
+
+  async begin(key, fingerprint) {
+    const local = await this.local.begin(key, fingerprint);
+    if (local.status !== 'new') {
+      return local;
+    }
+
+    try {
+      if (await this.acquire(key, fingerprint)) {
+        return { status: 'new' };
+      }
+
+      const existing = await IdempotencyKey.findById(key).lean();
+
+      if (existing && existing.state === 'done') {
+        const record = toRecord(existing);
+        await this.local.complete(key, record);
+        return { status: 'done', record };
+      }
+
+      // In esecuzione in un altro processo: la voce locale si libera subito (chi non
+      // chiama wait(), ad esempio per fingerprint diversa, non la lascia appesa) e i
+      // duplicati locali condividono lo stesso polling
+      await this.local.release(key);
+      return {
+        status: 'pending',
+        fingerprint: existing ? existing.fingerprint : fingerprint,
+        wait: () => this.waitRemote(key)
+      };
+    } catch (error) {
+      await this.local.release(key);
+      throw error;
+    }
+  }
+
+  // Crea il lock; se esiste ma è scaduto (processo caduto) lo rileva
+  async acquire(key, fingerprint) {
+    const expiresAt = new Date(Date.now() + this.options.lockTimeoutMs);
+
+    try {
+      await IdempotencyKey.create({ _id: key, fingerprint, state: 'pending', expiresAt });
+      return true;
+    } catch (error) {
+      if (error.code !== DUPLICATE_KEY) throw error;
+    }
+
+    const takeover = await IdempotencyKey.updateOne(
+      { _id: key, state: 'pending', expiresAt: { $lt: new Date() } },
+      { $set: { fingerprint, expiresAt } }
+    );
+
+    return takeover.modifiedCount === 1;
+  }
+
+  // Un solo polling per chiave, condiviso dai duplicati locali; la risposta trovata
+  // resta nello store in memoria
+  waitRemote(key) {
+    let polling = this.polling.get(key);
+
+    if (!polling) {
+      polling = this.poll(key)
+        .then(async (record) => {
+          if (record) await this.local.complete(key, record);
+          return record;
+        })
+        .finally(() => this.polling.delete(key));
+      this.polling.set(key, polling);
+    }
+
+    return polling;
+  }
+
+  // Attende che l'altro processo completi o rilasci la chiave
+  async poll(key) {
+    const deadline = Date.now() + this.options.lockTimeoutMs;
+
+    while (Date.now() < deadline) {
+      await new Promise((resolve) => setTimeout(resolve, this.options.pollMs));
+
+      const existing = await IdempotencyKey.findById(key).lean();
+      if (!existing) return null;
+      if (existing.state === 'done') return toRecord(existing);
+    }
+
+    return null;
+  }
+
+  async complete(key, record) {
+    await IdempotencyKey.updateOne(
+      { _id: key },
+      {
+        $set: {
+          state: 'done',
+          fingerprint: record.fingerprint,
+          statusCode: record.statusCode,
+          body: record.body,
+          expiresAt: new Date(Date.now() + this.options.ttlMs)
+        }
+      }
+    );
+    await this.local.complete(key, record);
+  }
+
+  async release(key) {
+    await IdempotencyKey.deleteOne({ _id: key, state: 'pending' });
+    await this.local.release(key);
+  }
+
+  getMetrics() {
+    return { ...this.local.getMetrics(), polling: this.polling.size, store: 'mongo' };
+  }
+}
+
+const toRecord = (doc) => ({
+  fingerprint: doc.fingerprint,
+  statusCode: doc.statusCode,
+  body: doc.body
+});
+
+module.exports = { MemoryIdempotencyStore, MongoIdempotencyStore };
@@ -0,0 +1,371 @@
+
+// Motore classifica in memoria: caricato una volta da Mongo e aggiornato in modo
+// incrementale dagli eventi del modello Table (punti, nome, eliminazione).
+// Top-N e posizione di un tavolo in O(log n) senza query al database.
+// Una classifica per ristorante (tenant), creata e caricata al primo accesso; al più
+// TENANCY.maxTenants in memoria.
+const Table = require('../models/Table');
+const IndexedSkipList = require('./skipList');
+const LRUCache = require('./lruCache');
+const tableEvents = require('./tableEvents');
+const config = require('../config/config');
+const { medalFor } = require('./serializers');
+const log = require('./logger').child('leaderboard');
+
+const FIELDS = 'tableNumber name qrCode points lastPointsUpdate isActive';
+
+// Ordine classifica: punti decrescenti, aggiornamento meno recente, poi _id
+const compareEntries = (a, b) =>
+  (b.points - a.points) ||
+  (a.updatedAtMs - b.updatedAtMs) ||
+  (a.id < b.id ? -1 : a.id > b.id ? 1 : 0);
+
+const toEntry = (table) => ({
+  id: String(table._id),
+  _id: table._id,
+  tableNumber: table.tableNumber,
+  name: table.name,
+  points: table.points,
+  lastPointsUpdate: table.lastPointsUpdate,
+  updatedAtMs: new Date(table.lastPointsUpdate).getTime()
+});
+
+// Voce di classifica con la stessa forma della vecchia risposta (toObject + virtuals)
+const toLeaderboardItem = (entry, position) => ({
+  _id: entry._id,
+  tableNumber: entry.tableNumber,
+  name: entry.name,
+  points: entry.points,
+  lastPointsUpdate: entry.lastPointsUpdate,
+  formattedQR: `TABLE_${entry.tableNumber}`,
+  id: entry.id,
+  position,
+  medal: medalFor(position)
+});
+
+class LeaderboardEngine {
+  constructor({ filter = {} } = {}) {
+    this.filter = filter;
+    this.list = new IndexedSkipList(compareEntries);
+    this.byId = new Map();
+    this.state = 'empty';
+    this.loading = null;
+    this.invalidatedDuringLoad = false;
+    this.pending = new Set();
+    // Incrementata a ogni modifica applicata: identifica lo stato servito da top()
+    this.revision = 0;
+    this.stats = { loads: 0, lastLoadMs: 0, updates: 0, refreshes: 0, staleUpdates: 0 };
+  }
+
+  get model() {
+    return Table;
+  }
+
+  get size() {
+    return this.list.length;
+  }
+
+  // Carica (o ricarica in background) la classifica da Mongo.
+  // Le modifiche arrivate durante il caricamento vengono rilette dopo lo swap.
+  load() {
+    if (this.loading) {
+      return this.loading;
+    }
+
+    this.loading = (async () => {
+      const start = process.hrtime.bigint();
+      this.invalidatedDuringLoad = false;
+      const tables = await this.model.find({ ...this.filter, isActive: true })
+        .select(FIELDS)
+        .lean();
+
+      const list = new IndexedSkipList(compareEntries);
+      const byId = new Map();
+
+      for (const table of tables) {
+        const entry = toEntry(table);
+        list.insert(entry);
+        byId.set(entry.id, entry);
+      }
+
+      this.list = list;
+      this.byId = byId;
+      this.revision++;
+      // Una modifica massiva durante la lettura richiede un nuovo caricamento
+      this.state = this.invalidatedDuringLoad ? 'stale' : 'ready';
+      this.stats.loads++;
+      this.stats.lastLoadMs = Number(process.hrtime.bigint() - start) / 1e6;
+    })().finally(() => {
+      this.loading = null;
+    });
+
+    return this.loading.then(() => this.applyPending());
+  }
+
+  async applyPending() {
+    const ids = [...this.pending];
+    this.pending.clear();
+    await Promise.all(ids.map((id) => this.refresh(id)));
+  }
+
+  async ensureLoaded() {
+    while (this.state !== 'ready') {
+      await this.load();
+    }
+  }
+
+  // Applica lo stato aggiornato di un tavolo. Gli hook post-update possono arrivare
+  // fuori ordine: uno stato con lastPointsUpdate più vecchio di quello in classifica
+  // viene scartato; a parità di istante con punti diversi l'ordine non è
+  // ricostruibile e il tavolo viene riletto (fromDatabase: stato riletto, vince).
+  upsert(table, { fromDatabase = false } = {}) {
+    const id = String(table._id);
+
+    if (this.loading) {
+      this.pending.add(id);
+    }
+
+    if (this.state !== 'ready') {
+      return;
+    }
+
+    const current = this.byId.get(id);
+
+    if (current) {
+      const updatedAtMs = new Date(table.lastPointsUpdate).getTime();
+
+      if (updatedAtMs < current.updatedAtMs) {
+        this.stats.staleUpdates++;
+        return;
+      }
+
+      if (!fromDatabase && updatedAtMs === current.updatedAtMs && table.points !== current.points) {
+        this.refresh(id).catch((error) => {
+          log.error('Leaderboard refresh error', { error });
+          this.invalidate();
+        });
+        return;
+      }
+    }
+
+    this.remove(id);
+
+    if (table.isActive) {
+      const entry = toEntry(table);
+      this.list.insert(entry);
+      this.byId.set(id, entry);
+    }
+
+    this.revision++;
+    this.stats.updates++;
+  }
+
+  remove(id) {
+    const entry = this.byId.get(String(id));
+
+    if (entry) {
+      this.list.remove(entry);
+      this.byId.delete(String(id));
+      this.revision++;
+    }
+  }
+
+  // Rilegge un singolo tavolo (eventi senza stato completo)
+  async refresh(id) {
+    if (this.loading) {
+      this.pending.add(String(id));
+      return;
+    }
+
+    if (this.state !== 'ready') {
+      return;
+    }
+
+    this.stats.refreshes++;
+    const table = await this.model.findOne({ ...this.filter, _id: id }).select(FIELDS).lean();
+
+    if (table) {
+      this.upsert(table, { fromDatabase: true });
+    } else {
+      this.remove(id);
+    }
+  }
+
+  // Modifica massiva: la prossima lettura attende un ricaricamento completo
+  invalidate() {
+    this.state = 'stale';
+    this.invalidatedDuringLoad = Boolean(this.loading);
+  }
+
+  async top(limit = 20) {
+    await this.ensureLoaded();
+    return this.list.slice(0, limit).map((entry, index) => toLeaderboardItem(entry, index + 1));
+  }
+
+  // Posizione 1-based del tavolo, null se non presente in classifica
+  async rankOf(tableId) {
+    await this.ensureLoaded();
+    const entry = this.byId.get(String(tableId));
+    return entry ? this.list.rank(entry) : null;
+  }
+
+  // Confronta la classifica in memoria con l'ordinamento calcolato da Mongo
+  async verify({ maxMismatches = 20 } = {}) {
+    await this.ensureLoaded();
+
+    const query = { ...this.filter, isActive: true };
+    const cursor = this.model.find(query)
+      .select(FIELDS)
+      .sort({ points: -1, lastPointsUpdate: 1, _id: 1 })
+      .lean()
+      .cursor();
+
+    const engineEntries = this.list[Symbol.iterator]();
+    const mismatches = [];
+    let checked = 0;
+
+    for await (const table of cursor) {
+      checked++;
+      const entry = engineEntries.next().value;
+
+      if (!entry || entry.id !== String(table._id) || entry.points !== table.points || entry.name !== table.name) {
+        mismatches.push({
+          position: checked,
+          database: { id: String(table._id), points: table.points, name: table.name },
+          engine: entry ? { id: entry.id, points: entry.points, name: entry.name } : null
+        });
+
+        if (mismatches.length >= maxMismatches) break;
+      }
+    }
+
+    const databaseCount = await this.model.countDocuments(query);
+
+    return {
+      consistent: mismatches.length === 0 && databaseCount === this.list.length,
+      engineCount: this.list.length,
+      databaseCount,
+      checked,
+      mismatches
+    };
+  }
+
+  getMetrics() {
+    return {
+      enabled: config.LEADERBOARD.engine,
+      state: this.state,
+      revision: this.revision,
+      size: this.list.length,
+      ...this.stats
+    };
+  }
+}
+
+// Classifiche per tenant: gli eventi dei tavoli vengono instradati solo alla
+// classifica del ristorante interessato
+class LeaderboardRegistry {
+  constructor() {
+    // Limitato: i ristoranti meno usati vengono scartati e ricaricati alla prossima lettura
+    this.engines = new LRUCache({ max: config.TENANCY.maxTenants });
+  }
+
+  forTenant(tenant = config.TENANCY.defaultTenant) {
+    let engine = this.engines.get(tenant);
+
+    if (!engine) {
+      engine = new LeaderboardEngine({ filter: { tenant } });
+      this.engines.set(tenant, engine);
+    }
+
+    return engine;
+  }
+
+  // Precarica le classifiche di tutti i ristoranti con tavoli attivi
+  async load() {
+    const tenants = await Table.distinct('tenant', { isActive: true });
+
+    for (const tenant of tenants) {
+      await this.forTenant(tenant).load();
+    }
+  }
+
+  upsert(table) {
+    const engine = this.engines.get(table.tenant || config.TENANCY.defaultTenant);
+    if (engine) engine.upsert(table);
+  }
+
+  // Tenant non noto (evento senza stato): lo ricava dal tavolo stesso
+  async refresh(tableId, tenant) {
+    if (!tenant) {
+      const table = await Table.findById(tableId).select('tenant').lean();
+
+      if (!table) {
+        for (const engine of this.engines.values()) engine.remove(tableId);
+        return;
+      }
+
+      tenant = table.tenant;
+    }
+
+    const engine = this.engines.get(tenant);
+    if (engine) await engine.refresh(tableId);
+  }
+
+  invalidate(tenant) {
+    if (tenant) {
+      const engine = this.engines.get(tenant);
+      if (engine) engine.invalidate();
+      return;
+    }
+
+    for (const engine of this.engines.values()) engine.invalidate();
+  }
+
+  getMetrics() {
+    const totals = { size: 0, loads: 0, updates: 0, refreshes: 0, maxLoadMs: 0 };
+    const states = {};
+
+    for (const engine of this.engines.values()) {
+      totals.size += engine.size;
+      totals.loads += engine.stats.loads;
+      totals.updates += engine.stats.updates;
+      totals.refreshes += engine.stats.refreshes;
+      totals.maxLoadMs = Math.max(totals.maxLoadMs, engine.stats.lastLoadMs);
+      states[engine.state] = (states[engine.state] || 0) + 1;
+    }
+
+    return {
+      enabled: config.LEADERBOARD.engine,
+      tenants: this.engines.size,
+      states,
+      ...totals
+    };
+  }
+}
+
+const leaderboard = new LeaderboardRegistry();
+
+tableEvents.on('changed', (table) => leaderboard.upsert(table));
+tableEvents.on('stale', (tableId, tenant) => {
+  leaderboard.refresh(tableId, tenant).catch((error) => {
+    log.error('Leaderboard refresh error', { error });
+    leaderboard.invalidate(tenant);
+  });
+});
+tableEvents.on('invalidated', (tenant) => leaderboard.invalidate(tenant));
+
+// Riallineamento periodico opzionale (utile con più processi sullo stesso DB)
+if (config.LEADERBOARD.engine && config.LEADERBOARD.resyncMs > 0) {
+  setInterval(() => {
+    for (const engine of leaderboard.engines.values()) {
+      if (engine.state === 'ready') {
+        engine.load().catch((error) => log.error('Leaderboard resync error', { error }));
+      }
+    }
+  }, config.LEADERBOARD.resyncMs).unref();
+}
+
+module.exports = leaderboard;
+module.exports.LeaderboardEngine = LeaderboardEngine;
+module.exports.LeaderboardRegistry = LeaderboardRegistry;
+module.exports.toLeaderboardItem = toLeaderboardItem;
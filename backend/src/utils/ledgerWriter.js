@@ -0,0 +1,297 @@
+
+// Ledger write-behind: accoda le transazioni punti e le scrive in batch con insertMany.
+// Ogni record viene prima appeso a un file di spill locale, così un crash tra due
+// flush non perde nulla: all'avvio i segmenti rimasti vengono reinseriti.
+const fs = require('fs');
+const path = require('path');
+const PointTransaction = require('../models/PointTransaction');
+const statsRollups = require('./statsRollups');
+const config = require('../config/config');
+const log = require('./logger').child('ledger');
+
+const DUPLICATE_KEY = 11000;
+
+class LedgerWriter {
+  constructor(options = {}) {
+    this.options = { ...config.LEDGER, ...options };
+    this.dir = path.resolve(this.options.spillDir, this.options.spillId);
+    this.queue = [];
+    this.segment = null;
+    this.segmentSeq = 0;
+    this.retainedSegments = [];
+    this.flushing = null;
+    this.flushScheduled = false;
+    this.timer = null;
+    this.stats = {
+      enqueued: 0,
+      flushed: 0,
+      flushes: 0,
+      failedFlushes: 0,
+      recovered: 0,
+      backpressureWaits: 0,
+      lastFlushMs: 0,
+      maxFlushMs: 0,
+      totalFlushMs: 0
+    };
+  }
+
+  get enabled() {
+    return this.options.writeBehind;
+  }
+
+  get model() {
+    return PointTransaction;
+  }
+
+  // Registra una transazione. Senza write-behind equivale a PointTransaction.create;
+  // con write-behind ritorna appena il record è sul file di spill.
+  async record(data) {
+    if (!this.enabled) {
+      return this.model.create(data);
+    }
+
+    const now = new Date();
+    const transaction = new this.model({ createdAt: now, updatedAt: now, ...data });
+
+    const error = transaction.validateSync();
+    if (error) {
+      throw error;
+    }
+
+    const record = transaction.toObject({ depopulate: true, virtuals: false });
+
+    // Append e accodamento nello stesso tick: il segmento corrente contiene
+    // esattamente i record della coda che verrà presa dal prossimo flush
+    const written = this.append(record);
+    this.queue.push(record);
+    this.stats.enqueued++;
+    this.ensureTimer();
+
+    if (this.queue.length >= this.options.batchSize) {
+      this.scheduleFlush();
+    }
+
+    await written;
+
+    // Coda piena: il chiamante attende un flush (backpressure). Il record è già sullo
+    // spill, quindi accettato: un flush fallito è già nei log e si ritenterà, ma non
+    // deve far fallire un'operazione che ha già aggiornato il tavolo
+    if (this.queue.length >= this.options.maxQueue) {
+      this.stats.backpressureWaits++;
+      await this.flush().catch(() => {});
+    }
+
+    return transaction;
+  }
+
+  // Scrive tutti i record in coda; un solo flush alla volta
+  async flush() {
+    while (this.flushing) {
+      await this.flushing.catch(() => {});
+    }
+
+    if (!this.queue.length && !this.retainedSegments.length) {
+      return;
+    }
+
+    this.flushing = this.flushBatch().finally(() => {
+      this.flushing = null;
+    });
+
+    return this.flushing;
+  }
+
+  async flushBatch() {
+    const batch = this.queue;
+    const segments = [...this.retainedSegments, ...this.rotate()];
+    this.queue = [];
+    this.retainedSegments = [];
+
+    const start = process.hrtime.bigint();
+
+    try {
+      await this.insert(batch, { lean: true });
+      await Promise.all(segments.map((segment) => this.removeSegment(segment)));
+
+      const elapsedMs = Number(process.hrtime.bigint() - start) / 1e6;
+      this.stats.flushes++;
+      this.stats.flushed += batch.length;
+      this.stats.lastFlushMs = elapsedMs;
+      this.stats.totalFlushMs += elapsedMs;
+      this.stats.maxFlushMs = Math.max(this.stats.maxFlushMs, elapsedMs);
+    } catch (error) {
+      // Rimette il batch in testa: i segmenti restano su disco fino al prossimo flush
+      this.stats.failedFlushes++;
+      this.queue = batch.concat(this.queue);
+      this.retainedSegments = segments.concat(this.retainedSegments);
+      log.error('Ledger flush error', { error });
+      throw error;
+    }
+  }
+
+  // insertMany non ordinato: i duplicati (record già scritti prima di un crash) sono ignorati
+  async insert(records, options = {}) {
+    if (!records.length) return;
+
+    try {
+      await this.model.insertMany(records, { ordered: false, ...options });
+    } catch (error) {
+      const writeErrors = error.writeErrors || [];
+      const onlyDuplicates = writeErrors.length > 0 &&
+        writeErrors.every((writeError) => (writeError.code || writeError.err?.code) === DUPLICATE_KEY);
+
+      if (!onlyDuplicates) {
+        throw error;
+      }
+
+      // Il post hook insertMany non scatta su errore: i record nuovi vanno nei rollup qui
+      statsRollups.record(error.insertedDocs || []);
+    }
+  }
+
+  // Reinserisce i segmenti di spill lasciati da un processo precedente
+  async recover() {
+    if (!this.enabled) return 0;
+
+    await fs.promises.mkdir(this.dir, { recursive: true });
+    const files = (await fs.promises.readdir(this.dir))
+      .filter((file) => file.endsWith('.jsonl'))
+      .filter((file) => !this.segment || path.join(this.dir, file) !== this.segment.path)
+      .sort();
+
+    let recovered = 0;
+
+    for (const file of files) {
+      const filePath = path.join(this.dir, file);
+      const content = await fs.promises.readFile(filePath, 'utf8');
+      const records = content
+        .split('\n')
+        .filter(Boolean)
+        .map((line) => {
+          try {
+            return JSON.parse(line);
+          } catch (error) {
+            // Riga troncata da un crash durante la scrittura
+            return null;
+          }
+        })
+        .filter(Boolean);
+
+      // Non lean: i record su disco vanno ricastati (ObjectId, Date)
+      await this.insert(records);
+      await fs.promises.unlink(filePath);
+      recovered += records.length;
+    }
+
+    this.stats.recovered += recovered;
+    return recovered;
+  }
+
+  async start() {
+    if (!this.enabled) return;
+
+    const recovered = await this.recover();
+    if (recovered) {
+      log.info('Ledger: transazioni recuperate dallo spill', { recovered });
+    }
+    this.ensureTimer();
+  }
+
+  // Ferma il timer e scrive tutto ciò che è in coda (da usare in shutdown)
+  async stop() {
+    if (this.timer) {
+      clearInterval(this.timer);
+      this.timer = null;
+    }
+
+    if (!this.enabled) return;
+
+    await this.flush();
+
+    if (this.segment) {
+      const segment = this.segment;
+      this.segment = null;
+      await this.removeSegment(segment);
+    }
+  }
+
+  getMetrics() {
+    return {
+      writeBehind: this.enabled,
+      queueDepth: this.queue.length,
+      retainedSegments: this.retainedSegments.length,
+      ...this.stats,
+      avgFlushMs: this.stats.flushes ? this.stats.totalFlushMs / this.stats.flushes : 0
+    };
+  }
+
+  append(record) {
+    if (!this.segment) {
+      this.segment = this.openSegment();
+    }
+
+    const line = `${JSON.stringify(record)}\n`;
+
+    return new Promise((resolve, reject) => {
+      this.segment.stream.write(line, (error) => (error ? reject(error) : resolve()));
+    });
+  }
+
+  openSegment() {
+    fs.mkdirSync(this.dir, { recursive: true });
+
+    const name = `ledger-${Date.now()}-${process.pid}-${this.segmentSeq++}.jsonl`;
+    const segmentPath = path.join(this.dir, name);
+    const stream = fs.createWriteStream(segmentPath, { flags: 'a' });
+    const closed = new Promise((resolve) => stream.once('close', resolve));
+
+    stream.on('error', (error) => {
+      log.error('Ledger spill error', { error });
+    });
+
+    return { path: segmentPath, stream, closed };
+  }
+
+  // Chiude il segmento corrente: i nuovi record andranno in un nuovo file
+  rotate() {
+    if (!this.segment) return [];
+
+    const segment = this.segment;
+    this.segment = null;
+    segment.stream.end();
+    return [segment];
+  }
+
+  async removeSegment(segment) {
+    if (!segment.stream.writableEnded) {
+      segment.stream.end();
+    }
+    await segment.closed;
+
+    await fs.promises.unlink(segment.path).catch((error) => {
+      if (error.code !== 'ENOENT') throw error;
+    });
+  }
+
+  ensureTimer() {
+    if (this.timer) return;
+
+    this.timer = setInterval(() => {
+      this.flush().catch(() => {});
+    }, this.options.flushIntervalMs);
+    this.timer.unref();
+  }
+
+  scheduleFlush() {
+    if (this.flushScheduled) return;
+
+    this.flushScheduled = true;
+    setImmediate(() => {
+      this.flushScheduled = false;
+      this.flush().catch(() => {});
+    });
+  }
+}
+
+module.exports = new LedgerWriter();
+module.exports.LedgerWriter = LedgerWriter;
@@ -0,0 +1,337 @@
+
+// Canale push (Server-Sent Events) per classifica e tavoli. Le modifiche ai tavoli
+// arrivano dal bus tableEvents, vengono accorpate per una breve finestra (l'ultimo
+// stato per tavolo) e inviate a tutti gli iscritti come un unico evento 'tables'
+// serializzato una sola volta. Un client lento non blocca gli altri: finché il suo
+// socket non si svuota i delta restano accumulati solo per lui; oltre una soglia
+// riceverà un evento 'resync' e ricaricherà la classifica via REST.
+// Ogni iscritto appartiene a un ristorante (tenant): riceve solo i delta dei suoi tavoli.
+const Table = require('../models/Table');
+const tableEvents = require('./tableEvents');
+const config = require('../config/config');
+const log = require('./logger').child('live');
+
+const FIELDS = 'tenant tableNumber name points lastPointsUpdate isActive';
+
+// Delta compatto: solo i campi mostrati dal frontend
+const toDelta = (table) => {
+  if (!table.isActive) {
+    return { id: String(table._id), removed: true };
+  }
+
+  return {
+    id: String(table._id),
+    tableNumber: table.tableNumber,
+    name: table.name,
+    points: table.points,
+    lastPointsUpdate: table.lastPointsUpdate
+  };
+};
+
+const ALL = Symbol('all');
+
+const frame = (event, data) => `event: ${event}\ndata: ${JSON.stringify(data)}\n\n`;
+
+class LiveUpdates {
+  constructor(options = {}) {
+    this.options = { ...config.LIVE, ...options };
+    this.clients = new Set();
+    this.byTenant = new Map();
+    // tenant -> (tableId -> delta); chiave null = tenant da ricavare rileggendo il tavolo
+    this.dirty = new Map();
+    // Tenant da risincronizzare; ALL = tutti
+    this.invalidated = new Set();
+    this.flushTimer = null;
+    this.heartbeatTimer = null;
+    this.stats = {
+      connections: 0,
+      rejected: 0,
+      frames: 0,
+      deltas: 0,
+      coalesced: 0,
+      backpressured: 0,
+      resyncs: 0
+    };
+  }
+
+  get size() {
+    return this.clients.size;
+  }
+
+  // Registra una risposta HTTP come iscritto allo stream
+  subscribe(req, res) {
+    if (this.clients.size >= this.options.maxClients) {
+      this.stats.rejected++;
+      return res.status(503).json({
+        success: false,
+        message: 'Troppe connessioni attive, riprova più tardi'
+      });
+    }
+
+    req.socket.setTimeout(0);
+    req.socket.setNoDelay(true);
+    req.socket.setKeepAlive(true);
+
+    res.writeHead(200, {
+      'Content-Type': 'text/event-stream',
+      'Cache-Control': 'no-cache, no-transform',
+      Connection: 'keep-alive',
+      'X-Accel-Buffering': 'no'
+    });
+
+    const tenant = req.tenant || config.TENANCY.defaultTenant;
+    const client = { res, tenant, blocked: false, pending: null, resync: false };
+    this.clients.add(client);
+    this.tenantClients(tenant).add(client);
+    this.stats.connections++;
+    this.ensureHeartbeat();
+
+    res.on('drain', () => this.drain(client));
+    res.on('close', () => {
+      this.clients.delete(client);
+      this.tenantClients(tenant).delete(client);
+      if (!this.tenantClients(tenant).size) this.byTenant.delete(tenant);
+      if (!this.clients.size) this.stopHeartbeat();
+    });
+
+    this.write(client, `retry: ${this.options.retryMs}\n${frame('ready', { coalesceMs: this.options.coalesceMs })}`);
+  }
+
+  tenantClients(tenant) {
+    let clients = this.byTenant.get(tenant);
+
+    if (!clients) {
+      clients = new Set();
+      this.byTenant.set(tenant, clients);
+    }
+
+    return clients;
+  }
+
+  // Segna un tavolo come modificato; delta null = stato da rileggere
+  track(tableId, delta, tenant = null) {
+    if (!this.clients.size) return;
+    if (tenant && !this.byTenant.has(tenant)) return;
+
+    const id = String(tableId);
+    const dirty = this.dirty.get(tenant) || new Map();
+    if (dirty.has(id)) {
+      this.stats.coalesced++;
+    }
+
+    dirty.set(id, delta);
+    this.dirty.set(tenant, dirty);
+    this.scheduleFlush();
+  }
+
+  // Modifica massiva: i client del ristorante (o tutti) ricaricano tutto
+  invalidate(tenant) {
+    if (!this.clients.size) return;
+
+    this.invalidated.add(tenant || ALL);
+    this.scheduleFlush();
+  }
+
+  scheduleFlush() {
+    if (this.flushTimer) return;
+
+    this.flushTimer = setTimeout(() => {
+      this.flushTimer = null;
+      this.flush().catch((error) => {
+        log.error('Live updates flush error', { error });
+        this.invalidate();
+      });
+    }, this.options.coalesceMs);
+    this.flushTimer.unref();
+  }
+
+  async flush() {
+    const invalidated = this.invalidated;
+    const dirty = this.dirty;
+    this.invalidated = new Set();
+    this.dirty = new Map();
+
+    if (invalidated.has(ALL)) {
+      this.broadcastResync(this.clients);
+      return;
+    }
+
+    for (const tenant of invalidated) {
+      dirty.delete(tenant);
+      this.broadcastResync(this.byTenant.get(tenant) || []);
+    }
+
+    // Tavoli da rileggere: lo stato letto indica anche il tenant di destinazione
+    const stale = [];
+    for (const [tenant, deltas] of dirty) {
+      for (const [id, delta] of deltas) {
+        if (delta === null) stale.push({ id, tenant });
+      }
+    }
+
+    if (stale.length) {
+      const tables = await Table.find({ _id: { $in: stale.map(({ id }) => id) } }).select(FIELDS).lean();
+      const found = new Map(tables.map((table) => [String(table._id), table]));
+
+      for (const { id, tenant } of stale) {
+        const table = found.get(id);
+        const target = tenant || (table && table.tenant);
+
+        dirty.get(tenant).delete(id);
+
+        if (target && invalidated.has(target)) continue;
+
+        if (target) {
+          const deltas = dirty.get(target) || new Map();
+          deltas.set(id, table ? toDelta(table) : { id, removed: true });
+          dirty.set(target, deltas);
+        } else {
+          // Tavolo eliminato di un tenant non noto: la rimozione va a tutti
+          for (const other of this.byTenant.keys()) {
+            const deltas = dirty.get(other) || new Map();
+            deltas.set(id, { id, removed: true });
+            dirty.set(other, deltas);
+          }
+        }
+      }
+    }
+
+    for (const [tenant, deltaMap] of dirty) {
+      const clients = tenant && this.byTenant.get(tenant);
+      const deltas = [...deltaMap.values()];
+      if (!clients || !clients.size || !deltas.length) continue;
+
+      this.stats.deltas += deltas.length;
+      const message = frame('tables', deltas);
+
+      for (const client of clients) {
+        if (client.blocked) {
+          this.buffer(client, deltas);
+        } else {
+          this.write(client, message);
+        }
+      }
+    }
+  }
+
+  broadcastResync(clients) {
+    this.stats.resyncs++;
+    const message = frame('resync', {});
+
+    for (const client of clients) {
+      if (client.blocked) {
+        client.pending = null;
+        client.resync = true;
+      } else {
+        this.write(client, message);
+      }
+    }
+  }
+
+  write(client, message) {
+    this.stats.frames++;
+
+    if (!client.res.write(message)) {
+      client.blocked = true;
+      this.stats.backpressured++;
+    }
+  }
+
+  // Client con il buffer del socket pieno: conserva solo l'ultimo delta per tavolo
+  buffer(client, deltas) {
+    if (client.resync) return;
+
+    client.pending = client.pending || new Map();
+    for (const delta of deltas) {
+      client.pending.set(delta.id, delta);
+    }
+
+    if (client.pending.size > this.options.maxPending) {
+      client.pending = null;
+      client.resync = true;
+    }
+  }
+
+  drain(client) {
+    client.blocked = false;
+
+    if (client.resync) {
+      client.resync = false;
+      this.stats.resyncs++;
+      this.write(client, frame('resync', {}));
+    } else if (client.pending) {
+      const deltas = [...client.pending.values()];
+      client.pending = null;
+      this.write(client, frame('tables', deltas));
+    }
+  }
+
+  // Commento SSE periodico: tiene aperte le connessioni attraverso i proxy
+  ensureHeartbeat() {
+    if (this.heartbeatTimer) return;
+
+    this.heartbeatTimer = setInterval(() => {
+      for (const client of this.clients) {
+        if (!client.blocked) {
+          client.res.write(': ping\n\n');
+        }
+      }
+    }, this.options.heartbeatMs);
+    this.heartbeatTimer.unref();
+  }
+
+  stopHeartbeat() {
+    if (this.heartbeatTimer) {
+      clearInterval(this.heartbeatTimer);
+      this.heartbeatTimer = null;
+    }
+  }
+
+  // Chiude tutti gli stream (shutdown): i client si riconnettono da soli
+  close() {
+    for (const client of this.clients) {
+      client.res.end();
+    }
+
+    this.clients.clear();
+    this.byTenant.clear();
+    this.dirty.clear();
+    this.invalidated.clear();
+    this.stopHeartbeat();
+
+    if (this.flushTimer) {
+      clearTimeout(this.flushTimer);
+      this.flushTimer = null;
+    }
+  }
+
+  getMetrics() {
+    let blocked = 0;
+    for (const client of this.clients) {
+      if (client.blocked) blocked++;
+    }
+
+    let pendingTables = 0;
+    for (const deltas of this.dirty.values()) {
+      pendingTables += deltas.size;
+    }
+
+    return {
+      clients: this.clients.size,
+      tenants: this.byTenant.size,
+      blockedClients: blocked,
+      pendingTables,
+      ...this.stats
+    };
+  }
+}
+
+const liveUpdates = new LiveUpdates();
+
+tableEvents.on('changed', (table) => liveUpdates.track(table._id, toDelta(table), table.tenant));
+tableEvents.on('stale', (tableId, tenant) => liveUpdates.track(tableId, null, tenant));
+tableEvents.on('invalidated', (tenant) => liveUpdates.invalidate(tenant));
+
+module.exports = liveUpdates;
+module.exports.LiveUpdates = LiveUpdates;
+module.exports.toDelta = toDelta;
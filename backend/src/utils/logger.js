@@ -0,0 +1,230 @@
+
+// Logger strutturato: una riga JSON per evento (time, level, category, msg, requestId,
+// traceId e campi), livelli debug/info/warn/error e campionamento per categoria
+// (es. "auth.token=0.01": un token non valido su cento finisce nel log).
+// Trasporto asincrono: le righe si accumulano in un buffer scritto con fs.write (thread
+// pool di libuv) ogni flushMs o oltre bufferSize caratteri, una write per lotto.
+// console.* su pipe e TTY è sincrono su Linux e blocca l'event loop a ogni riga; qui il
+// costo per evento è un JSON.stringify. Oltre maxBufferSize (destinazione più lenta dei
+// log prodotti) le righe sono scartate e contate, mai accodate senza limite.
+// LOG_TRANSPORT=sync scrive ogni riga subito (debug, confronto nei benchmark).
+const fs = require('fs');
+const path = require('path');
+const crypto = require('crypto');
+const { AsyncLocalStorage } = require('async_hooks');
+const tracer = require('./tracing');
+const config = require('../config/config');
+
+const LEVELS = { debug: 10, info: 20, warn: 30, error: 40 };
+const REQUEST_ID = /^[\w.:-]{1,128}$/;
+const RETRY_MS = 10;
+
+// Errori serializzati con stack e codice; gli altri campi restano invariati
+const serializeFields = (fields) => {
+  const entry = {};
+
+  for (const [key, value] of Object.entries(fields)) {
+    entry[key] = value instanceof Error
+      ? { name: value.name, message: value.message, ...(value.code !== undefined && { code: value.code }), stack: value.stack }
+      : value;
+  }
+
+  return entry;
+};
+
+class Logger {
+  constructor(options = {}) {
+    this.options = { ...config.LOGGING, ...options };
+    this.storage = new AsyncLocalStorage();
+    this.fd = null;
+    this.chunks = [];
+    this.size = 0;
+    this.timer = null;
+    this.flushing = null;
+    this.stats = { written: 0, sampledOut: 0, dropped: 0, flushes: 0, writeErrors: 0 };
+
+    // A processo in uscita il buffer è scritto in modo sincrono
+    process.once('exit', () => this.flushSync());
+  }
+
+  get level() {
+    return LEVELS[this.options.level] || LEVELS.info;
+  }
+
+  isLevelEnabled(level) {
+    return LEVELS[level] >= this.level;
+  }
+
+  log(level, category, message, fields = {}) {
+    if (LEVELS[level] < this.level) return;
+
+    const rate = this.options.sampling[category];
+    if (rate !== undefined && Math.random() >= rate) {
+      this.stats.sampledOut++;
+      return;
+    }
+
+    const context = this.storage.getStore();
+    const traceId = tracer.currentTraceId();
+
+    this.write(`${JSON.stringify({
+      time: new Date().toISOString(),
+      level,
+      category,
+      msg: message,
+      pid: process.pid,
+      ...(context && { requestId: context.requestId }),
+      ...(traceId && { traceId }),
+      ...(rate !== undefined && { sampleRate: rate }),
+      ...serializeFields(fields)
+    })}\n`);
+  }
+
+  // Logger di una categoria: log.error('Add points error', { error })
+  child(category) {
+    return {
+      debug: (message, fields) => this.log('debug', category, message, fields),
+      info: (message, fields) => this.log('info', category, message, fields),
+      warn: (message, fields) => this.log('warn', category, message, fields),
+      error: (message, fields) => this.log('error', category, message, fields)
+    };
+  }
+
+  // Request id della richiesta: X-Request-Id del proxy se valido, altrimenti generato.
+  // Restituito nella risposta e presente in ogni riga di log della richiesta
+  middleware() {
+    return (req, res, next) => {
+      const given = req.get('x-request-id');
+      const requestId = given && REQUEST_ID.test(given) ? given : crypto.randomUUID();
+
+      req.id = requestId;
+      res.set('X-Request-Id', requestId);
+      this.storage.run({ requestId }, next);
+    };
+  }
+
+  destination() {
+    if (this.fd === null) {
+      if (this.options.file) {
+        fs.mkdirSync(path.dirname(this.options.file), { recursive: true });
+        this.fd = fs.openSync(this.options.file, 'a');
+      } else {
+        this.fd = process.stdout.fd;
+      }
+    }
+
+    return this.fd;
+  }
+
+  write(line) {
+    if (this.options.transport === 'sync') {
+      this.writeSync(line);
+      return;
+    }
+
+    if (this.size + line.length > this.options.maxBufferSize) {
+      this.stats.dropped++;
+      return;
+    }
+
+    this.chunks.push(line);
+    this.size += line.length;
+    this.stats.written++;
+
+    if (this.size >= this.options.bufferSize) {
+      this.flush();
+    } else if (!this.timer) {
+      this.timer = setTimeout(() => this.flush(), this.options.flushMs);
+      this.timer.unref();
+    }
+  }
+
+  writeSync(data) {
+    try {
+      fs.writeSync(this.destination(), data);
+      this.stats.written++;
+    } catch (error) {
+      this.stats.writeErrors++;
+    }
+  }
+
+  // Scrive il buffer con una sola fs.write (ripresa sulle scritture parziali e su EAGAIN
+  // delle pipe non bloccanti); le righe arrivate nel frattempo vanno nel lotto successivo
+  flush() {
+    clearTimeout(this.timer);
+    this.timer = null;
+
+    if (this.flushing || this.chunks.length === 0) {
+      return this.flushing || Promise.resolve();
+    }
+
+    const buffer = Buffer.from(this.chunks.join(''));
+    this.chunks = [];
+    this.size = 0;
+    this.stats.flushes++;
+
+    this.flushing = new Promise((resolve) => {
+      const writeFrom = (offset) => {
+        fs.write(this.destination(), buffer, offset, buffer.length - offset, null, (error, written) => {
+          if (error && error.code === 'EAGAIN') {
+            return setTimeout(() => writeFrom(offset), RETRY_MS);
+          }
+
+          if (error) {
+            this.stats.writeErrors++;
+          } else if (offset + written < buffer.length) {
+            return writeFrom(offset + written);
+          }
+
+          resolve();
+        });
+      };
+
+      writeFrom(0);
+    }).then(() => {
+      this.flushing = null;
+      if (this.chunks.length > 0) return this.flush();
+    });
+
+    return this.flushing;
+  }
+
+  flushSync() {
+    clearTimeout(this.timer);
+    this.timer = null;
+
+    if (this.chunks.length === 0) return;
+
+    const data = this.chunks.join('');
+    this.chunks = [];
+    this.size = 0;
+
+    try {
+      fs.writeSync(this.destination(), data);
+    } catch (error) {
+      this.stats.writeErrors++;
+    }
+  }
+
+  async close() {
+    await this.flush();
+
+    if (this.options.file && this.fd !== null) {
+      fs.closeSync(this.fd);
+      this.fd = null;
+    }
+  }
+
+  getMetrics() {
+    return {
+      level: this.options.level,
+      transport: this.options.transport,
+      buffered: this.size,
+      ...this.stats
+    };
+  }
+}
+
+module.exports = new Logger();
+module.exports.Logger = Logger;
+module.exports.LEVELS = LEVELS;
@@ -0,0 +1,87 @@
+
+// Cache LRU in memoria con scadenza opzionale (TTL) e contatori hit/miss
+class LRUCache {
+  constructor({ max = 1000, ttlMs = 0 } = {}) {
+    this.max = max;
+    this.ttlMs = ttlMs;
+    this.entries = new Map();
+    this.stats = { hits: 0, misses: 0, evictions: 0, expired: 0 };
+  }
+
+  get size() {
+    return this.entries.size;
+  }
+
+  get(key) {
+    const entry = this.entries.get(key);
+
+    if (!entry) {
+      this.stats.misses++;
+      return undefined;
+    }
+
+    if (entry.expiresAt && entry.expiresAt <= Date.now()) {
+      this.entries.delete(key);
+      this.stats.expired++;
+      this.stats.misses++;
+      return undefined;
+    }
+
+    // Sposta in coda (più recente): la Map mantiene l'ordine di inserimento
+    this.entries.delete(key);
+    this.entries.set(key, entry);
+    this.stats.hits++;
+    return entry.value;
+  }
+
+  set(key, value, ttlMs = this.ttlMs) {
+    this.entries.delete(key);
+    this.entries.set(key, {
+      value,
+      expiresAt: ttlMs > 0 ? Date.now() + ttlMs : 0
+    });
+
+    while (this.entries.size > this.max) {
+      this.entries.delete(this.entries.keys().next().value);
+      this.stats.evictions++;
+    }
+
+    return value;
+  }
+
+  has(key) {
+    const entry = this.entries.get(key);
+    return Boolean(entry) && (!entry.expiresAt || entry.expiresAt > Date.now());
+  }
+
+  // Valori non scaduti, dal meno al più recente (senza aggiornare l'ordine)
+  *values() {
+    const now = Date.now();
+
+    for (const entry of this.entries.values()) {
+      if (!entry.expiresAt || entry.expiresAt > now) yield entry.value;
+    }
+  }
+
+  delete(key) {
+    return this.entries.delete(key);
+  }
+
+  clear() {
+    this.entries.clear();
+  }
+
+  getMetrics() {
+    const lookups = this.stats.hits + this.stats.misses;
+
+    return {
+      size: this.entries.size,
+      max: this.max,
+      ttlMs: this.ttlMs,
+      ...this.stats,
+      hitRatio: lookups ? this.stats.hits / lookups : 0
+    };
+  }
+}
+
+module.exports = LRUCache;
@@ -0,0 +1,293 @@
+
+// Metriche in formato Prometheus (text exposition 0.0.4) senza dipendenze esterne:
+// contatori, gauge e istogrammi con etichette, più i collector di processo (lag
+// dell'event loop, pause del GC, memoria) e dei comandi Mongo. Il costo sul percorso
+// caldo è un incremento in una Map per etichette e una ricerca lineare su ~10 bucket;
+// i valori derivati dai componenti (pool, ledger, cache) sono letti solo allo scrape.
+// In cluster ogni worker ha il proprio registro: va esposto e raccolto per processo.
+const { monitorEventLoopDelay, PerformanceObserver, constants } = require('perf_hooks');
+const config = require('../config/config');
+
+const HTTP_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5];
+const DB_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1];
+const LAG_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1];
+const GC_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25];
+
+const GC_KINDS = {
+  [constants.NODE_PERFORMANCE_GC_MAJOR]: 'major',
+  [constants.NODE_PERFORMANCE_GC_MINOR]: 'minor',
+  [constants.NODE_PERFORMANCE_GC_INCREMENTAL]: 'incremental',
+  [constants.NODE_PERFORMANCE_GC_WEAKCB]: 'weakcb'
+};
+
+const escapeLabel = (value) => String(value).replace(/\\/g, '\\\\').replace(/\n/g, '\\n').replace(/"/g, '\\"');
+
+// Chiave della serie: valori delle etichette nell'ordine dichiarato
+const seriesKey = (labelNames, labels) => labelNames.map(name => labels[name] ?? '').join('\u0000');
+
+const formatLabels = (labelNames, values, extra = '') => {
+  const pairs = labelNames.map((name, i) => `${name}="${escapeLabel(values[i])}"`);
+  if (extra) pairs.push(extra);
+  return pairs.length ? `{${pairs.join(',')}}` : '';
+};
+
+class Metric {
+  constructor(type, name, help, labelNames = []) {
+    this.type = type;
+    this.name = name;
+    this.help = help;
+    this.labelNames = labelNames;
+    this.series = new Map();
+  }
+
+  header() {
+    return `# HELP ${this.name} ${this.help}\n# TYPE ${this.name} ${this.type}\n`;
+  }
+
+  reset() {
+    this.series.clear();
+  }
+}
+
+class Counter extends Metric {
+  constructor(name, help, labelNames) {
+    super('counter', name, help, labelNames);
+  }
+
+  inc(labels = {}, value = 1) {
+    const key = seriesKey(this.labelNames, labels);
+    this.series.set(key, (this.series.get(key) || 0) + value);
+  }
+
+  render() {
+    let out = this.header();
+    for (const [key, value] of this.series) {
+      out += `${this.name}${formatLabels(this.labelNames, key.split('\u0000'))} ${value}\n`;
+    }
+    return out;
+  }
+}
+
+class Gauge extends Metric {
+  // collect(): valori letti allo scrape, come [[labels, value], ...] oppure un numero
+  constructor(name, help, labelNames, collect = null) {
+    super('gauge', name, help, labelNames);
+    this.collect = collect;
+  }
+
+  set(labels = {}, value) {
+    this.series.set(seriesKey(this.labelNames, labels), value);
+  }
+
+  render() {
+    if (this.collect) {
+      const collected = this.collect();
+      this.series.clear();
+
+      if (typeof collected === 'number') {
+        this.set({}, collected);
+      } else {
+        for (const [labels, value] of collected) this.set(labels, value);
+      }
+    }
+
+    let out = this.header();
+    for (const [key, value] of this.series) {
+      out += `${this.name}${formatLabels(this.labelNames, key.split('\u0000'))} ${value}\n`;
+    }
+    return out;
+  }
+}
+
+class Histogram extends Metric {
+  constructor(name, help, labelNames, buckets) {
+    super('histogram', name, help, labelNames);
+    this.buckets = buckets;
+  }
+
+  observe(labels, value) {
+    const key = seriesKey(this.labelNames, labels);
+    let series = this.series.get(key);
+
+    if (!series) {
+      series = { counts: new Array(this.buckets.length).fill(0), sum: 0, count: 0 };
+      this.series.set(key, series);
+    }
+
+    // Conteggi per bucket non cumulativi: si cumulano solo allo scrape
+    let i = 0;
+    while (i < this.buckets.length && value > this.buckets[i]) i++;
+    if (i < this.buckets.length) series.counts[i]++;
+
+    series.sum += value;
+    series.count++;
+  }
+
+  // Timer: ritorna una funzione che osserva i secondi trascorsi
+  startTimer(labels = {}) {
+    const start = process.hrtime.bigint();
+    return (extra = {}) => this.observe({ ...labels, ...extra }, Number(process.hrtime.bigint() - start) / 1e9);
+  }
+
+  render() {
+    let out = this.header();
+
+    for (const [key, series] of this.series) {
+      const values = key.split('\u0000');
+      let cumulative = 0;
+
+      this.buckets.forEach((bound, i) => {
+        cumulative += series.counts[i];
+        out += `${this.name}_bucket${formatLabels(this.labelNames, values, `le="${bound}"`)} ${cumulative}\n`;
+      });
+
+      out += `${this.name}_bucket${formatLabels(this.labelNames, values, 'le="+Inf"')} ${series.count}\n`;
+      out += `${this.name}_sum${formatLabels(this.labelNames, values)} ${series.sum}\n`;
+      out += `${this.name}_count${formatLabels(this.labelNames, values)} ${series.count}\n`;
+    }
+
+    return out;
+  }
+}
+
+class MetricsRegistry {
+  constructor(options = {}) {
+    this.options = { ...config.METRICS, ...options };
+    this.metrics = new Map();
+    this.clients = new WeakSet();
+    this.eventLoop = null;
+    this.lagTimer = null;
+    this.gcObserver = null;
+    this.lastLagMs = 0;
+
+    this.httpDuration = this.histogram('http_request_duration_seconds',
+      'Durata delle richieste HTTP per route, metodo e stato', ['method', 'route', 'status'], HTTP_BUCKETS);
+    this.dbDuration = this.histogram('mongodb_command_duration_seconds',
+      'Durata dei comandi MongoDB per comando ed esito', ['command', 'outcome'], DB_BUCKETS);
+    this.eventLoopLag = this.histogram('nodejs_eventloop_lag_seconds',
+      'Ritardo dell\'event loop campionato a intervalli regolari', [], LAG_BUCKETS);
+    this.gcPause = this.histogram('nodejs_gc_pause_seconds',
+      'Pause del garbage collector per tipo', ['kind'], GC_BUCKETS);
+
+    this.points = this.counter('qr_points_total',
+      'Punti registrati dalle transazioni per tipo (EARNED, REDEEMED, ADJUSTMENT)', ['type']);
+    this.transactions = this.counter('qr_point_transactions_total',
+      'Transazioni punti registrate per tipo', ['type']);
+    this.scans = this.counter('qr_scans_total',
+      'Scansioni QR (ricerca tavolo) per esito', ['result']);
+    this.logins = this.counter('qr_logins_total',
+      'Tentativi di login per esito', ['result']);
+
+    this.gauge('nodejs_eventloop_delay_p99_seconds',
+      'p99 del ritardo dell\'event loop dall\'ultimo scrape (monitorEventLoopDelay)', [],
+      () => this.eventLoopP99());
+    this.gauge('process_resident_memory_bytes', 'Memoria residente del processo', [],
+      () => process.memoryUsage.rss());
+    this.gauge('nodejs_heap_used_bytes', 'Heap V8 in uso', [],
+      () => process.memoryUsage().heapUsed);
+    this.gauge('process_uptime_seconds', 'Secondi dall\'avvio del processo', [],
+      () => process.uptime());
+  }
+
+  counter(name, help, labelNames = []) {
+    return this.register(new Counter(name, help, labelNames));
+  }
+
+  gauge(name, help, labelNames = [], collect = null) {
+    return this.register(new Gauge(name, help, labelNames, collect));
+  }
+
+  histogram(name, help, labelNames, buckets) {
+    return this.register(new Histogram(name, help, labelNames, buckets));
+  }
+
+  register(metric) {
+    this.metrics.set(metric.name, metric);
+    return metric;
+  }
+
+  get enabled() {
+    return this.options.enabled;
+  }
+
+  // Collector di processo: campionatore del lag, monitorEventLoopDelay e osservatore GC.
+  // Timer e observer non tengono vivo il processo.
+  start() {
+    if (!this.enabled || this.lagTimer) return;
+
+    this.eventLoop = monitorEventLoopDelay({ resolution: 20 });
+    this.eventLoop.enable();
+
+    let expected = Date.now() + this.options.lagSampleMs;
+    this.lagTimer = setInterval(() => {
+      const now = Date.now();
+      this.lastLagMs = Math.max(0, now - expected);
+      this.eventLoopLag.observe({}, this.lastLagMs / 1000);
+      expected = now + this.options.lagSampleMs;
+    }, this.options.lagSampleMs);
+    this.lagTimer.unref();
+
+    this.gcObserver = new PerformanceObserver((list) => {
+      for (const entry of list.getEntries()) {
+        this.gcPause.observe({ kind: GC_KINDS[entry.detail?.kind] || 'other' }, entry.duration / 1000);
+      }
+    });
+    this.gcObserver.observe({ entryTypes: ['gc'] });
+  }
+
+  stop() {
+    clearInterval(this.lagTimer);
+    this.lagTimer = null;
+    if (this.eventLoop) this.eventLoop.disable();
+    if (this.gcObserver) this.gcObserver.disconnect();
+  }
+
+  eventLoopP99() {
+    if (!this.eventLoop) return 0;
+
+    const p99 = this.eventLoop.percentile(99) / 1e9;
+    this.eventLoop.reset();
+    return p99;
+  }
+
+  // Durata dei comandi dal driver (richiede monitorCommands, attivo con le metriche)
+  attachMongo(client) {
+    if (!this.enabled || this.clients.has(client)) return;
+    this.clients.add(client);
+
+    client.on('commandSucceeded', (event) => {
+      this.dbDuration.observe({ command: event.commandName, outcome: 'ok' }, event.duration / 1000);
+    });
+    client.on('commandFailed', (event) => {
+      this.dbDuration.observe({ command: event.commandName, outcome: 'failed' }, event.duration / 1000);
+    });
+  }
+
+  // Contatori di dominio per transazioni già persistite
+  recordTransactions(transactions) {
+    for (const transaction of transactions) {
+      this.transactions.inc({ type: transaction.type });
+      this.points.inc({ type: transaction.type }, transaction.points);
+    }
+  }
+
+  render() {
+    let out = '';
+    for (const metric of this.metrics.values()) {
+      out += metric.render();
+    }
+    return out;
+  }
+
+  reset() {
+    for (const metric of this.metrics.values()) {
+      metric.reset();
+    }
+  }
+}
+
+module.exports = new MetricsRegistry();
+module.exports.MetricsRegistry = MetricsRegistry;
+module.exports.Counter = Counter;
+module.exports.Gauge = Gauge;
+module.exports.Histogram = Histogram;
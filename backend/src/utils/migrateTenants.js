@@ -0,0 +1,56 @@
+
+// Migrazione a multi-ristorante: assegna il tenant di default ai documenti creati
+// prima dell'introduzione dei tenant, sostituisce gli indici univoci globali con
+// quelli prefissati dal tenant e ricostruisce i rollup statistiche con il tenant.
+// Uso: npm run tenants:migrate  (DEFAULT_TENANT sceglie lo slug, default "default")
+const mongoose = require('mongoose');
+require('dotenv').config();
+const { connect } = require('../config/database');
+const config = require('../config/config');
+
+const User = require('../models/User');
+const Table = require('../models/Table');
+const PointTransaction = require('../models/PointTransaction');
+const StatsRollup = require('../models/StatsRollup');
+const statsRollups = require('./statsRollups');
+
+const runMigration = async () => {
+  try {
+    await connect();
+    console.log('🗄️  MongoDB Connected for tenant migration');
+
+    const tenant = config.TENANCY.defaultTenant;
+
+    for (const Model of [User, Table, PointTransaction]) {
+      const { modifiedCount } = await Model.updateMany(
+        { tenant: { $exists: false } },
+        { $set: { tenant } }
+      );
+
+      // Elimina gli indici non più dichiarati (es. tableNumber_1 univoco) e crea i nuovi
+      const dropped = await Model.syncIndexes();
+      console.log(`🏷️  ${Model.modelName}: ${modifiedCount} documenti assegnati a "${tenant}", indici rimossi: ${dropped.join(', ') || 'nessuno'}`);
+    }
+
+    // I rollup hanno il tenant nella chiave: si ricostruiscono dalle transazioni
+    await StatsRollup.syncIndexes();
+    for (const rollupTenant of await PointTransaction.distinct('tenant')) {
+      const rollups = await statsRollups.backfill({ tenant: rollupTenant });
+      console.log(`📊 Rollup di "${rollupTenant}" ricostruiti: ${rollups} bucket orari`);
+    }
+
+    console.log('✅ Migrazione tenant completata');
+    await mongoose.connection.close();
+    process.exit(0);
+  } catch (error) {
+    console.error('❌ Tenant migration error:', error);
+    process.exit(1);
+  }
+};
+
+// Esegui se chiamato direttamente
+if (require.main === module) {
+  runMigration();
+}
+
+module.exports = { runMigration };
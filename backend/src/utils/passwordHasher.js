@@ -0,0 +1,90 @@
+
+// Pool di worker thread per bcrypt (register, login, cambio password).
+// Un hash a costo 12 in bcryptjs occupa la CPU per centinaia di ms: eseguito
+// sull'event loop bloccherebbe ogni altra richiesta. La coda è limitata: oltre
+// maxQueue operazioni in attesa le nuove vengono rifiutate (errore BUSY → 503).
+// I worker (passwordWorker.js) sono gestiti dal WorkerPool condiviso con i QR.
+const path = require('path');
+const bcrypt = require('bcryptjs');
+const WorkerPool = require('./workerPool');
+const config = require('../config/config');
+
+const { BUSY } = WorkerPool;
+const WORKER_SCRIPT = path.join(__dirname, 'passwordWorker.js');
+
+class PasswordHasher {
+  constructor(options = {}) {
+    this.options = { ...config.PASSWORD, ...options };
+    this.pool = this.options.workers > 0
+      ? new WorkerPool(WORKER_SCRIPT, {
+        size: this.options.workers,
+        maxQueue: this.options.maxQueue,
+        name: 'Password worker'
+      })
+      : null;
+    this.stats = {
+      hashes: 0,
+      compares: 0
+    };
+  }
+
+  get rounds() {
+    return this.options.rounds;
+  }
+
+  // Operazioni in attesa di un worker
+  get queueDepth() {
+    return this.pool ? this.pool.queue.length : 0;
+  }
+
+  hash(password) {
+    this.stats.hashes++;
+    return this.run({ op: 'hash', password, rounds: this.rounds });
+  }
+
+  async compare(password, hash) {
+    if (!password || !hash) return false;
+
+    this.stats.compares++;
+    return this.run({ op: 'compare', password, hash });
+  }
+
+  // Hash con un costo diverso da quello configurato: va rigenerato al prossimo login
+  needsRehash(hash) {
+    try {
+      return bcrypt.getRounds(hash) !== this.rounds;
+    } catch (error) {
+      return true;
+    }
+  }
+
+  run(task) {
+    // workers = 0: bcrypt asincrono sul thread principale (a blocchi, ma senza pool)
+    if (!this.pool) {
+      return task.op === 'hash'
+        ? bcrypt.hash(task.password, task.rounds)
+        : bcrypt.compare(task.password, task.hash);
+    }
+
+    return this.pool.run(task);
+  }
+
+  // Termina i worker (shutdown); le operazioni in coda e in corso vengono rifiutate
+  async stop() {
+    if (this.pool) {
+      await this.pool.stop();
+    }
+  }
+
+  getMetrics() {
+    return {
+      rounds: this.rounds,
+      ...this.stats,
+      ...(this.pool && this.pool.getMetrics())
+    };
+  }
+}
+
+module.exports = new PasswordHasher();
+module.exports.PasswordHasher = PasswordHasher;
+module.exports.BUSY = BUSY;
@@ -0,0 +1,16 @@
+
+// Worker thread per bcrypt: hash e confronto girano qui, fuori dall'event loop principale
+const { parentPort } = require('worker_threads');
+const bcrypt = require('bcryptjs');
+
+parentPort.on('message', ({ id, op, password, hash, rounds }) => {
+  try {
+    const result = op === 'hash'
+      ? bcrypt.hashSync(password, bcrypt.genSaltSync(rounds))
+      : bcrypt.compareSync(password, hash);
+
+    parentPort.postMessage({ id, result });
+  } catch (error) {
+    parentPort.postMessage({ id, error: error.message });
+  }
+});
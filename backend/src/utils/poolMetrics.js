@@ -0,0 +1,128 @@
+
+// Metriche del pool di connessioni Mongo dagli eventi del driver (CMAP e SDAM):
+// connessioni in uso, richieste in attesa di una connessione, tempo di attesa,
+// latenza di selezione del server all'avvio e RTT dei heartbeat (su cui il driver
+// basa la scelta del server). Opzionale: log a campione della durata dei comandi.
+const logger = require('./logger');
+
+class PoolMetrics {
+  constructor() {
+    this.reset();
+  }
+
+  reset() {
+    this.open = 0;
+    this.checkedOut = 0;
+    this.waiting = [];
+    this.stats = {
+      created: 0,
+      closed: 0,
+      checkOuts: 0,
+      checkOutFailures: 0,
+      totalWaitMs: 0,
+      maxWaitMs: 0,
+      heartbeats: 0,
+      heartbeatFailures: 0,
+      lastHeartbeatMs: 0,
+      totalHeartbeatMs: 0,
+      initialSelectionMs: 0,
+      sampledCommands: 0
+    };
+  }
+
+  // Tempo tra la connect e il primo server selezionabile
+  recordInitialSelection(ms) {
+    this.stats.initialSelectionMs = ms;
+  }
+
+  attach(client, { debugSampleRate = 0 } = {}) {
+    client.on('connectionCreated', () => {
+      this.open++;
+      this.stats.created++;
+    });
+
+    client.on('connectionClosed', () => {
+      this.open = Math.max(0, this.open - 1);
+      this.stats.closed++;
+    });
+
+    // La coda di attesa del driver è FIFO: il check-out completato è il più vecchio in attesa
+    client.on('connectionCheckOutStarted', () => {
+      this.waiting.push(process.hrtime.bigint());
+    });
+
+    client.on('connectionCheckedOut', () => {
+      this.checkedOut++;
+      this.stats.checkOuts++;
+      this.recordWait();
+    });
+
+    client.on('connectionCheckOutFailed', () => {
+      this.stats.checkOutFailures++;
+      this.recordWait();
+    });
+
+    client.on('connectionCheckedIn', () => {
+      this.checkedOut = Math.max(0, this.checkedOut - 1);
+    });
+
+    client.on('serverHeartbeatSucceeded', (event) => {
+      this.stats.heartbeats++;
+      this.stats.lastHeartbeatMs = event.duration;
+      this.stats.totalHeartbeatMs += event.duration;
+    });
+
+    client.on('serverHeartbeatFailed', () => {
+      this.stats.heartbeatFailures++;
+    });
+
+    if (debugSampleRate > 0) {
+      this.sampleCommands(client, debugSampleRate);
+    }
+  }
+
+  recordWait() {
+    const startedAt = this.waiting.shift();
+    if (startedAt === undefined) return;
+
+    const waitMs = Number(process.hrtime.bigint() - startedAt) / 1e6;
+    this.stats.totalWaitMs += waitMs;
+    this.stats.maxWaitMs = Math.max(this.stats.maxWaitMs, waitMs);
+  }
+
+  // Log di una frazione dei comandi con la loro durata (richiede monitorCommands)
+  sampleCommands(client, rate) {
+    const sampled = new Set();
+
+    client.on('commandStarted', (event) => {
+      if (Math.random() < rate) sampled.add(event.requestId);
+    });
+
+    const log = (event, outcome) => {
+      if (!sampled.delete(event.requestId)) return;
+
+      this.stats.sampledCommands++;
+      logger.log('info', 'db', 'Mongo command', { command: event.commandName, outcome, durationMs: event.duration });
+    };
+
+    client.on('commandSucceeded', (event) => log(event, 'ok'));
+    client.on('commandFailed', (event) => log(event, 'failed'));
+  }
+
+  getMetrics() {
+    const { checkOuts, checkOutFailures, totalWaitMs, heartbeats, totalHeartbeatMs } = this.stats;
+    const completed = checkOuts + checkOutFailures;
+
+    return {
+      open: this.open,
+      checkedOut: this.checkedOut,
+      waitQueueLength: this.waiting.length,
+      ...this.stats,
+      avgWaitMs: completed ? totalWaitMs / completed : 0,
+      avgHeartbeatMs: heartbeats ? totalHeartbeatMs / heartbeats : 0
+    };
+  }
+}
+
+module.exports = new PoolMetrics();
+module.exports.PoolMetrics = PoolMetrics;
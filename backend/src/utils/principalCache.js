@@ -0,0 +1,54 @@
+
+// Cache dei principal autenticati: evita User.findById a ogni richiesta protetta.
+// Contiene solo i campi usati da auth/roleCheck/controller; la staleness massima
+// è il TTL (PRINCIPAL_CACHE_TTL_MS, 0 = cache disattivata).
+const LRUCache = require('./lruCache');
+const config = require('../config/config');
+
+const cache = new LRUCache({
+  max: config.PRINCIPAL_CACHE.max,
+  ttlMs: config.PRINCIPAL_CACHE.ttlMs
+});
+
+// Campi letti da Mongo quando il principal non è in cache
+exports.FIELDS = 'tenant username firstName lastName role isActive';
+
+exports.enabled = () => cache.ttlMs > 0;
+
+// Converte un utente (documento o lean) nel principal esposto come req.user
+exports.toPrincipal = (user) => Object.freeze({
+  _id: user._id,
+  id: String(user._id),
+  tenant: user.tenant || config.TENANCY.defaultTenant,
+  username: user.username,
+  firstName: user.firstName,
+  lastName: user.lastName,
+  fullName: `${user.firstName} ${user.lastName}`,
+  role: user.role,
+  isActive: user.isActive
+});
+
+exports.get = (userId) => {
+  if (!exports.enabled()) return undefined;
+  return cache.get(String(userId));
+};
+
+exports.set = (userId, principal) => {
+  if (exports.enabled()) {
+    cache.set(String(userId), principal);
+  }
+  return principal;
+};
+
+exports.invalidate = (userId) => {
+  cache.delete(String(userId));
+};
+
+exports.clear = () => {
+  cache.clear();
+};
+
+exports.getMetrics = () => ({
+  enabled: exports.enabled(),
+  ...cache.getMetrics()
+});
@@ -0,0 +1,234 @@
+
+// Pipeline degli asset QR: rendering su un pool di worker thread, cache su disco
+// indirizzata per contenuto e cache LRU in memoria. La chiave è l'hash di payload,
+// formato e opzioni normalizzate (più RENDER_VERSION): un codice invariato non viene
+// mai ridisegnato, un cambio di payload o di opzioni produce un file nuovo.
+// PNG e SVG finiscono su disco (QR_CACHE_DIR/ab/<hash>.png); SVG, data URL e matrici
+// dei moduli restano anche in memoria. Richieste concorrenti dello stesso asset
+// condividono un solo rendering.
+// Le immagini servite via HTTP (image()) vivono solo in una LRU limitata di byte
+// pronti, senza disco: le varianti di dimensione e colore non riempiono la cache.
+const crypto = require('crypto');
+const path = require('path');
+const fs = require('fs').promises;
+const WorkerPool = require('./workerPool');
+const LRUCache = require('./lruCache');
+const config = require('../config/config');
+
+const WORKER_SCRIPT = path.join(__dirname, 'qrWorker.js');
+
+// Da incrementare se cambia il modo di disegnare i codici (invalida la cache su disco)
+const RENDER_VERSION = 1;
+
+const DEFAULT_OPTIONS = {
+  margin: 1,
+  color: {
+    dark: '#000000',
+    light: '#FFFFFF'
+  }
+};
+
+const DISK_FORMATS = new Set(['png', 'svg']);
+const MEMORY_FORMATS = new Set(['svg', 'dataURL', 'modules']);
+
+const normalizeOptions = (options = {}) => ({
+  ...DEFAULT_OPTIONS,
+  ...options,
+  color: { ...DEFAULT_OPTIONS.color, ...options.color }
+});
+
+class QRAssetPipeline {
+  constructor(options = {}) {
+    this.options = { ...config.QR_ASSETS, ...options };
+    this.pool = this.options.workers > 0
+      ? new WorkerPool(WORKER_SCRIPT, { size: this.options.workers, name: 'QR worker' })
+      : null;
+    this.memory = new LRUCache({ max: this.options.memoryMax });
+    this.images = new LRUCache({ max: this.options.imageCacheMax });
+    this.pending = new Map();
+    this.dirs = new Set();
+    this.stats = {
+      renders: 0,
+      memoryHits: 0,
+      imageHits: 0,
+      diskHits: 0,
+      diskWrites: 0,
+      failed: 0,
+      totalRenderMs: 0
+    };
+  }
+
+  keyFor(payload, format, options) {
+    return crypto.createHash('sha1')
+      .update(JSON.stringify([RENDER_VERSION, format, payload, options]))
+      .digest('hex');
+  }
+
+  pathFor(key, format) {
+    return path.join(this.options.cacheDir, key.slice(0, 2), `${key}.${format}`);
+  }
+
+  async draw(format, payload, options) {
+    const start = process.hrtime.bigint();
+
+    try {
+      const task = { format, payload, options };
+      let result = this.pool ? await this.pool.run(task) : await require('./qrWorker').render(task);
+
+      // I Buffer attraversano il worker come Uint8Array
+      if (format === 'png' && !Buffer.isBuffer(result)) {
+        result = Buffer.from(result.buffer, result.byteOffset, result.byteLength);
+      }
+
+      this.stats.renders++;
+      return result;
+    } catch (error) {
+      this.stats.failed++;
+      throw error;
+    } finally {
+      this.stats.totalRenderMs += Number(process.hrtime.bigint() - start) / 1e6;
+    }
+  }
+
+  // Scrittura atomica: un lettore concorrente non vede mai un file a metà
+  async persist(file, body) {
+    const dir = path.dirname(file);
+    if (!this.dirs.has(dir)) {
+      await fs.mkdir(dir, { recursive: true });
+      this.dirs.add(dir);
+    }
+
+    const tmp = `${file}.${process.pid}.${crypto.randomBytes(4).toString('hex')}.tmp`;
+    await fs.writeFile(tmp, body);
+    await fs.rename(tmp, file);
+    this.stats.diskWrites++;
+  }
+
+  // Asset { key, body, cached } con cached = 'memory' | 'disk' | false.
+  // body: Buffer (png), stringa (svg, dataURL) o { size, data } (modules)
+  async render(payload, { format = 'png', ...options } = {}) {
+    const qrOptions = normalizeOptions(options);
+    const key = this.keyFor(payload, format, qrOptions);
+
+    if (MEMORY_FORMATS.has(format)) {
+      const body = this.memory.get(key);
+      if (body !== undefined) {
+        this.stats.memoryHits++;
+        return { key, body, cached: 'memory' };
+      }
+    }
+
+    if (this.pending.has(key)) {
+      return this.pending.get(key);
+    }
+
+    const building = (async () => {
+      const file = DISK_FORMATS.has(format) ? this.pathFor(key, format) : null;
+      let body = null;
+      let cached = false;
+
+      if (file) {
+        try {
+          body = await fs.readFile(file, format === 'svg' ? 'utf8' : null);
+          cached = 'disk';
+          this.stats.diskHits++;
+        } catch (error) {
+          if (error.code !== 'ENOENT') throw error;
+        }
+      }
+
+      if (body === null) {
+        body = await this.draw(format, payload, qrOptions);
+        if (file) await this.persist(file, body);
+      }
+
+      if (MEMORY_FORMATS.has(format)) {
+        this.memory.set(key, body);
+      }
+
+      return { key, body, cached };
+    })().finally(() => {
+      this.pending.delete(key);
+    });
+
+    this.pending.set(key, building);
+    return building;
+  }
+
+  // ETag forte dell'immagine: dipende solo da payload, formato, opzioni e versione di
+  // rendering, quindi è noto (e confrontabile con If-None-Match) prima di disegnare
+  etagFor(payload, { format = 'png', ...options } = {}) {
+    return `"${this.keyFor(payload, format, normalizeOptions(options))}"`;
+  }
+
+  // Immagine { key, etag, body: Buffer } per le risposte HTTP, dalla LRU se già disegnata
+  async image(payload, { format = 'png', ...options } = {}) {
+    const qrOptions = normalizeOptions(options);
+    const key = this.keyFor(payload, format, qrOptions);
+    const cached = this.images.get(key);
+
+    if (cached) {
+      this.stats.imageHits++;
+      return cached;
+    }
+
+    const pendingKey = `image:${key}`;
+    if (this.pending.has(pendingKey)) {
+      return this.pending.get(pendingKey);
+    }
+
+    const building = (async () => {
+      const body = await this.draw(format, payload, qrOptions);
+      const image = { key, etag: `"${key}"`, body: Buffer.isBuffer(body) ? body : Buffer.from(body) };
+
+      this.images.set(key, image);
+      return image;
+    })().finally(() => {
+      this.pending.delete(pendingKey);
+    });
+
+    this.pending.set(pendingKey, building);
+    return building;
+  }
+
+  // Percorso dell'asset nella cache su disco, disegnato solo se manca
+  async file(payload, { format = 'png', ...options } = {}) {
+    if (!DISK_FORMATS.has(format)) {
+      throw new Error(`Formato QR non salvabile su disco: ${format}`);
+    }
+
+    const file = this.pathFor(this.keyFor(payload, format, normalizeOptions(options)), format);
+
+    try {
+      await fs.access(file);
+      this.stats.diskHits++;
+      return { path: file, cached: 'disk' };
+    } catch (error) {
+      const { cached } = await this.render(payload, { format, ...options });
+      return { path: file, cached };
+    }
+  }
+
+  async stop() {
+    if (this.pool) {
+      await this.pool.stop();
+    }
+  }
+
+  getMetrics() {
+    return {
+      workers: this.options.workers,
+      cacheDir: this.options.cacheDir,
+      ...this.stats,
+      avgRenderMs: this.stats.renders ? this.stats.totalRenderMs / this.stats.renders : 0,
+      pending: this.pending.size,
+      memory: this.memory.getMetrics(),
+      images: this.images.getMetrics(),
+      pool: this.pool ? this.pool.getMetrics() : null
+    };
+  }
+}
+
+module.exports = new QRAssetPipeline();
+module.exports.QRAssetPipeline = QRAssetPipeline;
+module.exports.RENDER_VERSION = RENDER_VERSION;
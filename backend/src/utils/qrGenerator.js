@@ -1,8 +1,14 @@
 
-// Genera QR code per i tavoli (PNG/DataURL/SVG), funzione bulk QR per stampa/carte
+// Genera QR code per i tavoli (PNG/DataURL/SVG), funzione bulk QR per stampa/carte.
+// SVG, data URL e generazione massiva passano dalla pipeline qrAssets (worker thread,
+// cache su disco e in memoria): un codice invariato non viene ridisegnato.
 const QRCode = require('qrcode');
 const path = require('path');
 const fs = require('fs').promises;
+const qrAssets = require('./qrAssets');
+const { qrPayload } = require('./tenants');
+const { mapLimit } = require('./helpers');
+const log = require('./logger').child('qr');
 
 // Genera QR code come immagine
 exports.generateQRImage = async (data, outputPath, options = {}) => {
@@ -28,7 +34,7 @@ exports.generateQRImage = async (data, outputPath, options = {}) => {
     };
 
   } catch (error) {
-    console.error('QR Generation Error:', error);
+    log.error('QR Generation Error', { error });
     return {
       success: false,
       error: error.message
@@ -39,26 +45,16 @@ exports.generateQRImage = async (data, outputPath, options = {}) => {
 // Genera QR code come string SVG
 exports.generateQRSVG = async (data, options = {}) => {
   try {
-    const defaultOptions = {
-      type: 'svg',
-      margin: 1,
-      color: {
-        dark: '#000000',
-        light: '#FFFFFF'
-      }
-    };
-
-    const qrOptions = { ...defaultOptions, ...options };
-    const svgString = await QRCode.toString(data, qrOptions);
+    const { body } = await qrAssets.render(data, { ...options, format: 'svg' });
 
     return {
       success: true,
-      svg: svgString,
+      svg: body,
       data
     };
 
   } catch (error) {
-    console.error('QR SVG Generation Error:', error);
+    log.error('QR SVG Generation Error', { error });
     return {
       success: false,
       error: error.message
@@ -69,25 +65,16 @@ exports.generateQRSVG = async (data, options = {}) => {
 // Genera QR code come Data URL (base64)
 exports.generateQRDataURL = async (data, options = {}) => {
   try {
-    const defaultOptions = {
-      margin: 1,
-      color: {
-        dark: '#000000',
-        light: '#FFFFFF'
-      }
-    };
-
-    const qrOptions = { ...defaultOptions, ...options };
-    const dataURL = await QRCode.toDataURL(data, qrOptions);
+    const { body } = await qrAssets.render(data, { ...options, format: 'dataURL' });
 
     return {
       success: true,
-      dataURL,
+      dataURL: body,
       data
     };
 
   } catch (error) {
-    console.error('QR DataURL Generation Error:', error);
+    log.error('QR DataURL Generation Error', { error });
     return {
       success: false,
       error: error.message
@@ -95,46 +82,45 @@ exports.generateQRDataURL = async (data, options = {}) => {
   }
 };
 
-// Genera QR codes per tutti i tavoli
-exports.generateTableQRCodes = async (tables, outputDir = './qr-codes') => {
+// Genera QR codes per tutti i tavoli: rendering in parallelo sul pool di worker,
+// i codici già presenti nella cache su disco vengono solo copiati
+exports.generateTableQRCodes = async (tables, outputDir = './qr-codes', options = {}) => {
   try {
-    // Crea directory se non esiste
-    try {
-      await fs.mkdir(outputDir, { recursive: true });
-    } catch (error) {
-      if (error.code !== 'EEXIST') {
-        throw error;
-      }
-    }
-
-    const results = [];
+    await fs.mkdir(outputDir, { recursive: true });
 
-    for (const table of tables) {
-      const qrData = table.qrCode || `TABLE_${table.tableNumber}`;
+    const results = await mapLimit(tables, qrAssets.options.concurrency, async (table) => {
+      const qrData = qrPayload(table);
       const fileName = `table-${table.tableNumber}.png`;
       const outputPath = path.join(outputDir, fileName);
-
-      const result = await exports.generateQRImage(qrData, outputPath);
-
-      results.push({
+      const result = {
         tableNumber: table.tableNumber,
         tableName: table.name,
         qrCode: qrData,
         fileName,
-        outputPath,
-        success: result.success
-      });
-    }
+        outputPath
+      };
+
+      try {
+        const asset = await qrAssets.file(qrData, { ...options, format: 'png' });
+        await fs.copyFile(asset.path, outputPath);
+
+        return { ...result, success: true, cached: Boolean(asset.cached) };
+      } catch (error) {
+        log.error('QR Generation Error', { tableNumber: table.tableNumber, error });
+        return { ...result, success: false, cached: false };
+      }
+    });
 
     return {
       success: true,
       results,
       totalGenerated: results.filter(r => r.success).length,
+      totalCached: results.filter(r => r.cached).length,
       outputDirectory: outputDir
     };
 
   } catch (error) {
-    console.error('Bulk QR Generation Error:', error);
+    log.error('Bulk QR Generation Error', { error });
     return {
       success: false,
       error: error.message
@@ -142,10 +128,10 @@ exports.generateTableQRCodes = async (tables, outputDir = './qr-codes') => {
   }
 };
 
-// Genera QR code per frontend (ritorna data URL)
-exports.generateTableQRForFrontend = async (tableNumber) => {
+// Genera QR code per frontend (ritorna data URL, dalla cache in memoria se già disegnato)
+exports.generateTableQRForFrontend = async (tableNumber, tenant) => {
   try {
-    const qrData = `TABLE_${tableNumber}`;
+    const qrData = qrPayload({ tableNumber, tenant });
     const result = await exports.generateQRDataURL(qrData);
 
     if (result.success) {
@@ -160,7 +146,7 @@ exports.generateTableQRForFrontend = async (tableNumber) => {
     return result;
 
   } catch (error) {
-    console.error('Frontend QR Generation Error:', error);
+    log.error('Frontend QR Generation Error', { error });
     return {
       success: false,
       error: error.message
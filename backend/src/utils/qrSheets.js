@@ -0,0 +1,252 @@
+
+// Esportazione in streaming dei QR di tutti i tavoli: archivio ZIP di PNG oppure
+// foglio PDF A4 pronto per la stampa (12 codici per pagina, vettoriali, con etichetta).
+// I codici sono disegnati dalla pipeline qrAssets con una finestra limitata di
+// rendering in anticipo e scritti nella risposta rispettando la backpressure:
+// la memoria resta costante qualunque sia il numero di tavoli.
+const zlib = require('zlib');
+const { once } = require('events');
+const qrAssets = require('./qrAssets');
+const { qrPayload } = require('./tenants');
+
+// Rende gli elementi in ordine tenendo al massimo `window` rendering in corso
+async function* inOrder(items, render, window = qrAssets.options.concurrency) {
+  const inflight = [];
+  let next = 0;
+
+  while (next < items.length || inflight.length) {
+    while (next < items.length && inflight.length < window) {
+      const item = items[next++];
+      const rendering = render(item);
+      rendering.catch(() => {});
+      inflight.push({ item, rendering });
+    }
+
+    const { item, rendering } = inflight.shift();
+    yield { item, asset: await rendering };
+  }
+}
+
+// Scrive rispettando la backpressure; false se il client ha chiuso la connessione
+const write = async (res, chunk) => {
+  if (res.destroyed) return false;
+  if (!res.write(chunk)) {
+    await Promise.race([once(res, 'drain'), once(res, 'close')]);
+  }
+  return !res.destroyed;
+};
+
+const tableLabel = (table) => {
+  const label = `Tavolo ${table.tableNumber}`;
+  return table.name && table.name !== label ? `${label} - ${table.name}` : label;
+};
+
+// ---------------------------------------------------------------------------
+// ZIP (metodo "stored": i PNG sono già compressi)
+
+const CRC_TABLE = Array.from({ length: 256 }, (_, n) => {
+  let c = n;
+  for (let k = 0; k < 8; k++) {
+    c = c & 1 ? 0xEDB88320 ^ (c >>> 1) : c >>> 1;
+  }
+  return c >>> 0;
+});
+
+const crc32 = (buffer) => {
+  let crc = 0xFFFFFFFF;
+  for (let i = 0; i < buffer.length; i++) {
+    crc = CRC_TABLE[(crc ^ buffer[i]) & 0xFF] ^ (crc >>> 8);
+  }
+  return (crc ^ 0xFFFFFFFF) >>> 0;
+};
+
+const dosDateTime = (date) => ({
+  time: (date.getHours() << 11) | (date.getMinutes() << 5) | (date.getSeconds() >> 1),
+  date: ((date.getFullYear() - 1980) << 9) | ((date.getMonth() + 1) << 5) | date.getDate()
+});
+
+exports.streamZip = async (res, tables) => {
+  const { time, date } = dosDateTime(new Date());
+  const central = [];
+  let offset = 0;
+
+  for await (const { item, asset } of inOrder(tables, (table) => qrAssets.render(qrPayload(table), { format: 'png' }))) {
+    const name = Buffer.from(`table-${item.tableNumber}.png`);
+    const body = asset.body;
+    const crc = crc32(body);
+
+    const header = Buffer.alloc(30);
+    header.writeUInt32LE(0x04034b50, 0);
+    header.writeUInt16LE(20, 4);
+    header.writeUInt16LE(0x0800, 6);    // nomi UTF-8
+    header.writeUInt16LE(0, 8);         // stored
+    header.writeUInt16LE(time, 10);
+    header.writeUInt16LE(date, 12);
+    header.writeUInt32LE(crc, 14);
+    header.writeUInt32LE(body.length, 18);
+    header.writeUInt32LE(body.length, 22);
+    header.writeUInt16LE(name.length, 26);
+    header.writeUInt16LE(0, 28);
+
+    const entry = Buffer.alloc(46);
+    entry.writeUInt32LE(0x02014b50, 0);
+    entry.writeUInt16LE(20, 4);
+    entry.writeUInt16LE(20, 6);
+    entry.writeUInt16LE(0x0800, 8);
+    entry.writeUInt16LE(0, 10);
+    entry.writeUInt16LE(time, 12);
+    entry.writeUInt16LE(date, 14);
+    entry.writeUInt32LE(crc, 16);
+    entry.writeUInt32LE(body.length, 20);
+    entry.writeUInt32LE(body.length, 24);
+    entry.writeUInt16LE(name.length, 28);
+    entry.writeUInt32LE(offset, 42);
+    central.push(entry, name);
+
+    if (!await write(res, Buffer.concat([header, name, body]))) return;
+    offset += header.length + name.length + body.length;
+  }
+
+  const directory = Buffer.concat(central);
+  const end = Buffer.alloc(22);
+  end.writeUInt32LE(0x06054b50, 0);
+  end.writeUInt16LE(central.length / 2, 8);
+  end.writeUInt16LE(central.length / 2, 10);
+  end.writeUInt32LE(directory.length, 12);
+  end.writeUInt32LE(offset, 16);
+
+  await write(res, Buffer.concat([directory, end]));
+  res.end();
+};
+
+// ---------------------------------------------------------------------------
+// PDF (A4, griglia 3x4, moduli disegnati come rettangoli)
+
+const PAGE = { width: 595.28, height: 841.89, margin: 36 };
+const GRID = { columns: 3, rows: 4, qrSize: 140 };
+const FONT_SIZE = 10;
+
+const num = (value) => +value.toFixed(2);
+
+// Testo per Helvetica/WinAnsi: caratteri fuori da Latin-1 sostituiti, parentesi escapate
+const pdfText = (text) => Buffer.from(
+  String(text).replace(/[^\x20-\x7E\xA0-\xFF]/g, '?').replace(/([\\()])/g, '\\$1'),
+  'latin1'
+);
+
+// Moduli scuri come rettangoli, accorpando le sequenze orizzontali
+const drawModules = ({ size, data }, x, top, side) => {
+  const cell = side / size;
+  const ops = [];
+
+  for (let row = 0; row < size; row++) {
+    let col = 0;
+    while (col < size) {
+      if (!data[row * size + col]) {
+        col++;
+        continue;
+      }
+
+      const start = col;
+      while (col < size && data[row * size + col]) col++;
+      ops.push(`${num(x + start * cell)} ${num(top - (row + 1) * cell)} ${num((col - start) * cell)} ${num(cell)} re`);
+    }
+  }
+
+  ops.push('f');
+  return ops.join('\n');
+};
+
+const drawLabel = (text, centerX, y) => {
+  const bytes = pdfText(text);
+  // Larghezza stimata (Helvetica ~0.5 em per carattere) per centrare l'etichetta
+  const width = bytes.length * FONT_SIZE * 0.5;
+  return Buffer.concat([
+    Buffer.from(`BT /F1 ${FONT_SIZE} Tf ${num(centerX - width / 2)} ${num(y)} Td (`),
+    bytes,
+    Buffer.from(') Tj ET')
+  ]);
+};
+
+exports.streamPdf = async (res, tables) => {
+  const perPage = GRID.columns * GRID.rows;
+  const cellWidth = (PAGE.width - 2 * PAGE.margin) / GRID.columns;
+  const cellHeight = (PAGE.height - 2 * PAGE.margin) / GRID.rows;
+  // 1: catalogo, 2: albero pagine (scritto in fondo, quando le pagine sono note), 3: font
+  const offsets = [0];
+  const pages = [];
+  let position = 0;
+  let nextObject = 4;
+
+  const emit = async (chunk) => {
+    position += chunk.length;
+    return write(res, chunk);
+  };
+
+  const emitObject = async (id, ...parts) => {
+    offsets[id] = position;
+    return emit(Buffer.concat([Buffer.from(`${id} 0 obj\n`), ...parts, Buffer.from('\nendobj\n')]));
+  };
+
+  const emitPage = async (content) => {
+    const stream = zlib.deflateSync(Buffer.concat(content));
+    const contentId = nextObject++;
+    const pageId = nextObject++;
+    pages.push(pageId);
+
+    return await emitObject(contentId,
+      Buffer.from(`<< /Length ${stream.length} /Filter /FlateDecode >>\nstream\n`),
+      stream,
+      Buffer.from('\nendstream')
+    ) && emitObject(pageId, Buffer.from(
+      `<< /Type /Page /Parent 2 0 R /MediaBox [0 0 ${PAGE.width} ${PAGE.height}] ` +
+      `/Contents ${contentId} 0 R /Resources << /Font << /F1 3 0 R >> >> >>`
+    ));
+  };
+
+  await emit(Buffer.from('%PDF-1.4\n%\xE2\xE3\xCF\xD3\n', 'latin1'));
+  await emitObject(1, Buffer.from('<< /Type /Catalog /Pages 2 0 R >>'));
+  await emitObject(3, Buffer.from('<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>'));
+
+  let content = [];
+  let slot = 0;
+
+  for await (const { item, asset } of inOrder(tables, (table) => qrAssets.render(qrPayload(table), { format: 'modules' }))) {
+    const column = slot % GRID.columns;
+    const row = Math.floor(slot / GRID.columns);
+    const centerX = PAGE.margin + column * cellWidth + cellWidth / 2;
+    const top = PAGE.height - PAGE.margin - row * cellHeight - (cellHeight - GRID.qrSize - 2 * FONT_SIZE) / 2;
+
+    content.push(
+      Buffer.from(`${drawModules(asset.body, centerX - GRID.qrSize / 2, top, GRID.qrSize)}\n`),
+      drawLabel(tableLabel(item), centerX, top - GRID.qrSize - FONT_SIZE * 1.5),
+      Buffer.from('\n')
+    );
+
+    if (++slot === perPage) {
+      if (!await emitPage(content)) return;
+      content = [];
+      slot = 0;
+    }
+  }
+
+  // Anche senza tavoli il PDF deve avere almeno una pagina
+  if (slot > 0 || pages.length === 0) {
+    if (!await emitPage(content)) return;
+  }
+
+  await emitObject(2, Buffer.from(
+    `<< /Type /Pages /Kids [${pages.map(id => `${id} 0 R`).join(' ')}] /Count ${pages.length} >>`
+  ));
+
+  const xref = position;
+  const entries = Array.from({ length: nextObject - 1 }, (_, i) => `${String(offsets[i + 1]).padStart(10, '0')} 00000 n \n`);
+
+  await emit(Buffer.from(
+    `xref\n0 ${nextObject}\n0000000000 65535 f \n${entries.join('')}` +
+    `trailer\n<< /Size ${nextObject} /Root 1 0 R >>\nstartxref\n${xref}\n%%EOF\n`
+  ));
+  res.end();
+};
+
+exports.crc32 = crc32;
@@ -0,0 +1,35 @@
+
+// Rendering dei QR code: nel worker thread del pool asset QR oppure, con QR_WORKERS=0,
+// chiamato direttamente dal thread principale
+const { parentPort } = require('worker_threads');
+const QRCode = require('qrcode');
+
+// format: png (Buffer), svg (stringa), dataURL (stringa), modules (matrice per il PDF)
+const render = async ({ format, payload, options }) => {
+  switch (format) {
+    case 'png':
+      return QRCode.toBuffer(payload, { ...options, type: 'png' });
+    case 'svg':
+      return QRCode.toString(payload, { ...options, type: 'svg' });
+    case 'dataURL':
+      return QRCode.toDataURL(payload, options);
+    case 'modules': {
+      const { modules } = QRCode.create(payload, options);
+      return { size: modules.size, data: Uint8Array.from(modules.data) };
+    }
+    default:
+      throw new Error(`Formato QR non supportato: ${format}`);
+  }
+};
+
+if (parentPort) {
+  parentPort.on('message', async ({ id, ...task }) => {
+    try {
+      parentPort.postMessage({ id, result: await render(task) });
+    } catch (error) {
+      parentPort.postMessage({ id, error: error.message });
+    }
+  });
+}
+
+module.exports = { render };
@@ -0,0 +1,171 @@
+
+// Store del rate limiter a finestra scorrevole (sliding window counter): si contano
+// le richieste della finestra fissa corrente e della precedente, e la precedente pesa
+// in proporzione alla parte ancora coperta dalla finestra scorrevole.
+// hit(key, windowMs) registra una richiesta e ritorna { count, resetMs }.
+//   MemoryRateLimitStore   singolo processo
+//   ClusterRateLimitStore  worker del cluster: i contatori stanno nel processo primario (IPC)
+//   MongoRateLimitStore    condiviso tra processi e macchine
+const cluster = require('cluster');
+const RateLimitCounter = require('../models/RateLimitCounter');
+
+const windowOf = (now, windowMs) => Math.floor(now / windowMs) * windowMs;
+
+const slidingCount = (now, windowStart, windowMs, previous, current) => {
+  const weight = 1 - (now - windowStart) / windowMs;
+  return previous * weight + current;
+};
+
+class MemoryRateLimitStore {
+  constructor({ sweepMs = 60 * 1000 } = {}) {
+    this.entries = new Map();
+    this.sweepTimer = setInterval(() => this.sweep(), sweepMs);
+    this.sweepTimer.unref();
+  }
+
+  async hit(key, windowMs, now = Date.now()) {
+    return this.hitSync(key, windowMs, now);
+  }
+
+  hitSync(key, windowMs, now = Date.now()) {
+    const windowStart = windowOf(now, windowMs);
+    let entry = this.entries.get(key);
+
+    if (!entry || entry.windowStart !== windowStart) {
+      const previous = entry && entry.windowStart === windowStart - windowMs ? entry.current : 0;
+      entry = { windowStart, windowMs, previous, current: 0 };
+      this.entries.set(key, entry);
+    }
+
+    entry.current++;
+
+    return {
+      count: slidingCount(now, windowStart, windowMs, entry.previous, entry.current),
+      resetMs: windowStart + windowMs - now
+    };
+  }
+
+  // Rimuove le chiavi senza richieste nelle ultime due finestre
+  sweep(now = Date.now()) {
+    for (const [key, entry] of this.entries) {
+      if (entry.windowStart + 2 * entry.windowMs <= now) {
+        this.entries.delete(key);
+      }
+    }
+  }
+
+  async reset() {
+    this.entries.clear();
+  }
+
+  getMetrics() {
+    return { store: 'memory', keys: this.entries.size };
+  }
+}
+
+// Nei worker del cluster inoltra gli hit al primario, che li conta in uno store in
+// memoria comune (ClusterRateLimitStore.serve). Fuori da un cluster, o se il primario
+// non risponde entro timeoutMs, conta in locale.
+class ClusterRateLimitStore {
+  constructor({ timeoutMs = 1000 } = {}) {
+    this.timeoutMs = timeoutMs;
+    this.local = new MemoryRateLimitStore();
+    this.pending = new Map();
+    this.seq = 0;
+    this.stats = { forwarded: 0, fallbacks: 0 };
+
+    if (cluster.isWorker) {
+      process.on('message', (message) => {
+        if (!message || message.type !== 'rate-limit:result') return;
+
+        const request = this.pending.get(message.id);
+        if (request) {
+          this.pending.delete(message.id);
+          clearTimeout(request.timer);
+          request.resolve(message.result);
+        }
+      });
+    }
+  }
+
+  hit(key, windowMs) {
+    if (!cluster.isWorker || !process.connected) {
+      return this.local.hit(key, windowMs);
+    }
+
+    return new Promise((resolve) => {
+      const id = ++this.seq;
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        this.stats.fallbacks++;
+        resolve(this.local.hitSync(key, windowMs));
+      }, this.timeoutMs);
+      timer.unref();
+
+      this.pending.set(id, { resolve, timer });
+      this.stats.forwarded++;
+      process.send({ type: 'rate-limit:hit', id, key, windowMs });
+    });
+  }
+
+  async reset() {
+    await this.local.reset();
+  }
+
+  getMetrics() {
+    return { store: 'cluster', pending: this.pending.size, ...this.stats };
+  }
+
+  // Lato primario: risponde agli hit di tutti i worker con un unico store
+  static serve(clusterModule = cluster, store = new MemoryRateLimitStore()) {
+    clusterModule.on('message', (worker, message) => {
+      if (!message || message.type !== 'rate-limit:hit') return;
+
+      const result = store.hitSync(message.key, message.windowMs);
+      if (worker.isConnected()) {
+        worker.send({ type: 'rate-limit:result', id: message.id, result });
+      }
+    });
+
+    return store;
+  }
+}
+
+// Un documento per chiave e finestra: $inc atomico sulla corrente, lettura della precedente
+class MongoRateLimitStore {
+  constructor() {
+    this.stats = { hits: 0 };
+  }
+
+  async hit(key, windowMs, now = Date.now()) {
+    const windowStart = windowOf(now, windowMs);
+    this.stats.hits++;
+
+    const [current, previous] = await Promise.all([
+      RateLimitCounter.findOneAndUpdate(
+        { _id: `${key}|${windowStart}` },
+        {
+          $inc: { count: 1 },
+          $setOnInsert: { expiresAt: new Date(windowStart + 2 * windowMs) }
+        },
+        { upsert: true, new: true, lean: true }
+      ),
+      RateLimitCounter.findById(`${key}|${windowStart - windowMs}`).select('count').lean()
+    ]);
+
+    return {
+      count: slidingCount(now, windowStart, windowMs, previous ? previous.count : 0, current.count),
+      resetMs: windowStart + windowMs - now
+    };
+  }
+
+  async reset() {
+    await RateLimitCounter.deleteMany({});
+  }
+
+  getMetrics() {
+    return { store: 'mongo', ...this.stats };
+  }
+}
+
+module.exports = { MemoryRateLimitStore, ClusterRateLimitStore, MongoRateLimitStore };
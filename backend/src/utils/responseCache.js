@@ -0,0 +1,149 @@
+
+// Cache delle risposte pubbliche (classifica, ricerca QR). Ogni voce conserva il
+// JSON già serializzato in un Buffer e un ETag forte calcolato sul contenuto.
+// Una versione monotona per ristorante (tenant), incrementata dagli eventi del bus
+// tableEvents (punti, nome, eliminazione, modifiche massive), invalida in O(1) le
+// voci di quel ristorante: una voce è valida solo se creata con la versione corrente.
+// Gli eventi senza tenant incrementano l'epoca comune e invalidano tutto.
+// Con If-None-Match uguale all'ETag la risposta è un 304 senza corpo.
+const crypto = require('crypto');
+const LRUCache = require('./lruCache');
+const tableEvents = require('./tableEvents');
+const config = require('../config/config');
+
+// ETag dal contenuto: uguale tra processi diversi che servono lo stesso JSON
+const etagFor = (body) => `"${crypto.createHash('sha1').update(body).digest('base64url')}"`;
+
+class ResponseCache {
+  constructor(options = {}) {
+    this.options = { ...config.RESPONSE_CACHE, ...options };
+    this.entries = new LRUCache({ max: this.options.max });
+    this.building = new Map();
+    this.epoch = 0;
+    this.versions = new Map();
+    this.stats = {
+      hits: 0,
+      misses: 0,
+      notModified: 0,
+      bytesServed: 0,
+      bytesSaved: 0,
+      invalidations: 0
+    };
+  }
+
+  get enabled() {
+    return this.options.enabled;
+  }
+
+  // Versione corrente delle voci del tenant
+  versionOf(tenant) {
+    return `${this.epoch}.${this.versions.get(tenant) || 0}`;
+  }
+
+  bump(tenant) {
+    // Oltre maxTenants versioni si ricomincia da un'epoca nuova: scartare una sola
+    // versione la riporterebbe a 0 e renderebbe di nuovo valide le vecchie voci
+    if (tenant && (this.versions.has(tenant) || this.versions.size < config.TENANCY.maxTenants)) {
+      this.versions.set(tenant, (this.versions.get(tenant) || 0) + 1);
+    } else {
+      this.epoch++;
+      this.versions.clear();
+    }
+
+    this.stats.invalidations++;
+  }
+
+  // Voce valida per la chiave del tenant; build() produce il payload (null = non
+  // cacheabile). revision distingue stati diversi della sorgente a parità di versione
+  // (es. il motore classifica che applica una rilettura in ritardo).
+  async get(key, build, { tenant = config.TENANCY.defaultTenant, revision = 0 } = {}) {
+    const version = this.versionOf(tenant);
+    key = `${tenant}:${key}`;
+    const cached = this.entries.get(key);
+
+    if (cached && cached.version === version && cached.revision === revision) {
+      this.stats.hits++;
+      return cached;
+    }
+
+    this.stats.misses++;
+
+    // Richieste concorrenti sulla stessa chiave condividono una sola costruzione
+    const buildKey = `${key}|${version}|${revision}`;
+    if (this.building.has(buildKey)) {
+      return this.building.get(buildKey);
+    }
+
+    const building = (async () => {
+      const payload = await build();
+      if (payload === null) return null;
+
+      const body = Buffer.from(JSON.stringify(payload));
+      const entry = { version, revision, body, etag: etagFor(body) };
+
+      // Una modifica arrivata durante la costruzione rende la voce già vecchia
+      if (version === this.versionOf(tenant)) {
+        this.entries.set(key, entry);
+      }
+
+      return entry;
+    })().finally(() => {
+      this.building.delete(buildKey);
+    });
+
+    this.building.set(buildKey, building);
+    return building;
+  }
+
+  // Invia una voce con ETag e Cache-Control; 304 se il client ha già questa versione
+  send(req, res, entry) {
+    const { maxAge, sMaxAge, staleWhileRevalidate } = this.options;
+
+    res.set({
+      ETag: entry.etag,
+      'Cache-Control': `public, max-age=${maxAge}, s-maxage=${sMaxAge}, stale-while-revalidate=${staleWhileRevalidate}`
+    });
+    // Il ristorante può arrivare dall'header: CDN e browser tengono copie separate
+    res.vary(config.TENANCY.header);
+
+    // req.fresh confronta If-None-Match con l'ETag appena impostato
+    if (req.fresh) {
+      this.stats.notModified++;
+      this.stats.bytesSaved += entry.body.length;
+      return res.status(304).end();
+    }
+
+    this.stats.bytesServed += entry.body.length;
+    res.type('application/json').send(entry.body);
+  }
+
+  clear() {
+    this.entries.clear();
+    this.bump();
+  }
+
+  getMetrics() {
+    const lookups = this.stats.hits + this.stats.misses;
+
+    return {
+      enabled: this.enabled,
+      epoch: this.epoch,
+      tenants: this.versions.size,
+      entries: this.entries.size,
+      max: this.options.max,
+      evictions: this.entries.stats.evictions,
+      ...this.stats,
+      hitRatio: lookups ? this.stats.hits / lookups : 0
+    };
+  }
+}
+
+const responseCache = new ResponseCache();
+
+tableEvents.on('changed', (table) => responseCache.bump(table.tenant));
+tableEvents.on('stale', (tableId, tenant) => responseCache.bump(tenant));
+tableEvents.on('invalidated', (tenant) => responseCache.bump(tenant));
+
+module.exports = responseCache;
+module.exports.ResponseCache = ResponseCache;
+module.exports.etagFor = etagFor;
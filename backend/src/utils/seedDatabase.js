@@ -1,21 +1,20 @@
 
 // Popola il database con dati di esempio: utenti, tavoli e transazioni
-const mongoose = require('mongoose');
-const bcrypt = require('bcryptjs');
 require('dotenv').config();
+const { connect } = require('../config/database');
 
 // Import models
 const User = require('../models/User');
 const Table = require('../models/Table');
 const PointTransaction = require('../models/PointTransaction');
+const StatsRollup = require('../models/StatsRollup');
+const statsRollups = require('./statsRollups');
+const { tableSnapshot, cashierSnapshot } = require('./serializers');
 
-// Connessione database
+// Connessione database (stessa factory e opzioni pool del server)
 const connectDB = async () => {
   try {
-    await mongoose.connect(process.env.MONGODB_URI, {
-      useNewUrlParser: true,
-      useUnifiedTopology: true,
-    });
+    await connect();
     console.log('🗄️  MongoDB Connected for seeding');
   } catch (error) {
     console.error('❌ Database connection error:', error);
@@ -32,6 +31,7 @@ const seedData = async () => {
     await User.deleteMany({});
     await Table.deleteMany({});
     await PointTransaction.deleteMany({});
+    await StatsRollup.deleteMany({});
 
     console.log('🧹 Cleared existing data');
 
@@ -86,6 +86,8 @@ const seedData = async () => {
         PointTransaction.create({
           table: randomTable._id,
           assignedBy: randomUser._id,
+          tableSnapshot: tableSnapshot(randomTable),
+          assignedBySnapshot: cashierSnapshot(randomUser),
           points: randomPoints,
           type: 'EARNED',
           description: `Punti assegnati durante il seed - transazione ${i + 1}`,
@@ -99,6 +101,7 @@ const seedData = async () => {
     }
 
     await Promise.all(transactionPromises);
+    await statsRollups.stop();
     console.log('💰 Created sample transactions');
 
     console.log('\n✅ Database seeding completed successfully!');
@@ -0,0 +1,70 @@
+
+// Lettura lean: i controller leggono oggetti semplici (.lean() con proiezione) e li
+// completano qui in un solo passaggio con i campi calcolati che prima venivano dai
+// virtual di Mongoose (id, formattedQR) e con posizione/medaglia in classifica.
+const MEDALS = ['🥇', '🥈', '🥉'];
+
+// Campi di un tavolo esposti dalle API (recentBatches e __v esclusi)
+const TABLE_FIELDS = 'tenant tableNumber name qrCode points isActive lastPointsUpdate createdBy createdAt updatedAt';
+
+// Campi di una transazione nelle liste e nello storico
+const TRANSACTION_FIELDS = 'tenant table assignedBy tableSnapshot assignedBySnapshot points type description batchId batchIndex metadata createdAt updatedAt';
+
+const medalFor = (position) => (position <= MEDALS.length ? MEDALS[position - 1] : null);
+
+const serializeTable = (table) => ({
+  ...table,
+  id: String(table._id),
+  formattedQR: `TABLE_${table.tableNumber}`
+});
+
+const withPosition = (table, position) => ({
+  ...serializeTable(table),
+  position,
+  medal: medalFor(position)
+});
+
+// Tavoli già ordinati per classifica, a partire dalla posizione offset + 1
+const rankTables = (tables, offset = 0) => tables.map((table, index) => withPosition(table, offset + index + 1));
+
+// Istantanee di tavolo e cassiere salvate con ogni transazione al momento della
+// scrittura (numero e nome del tavolo di allora, anche se poi rinominato)
+const tableSnapshot = (table) => ({
+  tableNumber: table.tableNumber,
+  name: table.name
+});
+
+// Stessi campi del populate di assignedBy (username firstName lastName)
+const cashierSnapshot = (user) => ({
+  username: user.username,
+  firstName: user.firstName,
+  lastName: user.lastName
+});
+
+// Istantanea del cassiere da completare: assente, o scritta nella prima versione
+// (username e displayName, senza firstName/lastName)
+const needsCashierSnapshot = (snapshot) => !snapshot
+  || (snapshot.username !== undefined && snapshot.firstName === undefined);
+
+// Transazione lean con tavolo e cassiere negli stessi oggetti { _id, ... } dei
+// populate precedenti (table: tableNumber name; assignedBy: username firstName
+// lastName), ricavati dalle istantanee senza query aggiuntive
+const serializeTransaction = ({ tableSnapshot: table, assignedBySnapshot: assignedBy, ...transaction }) => ({
+  ...transaction,
+  table: { _id: transaction.table, ...table },
+  assignedBy: { _id: transaction.assignedBy, ...assignedBy }
+});
+
+module.exports = {
+  MEDALS,
+  TABLE_FIELDS,
+  TRANSACTION_FIELDS,
+  medalFor,
+  serializeTable,
+  withPosition,
+  rankTables,
+  tableSnapshot,
+  cashierSnapshot,
+  needsCashierSnapshot,
+  serializeTransaction
+};
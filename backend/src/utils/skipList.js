@@ -0,0 +1,169 @@
+
+// Skip list indicizzata (con span per livello): inserimento, rimozione e rank
+// in O(log n) atteso, iterazione ordinata in O(k). Struttura come zset di Redis.
+const MAX_LEVEL = 32;
+const P = 0.25;
+
+class Node {
+  constructor(key, level) {
+    this.key = key;
+    this.next = new Array(level).fill(null);
+    this.span = new Array(level).fill(0);
+  }
+}
+
+class IndexedSkipList {
+  constructor(compare) {
+    this.compare = compare;
+    this.clear();
+  }
+
+  clear() {
+    this.head = new Node(null, MAX_LEVEL);
+    this.level = 1;
+    this.length = 0;
+  }
+
+  randomLevel() {
+    let level = 1;
+    while (level < MAX_LEVEL && Math.random() < P) {
+      level++;
+    }
+    return level;
+  }
+
+  insert(key) {
+    const update = new Array(MAX_LEVEL);
+    const rank = new Array(MAX_LEVEL);
+    let x = this.head;
+
+    for (let i = this.level - 1; i >= 0; i--) {
+      rank[i] = i === this.level - 1 ? 0 : rank[i + 1];
+      while (x.next[i] && this.compare(x.next[i].key, key) < 0) {
+        rank[i] += x.span[i];
+        x = x.next[i];
+      }
+      update[i] = x;
+    }
+
+    const level = this.randomLevel();
+    if (level > this.level) {
+      for (let i = this.level; i < level; i++) {
+        rank[i] = 0;
+        update[i] = this.head;
+        update[i].span[i] = this.length;
+      }
+      this.level = level;
+    }
+
+    const node = new Node(key, level);
+    for (let i = 0; i < level; i++) {
+      node.next[i] = update[i].next[i];
+      update[i].next[i] = node;
+      node.span[i] = update[i].span[i] - (rank[0] - rank[i]);
+      update[i].span[i] = rank[0] - rank[i] + 1;
+    }
+
+    for (let i = level; i < this.level; i++) {
+      update[i].span[i]++;
+    }
+
+    this.length++;
+    return node;
+  }
+
+  // Rimuove la chiave (confronto === 0); ritorna true se trovata
+  remove(key) {
+    const update = new Array(MAX_LEVEL);
+    let x = this.head;
+
+    for (let i = this.level - 1; i >= 0; i--) {
+      while (x.next[i] && this.compare(x.next[i].key, key) < 0) {
+        x = x.next[i];
+      }
+      update[i] = x;
+    }
+
+    const node = x.next[0];
+    if (!node || this.compare(node.key, key) !== 0) {
+      return false;
+    }
+
+    for (let i = 0; i < this.level; i++) {
+      if (update[i].next[i] === node) {
+        update[i].span[i] += node.span[i] - 1;
+        update[i].next[i] = node.next[i];
+      } else {
+        update[i].span[i]--;
+      }
+    }
+
+    while (this.level > 1 && !this.head.next[this.level - 1]) {
+      this.level--;
+    }
+
+    this.length--;
+    return true;
+  }
+
+  // Posizione 1-based della chiave, 0 se assente
+  rank(key) {
+    let x = this.head;
+    let rank = 0;
+
+    for (let i = this.level - 1; i >= 0; i--) {
+      while (x.next[i] && this.compare(x.next[i].key, key) <= 0) {
+        rank += x.span[i];
+        x = x.next[i];
+      }
+
+      if (x !== this.head && this.compare(x.key, key) === 0) {
+        return rank;
+      }
+    }
+
+    return 0;
+  }
+
+  // Chiave alla posizione 1-based, undefined se fuori intervallo
+  at(position) {
+    if (position < 1 || position > this.length) return undefined;
+    return this.nodeAt(position).key;
+  }
+
+  // Primi `limit` elementi a partire dalla posizione `offset` (0-based)
+  slice(offset = 0, limit = this.length) {
+    const result = [];
+    let x = offset > 0 ? this.nodeAt(offset) : this.head;
+
+    while (x && (x = x.next[0]) && result.length < limit) {
+      result.push(x.key);
+    }
+
+    return result;
+  }
+
+  nodeAt(position) {
+    let x = this.head;
+    let traversed = 0;
+
+    for (let i = this.level - 1; i >= 0; i--) {
+      while (x.next[i] && traversed + x.span[i] <= position) {
+        traversed += x.span[i];
+        x = x.next[i];
+      }
+    }
+
+    return traversed === position ? x : null;
+  }
+
+  * [Symbol.iterator]() {
+    let x = this.head.next[0];
+    while (x) {
+      yield x.key;
+      x = x.next[0];
+    }
+  }
+}
+
+module.exports = IndexedSkipList;
@@ -0,0 +1,470 @@
+
+// Rollup statistiche: ogni transazione scritta incrementa i contatori orari del
+// suo ristorante (totale, cassiere, tavolo). Gli incrementi sono accumulati in memoria e scritti
+// con un unico bulkWrite a intervalli brevi; le letture fanno prima un flush.
+// Come nel ledger, ogni transazione contata è prima appesa a un segmento di spill
+// locale (uno per flush): all'avvio i segmenti rimasti da un crash vengono riapplicati.
+// Ogni flush ha un numero di sequenza per processo (spillId) salvato nei bucket che
+// aggiorna, così riapplicare un flush già scritto non conta due volte.
+// backfill() ricostruisce i rollup di un intervallo dalle transazioni esistenti.
+const fs = require('fs');
+const path = require('path');
+const StatsRollup = require('../models/StatsRollup');
+const config = require('../config/config');
+const { zonedDay, zonedMidnight, addDays, isHourAlignedTimeZone } = require('./helpers');
+const metrics = require('./metrics');
+const log = require('./logger').child('stats');
+
+const HOUR_MS = 60 * 60 * 1000;
+const DUPLICATE_KEY = 11000;
+
+const hourBucket = (date) => new Date(Math.floor(new Date(date).getTime() / HOUR_MS) * HOUR_MS);
+
+class StatsRollups {
+  constructor(options = {}) {
+    this.options = { ...config.STATS, ...options };
+    this.dir = path.resolve(this.options.spillDir, this.options.spillId);
+    // Campo dei bucket con l'ultimo seq applicato da questo processo
+    this.marker = `applied.${this.options.spillId.replace(/[.$]/g, '_')}`;
+    this.pending = new Map();
+    this.segment = null;
+    this.lastSeq = 0;
+    this.retained = [];
+    this.flushing = null;
+    this.timer = null;
+    this.stats = { recorded: 0, flushes: 0, failedFlushes: 0, upserts: 0, recovered: 0 };
+  }
+
+  // Accumula gli incrementi di una o più transazioni (e i contatori di /metrics)
+  record(transactions) {
+    transactions = [].concat(transactions);
+    metrics.recordTransactions(transactions);
+
+    const entries = transactions.map(toEntry);
+
+    // Append e accumulo nello stesso tick: il segmento corrente contiene esattamente
+    // le transazioni dei contatori che verranno presi dal prossimo flush
+    this.append(entries);
+
+    for (const entry of entries) {
+      accumulate(this.pending, entry);
+      this.stats.recorded++;
+    }
+
+    this.ensureTimer();
+  }
+
+  async flush() {
+    while (this.flushing) {
+      await this.flushing.catch(() => {});
+    }
+
+    if (!this.pending.size && !this.retained.length) return;
+
+    this.flushing = this.flushPending().finally(() => {
+      this.flushing = null;
+    });
+
+    return this.flushing;
+  }
+
+  async flushPending() {
+    if (this.pending.size) {
+      const segment = this.rotate();
+      this.retained.push({ seq: segment ? segment.seq : this.nextSeq(), counters: this.pending, segment });
+      this.pending = new Map();
+    }
+
+    // In ordine e ciascuno con il proprio seq: un flush fallito si ripete identico al
+    // giro successivo e i bucket già aggiornati lo ignorano
+    while (this.retained.length) {
+      const batch = this.retained[0];
+
+      try {
+        await this.apply(batch.seq, batch.counters);
+      } catch (error) {
+        this.stats.failedFlushes++;
+        log.error('Stats rollup flush error', { error });
+        throw error;
+      }
+
+      this.retained.shift();
+      this.stats.flushes++;
+      this.stats.upserts += batch.counters.size;
+
+      if (batch.segment) {
+        await this.removeSegment(batch.segment);
+      }
+      await this.saveSeq(batch.seq);
+    }
+  }
+
+  // Applica i contatori di un flush. Il filtro esclude i bucket che hanno già questo
+  // seq (o uno successivo) per lo stesso spillId: l'upsert fallisce allora con chiave
+  // duplicata. Un duplicato può essere anche l'upsert concorrente di un altro processo:
+  // le operazioni duplicate si ripetono una volta, e un secondo duplicato vuol dire
+  // bucket già aggiornato.
+  async apply(seq, counters) {
+    const applied = this.marker;
+    let operations = [...counters].map(([id, counter]) => ({
+      updateOne: {
+        filter: { _id: id, [applied]: { $not: { $gte: seq } } },
+        update: {
+          $inc: { count: counter.count, points: counter.points },
+          $set: { [applied]: seq },
+          $setOnInsert: {
+            tenant: counter.tenant,
+            dimension: counter.dimension,
+            key: counter.key,
+            type: counter.type,
+            bucket: counter.bucket
+          }
+        },
+        upsert: true
+      }
+    }));
+
+    for (let attempt = 0; operations.length; attempt++) {
+      try {
+        await StatsRollup.bulkWrite(operations, { ordered: false });
+        return;
+      } catch (error) {
+        const writeErrors = error.writeErrors || [];
+        const duplicates = writeErrors.filter((writeError) => (writeError.code || writeError.err?.code) === DUPLICATE_KEY);
+
+        if (!writeErrors.length || duplicates.length < writeErrors.length) throw error;
+        if (attempt > 0) return;
+
+        operations = duplicates.map((writeError) => operations[writeError.index]);
+      }
+    }
+  }
+
+  // Riapplica i segmenti di spill lasciati da un processo precedente (stesso spillId)
+  async recover() {
+    await fs.promises.mkdir(this.dir, { recursive: true });
+    await this.loadSeq();
+
+    const files = (await fs.promises.readdir(this.dir))
+      .filter((file) => file.endsWith('.jsonl'))
+      .filter((file) => !this.segment || path.join(this.dir, file) !== this.segment.path)
+      .sort((a, b) => seqOf(a) - seqOf(b));
+
+    let recovered = 0;
+
+    for (const file of files) {
+      const filePath = path.join(this.dir, file);
+      const content = await fs.promises.readFile(filePath, 'utf8');
+      const counters = new Map();
+
+      for (const line of content.split('\n').filter(Boolean)) {
+        try {
+          accumulate(counters, reviveEntry(JSON.parse(line)));
+          recovered++;
+        } catch (error) {
+          // Riga troncata da un crash durante la scrittura
+        }
+      }
+
+      const seq = seqOf(file);
+      this.lastSeq = Math.max(this.lastSeq, seq);
+      await this.apply(seq, counters);
+      await fs.promises.unlink(filePath);
+      await this.saveSeq(seq);
+    }
+
+    this.stats.recovered += recovered;
+    return recovered;
+  }
+
+  // Da chiamare prima di scrivere transazioni (e prima del recupero del ledger): i
+  // flush attendono il recupero, che applica i seq più vecchi
+  async start() {
+    if (!isHourAlignedTimeZone(this.options.timeZone)) {
+      log.warn('STATS_TIMEZONE senza offset di ore intere: i giorni possono spostarsi fino a 45 minuti', {
+        timeZone: this.options.timeZone
+      });
+    }
+
+    this.flushing = this.recover().finally(() => {
+      this.flushing = null;
+    });
+
+    const recovered = await this.flushing;
+    if (recovered) {
+      log.info('Stats rollup: transazioni recuperate dallo spill', { recovered });
+    }
+  }
+
+  ensureTimer() {
+    if (this.timer) return;
+
+    this.timer = setInterval(() => {
+      this.flush().catch(() => {});
+    }, this.options.rollupFlushMs);
+    this.timer.unref();
+  }
+
+  async stop() {
+    if (this.timer) {
+      clearInterval(this.timer);
+      this.timer = null;
+    }
+
+    await this.flush();
+  }
+
+  // Seq crescente anche tra riavvii dello stesso spillId: l'ultimo applicato resta su
+  // disco, così un orologio tornato indietro non genera seq già visti dai bucket
+  nextSeq() {
+    this.lastSeq = Math.max(this.lastSeq + 1, Date.now());
+    return this.lastSeq;
+  }
+
+  async loadSeq() {
+    try {
+      const saved = Number(await fs.promises.readFile(path.join(this.dir, 'seq'), 'utf8'));
+      this.lastSeq = Math.max(this.lastSeq, saved || 0);
+    } catch (error) {
+      if (error.code !== 'ENOENT') throw error;
+    }
+  }
+
+  async saveSeq(seq) {
+    await fs.promises.writeFile(path.join(this.dir, 'seq'), String(seq));
+  }
+
+  append(entries) {
+    if (!entries.length) return;
+
+    if (!this.segment) {
+      this.segment = this.openSegment();
+    }
+
+    this.segment.stream.write(entries.map((entry) => `${JSON.stringify(entry)}\n`).join(''));
+  }
+
+  openSegment() {
+    fs.mkdirSync(this.dir, { recursive: true });
+
+    const seq = this.nextSeq();
+    const segmentPath = path.join(this.dir, `rollups-${seq}.jsonl`);
+    const stream = fs.createWriteStream(segmentPath, { flags: 'a' });
+    const closed = new Promise((resolve) => stream.once('close', resolve));
+
+    stream.on('error', (error) => {
+      log.error('Stats rollup spill error', { error });
+    });
+
+    return { seq, path: segmentPath, stream, closed };
+  }
+
+  // Chiude il segmento corrente: le nuove transazioni andranno in un nuovo file
+  rotate() {
+    const segment = this.segment;
+    this.segment = null;
+
+    if (segment) {
+      segment.stream.end();
+    }
+
+    return segment;
+  }
+
+  async removeSegment(segment) {
+    if (!segment.stream.writableEnded) {
+      segment.stream.end();
+    }
+    await segment.closed;
+
+    await fs.promises.unlink(segment.path).catch((error) => {
+      if (error.code !== 'ENOENT') throw error;
+    });
+  }
+
+  // Statistiche di un intervallo: totali per tipo e dettaglio per giorno/ora
+  async getStats({ tenant = config.TENANCY.defaultTenant, dimension = 'all', key = null, from, to, timeZone, unit = 'day' }) {
+    await this.flush();
+
+    const rows = await StatsRollup.summarize({ tenant, dimension, key, from, to, timeZone, unit });
+    const periods = new Map();
+    const byType = new Map();
+
+    for (const row of rows) {
+      const { period, type } = row._id;
+      const entry = periods.get(period) || { period, ...emptyTotals() };
+      addToTotals(entry, type, row);
+      periods.set(period, entry);
+
+      const typeTotals = byType.get(type) || { _id: type, totalPoints: 0, transactionCount: 0 };
+      typeTotals.totalPoints += row.totalPoints;
+      typeTotals.transactionCount += row.transactionCount;
+      byType.set(type, typeTotals);
+    }
+
+    const totals = emptyTotals();
+    for (const typeTotals of byType.values()) {
+      addToTotals(totals, typeTotals._id, typeTotals);
+    }
+
+    return { totals, byType: [...byType.values()], periods: [...periods.values()] };
+  }
+
+  // Ricostruisce i rollup di un ristorante in [from, to) dalle transazioni (bucket
+  // orari interi). Da eseguire su intervalli passati o con traffico fermo: gli
+  // incrementi live concorrenti sull'intervallo verrebbero sovrascritti.
+  async backfill({ tenant = config.TENANCY.defaultTenant, from = new Date(0), to = new Date() } = {}) {
+    const PointTransaction = require('../models/PointTransaction');
+    const start = hourBucket(from);
+    const end = new Date(hourBucket(to).getTime() + HOUR_MS);
+    const range = { tenant, bucket: { $gte: start, $lt: end } };
+
+    // Le transazioni senza tenant (precedenti alla migrazione) sono del ristorante di default
+    const transactionTenant = tenant === config.TENANCY.defaultTenant ? { $in: [tenant, null] } : tenant;
+
+    await this.flush();
+    await StatsRollup.deleteMany(range);
+
+    const keys = { all: null, cashier: '$assignedBy', table: '$table' };
+
+    for (const [dimension, key] of Object.entries(keys)) {
+      await PointTransaction.aggregate([
+        { $match: { tenant: transactionTenant, createdAt: { $gte: start, $lt: end } } },
+        {
+          $group: {
+            _id: {
+              tenant: '$tenant',
+              key,
+              type: '$type',
+              bucket: { $dateTrunc: { date: '$createdAt', unit: 'hour' } }
+            },
+            count: { $sum: 1 },
+            points: { $sum: '$points' }
+          }
+        },
+        {
+          $project: {
+            _id: {
+              $concat: [
+                { $ifNull: ['$_id.tenant', config.TENANCY.defaultTenant] }, '|',
+                dimension, '|',
+                key ? { $toString: '$_id.key' } : '*', '|',
+                '$_id.type', '|',
+                { $dateToString: { date: '$_id.bucket', format: '%Y-%m-%dT%H:%M:%S.%LZ' } }
+              ]
+            },
+            tenant: { $ifNull: ['$_id.tenant', config.TENANCY.defaultTenant] },
+            dimension: { $literal: dimension },
+            key: '$_id.key',
+            type: '$_id.type',
+            bucket: '$_id.bucket',
+            count: 1,
+            points: 1
+          }
+        },
+        {
+          $merge: {
+            into: StatsRollup.collection.collectionName,
+            whenMatched: 'replace',
+            whenNotMatched: 'insert'
+          }
+        }
+      ]).allowDiskUse(true);
+    }
+
+    return StatsRollup.countDocuments(range);
+  }
+
+  getMetrics() {
+    return {
+      pendingCounters: this.pending.size,
+      retainedFlushes: this.retained.length,
+      ...this.stats
+    };
+  }
+}
+
+// Campi di una transazione che contano per i rollup (una riga dello spill)
+const toEntry = (transaction) => ({
+  tenant: transaction.tenant || config.TENANCY.defaultTenant,
+  assignedBy: transaction.assignedBy?._id || transaction.assignedBy,
+  table: transaction.table?._id || transaction.table,
+  type: transaction.type,
+  points: transaction.points,
+  createdAt: transaction.createdAt || new Date()
+});
+
+const reviveEntry = (entry) => ({ ...entry, createdAt: new Date(entry.createdAt) });
+
+const accumulate = (counters, entry) => {
+  const bucket = hourBucket(entry.createdAt);
+  const dimensions = [
+    ['all', null],
+    ['cashier', entry.assignedBy],
+    ['table', entry.table]
+  ];
+
+  for (const [dimension, key] of dimensions) {
+    const id = StatsRollup.rollupId(entry.tenant, dimension, key, entry.type, bucket);
+    const counter = counters.get(id);
+
+    if (counter) {
+      counter.count++;
+      counter.points += entry.points;
+    } else {
+      counters.set(id, { tenant: entry.tenant, dimension, key, type: entry.type, bucket, count: 1, points: entry.points });
+    }
+  }
+};
+
+const seqOf = (file) => Number(file.slice('rollups-'.length, -'.jsonl'.length));
+
+const emptyTotals = () => ({
+  totalTransactions: 0,
+  pointsEarned: 0,
+  pointsRedeemed: 0,
+  pointsAdjusted: 0,
+  netPoints: 0
+});
+
+const addToTotals = (totals, type, { transactionCount, totalPoints }) => {
+  totals.totalTransactions += transactionCount;
+
+  if (type === 'EARNED') {
+    totals.pointsEarned += totalPoints;
+  } else if (type === 'REDEEMED') {
+    totals.pointsRedeemed += totalPoints;
+  } else {
+    totals.pointsAdjusted += totalPoints;
+  }
+
+  totals.netPoints = totals.pointsEarned - totals.pointsRedeemed;
+};
+
+// Intervallo di giorni [from, to] nel fuso indicato come istanti [from, to).
+// Senza date: gli ultimi defaultDays giorni fino a oggi. null se non valido.
+const resolveRange = ({ date, from, to, tz } = {}, defaultDays = 1) => {
+  const timeZone = tz || config.STATS.timeZone;
+  const today = zonedDay(new Date(), timeZone);
+  const toDay = to || date || today;
+  const fromDay = from || date || addDays(toDay, -(defaultDays - 1));
+
+  const days = Math.round((Date.parse(toDay) - Date.parse(fromDay)) / (24 * 60 * 60 * 1000)) + 1;
+  if (days < 1 || days > config.STATS.maxRangeDays) {
+    return null;
+  }
+
+  return {
+    fromDay,
+    toDay,
+    days,
+    timeZone,
+    from: zonedMidnight(fromDay, timeZone),
+    to: zonedMidnight(addDays(toDay, 1), timeZone)
+  };
+};
+
+module.exports = new StatsRollups();
+module.exports.StatsRollups = StatsRollups;
+module.exports.hourBucket = hourBucket;
+module.exports.resolveRange = resolveRange;
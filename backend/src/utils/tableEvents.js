@@ -0,0 +1,14 @@
+
+// Bus eventi dei tavoli: notifica i componenti in memoria (classifica, cache)
+// delle modifiche fatte attraverso il modello Table.
+//   'changed'     (table)           stato completo e aggiornato di un tavolo (con tenant)
+//   'stale'       (tableId, tenant) il tavolo è cambiato ma lo stato va riletto
+//                                   (tenant assente se non noto)
+//   'invalidated' (tenant)          modifica massiva di un ristorante; senza tenant
+//                                   ricaricare tutto
+const { EventEmitter } = require('events');
+
+const tableEvents = new EventEmitter();
+tableEvents.setMaxListeners(50);
+
+module.exports = tableEvents;
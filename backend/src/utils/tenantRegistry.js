@@ -0,0 +1,85 @@
+// Ristoranti esistenti: tenant con almeno un tavolo, letti da Mongo e tenuti in
+// memoria (aggiornati dagli eventi dei tavoli). Le letture pubbliche accettano solo questi, così un X-Tenant
+// inventato non crea classifiche, versioni di cache o contatori di rate limit.
+// Un tenant sconosciuto provoca al più una rilettura ogni refreshMs (condivisa tra le
+// richieste concorrenti), non una query per richiesta.
+const config = require('../config/config');
+const tableEvents = require('./tableEvents');
+const { defaultTenant } = require('./tenants');
+const log = require('./logger').child('tenants');
+
+class TenantRegistry {
+  constructor(options = {}) {
+    this.options = { ...config.TENANCY, ...options };
+    this.known = new Set([defaultTenant()]);
+    this.loadedAt = 0;
+    this.loading = null;
+    this.stats = { loads: 0, rejected: 0 };
+  }
+
+  async isKnown(tenant) {
+    if (this.known.has(tenant)) {
+      return true;
+    }
+
+    if (Date.now() - this.loadedAt >= this.options.registryRefreshMs) {
+      await this.load();
+    }
+
+    if (this.known.has(tenant)) {
+      return true;
+    }
+
+    this.stats.rejected++;
+    return false;
+  }
+
+  load() {
+    if (this.loading) {
+      return this.loading;
+    }
+
+    this.loading = (async () => {
+      const Table = require('../models/Table');
+      const tenants = await Table.distinct('tenant');
+
+      this.known = new Set([defaultTenant(), ...tenants]);
+      this.loadedAt = Date.now();
+      this.stats.loads++;
+    })().catch((error) => {
+      log.error('Tenant registry load error', { error });
+      throw error;
+    }).finally(() => {
+      this.loading = null;
+    });
+
+    return this.loading;
+  }
+
+  add(tenant) {
+    if (tenant) this.known.add(tenant);
+  }
+
+  // Inserimenti massivi senza stato: il prossimo tenant sconosciuto rilegge subito
+  expire() {
+    this.loadedAt = 0;
+  }
+
+  getMetrics() {
+    return {
+      tenants: this.known.size,
+      loadedAt: this.loadedAt ? new Date(this.loadedAt).toISOString() : null,
+      ...this.stats
+    };
+  }
+}
+
+const tenantRegistry = new TenantRegistry();
+
+tableEvents.on('changed', (table) => tenantRegistry.add(table.tenant));
+tableEvents.on('invalidated', (tenant) => {
+  if (!tenant) tenantRegistry.expire();
+});
+
+module.exports = tenantRegistry;
+module.exports.TenantRegistry = TenantRegistry;
@@ -0,0 +1,47 @@
+
+// Tenant (ristorante): identificato da uno slug minuscolo presente su tavoli, utenti,
+// transazioni e rollup. Il payload dei QR stampati porta il tenant come prefisso
+// ("trattoria-roma:TABLE_5"); i QR senza prefisso appartengono al tenant di default,
+// così i codici già stampati di un'installazione a ristorante singolo restano validi.
+const config = require('../config/config');
+
+const TENANT_PATTERN = /^[a-z0-9][a-z0-9-]{0,39}$/;
+const QR_PATTERN = /^(?:([a-z0-9][a-z0-9-]{0,39}):)?(TABLE_\d+)$/i;
+
+const defaultTenant = () => config.TENANCY.defaultTenant;
+
+// Slug normalizzato oppure null se non valido
+const normalizeTenant = (value) => {
+  if (typeof value !== 'string') return null;
+
+  const tenant = value.trim().toLowerCase();
+  return TENANT_PATTERN.test(tenant) ? tenant : null;
+};
+
+// Scompone il payload di un QR: { tenant, qrCode } oppure null se non valido.
+// Senza prefisso il tenant è quello della richiesta (token o default).
+const parseQR = (payload, fallbackTenant = defaultTenant()) => {
+  const match = QR_PATTERN.exec(String(payload || '').trim());
+  if (!match) return null;
+
+  return {
+    tenant: match[1] ? match[1].toLowerCase() : fallbackTenant,
+    qrCode: match[2].toUpperCase()
+  };
+};
+
+// Payload da codificare nel QR di un tavolo
+const qrPayload = (table) => {
+  const tenant = table.tenant || defaultTenant();
+  const qrCode = table.qrCode || `${config.QR_CODE_PREFIX}${table.tableNumber}`;
+  return tenant === defaultTenant() ? qrCode : `${tenant}:${qrCode}`;
+};
+
+module.exports = {
+  TENANT_PATTERN,
+  QR_PATTERN,
+  defaultTenant,
+  normalizeTenant,
+  parseQR,
+  qrPayload
+};
@@ -0,0 +1,79 @@
+// Riepilogo delle trace esportate su file: per ogni span (middleware, controller,
+// operazione Mongo) numero di occorrenze e durata p50/p99/max, ordinati per tempo
+// totale. Serve a trovare la fase lenta di una route senza un servizio esterno.
+// Uso: npm run traces:report -- [--file ./data/traces.jsonl] [--route "POST /api/points/add"]
+require('dotenv').config();
+const fs = require('fs');
+const readline = require('readline');
+const config = require('../config/config');
+
+const readArg = (name) => {
+  const index = process.argv.indexOf(`--${name}`);
+  return index !== -1 ? process.argv[index + 1] : undefined;
+};
+
+const percentile = (sorted, p) => sorted[Math.min(sorted.length - 1, Math.floor(sorted.length * p))];
+
+const durationMs = (span) => Number(BigInt(span.endTimeUnixNano) - BigInt(span.startTimeUnixNano)) / 1e6;
+
+const summarize = async (file, route) => {
+  const durations = new Map();
+  let traces = 0;
+
+  const lines = readline.createInterface({ input: fs.createReadStream(file), crlfDelay: Infinity });
+
+  for await (const line of lines) {
+    if (!line.trim()) continue;
+
+    const spans = JSON.parse(line).resourceSpans
+      .flatMap(resource => resource.scopeSpans)
+      .flatMap(scope => scope.spans);
+
+    // Filtro sulla route: nome dello span radice (SERVER)
+    const root = spans.find(span => span.kind === 2);
+    if (route && (!root || root.name !== route)) continue;
+
+    traces++;
+    for (const span of spans) {
+      if (!durations.has(span.name)) durations.set(span.name, []);
+      durations.get(span.name).push(durationMs(span));
+    }
+  }
+
+  const rows = [...durations].map(([name, values]) => {
+    const sorted = values.sort((a, b) => a - b);
+    const total = sorted.reduce((sum, value) => sum + value, 0);
+
+    return {
+      span: name,
+      count: sorted.length,
+      totalMs: +total.toFixed(2),
+      p50Ms: +percentile(sorted, 0.5).toFixed(2),
+      p99Ms: +percentile(sorted, 0.99).toFixed(2),
+      maxMs: +sorted[sorted.length - 1].toFixed(2)
+    };
+  });
+
+  return { traces, rows: rows.sort((a, b) => b.totalMs - a.totalMs) };
+};
+
+const runReport = async () => {
+  try {
+    const file = readArg('file') || config.TRACING.file;
+    const { traces, rows } = await summarize(file, readArg('route'));
+
+    console.log(`🔍 ${traces} trace in ${file}`);
+    console.table(rows);
+    process.exit(0);
+  } catch (error) {
+    console.error('❌ Trace report error:', error);
+    process.exit(1);
+  }
+};
+
+// Esegui se chiamato direttamente
+if (require.main === module) {
+  runReport();
+}
+
+module.exports = { summarize };
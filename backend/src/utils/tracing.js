@@ -0,0 +1,382 @@
+
+// Tracing delle richieste compatibile con OpenTelemetry (trace/span id W3C, header
+// traceparent, esportazione in formato OTLP/JSON) senza dipendenze esterne.
+// Il contesto viaggia con AsyncLocalStorage: uno span radice per richiesta, uno per
+// ogni middleware e controller delle route (instrumentRouter) e uno per ogni operazione
+// Mongo (plugin mongoose su query, aggregate e save).
+// Campionamento: il flag "sampled" di un traceparent in ingresso vince; altrimenti una
+// frazione sampleRate delle richieste. Con slowMs > 0 ogni richiesta registra i
+// propri span e a fine risposta si tengono anche le lente (>= slowMs) e quelle in
+// errore (5xx). Esportazione: file JSON lines (una riga OTLP per trace) o console.
+const crypto = require('crypto');
+const fs = require('fs');
+const path = require('path');
+const { AsyncLocalStorage } = require('async_hooks');
+const mongoose = require('mongoose');
+const config = require('../config/config');
+
+const SPAN_KIND = { INTERNAL: 1, SERVER: 2, CLIENT: 3 };
+const STATUS = { UNSET: 0, OK: 1, ERROR: 2 };
+const TRACEPARENT = /^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$/;
+
+const randomId = (bytes) => crypto.randomBytes(bytes).toString('hex');
+
+const attributeValue = (value) => (Number.isInteger(value)
+  ? { intValue: String(value) }
+  : typeof value === 'number' ? { doubleValue: value } : { stringValue: String(value) });
+
+class Span {
+  constructor(trace, name, { parentSpanId = null, kind = SPAN_KIND.INTERNAL, attributes = {} } = {}) {
+    this.trace = trace;
+    this.spanId = randomId(8);
+    this.parentSpanId = parentSpanId;
+    this.name = name;
+    this.kind = kind;
+    this.attributes = attributes;
+    this.start = process.hrtime.bigint();
+    this.end = null;
+    this.status = { code: STATUS.UNSET };
+
+    trace.spans.push(this);
+    trace.open.add(this);
+  }
+
+  get durationMs() {
+    return this.end === null ? 0 : Number(this.end - this.start) / 1e6;
+  }
+
+  setAttribute(key, value) {
+    this.attributes[key] = value;
+  }
+
+  finish(error) {
+    if (this.end !== null) return;
+
+    this.end = process.hrtime.bigint();
+    this.trace.open.delete(this);
+
+    if (error) {
+      this.status = { code: STATUS.ERROR, message: error.message || String(error) };
+    }
+  }
+
+  // Span in formato OTLP/JSON
+  toOTLP() {
+    const unixNano = (hr) => (this.trace.epochNs + (hr - this.trace.startHr)).toString();
+
+    return {
+      traceId: this.trace.traceId,
+      spanId: this.spanId,
+      ...(this.parentSpanId && { parentSpanId: this.parentSpanId }),
+      name: this.name,
+      kind: this.kind,
+      startTimeUnixNano: unixNano(this.start),
+      endTimeUnixNano: unixNano(this.end ?? this.start),
+      attributes: Object.entries(this.attributes).map(([key, value]) => ({ key, value: attributeValue(value) })),
+      status: this.status
+    };
+  }
+}
+
+// Esportatore su file: una riga JSON (OTLP resourceSpans) per trace, scrittura asincrona
+class FileExporter {
+  constructor(file) {
+    this.file = file;
+    this.stream = null;
+  }
+
+  export(payload) {
+    if (!this.stream) {
+      fs.mkdirSync(path.dirname(this.file), { recursive: true });
+      this.stream = fs.createWriteStream(this.file, { flags: 'a' });
+      this.stream.on('error', (error) => console.error('Trace exporter error:', error.message));
+    }
+
+    this.stream.write(`${JSON.stringify(payload)}\n`);
+  }
+
+  close() {
+    return new Promise((resolve) => (this.stream ? this.stream.end(resolve) : resolve()));
+  }
+}
+
+// Esportatore su console: albero degli span con le durate, per lo sviluppo locale
+class ConsoleExporter {
+  export(payload, trace) {
+    const depth = new Map([[null, -1]]);
+    const lines = trace.spans.map((span) => {
+      const level = (depth.get(span.parentSpanId) ?? -1) + 1;
+      depth.set(span.spanId, level);
+      const failed = span.status.code === STATUS.ERROR ? ' ❌' : '';
+      return `${'  '.repeat(level)}${span.name} ${span.durationMs.toFixed(2)}ms${failed}`;
+    });
+
+    console.log(`🔍 trace ${trace.traceId}\n${lines.join('\n')}`);
+  }
+
+  close() {
+    return Promise.resolve();
+  }
+}
+
+class Tracer {
+  constructor(options = {}) {
+    this.options = { ...config.TRACING, ...options };
+    this.storage = new AsyncLocalStorage();
+    this.exporter = this.options.exporter === 'console'
+      ? new ConsoleExporter()
+      : new FileExporter(this.options.file);
+    this.stats = { requests: 0, recorded: 0, exported: 0, keptSlow: 0, keptError: 0 };
+    this.handlerNames = new WeakMap();
+  }
+
+  get enabled() {
+    return this.options.enabled;
+  }
+
+  // Contesto { trace, span } corrente, se la richiesta sta registrando
+  current() {
+    const context = this.storage.getStore();
+    return context && context.trace.recording ? context : null;
+  }
+
+  currentTraceId() {
+    const context = this.storage.getStore();
+    return context ? context.trace.traceId : null;
+  }
+
+  // Span figlio dello span corrente; null (costo nullo) se la richiesta non registra
+  startSpan(name, attributes = {}, kind = SPAN_KIND.INTERNAL) {
+    const context = this.current();
+    if (!context) return null;
+
+    return new Span(context.trace, name, { parentSpanId: context.span.spanId, kind, attributes });
+  }
+
+  // Middleware radice: decide il campionamento e apre lo span della richiesta
+  middleware() {
+    return (req, res, next) => {
+      if (!this.enabled) return next();
+
+      this.stats.requests++;
+      const parent = TRACEPARENT.exec(req.get('traceparent') || '');
+      const sampled = parent ? (parseInt(parent[3], 16) & 1) === 1 : Math.random() < this.options.sampleRate;
+
+      const trace = {
+        traceId: parent ? parent[1] : randomId(16),
+        sampled,
+        recording: sampled || this.options.slowMs > 0,
+        spans: [],
+        open: new Set(),
+        startHr: process.hrtime.bigint(),
+        epochNs: BigInt(Date.now()) * 1000000n
+      };
+
+      req.traceId = trace.traceId;
+      res.set('X-Trace-Id', trace.traceId);
+
+      if (!trace.recording) {
+        return this.storage.run({ trace, span: null }, next);
+      }
+
+      this.stats.recorded++;
+      const root = new Span(trace, `${req.method} ${req.path}`, {
+        parentSpanId: parent ? parent[2] : null,
+        kind: SPAN_KIND.SERVER,
+        attributes: { 'http.request.method': req.method, 'url.path': req.originalUrl }
+      });
+
+      let done = false;
+      const finish = () => {
+        if (done) return;
+        done = true;
+
+        if (req.route) {
+          root.name = `${req.method} ${req.baseUrl}${req.route.path}`;
+          root.setAttribute('http.route', `${req.baseUrl}${req.route.path}`);
+        }
+        root.setAttribute('http.response.status_code', res.statusCode);
+        if (res.statusCode >= 500) root.status = { code: STATUS.ERROR };
+
+        // Span rimasti aperti (middleware che hanno risposto senza next) chiusi con la risposta
+        for (const span of [...trace.open]) span.finish();
+        this.keep(trace, root);
+      };
+
+      res.once('finish', finish);
+      res.once('close', finish);
+      this.storage.run({ trace, span: root }, next);
+    };
+  }
+
+  keep(trace, root) {
+    let kept = trace.sampled;
+
+    if (!kept && this.options.slowMs > 0 && root.durationMs >= this.options.slowMs) {
+      kept = true;
+      this.stats.keptSlow++;
+    }
+
+    if (!kept && root.status.code === STATUS.ERROR) {
+      kept = true;
+      this.stats.keptError++;
+    }
+
+    if (kept) {
+      this.export(trace);
+    }
+  }
+
+  export(trace) {
+    this.stats.exported++;
+    this.exporter.export({
+      resourceSpans: [{
+        resource: {
+          attributes: [
+            { key: 'service.name', value: { stringValue: this.options.serviceName } },
+            { key: 'process.pid', value: { intValue: String(process.pid) } }
+          ]
+        },
+        scopeSpans: [{
+          scope: { name: 'qr-tavoli-tracing' },
+          spans: trace.spans.map(span => span.toOTLP())
+        }]
+      }]
+    }, trace);
+  }
+
+  // Nomi degli span dai moduli di middleware e controller: gli handler sono arrow
+  // function assegnate a exports.x, senza un name proprio. Le catene di validazione
+  // (array) prendono il nome dell'array
+  nameHandlers(...modules) {
+    for (const module of modules) {
+      for (const [key, value] of Object.entries(module)) {
+        [].concat(value)
+          .filter(handle => typeof handle === 'function')
+          .forEach(handle => this.handlerNames.set(handle, key));
+      }
+    }
+  }
+
+  // Avvolge ogni handler delle route di un router in uno span (middleware o controller).
+  // Lo span si chiude quando l'handler chiama next() o quando la sua promise termina;
+  // next() prosegue nel contesto della richiesta, così gli handler successivi non
+  // risultano figli di quello precedente.
+  instrumentRouter(router) {
+    for (const layer of router.stack) {
+      if (!layer.route) continue;
+
+      const handlers = layer.route.stack;
+      handlers.forEach((routeLayer, i) => {
+        const kind = i === handlers.length - 1 ? 'controller' : 'middleware';
+        routeLayer.handle = this.wrap(routeLayer.handle, kind);
+      });
+    }
+  }
+
+  wrap(handle, kind) {
+    // Gli error handler (4 argomenti) restano invariati
+    if (handle.length > 3 || handle.traced) return handle;
+
+    const name = `${kind} ${this.handlerNames.get(handle) || handle.name || 'anonymous'}`;
+    const tracer = this;
+
+    const traced = function(req, res, next) {
+      const context = tracer.current();
+      if (!context) return handle.call(this, req, res, next);
+
+      const span = new Span(context.trace, name, { parentSpanId: context.span.spanId });
+
+      const tracedNext = (error) => {
+        span.finish(error && error !== 'route' && error !== 'router' ? error : undefined);
+        tracer.storage.run(context, () => next(error));
+      };
+
+      try {
+        const result = tracer.storage.run({ trace: context.trace, span }, () => handle.call(this, req, res, tracedNext));
+
+        if (result && typeof result.then === 'function') {
+          result.then(() => span.finish(), (error) => span.finish(error));
+        }
+
+        return result;
+      } catch (error) {
+        span.finish(error);
+        throw error;
+      }
+    };
+
+    traced.traced = true;
+    return traced;
+  }
+
+  close() {
+    return this.exporter.close();
+  }
+
+  getMetrics() {
+    return {
+      enabled: this.enabled,
+      sampleRate: this.options.sampleRate,
+      slowMs: this.options.slowMs,
+      exporter: this.options.exporter,
+      ...this.stats
+    };
+  }
+}
+
+const tracer = new Tracer();
+
+// Plugin mongoose: uno span per operazione (collection e operazione come attributi).
+// Registrato globalmente: vale per gli schemi compilati dopo il require di questo modulo.
+const QUERY_OPS = [
+  'find', 'findOne', 'countDocuments', 'estimatedDocumentCount', 'distinct',
+  'findOneAndUpdate', 'findOneAndDelete', 'updateOne', 'updateMany', 'deleteOne', 'deleteMany', 'replaceOne'
+];
+
+const dbAttributes = (collection, operation) => ({
+  'db.system': 'mongodb',
+  'db.collection.name': collection,
+  'db.operation.name': operation
+});
+
+const tracingPlugin = (schema) => {
+  schema.pre(QUERY_OPS, function(next) {
+    this.$traceSpan = tracer.startSpan(`mongodb.${this.op}`, dbAttributes(this.mongooseCollection.name, this.op), SPAN_KIND.CLIENT);
+    next();
+  });
+  schema.post(QUERY_OPS, function(result, next) {
+    if (this.$traceSpan) this.$traceSpan.finish();
+    next();
+  });
+  schema.post(QUERY_OPS, function(error, result, next) {
+    if (this.$traceSpan) this.$traceSpan.finish(error);
+    next(error);
+  });
+
+  schema.pre('aggregate', function(next) {
+    this.$traceSpan = tracer.startSpan('mongodb.aggregate', dbAttributes(this.model().collection.name, 'aggregate'), SPAN_KIND.CLIENT);
+    next();
+  });
+  schema.post('aggregate', function(result, next) {
+    if (this.$traceSpan) this.$traceSpan.finish();
+    next();
+  });
+
+  schema.pre('save', function(next) {
+    this.$locals.traceSpan = tracer.startSpan('mongodb.save', dbAttributes(this.collection.name, this.isNew ? 'insert' : 'update'), SPAN_KIND.CLIENT);
+    next();
+  });
+  schema.post('save', function(doc, next) {
+    if (this.$locals.traceSpan) this.$locals.traceSpan.finish();
+    next();
+  });
+};
+
+mongoose.plugin(tracingPlugin);
+
+module.exports = tracer;
+module.exports.Tracer = Tracer;
+module.exports.Span = Span;
+module.exports.SPAN_KIND = SPAN_KIND;
+module.exports.tracingPlugin = tracingPlugin;
@@ -0,0 +1,155 @@
+
+// Pool generico di worker thread: i task sono messaggi { id, ...task } e il worker
+// risponde con { id, result } oppure { id, error }. I worker nascono su richiesta fino
+// a `size`, tengono vivo il processo solo mentre lavorano e, se cadono, vengono
+// sostituiti al dispatch successivo (il task in corso viene rifiutato). Con maxQueue la
+// coda è limitata: oltre quel numero di task in attesa i nuovi vengono rifiutati con
+// codice BUSY.
+const { Worker } = require('worker_threads');
+
+const BUSY = 'EPOOLBUSY';
+
+class WorkerPool {
+  constructor(script, { size = 1, name = 'Worker', maxQueue = Infinity } = {}) {
+    this.script = script;
+    this.size = size;
+    this.name = name;
+    this.maxQueue = maxQueue;
+    this.workers = new Set();
+    this.idle = [];
+    this.queue = [];
+    this.tasks = new Map();
+    this.seq = 0;
+    this.stats = {
+      completed: 0,
+      failed: 0,
+      rejected: 0,
+      maxQueueDepth: 0,
+      totalWaitMs: 0,
+      totalRunMs: 0
+    };
+  }
+
+  run(task) {
+    if (this.queue.length >= this.maxQueue) {
+      this.stats.rejected++;
+      const error = new Error(`${this.name}: troppi task in coda`);
+      error.code = BUSY;
+      return Promise.reject(error);
+    }
+
+    return new Promise((resolve, reject) => {
+      const id = ++this.seq;
+      this.queue.push({ id, task, resolve, reject, enqueuedAt: process.hrtime.bigint() });
+      this.stats.maxQueueDepth = Math.max(this.stats.maxQueueDepth, this.queue.length);
+      this.dispatch();
+    });
+  }
+
+  dispatch() {
+    while (this.queue.length && (this.idle.length || this.workers.size < this.size)) {
+      const worker = this.idle.pop() || this.spawn();
+      const job = this.queue.shift();
+      const now = process.hrtime.bigint();
+
+      this.stats.totalWaitMs += Number(now - job.enqueuedAt) / 1e6;
+      job.startedAt = now;
+      worker.job = job;
+      this.tasks.set(job.id, job);
+
+      // Il worker tiene vivo il processo solo mentre lavora
+      worker.ref();
+      worker.postMessage({ id: job.id, ...job.task });
+    }
+  }
+
+  spawn() {
+    const worker = new Worker(this.script);
+    worker.job = null;
+    this.workers.add(worker);
+
+    worker.on('message', ({ id, result, error }) => {
+      const job = this.tasks.get(id);
+      this.tasks.delete(id);
+      worker.job = null;
+      worker.unref();
+      this.idle.push(worker);
+
+      if (job) {
+        this.stats.totalRunMs += Number(process.hrtime.bigint() - job.startedAt) / 1e6;
+
+        if (error) {
+          this.stats.failed++;
+          job.reject(new Error(error));
+        } else {
+          this.stats.completed++;
+          job.resolve(result);
+        }
+      }
+
+      this.dispatch();
+    });
+
+    // Worker caduto: rifiuta il task in corso, il prossimo dispatch ne crea un altro
+    const discard = (error) => {
+      if (!this.workers.delete(worker)) return;
+
+      this.idle = this.idle.filter((idleWorker) => idleWorker !== worker);
+
+      if (worker.job) {
+        this.tasks.delete(worker.job.id);
+        this.stats.failed++;
+        worker.job.reject(error);
+      }
+
+      this.dispatch();
+    };
+
+    worker.on('error', discard);
+    worker.on('exit', (code) => discard(new Error(`${this.name} terminato (codice ${code})`)));
+
+    return worker;
+  }
+
+  // Termina i worker (shutdown); i task in coda e quelli in corso vengono rifiutati.
+  // I worker escono dal set prima di terminare, quindi discard non li vede più: i task
+  // in corso si rifiutano qui
+  async stop() {
+    const error = new Error(`${this.name} arrestato`);
+
+    for (const job of this.queue.splice(0)) {
+      job.reject(error);
+    }
+
+    const workers = [...this.workers];
+    for (const worker of workers) {
+      if (worker.job) {
+        this.tasks.delete(worker.job.id);
+        this.stats.failed++;
+        worker.job.reject(error);
+        worker.job = null;
+      }
+    }
+
+    this.workers.clear();
+    this.idle = [];
+    await Promise.all(workers.map((worker) => worker.terminate()));
+  }
+
+  getMetrics() {
+    const finished = this.stats.completed + this.stats.failed;
+
+    return {
+      size: this.size,
+      workers: this.workers.size,
+      busyWorkers: this.tasks.size,
+      queueDepth: this.queue.length,
+      ...this.stats,
+      avgWaitMs: finished > 0 ? this.stats.totalWaitMs / finished : 0,
+      avgRunMs: finished > 0 ? this.stats.totalRunMs / finished : 0
+    };
+  }
+}
+
+module.exports = WorkerPool;
+module.exports.BUSY = BUSY;
@@ -3,18 +3,24 @@
 const request = require('supertest');
 const mongoose = require('mongoose');
 const app = require('../src/app');
+const { connect } = require('../src/config/database');
+const bcrypt = require('bcryptjs');
 const User = require('../src/models/User');
+const passwordHasher = require('../src/utils/passwordHasher');
+const { PasswordHasher, BUSY } = require('../src/utils/passwordHasher');
+const { rateLimiter } = require('../src/middleware/rateLimiter');
 
 describe('Auth Endpoints', () => {
   beforeAll(async () => {
     // Connetti a database di test
     const MONGODB_URI = process.env.MONGODB_TEST_URI || 'mongodb://localhost:27017/qr-tavoli-test';
-    await mongoose.connect(MONGODB_URI);
+    await connect(MONGODB_URI);
   });
 
   beforeEach(async () => {
-    // Pulisci database prima di ogni test
+    // Pulisci database e contatori rate limit prima di ogni test
     await User.deleteMany({});
+    await rateLimiter.reset();
   });
 
   afterAll(async () => {
@@ -87,6 +93,32 @@ describe('Auth Endpoints', () => {
       expect(response.body.data.token).toBeDefined();
     });
 
+    test('Should keep the password hash unchanged across logins', async () => {
+      const userData = {
+        username: 'testuser',
+        email: 'test@example.com',
+        password: 'Test123!',
+        firstName: 'Test',
+        lastName: 'User'
+      };
+
+      await User.create(userData);
+      const { password: originalHash } = await User.findOne({ email: userData.email }).select('+password');
+      const hashes = passwordHasher.getMetrics().hashes;
+
+      for (let i = 0; i < 2; i++) {
+        await request(app)
+          .post('/api/auth/login')
+          .send({ email: userData.email, password: userData.password })
+          .expect(200);
+      }
+
+      const user = await User.findOne({ email: userData.email }).select('+password');
+      expect(user.password).toBe(originalHash);
+      expect(user.lastLogin).toBeDefined();
+      expect(passwordHasher.getMetrics().hashes).toBe(hashes);
+    });
+
     test('Should not login with invalid credentials', async () => {
       const response = await request(app)
         .post('/api/auth/login')
@@ -99,4 +131,98 @@ describe('Auth Endpoints', () => {
       expect(response.body.success).toBe(false);
     });
   });
+
+  describe('Password hashing', () => {
+    const userData = {
+      username: 'rehashuser',
+      email: 'rehash@example.com',
+      password: 'Test123!',
+      firstName: 'Rehash',
+      lastName: 'User'
+    };
+
+    test('Should rehash the password on login when the bcrypt cost changes', async () => {
+      await User.create(userData);
+      const rounds = passwordHasher.options.rounds;
+      passwordHasher.options.rounds = 4;
+
+      try {
+        await request(app)
+          .post('/api/auth/login')
+          .send({ email: userData.email, password: userData.password })
+          .expect(200);
+
+        const user = await User.findOne({ email: userData.email }).select('+password');
+        expect(bcrypt.getRounds(user.password)).toBe(4);
+        expect(await user.matchPassword(userData.password)).toBe(true);
+      } finally {
+        passwordHasher.options.rounds = rounds;
+      }
+    });
+
+    test('Should reject work beyond the queue limit', async () => {
+      const hasher = new PasswordHasher({ workers: 1, maxQueue: 1, rounds: 4 });
+
+      const results = await Promise.allSettled([1, 2, 3].map(i => hasher.hash(`password${i}`)));
+
+      expect(results.map(r => r.status)).toEqual(['fulfilled', 'fulfilled', 'rejected']);
+      expect(results[2].reason.code).toBe(BUSY);
+      expect(await hasher.compare('password1', results[0].value)).toBe(true);
+
+      await hasher.stop();
+    });
+
+    test('Should reject running and queued work on stop', async () => {
+      const hasher = new PasswordHasher({ workers: 1, maxQueue: 8, rounds: 10 });
+
+      const pending = Promise.allSettled([hasher.hash('password1'), hasher.hash('password2')]);
+      await hasher.stop();
+
+      const results = await pending;
+      expect(results.map(r => r.status)).toEqual(['rejected', 'rejected']);
+      expect(results[0].reason.message).toMatch(/arrestato/);
+      expect(hasher.getMetrics()).toMatchObject({ busyWorkers: 0, queueDepth: 0 });
+    });
+  });
+
+  describe('GET /api/auth/me', () => {
+    let user, token;
+
+    beforeEach(async () => {
+      user = await User.create({
+        username: 'testuser',
+        email: 'test@example.com',
+        password: 'Test123!',
+        firstName: 'Test',
+        lastName: 'User'
+      });
+      token = user.getSignedJwtToken();
+    });
+
+    test('Should return the profile of the authenticated user', async () => {
+      const response = await request(app)
+        .get('/api/auth/me')
+        .set('Authorization', `Bearer ${token}`)
+        .expect(200);
+
+      expect(response.body.data.username).toBe('testuser');
+    });
+
+    test('Should reject a cached principal once the user is deactivated', async () => {
+      // Prima richiesta: il principal finisce in cache
+      await request(app)
+        .get('/api/auth/me')
+        .set('Authorization', `Bearer ${token}`)
+        .expect(200);
+
+      await User.findByIdAndUpdate(user._id, { isActive: false });
+
+      const response = await request(app)
+        .get('/api/auth/me')
+        .set('Authorization', `Bearer ${token}`)
+        .expect(401);
+
+      expect(response.body.success).toBe(false);
+    });
+  });
 });
@@ -0,0 +1,87 @@
+
+// Test logger strutturato: request id, livelli, campionamento per categoria, buffer
+const request = require('supertest');
+const express = require('express');
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const { Logger } = require('../src/utils/logger');
+
+describe('Structured logging', () => {
+  const readLog = (file) => fs.readFileSync(file, 'utf8').trim().split('\n').map(line => JSON.parse(line));
+  let file;
+
+  beforeEach(() => {
+    file = path.join(os.tmpdir(), `qr-log-${process.pid}-${Date.now()}.jsonl`);
+  });
+
+  afterEach(() => {
+    fs.rmSync(file, { force: true });
+  });
+
+  test('Should log with the request id, sampled per category', async () => {
+    const logger = new Logger({ file, sampling: { 'auth.token': 1, http: 0 } });
+    const tokenLog = logger.child('auth.token');
+    const httpLog = logger.child('http');
+
+    const app = express()
+      .use(logger.middleware())
+      .get('/api/auth/me', (req, res) => {
+        tokenLog.warn('Invalid token', { reason: 'JsonWebTokenError' });
+        httpLog.info('GET /api/auth/me 401');
+        res.status(401).json({ success: false });
+      });
+
+    const response = await request(app)
+      .get('/api/auth/me')
+      .set('X-Request-Id', 'req-1234')
+      .expect(401);
+
+    expect(response.headers['x-request-id']).toBe('req-1234');
+    await logger.close();
+
+    const entries = readLog(file);
+    expect(entries).toHaveLength(1);
+    expect(entries[0]).toMatchObject({
+      level: 'warn',
+      category: 'auth.token',
+      msg: 'Invalid token',
+      requestId: 'req-1234',
+      reason: 'JsonWebTokenError',
+      sampleRate: 1
+    });
+    expect(logger.getMetrics()).toMatchObject({ written: 1, sampledOut: 1 });
+  });
+
+  test('Should generate a request id when the given one is invalid', async () => {
+    const logger = new Logger({ file });
+    const app = express()
+      .use(logger.middleware())
+      .get('/', (req, res) => res.json({ requestId: req.id }));
+
+    const response = await request(app)
+      .get('/')
+      .set('X-Request-Id', 'not valid!')
+      .expect(200);
+
+    expect(response.headers['x-request-id']).toBe(response.body.requestId);
+    expect(response.body.requestId).not.toBe('not valid!');
+    await logger.close();
+  });
+
+  test('Should buffer writes, honour levels and sample categories', async () => {
+    const buffered = new Logger({ file, level: 'info', sampling: { noisy: 0 }, flushMs: 60000 });
+
+    buffered.child('app').debug('hidden');
+    buffered.child('noisy').error('sampled out');
+    buffered.child('app').error('Save failed', { error: new Error('boom') });
+
+    // Nulla è scritto prima del flush
+    expect(buffered.getMetrics()).toMatchObject({ written: 1, sampledOut: 1, flushes: 0 });
+    await buffered.close();
+
+    const entries = readLog(file);
+    expect(entries).toHaveLength(1);
+    expect(entries[0]).toMatchObject({ level: 'error', category: 'app', msg: 'Save failed', error: { message: 'boom' } });
+  });
+});
@@ -0,0 +1,35 @@
+
+// Test endpoint /metrics (formato Prometheus)
+const request = require('supertest');
+const mongoose = require('mongoose');
+const app = require('../src/app');
+const { connect } = require('../src/config/database');
+const { rateLimiter } = require('../src/middleware/rateLimiter');
+
+describe('GET /metrics', () => {
+  beforeAll(async () => {
+    const MONGODB_URI = process.env.MONGODB_TEST_URI || 'mongodb://localhost:27017/qr-tavoli-test';
+    await connect(MONGODB_URI);
+    await rateLimiter.reset();
+  });
+
+  afterAll(async () => {
+    await mongoose.connection.close();
+  });
+
+  test('Should expose login counters and per-route latency histograms', async () => {
+    await request(app)
+      .post('/api/auth/login')
+      .send({ email: 'nobody@example.com', password: 'wrongpassword' })
+      .expect(401);
+
+    const response = await request(app)
+      .get('/metrics')
+      .expect('Content-Type', /text\/plain/)
+      .expect(200);
+
+    expect(response.text).toMatch(/qr_logins_total\{result="invalid"\} \d+/);
+    expect(response.text).toContain('http_request_duration_seconds_bucket{method="POST",route="/api/auth/login",status="401",le="+Inf"}');
+    expect(response.text).toContain('mongodb_command_duration_seconds_count{command="find",outcome="ok"}');
+  });
+});
@@ -3,16 +3,28 @@
 const request = require('supertest');
 const mongoose = require('mongoose');
 const app = require('../src/app');
+const { connect } = require('../src/config/database');
 const User = require('../src/models/User');
 const Table = require('../src/models/Table');
 const PointTransaction = require('../src/models/PointTransaction');
+const StatsRollup = require('../src/models/StatsRollup');
+const statsRollups = require('../src/utils/statsRollups');
+const { StatsRollups } = statsRollups;
+const os = require('os');
+const path = require('path');
+const { LedgerWriter } = require('../src/utils/ledgerWriter');
+const IdempotencyKey = require('../src/models/IdempotencyKey');
+const { MongoIdempotencyStore } = require('../src/utils/idempotencyStore');
+const tracer = require('../src/utils/tracing');
+const { backfillSnapshots } = require('../src/utils/backfillSnapshots');
+const { countTotal } = require('../src/utils/helpers');
 
 describe('Points Endpoints', () => {
   let cashierToken, adminUser, cashierUser, table;
 
   beforeAll(async () => {
     const MONGODB_URI = process.env.MONGODB_TEST_URI || 'mongodb://localhost:27017/qr-tavoli-test';
-    await mongoose.connect(MONGODB_URI);
+    await connect(MONGODB_URI);
   });
 
   beforeEach(async () => {
@@ -20,6 +32,8 @@ describe('Points Endpoints', () => {
     await User.deleteMany({});
     await Table.deleteMany({});
     await PointTransaction.deleteMany({});
+    await statsRollups.flush();
+    await StatsRollup.deleteMany({});
 
     // Crea utenti
     adminUser = await User.create({
@@ -77,6 +91,26 @@ describe('Points Endpoints', () => {
       expect(updatedTable.points).toBe(10);
     });
 
+    test('Should not lose updates on concurrent scans', async () => {
+      const scans = Array.from({ length: 10 }, () =>
+        request(app)
+          .post('/api/points/add')
+          .set('Authorization', `Bearer ${cashierToken}`)
+          .send({ qrCode: table.qrCode, points: 10 })
+      );
+
+      const responses = await Promise.all(scans);
+      responses.forEach(response => expect(response.status).toBe(200));
+
+      const updatedTable = await Table.findById(table._id);
+      expect(updatedTable.points).toBe(100);
+
+      // Ogni transazione registra i valori prodotti dalla propria operazione atomica
+      const transactions = await PointTransaction.find({ table: table._id });
+      const previous = transactions.map(t => t.metadata.previousPoints).sort((a, b) => a - b);
+      expect(previous).toEqual([0, 10, 20, 30, 40, 50, 60, 70, 80, 90]);
+    });
+
     test('Should not add points without authentication', async () => {
       const pointsData = {
         qrCode: table.qrCode,
@@ -105,6 +139,291 @@ describe('Points Endpoints', () => {
 
       expect(response.body.success).toBe(false);
     });
+
+    test('Should trace middleware, controller and Mongo spans', async () => {
+      const traces = [];
+      const options = { ...tracer.options };
+      const exporter = tracer.exporter;
+      Object.assign(tracer.options, { enabled: true, sampleRate: 1 });
+      tracer.exporter = { export: (payload) => traces.push(payload) };
+
+      try {
+        const response = await request(app)
+          .post('/api/points/add')
+          .set('Authorization', `Bearer ${cashierToken}`)
+          .send({ qrCode: table.qrCode, points: 10 })
+          .expect(200);
+
+        expect(traces).toHaveLength(1);
+        const spans = traces[0].resourceSpans[0].scopeSpans[0].spans;
+        const names = spans.map(span => span.name);
+        const root = spans.find(span => !span.parentSpanId);
+
+        expect(response.headers['x-trace-id']).toBe(root.traceId);
+        expect(root.name).toBe('POST /api/points/add');
+        expect(names).toEqual(expect.arrayContaining([
+          'middleware protect',
+          'middleware requireCashier',
+          'middleware validateQRCode',
+          'middleware validateAddPoints',
+          'controller addPoints'
+        ]));
+
+        // Le operazioni Mongo sono figlie dello span del controller
+        const controller = spans.find(span => span.name === 'controller addPoints');
+        const mongo = spans.filter(span => span.name.startsWith('mongodb.'));
+        expect(mongo.length).toBeGreaterThan(0);
+        expect(mongo.some(span => span.parentSpanId === controller.spanId)).toBe(true);
+      } finally {
+        tracer.options = options;
+        tracer.exporter = exporter;
+      }
+    });
+
+    test('Should follow the sampling decision of an incoming traceparent', async () => {
+      const traces = [];
+      const options = { ...tracer.options };
+      const exporter = tracer.exporter;
+      Object.assign(tracer.options, { enabled: true, sampleRate: 0, slowMs: 0 });
+      tracer.exporter = { export: (payload) => traces.push(payload) };
+      const traceId = '4bf92f3577b34da6a3ce929d0e0e4736';
+
+      try {
+        const notSampled = await request(app)
+          .post('/api/points/add')
+          .set('Authorization', `Bearer ${cashierToken}`)
+          .set('traceparent', `00-${traceId}-00f067aa0ba902b7-00`)
+          .send({ qrCode: table.qrCode, points: 10 })
+          .expect(200);
+
+        expect(notSampled.headers['x-trace-id']).toBe(traceId);
+        expect(traces).toHaveLength(0);
+
+        await request(app)
+          .post('/api/points/add')
+          .set('Authorization', `Bearer ${cashierToken}`)
+          .set('traceparent', `00-${traceId}-00f067aa0ba902b7-01`)
+          .send({ qrCode: table.qrCode, points: 10 })
+          .expect(200);
+
+        expect(traces).toHaveLength(1);
+        const root = traces[0].resourceSpans[0].scopeSpans[0].spans.find(span => span.kind === 2);
+        expect(root.parentSpanId).toBe('00f067aa0ba902b7');
+      } finally {
+        tracer.options = options;
+        tracer.exporter = exporter;
+      }
+    });
+  });
+
+  describe('POST /api/points/redeem', () => {
+    test('Should redeem points when balance is sufficient', async () => {
+      await Table.updateOne({ _id: table._id }, { points: 30 });
+
+      const response = await request(app)
+        .post('/api/points/redeem')
+        .set('Authorization', `Bearer ${cashierToken}`)
+        .send({ qrCode: table.qrCode, points: 20 })
+        .expect(200);
+
+      expect(response.body.data.table.points).toBe(10);
+      expect(response.body.data.table.previousPoints).toBe(30);
+    });
+
+    test('Should not redeem more points than available', async () => {
+      const response = await request(app)
+        .post('/api/points/redeem')
+        .set('Authorization', `Bearer ${cashierToken}`)
+        .send({ qrCode: table.qrCode, points: 20 })
+        .expect(400);
+
+      expect(response.body.success).toBe(false);
+
+      const unchangedTable = await Table.findById(table._id);
+      expect(unchangedTable.points).toBe(0);
+    });
+  });
+
+  describe('POST /api/points/batch', () => {
+    const batch = {
+      batchId: 'shift-2024-06-01-a',
+      items: [
+        { qrCode: 'TABLE_1', points: 10 },
+        { tableId: null, points: 5, type: 'REDEEMED' },
+        { qrCode: 'TABLE_1', points: 50, type: 'REDEEMED' },
+        { qrCode: 'TABLE_999', points: 1 }
+      ]
+    };
+
+    const sendBatch = () => request(app)
+      .post('/api/points/batch')
+      .set('Authorization', `Bearer ${cashierToken}`)
+      .send({ ...batch, items: batch.items.map(item => (item.tableId === null ? { ...item, tableId: String(table._id) } : item)) })
+      .expect(200);
+
+    test('Should apply items in order with per-item results', async () => {
+      const response = await sendBatch();
+
+      expect(response.body.data.results.map(r => r.status))
+        .toEqual(['applied', 'applied', 'insufficient_points', 'not_found']);
+      expect(response.body.data.results[1]).toMatchObject({ previousPoints: 10, newPoints: 5 });
+
+      const updatedTable = await Table.findById(table._id);
+      expect(updatedTable.points).toBe(5);
+      expect(await PointTransaction.countDocuments({ batchId: batch.batchId })).toBe(2);
+    });
+
+    test('Should be idempotent on retry', async () => {
+      const first = await sendBatch();
+      const retry = await sendBatch();
+
+      expect(retry.body.data.results.map(r => r.status))
+        .toEqual(['replayed', 'replayed', 'insufficient_points', 'not_found']);
+      expect(retry.body.data.results[0].transaction).toBe(first.body.data.results[0].transaction);
+
+      const updatedTable = await Table.findById(table._id);
+      expect(updatedTable.points).toBe(5);
+      expect(await PointTransaction.countDocuments({ batchId: batch.batchId })).toBe(2);
+    });
+
+    test('Should reject a batchId reused for different changes', async () => {
+      await sendBatch();
+
+      const response = await request(app)
+        .post('/api/points/batch')
+        .set('Authorization', `Bearer ${cashierToken}`)
+        .send({ batchId: batch.batchId, items: [{ qrCode: 'TABLE_1', points: 20 }] })
+        .expect(422);
+
+      expect(response.body.success).toBe(false);
+      expect((await Table.findById(table._id)).points).toBe(5);
+      expect(await PointTransaction.countDocuments({ batchId: batch.batchId })).toBe(2);
+    });
+
+    test('Should validate every item', async () => {
+      const response = await request(app)
+        .post('/api/points/batch')
+        .set('Authorization', `Bearer ${cashierToken}`)
+        .send({ batchId: 'shift-invalid', items: [{ qrCode: 'TABLE_1', points: 10 }, { qrCode: 'BAD', points: 0 }] })
+        .expect(400);
+
+      expect(response.body.success).toBe(false);
+    });
+  });
+
+  describe('Idempotency-Key', () => {
+    // Lo store in memoria sopravvive tra i test: chiavi diverse per ogni test
+    const uniqueKey = (label) => `${label}-${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
+    const post = (url, key, body) => request(app)
+      .post(url)
+      .set('Authorization', `Bearer ${cashierToken}`)
+      .set('Idempotency-Key', key)
+      .send(body);
+
+    test('Should apply concurrent duplicates once and replay the response', async () => {
+      const key = uniqueKey('add');
+      const body = { qrCode: table.qrCode, points: 10 };
+
+      const responses = await Promise.all([1, 2, 3].map(() => post('/api/points/add', key, body)));
+
+      responses.forEach(response => expect(response.status).toBe(200));
+      expect(responses.filter(r => r.headers['idempotent-replayed'] === 'true')).toHaveLength(2);
+      expect(new Set(responses.map(r => r.body.data.transaction._id)).size).toBe(1);
+
+      const updatedTable = await Table.findById(table._id);
+      expect(updatedTable.points).toBe(10);
+      expect(await PointTransaction.countDocuments({ table: table._id })).toBe(1);
+    });
+
+    test('Should not redeem twice on retry', async () => {
+      await Table.updateOne({ _id: table._id }, { points: 30 });
+      const key = uniqueKey('redeem');
+      const body = { qrCode: table.qrCode, points: 20 };
+
+      const [first, second] = await Promise.all([
+        post('/api/points/redeem', key, body),
+        post('/api/points/redeem', key, body)
+      ]);
+
+      expect(first.status).toBe(200);
+      expect(second.status).toBe(200);
+      expect(second.body).toEqual(first.body);
+
+      const updatedTable = await Table.findById(table._id);
+      expect(updatedTable.points).toBe(10);
+    });
+
+    test('Should reject a reused key with a different body', async () => {
+      const key = uniqueKey('mismatch');
+
+      await post('/api/points/add', key, { qrCode: table.qrCode, points: 10 }).expect(200);
+      const response = await post('/api/points/add', key, { qrCode: table.qrCode, points: 20 }).expect(422);
+
+      expect(response.body.success).toBe(false);
+      expect((await Table.findById(table._id)).points).toBe(10);
+    });
+
+    test('Should not record requests rejected by validation', async () => {
+      const key = uniqueKey('invalid');
+
+      await post('/api/points/add', key, { qrCode: table.qrCode, points: 0 }).expect(400);
+      const replayed = await post('/api/points/add', key, { qrCode: table.qrCode, points: 0 }).expect(400);
+
+      expect(replayed.headers['idempotent-replayed']).toBeUndefined();
+    });
+
+    test('Should reject malformed keys', async () => {
+      await post('/api/points/add', 'chiave con spazi', { qrCode: table.qrCode, points: 10 }).expect(400);
+    });
+
+    test('Mongo store should share state through the database', async () => {
+      await IdempotencyKey.deleteMany({});
+      const key = uniqueKey('mongo');
+      const first = new MongoIdempotencyStore();
+      const second = new MongoIdempotencyStore({ pollMs: 10 });
+
+      expect((await first.begin(key, 'fp')).status).toBe('new');
+
+      const pending = await second.begin(key, 'fp');
+      expect(pending.status).toBe('pending');
+
+      const record = { fingerprint: 'fp', statusCode: 200, body: '{"success":true}' };
+      const waited = pending.wait();
+      await first.complete(key, record);
+
+      expect(await waited).toEqual(record);
+      expect(await new MongoIdempotencyStore().begin(key, 'fp')).toEqual({ status: 'done', record });
+    });
+
+    test('Mongo store should not leak local entries when the lock is held elsewhere', async () => {
+      await IdempotencyKey.deleteMany({});
+      const key = uniqueKey('mongo-mismatch');
+      const first = new MongoIdempotencyStore();
+      const second = new MongoIdempotencyStore({ pollMs: 10 });
+
+      expect((await first.begin(key, 'fp')).status).toBe('new');
+
+      // Corpo diverso: il middleware risponde 422 senza chiamare wait()
+      const mismatch = await second.begin(key, 'other');
+      expect(mismatch).toMatchObject({ status: 'pending', fingerprint: 'fp' });
+      expect(second.local.inFlight.size).toBe(0);
+
+      // Il retry con il corpo originale attende l'esito dell'altro processo
+      const retry = await second.begin(key, 'fp');
+      const duplicate = await second.begin(key, 'fp');
+      expect(retry.status).toBe('pending');
+      expect(duplicate.status).toBe('pending');
+
+      const record = { fingerprint: 'fp', statusCode: 200, body: '{"success":true}' };
+      const waited = Promise.all([retry.wait(), duplicate.wait()]);
+      expect(second.polling.size).toBe(1);
+      await first.complete(key, record);
+
+      expect(await waited).toEqual([record, record]);
+      expect(second.getMetrics()).toMatchObject({ inFlight: 0, polling: 0 });
+      expect(await second.begin(key, 'fp')).toEqual({ status: 'done', record });
+    });
   });
 
   describe('GET /api/points/transactions', () => {
@@ -133,5 +452,367 @@ describe('Points Endpoints', () => {
       expect(response.body.success).toBe(true);
       expect(response.body.data).toHaveLength(2);
     });
+
+    test('Should serve history from write-time snapshots without populate', async () => {
+      await request(app)
+        .post('/api/points/add')
+        .set('Authorization', `Bearer ${cashierToken}`)
+        .send({ qrCode: table.qrCode, points: 10 })
+        .expect(200);
+
+      // Il nome cambiato dopo la scrittura non riscrive lo storico
+      await Table.updateOne({ _id: table._id }, { $set: { name: 'Tavolo rinominato' } });
+
+      const [transactions, history] = await Promise.all([
+        request(app)
+          .get('/api/points/transactions')
+          .set('Authorization', `Bearer ${cashierToken}`)
+          .expect(200),
+        request(app)
+          .get(`/api/tables/${table._id}/history`)
+          .set('Authorization', `Bearer ${cashierToken}`)
+          .expect(200)
+      ]);
+
+      for (const transaction of [transactions.body.data[0], history.body.data[0]]) {
+        expect(transaction.table).toEqual({ _id: String(table._id), tableNumber: 1, name: 'Test Table' });
+        expect(transaction.assignedBy).toEqual({
+          _id: String(cashierUser._id),
+          username: 'cashier',
+          firstName: 'Cashier',
+          lastName: 'User'
+        });
+        expect(transaction).not.toHaveProperty('tableSnapshot');
+      }
+    });
+
+    test('Should backfill snapshots on transactions written before them', async () => {
+      // Transazioni legacy: scritte senza istantanee, direttamente sulla collection
+      await PointTransaction.collection.insertMany(Array.from({ length: 5 }, (_, i) => ({
+        tenant: table.tenant,
+        table: table._id,
+        assignedBy: cashierUser._id,
+        points: i + 1,
+        type: 'EARNED',
+        createdAt: new Date()
+      })));
+
+      // Prima della migrazione lo storico è completato con una lettura di Table e User
+      const before = await PointTransaction.getTableHistory(table._id, 10);
+      expect(before[0].table.name).toBe('Test Table');
+
+      const updated = await backfillSnapshots({ batchSize: 2 });
+      expect(updated).toBe(5);
+      expect(await backfillSnapshots({ batchSize: 2 })).toBe(0);
+
+      const stored = await PointTransaction.find({ table: table._id }).lean();
+      stored.forEach(transaction => {
+        expect(transaction.tableSnapshot).toEqual({ tableNumber: 1, name: 'Test Table' });
+        expect(transaction.assignedBySnapshot).toEqual({ username: 'cashier', firstName: 'Cashier', lastName: 'User' });
+      });
+    });
+
+    test('Should complete cashier snapshots written without firstName and lastName', async () => {
+      await PointTransaction.collection.insertOne({
+        tenant: table.tenant,
+        table: table._id,
+        assignedBy: cashierUser._id,
+        tableSnapshot: { tableNumber: 1, name: 'Test Table' },
+        assignedBySnapshot: { username: 'cashier', displayName: 'Cashier User' },
+        points: 3,
+        type: 'EARNED',
+        createdAt: new Date()
+      });
+
+      // Prima della migrazione il nome arriva da User, come con il populate
+      const [before] = await PointTransaction.getTableHistory(table._id, 10);
+      expect(before.assignedBy).toMatchObject({ username: 'cashier', firstName: 'Cashier', lastName: 'User' });
+
+      expect(await backfillSnapshots()).toBe(1);
+      expect(await backfillSnapshots()).toBe(0);
+
+      const stored = await PointTransaction.findOne({ table: table._id }).lean();
+      expect(stored.assignedBySnapshot).toEqual({ username: 'cashier', firstName: 'Cashier', lastName: 'User' });
+    });
+
+    test('Should serve the estimated total from a cached per-tenant count', async () => {
+      let counts = 0;
+      const Model = {
+        modelName: 'EstimateProbe',
+        countDocuments: async () => ++counts * 10
+      };
+
+      // Un solo conteggio per scope entro PAGINATION_ESTIMATE_TTL_MS, qualunque sia il numero di pagine
+      for (let i = 0; i < 5; i++) {
+        expect(await countTotal(Model, { tenant: 'a' }, false, { tenant: 'a' })).toEqual({ total: 10, estimated: true });
+      }
+      expect(await countTotal(Model, { tenant: 'b' }, false, { tenant: 'b' })).toEqual({ total: 20, estimated: true });
+      expect(counts).toBe(2);
+
+      // Filtri oltre lo scope: la stima del ristorante sarebbe sbagliata
+      expect(await countTotal(Model, { tenant: 'a', type: 'EARNED' }, false, { tenant: 'a' })).toEqual({ total: null, estimated: true });
+      expect(counts).toBe(2);
+
+      // Il totale esatto resta su richiesta
+      expect(await countTotal(Model, {}, true, { tenant: 'a' })).toEqual({ total: 30, estimated: false });
+    });
+
+    test('Should page through transactions with a cursor', async () => {
+      // Stesso createdAt per tutte: lo spareggio su _id evita duplicati e buchi
+      const createdAt = new Date();
+      await PointTransaction.insertMany(Array.from({ length: 5 }, (_, i) => ({
+        table: table._id,
+        assignedBy: cashierUser._id,
+        points: i + 1,
+        type: 'EARNED',
+        createdAt
+      })));
+
+      const seen = [];
+      let cursor = null;
+
+      do {
+        const response = await request(app)
+          .get('/api/points/transactions')
+          .query({ limit: 2, withTotal: true, ...(cursor && { cursor }) })
+          .set('Authorization', `Bearer ${cashierToken}`)
+          .expect(200);
+
+        expect(response.body.pagination.total).toBe(5);
+        expect(response.body.pagination.totalEstimated).toBe(false);
+        seen.push(...response.body.data.map(t => t._id));
+        cursor = response.body.pagination.nextCursor;
+      } while (cursor);
+
+      expect(seen).toHaveLength(5);
+      expect(new Set(seen).size).toBe(5);
+    });
+
+    test('Should not report the tenant estimate as the total of a filtered list', async () => {
+      await PointTransaction.create([
+        { table: table._id, assignedBy: cashierUser._id, points: 10, type: 'EARNED' },
+        { table: table._id, assignedBy: cashierUser._id, points: 5, type: 'REDEEMED' }
+      ]);
+
+      const response = await request(app)
+        .get('/api/points/transactions')
+        .query({ type: 'REDEEMED' })
+        .set('Authorization', `Bearer ${cashierToken}`)
+        .expect(200);
+
+      expect(response.body.data).toHaveLength(1);
+      expect(response.body.pagination).toMatchObject({ total: null, pages: null });
+    });
+
+    test('Should reject a malformed cursor', async () => {
+      const encode = (values) => Buffer.from(JSON.stringify(values)).toString('base64url');
+      const cursors = [
+        'bm90LWEtY3Vyc29y',
+        encode(['not-a-date', '507f1f77bcf86cd799439011']),
+        encode([new Date().toISOString(), 'not-an-id']),
+        encode([{ $gt: '' }, '507f1f77bcf86cd799439011'])
+      ];
+
+      for (const cursor of cursors) {
+        const response = await request(app)
+          .get('/api/points/transactions')
+          .query({ cursor })
+          .set('Authorization', `Bearer ${cashierToken}`)
+          .expect(400);
+        expect(response.body.success).toBe(false);
+      }
+    });
+  });
+
+  describe('GET /api/points/stats/daily', () => {
+    const addPoints = (points) => request(app)
+      .post('/api/points/add')
+      .set('Authorization', `Bearer ${cashierToken}`)
+      .send({ qrCode: table.qrCode, points })
+      .expect(200);
+
+    test('Should read today\'s totals from the rollups', async () => {
+      await addPoints(10);
+      await addPoints(15);
+
+      await request(app)
+        .post('/api/points/redeem')
+        .set('Authorization', `Bearer ${cashierToken}`)
+        .send({ qrCode: table.qrCode, points: 5 })
+        .expect(200);
+
+      const response = await request(app)
+        .get('/api/points/stats/daily')
+        .set('Authorization', `Bearer ${cashierToken}`)
+        .expect(200);
+
+      expect(response.body.data.timeZone).toBe('Europe/Rome');
+      expect(response.body.data.totalTransactions).toBe(3);
+      expect(response.body.data.pointsEarned).toBe(25);
+      expect(response.body.data.pointsRedeemed).toBe(5);
+      expect(response.body.data.netPoints).toBe(20);
+
+      const userStats = await request(app)
+        .get('/api/points/stats/user')
+        .set('Authorization', `Bearer ${cashierToken}`)
+        .expect(200);
+
+      const earned = userStats.body.data.stats.find(s => s._id === 'EARNED');
+      expect(earned).toMatchObject({ totalPoints: 25, transactionCount: 2 });
+    });
+
+    test('Should rebuild rollups from existing transactions', async () => {
+      // Inserimento diretto: nessun hook, i rollup non vengono aggiornati
+      await PointTransaction.collection.insertOne({
+        table: table._id,
+        assignedBy: cashierUser._id,
+        points: 7,
+        type: 'EARNED',
+        createdAt: new Date(),
+        updatedAt: new Date()
+      });
+
+      await statsRollups.backfill({ from: new Date(Date.now() - 24 * 60 * 60 * 1000) });
+
+      const response = await request(app)
+        .get('/api/points/stats/daily')
+        .query({ tableId: String(table._id) })
+        .set('Authorization', `Bearer ${cashierToken}`)
+        .expect(200);
+
+      expect(response.body.data.pointsEarned).toBe(7);
+    });
+
+    test('Should rebuild rollups of one tenant only', async () => {
+      await PointTransaction.collection.insertOne({
+        tenant: 'trattoria-roma',
+        table: table._id,
+        assignedBy: cashierUser._id,
+        points: 4,
+        type: 'EARNED',
+        createdAt: new Date(),
+        updatedAt: new Date()
+      });
+
+      expect(await statsRollups.backfill({ tenant: 'trattoria-roma' })).toBe(3);
+      await statsRollups.backfill();
+
+      expect(await StatsRollup.countDocuments({ tenant: 'trattoria-roma' })).toBe(3);
+    });
+
+    test('Should recover spilled rollup increments once after a crash', async () => {
+      const spillDir = path.join(os.tmpdir(), `qr-tavoli-stats-${process.pid}`);
+      const transaction = {
+        tenant: table.tenant,
+        table: table._id,
+        assignedBy: cashierUser._id,
+        points: 7,
+        type: 'EARNED',
+        createdAt: new Date()
+      };
+
+      const daily = async () => (await request(app)
+        .get('/api/points/stats/daily')
+        .query({ tableId: String(table._id) })
+        .set('Authorization', `Bearer ${cashierToken}`)
+        .expect(200)).body.data.pointsEarned;
+
+      // Crash prima del flush: gli incrementi esistono solo nello spill
+      const crashed = new StatsRollups({ spillDir, spillId: 'crash' });
+      crashed.record(transaction);
+      clearInterval(crashed.timer);
+      await new Promise((resolve) => crashed.segment.stream.end(resolve));
+
+      const restarted = new StatsRollups({ spillDir, spillId: 'crash' });
+      await restarted.start();
+      expect(restarted.getMetrics().recovered).toBe(1);
+      expect(await daily()).toBe(7);
+
+      // Crash dopo il bulkWrite ma prima di rimuovere il segmento: il recupero lo ignora
+      const applied = new StatsRollups({ spillDir, spillId: 'crash' });
+      await applied.start();
+      applied.record(transaction);
+      clearInterval(applied.timer);
+      const { seq, stream } = applied.segment;
+      await new Promise((resolve) => stream.end(resolve));
+      await applied.apply(seq, applied.pending);
+
+      const again = new StatsRollups({ spillDir, spillId: 'crash' });
+      await again.start();
+      expect(again.getMetrics().recovered).toBe(1);
+      expect(await daily()).toBe(14);
+    });
+
+    test('Should reject an invalid time zone', async () => {
+      await request(app)
+        .get('/api/points/stats/daily')
+        .query({ tz: 'Mars/Olympus' })
+        .set('Authorization', `Bearer ${cashierToken}`)
+        .expect(400);
+    });
+
+    test('Should reject a time zone not aligned to the hour', async () => {
+      // I rollup sono orari: con +05:30 mezz'ora finirebbe sul giorno sbagliato
+      const response = await request(app)
+        .get('/api/points/stats/daily')
+        .query({ tz: 'Asia/Kolkata' })
+        .set('Authorization', `Bearer ${cashierToken}`)
+        .expect(400);
+
+      expect(response.body.errors[0].message).toMatch(/ore intere/);
+    });
+  });
+
+  describe('Ledger write-behind', () => {
+    const spillDir = path.join(os.tmpdir(), `qr-tavoli-ledger-${process.pid}`);
+
+    const transactionData = (points) => ({
+      table: table._id,
+      assignedBy: cashierUser._id,
+      points,
+      type: 'EARNED',
+      metadata: { previousPoints: 0, newPoints: points }
+    });
+
+    test('Should persist queued transactions on flush', async () => {
+      const writer = new LedgerWriter({ writeBehind: true, spillDir, spillId: 'flush' });
+
+      await Promise.all([1, 2, 3].map(points => writer.record(transactionData(points))));
+      expect(writer.getMetrics().queueDepth).toBe(3);
+      expect(await PointTransaction.countDocuments()).toBe(0);
+
+      await writer.stop();
+      expect(await PointTransaction.countDocuments()).toBe(3);
+      expect(writer.getMetrics().queueDepth).toBe(0);
+    });
+
+    test('Should recover unflushed transactions from the spill file', async () => {
+      const crashed = new LedgerWriter({ writeBehind: true, spillDir, spillId: 'crash' });
+      await crashed.record(transactionData(5));
+      clearInterval(crashed.timer);
+      crashed.segment.stream.destroy();
+
+      // Un nuovo processo con lo stesso spill reinserisce il record una sola volta
+      const restarted = new LedgerWriter({ writeBehind: true, spillDir, spillId: 'crash' });
+      expect(await restarted.recover()).toBe(1);
+      expect(await restarted.recover()).toBe(0);
+      expect(await PointTransaction.countDocuments({ points: 5 })).toBe(1);
+    });
+
+    test('Should accept spilled transactions when a backpressure flush fails', async () => {
+      const writer = new LedgerWriter({ writeBehind: true, spillDir, spillId: 'backpressure', maxQueue: 1 });
+      writer.insert = async () => {
+        throw new Error('Mongo non disponibile');
+      };
+
+      // Coda piena e flush fallito: il record è sullo spill, la richiesta non fallisce
+      await expect(writer.record(transactionData(1))).resolves.toBeDefined();
+      await expect(writer.record(transactionData(2))).resolves.toBeDefined();
+      expect(writer.getMetrics()).toMatchObject({ queueDepth: 2, backpressureWaits: 2, failedFlushes: 2 });
+
+      delete writer.insert;
+      await writer.stop();
+      expect(await PointTransaction.countDocuments()).toBe(2);
+    });
   });
 });
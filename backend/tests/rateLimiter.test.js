@@ -0,0 +1,90 @@
+
+// Test rate limiting: budget per IP e per utente, finestra scorrevole, store Mongo
+const request = require('supertest');
+const mongoose = require('mongoose');
+const express = require('express');
+const app = require('../src/app');
+const { connect } = require('../src/config/database');
+const config = require('../src/config/config');
+const User = require('../src/models/User');
+const { rateLimiter, createRateLimiter } = require('../src/middleware/rateLimiter');
+const { MemoryRateLimitStore, MongoRateLimitStore } = require('../src/utils/rateLimitStore');
+
+describe('Rate limiting', () => {
+  beforeAll(async () => {
+    const MONGODB_URI = process.env.MONGODB_TEST_URI || 'mongodb://localhost:27017/qr-tavoli-test';
+    await connect(MONGODB_URI);
+  });
+
+  beforeEach(async () => {
+    // Pulisci utenti e contatori rate limit prima di ogni test
+    await User.deleteMany({});
+    await rateLimiter.reset();
+  });
+
+  afterAll(async () => {
+    await mongoose.connection.close();
+  });
+
+  test('Should throttle login attempts per IP', async () => {
+    const { max } = config.RATE_LIMIT.budgets.login;
+    const attempt = () => request(app)
+      .post('/api/auth/login')
+      .send({ email: 'wrong@example.com', password: 'wrongpassword' });
+
+    for (let i = 0; i < max; i++) {
+      await attempt().expect(401);
+    }
+
+    const response = await attempt().expect(429);
+    expect(response.body.success).toBe(false);
+    expect(response.headers['retry-after']).toBeDefined();
+    expect(response.headers['ratelimit-remaining']).toBe('0');
+  });
+
+  test('Should keep separate budgets per authenticated user', async () => {
+    const limiter = createRateLimiter({
+      store: new MemoryRateLimitStore(),
+      budgets: { ...config.RATE_LIMIT.budgets, writes: { windowMs: 60 * 1000, max: 2 } }
+    });
+    const limitedApp = express().use(limiter).post('/api/points/add', (req, res) => res.json({ success: true }));
+
+    const [first, second] = await User.create([
+      { username: 'cassa1', email: 'cassa1@example.com', password: 'Test123!', firstName: 'Cassa', lastName: 'Uno' },
+      { username: 'cassa2', email: 'cassa2@example.com', password: 'Test123!', firstName: 'Cassa', lastName: 'Due' }
+    ]);
+    const send = (user) => request(limitedApp)
+      .post('/api/points/add')
+      .set('Authorization', `Bearer ${user.getSignedJwtToken()}`);
+
+    await send(first).expect(200);
+    await send(first).expect(200);
+    await send(first).expect(429);
+    await send(second).expect(200);
+  });
+
+  test('Sliding window should weight the previous window', async () => {
+    const store = new MemoryRateLimitStore();
+    const windowMs = 1000;
+
+    for (let i = 0; i < 10; i++) {
+      await store.hit('k', windowMs, 10000 + i);
+    }
+
+    // A metà della finestra successiva la precedente pesa il 50%
+    expect((await store.hit('k', windowMs, 11500)).count).toBe(6);
+    // Due finestre dopo non resta nulla
+    expect((await store.hit('k', windowMs, 13000)).count).toBe(1);
+  });
+
+  test('Mongo store should count hits across instances', async () => {
+    const first = new MongoRateLimitStore();
+    const second = new MongoRateLimitStore();
+    await first.reset();
+
+    const now = Date.now();
+    await Promise.all(Array.from({ length: 5 }, (_, i) => (i % 2 ? first : second).hit('shared', 60000, now)));
+
+    expect((await first.hit('shared', 60000, now)).count).toBe(6);
+  });
+});
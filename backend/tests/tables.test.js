@@ -1,8 +1,11 @@
 
 // Test endpoint tavoli, classifica, QR lookup, permessi ruoli
+const http = require('http');
 const request = require('supertest');
 const mongoose = require('mongoose');
 const app = require('../src/app');
+const { connect, connectionOptions, getPoolMetrics } = require('../src/config/database');
+const config = require('../src/config/config');
 const User = require('../src/models/User');
 const Table = require('../src/models/Table');
 
@@ -11,7 +14,7 @@ describe('Tables Endpoints', () => {
 
   beforeAll(async () => {
     const MONGODB_URI = process.env.MONGODB_TEST_URI || 'mongodb://localhost:27017/qr-tavoli-test';
-    await mongoose.connect(MONGODB_URI);
+    await connect(MONGODB_URI);
   });
 
   beforeEach(async () => {
@@ -66,6 +69,201 @@ describe('Tables Endpoints', () => {
     });
   });
 
+  describe('Leaderboard engine', () => {
+    let tables;
+
+    beforeEach(async () => {
+      tables = await Table.create([
+        { tableNumber: 1, name: 'Tavolo 1', points: 50, createdBy: adminUser._id },
+        { tableNumber: 2, name: 'Tavolo 2', points: 75, createdBy: adminUser._id },
+        { tableNumber: 3, name: 'Tavolo 3', points: 25, createdBy: adminUser._id }
+      ]);
+    });
+
+    test('Should reflect point changes without a reload', async () => {
+      // Prima lettura: carica la classifica in memoria
+      await request(app).get('/api/tables/leaderboard').expect(200);
+
+      await Table.applyPointsDelta({ _id: tables[2]._id }, 100);
+
+      const response = await request(app)
+        .get('/api/tables/leaderboard')
+        .expect(200);
+
+      expect(response.body.data[0].tableNumber).toBe(3);
+      expect(response.body.data[0].points).toBe(125);
+      expect(response.body.data[0].medal).toBe('🥇');
+    });
+
+    test('Should drop deleted tables from the leaderboard', async () => {
+      await request(app).get('/api/tables/leaderboard').expect(200);
+
+      await request(app)
+        .delete(`/api/tables/${tables[1]._id}`)
+        .set('Authorization', `Bearer ${adminToken}`)
+        .expect(200);
+
+      const response = await request(app)
+        .get('/api/tables/leaderboard')
+        .expect(200);
+
+      expect(response.body.data).toHaveLength(2);
+      expect(response.body.data[0].tableNumber).toBe(1);
+    });
+
+    test('Should answer 304 to a matching If-None-Match', async () => {
+      const first = await request(app)
+        .get('/api/tables/leaderboard?limit=2')
+        .expect(200);
+
+      expect(first.headers.etag).toMatch(/^"[\w-]+"$/);
+      expect(first.headers['cache-control']).toMatch(/public/);
+
+      const response = await request(app)
+        .get('/api/tables/leaderboard?limit=2')
+        .set('If-None-Match', first.headers.etag)
+        .expect(304);
+
+      expect(response.text).toBeFalsy();
+
+      // Limit diverso: risposta e ETag distinti
+      const other = await request(app)
+        .get('/api/tables/leaderboard?limit=3')
+        .set('If-None-Match', first.headers.etag)
+        .expect(200);
+      expect(other.body.count).toBe(3);
+    });
+
+    test('Should change the ETag after points and name changes', async () => {
+      const initial = await request(app).get('/api/tables/leaderboard').expect(200);
+
+      await Table.applyPointsDelta({ _id: tables[2]._id }, 100);
+
+      const afterPoints = await request(app)
+        .get('/api/tables/leaderboard')
+        .set('If-None-Match', initial.headers.etag)
+        .expect(200);
+      expect(afterPoints.headers.etag).not.toBe(initial.headers.etag);
+      expect(afterPoints.body.data[0].points).toBe(125);
+
+      await request(app)
+        .put(`/api/tables/${tables[2]._id}/name`)
+        .set('Authorization', `Bearer ${adminToken}`)
+        .send({ name: 'Campioni' })
+        .expect(200);
+
+      const afterName = await request(app)
+        .get('/api/tables/leaderboard')
+        .set('If-None-Match', afterPoints.headers.etag)
+        .expect(200);
+      expect(afterName.body.data[0].name).toBe('Campioni');
+    });
+
+    test('Should report the engine consistent with the database', async () => {
+      await Table.applyPointsDelta({ _id: tables[0]._id }, 10);
+
+      const response = await request(app)
+        .get('/api/tables/leaderboard/check')
+        .set('Authorization', `Bearer ${adminToken}`)
+        .expect(200);
+
+      expect(response.body.data.consistent).toBe(true);
+      expect(response.body.data.engineCount).toBe(3);
+    });
+
+    test('Should ignore table events delivered out of order', async () => {
+      const tableEvents = require('../src/utils/tableEvents');
+      await request(app).get('/api/tables/leaderboard').expect(200);
+
+      const older = await Table.applyPointsDelta({ _id: tables[2]._id }, 10);
+      const newer = await Table.applyPointsDelta({ _id: tables[2]._id }, 100);
+
+      // Hook del primo aggiornamento consegnato dopo il secondo
+      tableEvents.emit('changed', newer);
+      tableEvents.emit('changed', older);
+
+      const response = await request(app).get('/api/tables/leaderboard').expect(200);
+      expect(response.body.data[0].tableNumber).toBe(3);
+      expect(response.body.data[0].points).toBe(135);
+    });
+  });
+
+  describe('GET /api/tables/stream', () => {
+    let server, stream, events;
+
+    const waitFor = async (predicate, timeoutMs = 3000) => {
+      const deadline = Date.now() + timeoutMs;
+      while (!predicate()) {
+        if (Date.now() > deadline) throw new Error('Timeout in attesa di eventi SSE');
+        await new Promise(resolve => setTimeout(resolve, 20));
+      }
+    };
+
+    beforeEach(async () => {
+      events = [];
+      server = app.listen(0);
+
+      stream = await new Promise((resolve) => {
+        http.get({ port: server.address().port, path: '/api/tables/stream' }, (res) => {
+          let buffer = '';
+          res.setEncoding('utf8');
+          res.on('data', (chunk) => {
+            const parts = (buffer + chunk).split('\n\n');
+            buffer = parts.pop();
+
+            for (const part of parts) {
+              const event = /^event: (.+)$/m.exec(part);
+              const data = /^data: (.+)$/m.exec(part);
+              if (event) events.push({ event: event[1], data: JSON.parse(data[1]) });
+            }
+          });
+          resolve(res);
+        });
+      });
+
+      await waitFor(() => events.some(e => e.event === 'ready'));
+    });
+
+    afterEach(() => {
+      stream.destroy();
+      server.close();
+    });
+
+    test('Should push one coalesced delta for a burst of point changes', async () => {
+      const table = await Table.create({
+        tableNumber: 1,
+        name: 'Tavolo 1',
+        points: 0,
+        createdBy: adminUser._id
+      });
+
+      await Table.applyPointsDelta({ _id: table._id }, 10);
+      await Table.applyPointsDelta({ _id: table._id }, 5);
+
+      const deltas = () => events.filter(e => e.event === 'tables').flatMap(e => e.data);
+      await waitFor(() => deltas().some(d => d.points === 15));
+
+      // Creazione e due aggiornamenti nella stessa finestra: meno delta che modifiche
+      expect(deltas().length).toBeLessThan(3);
+      expect(deltas().pop()).toMatchObject({ id: String(table._id), name: 'Tavolo 1', points: 15 });
+    });
+
+    test('Should push removal when a table is deleted', async () => {
+      const table = await Table.create({
+        tableNumber: 2,
+        name: 'Tavolo 2',
+        createdBy: adminUser._id
+      });
+
+      await request(app)
+        .delete(`/api/tables/${table._id}`)
+        .set('Authorization', `Bearer ${adminToken}`)
+        .expect(200);
+
+      await waitFor(() => events.some(e => e.event === 'tables' && e.data.some(d => d.removed)));
+    });
+  });
+
   describe('GET /api/tables/qr/:qrCode', () => {
     test('Should find table by valid QR code', async () => {
       const table = await Table.create({
@@ -84,6 +282,49 @@ describe('Tables Endpoints', () => {
       expect(response.body.data.position).toBe(1);
     });
 
+    test('Should return the same fields as the hydrated document', async () => {
+      const table = await Table.create({ tableNumber: 7, name: 'Tavolo 7', points: 10, createdBy: adminUser._id });
+
+      const response = await request(app)
+        .get(`/api/tables/qr/${table.qrCode}`)
+        .expect(200);
+
+      expect(response.body.data).toMatchObject({
+        _id: String(table._id),
+        id: String(table._id),
+        formattedQR: 'TABLE_7',
+        qrCode: 'TABLE_7',
+        medal: '🥇'
+      });
+      expect(response.body.data.recentBatches).toBeUndefined();
+      expect(response.body.data.__v).toBeUndefined();
+    });
+
+    test('Should update position after a points change', async () => {
+      const [first, second] = await Table.create([
+        { tableNumber: 1, name: 'Tavolo 1', points: 100, createdBy: adminUser._id },
+        { tableNumber: 2, name: 'Tavolo 2', points: 50, createdBy: adminUser._id }
+      ]);
+
+      let response = await request(app)
+        .get(`/api/tables/qr/${second.qrCode}`)
+        .expect(200);
+      expect(response.body.data.position).toBe(2);
+
+      await Table.applyPointsDelta({ _id: second._id }, 100);
+
+      response = await request(app)
+        .get(`/api/tables/qr/${second.qrCode}`)
+        .expect(200);
+      expect(response.body.data.position).toBe(1);
+      expect(response.body.data.medal).toBe('🥇');
+
+      response = await request(app)
+        .get(`/api/tables/qr/${first.qrCode}`)
+        .expect(200);
+      expect(response.body.data.position).toBe(2);
+    });
+
     test('Should return 404 for invalid QR code', async () => {
       const response = await request(app)
         .get('/api/tables/qr/INVALID_QR')
@@ -126,4 +367,263 @@ describe('Tables Endpoints', () => {
       expect(response.body.success).toBe(false);
     });
   });
+
+  describe('GET /api/tables/qr-sheet', () => {
+    const binary = (res, callback) => {
+      const chunks = [];
+      res.on('data', chunk => chunks.push(chunk));
+      res.on('end', () => callback(null, Buffer.concat(chunks)));
+    };
+
+    beforeEach(async () => {
+      await Table.create([
+        { tableNumber: 1, name: 'Tavolo 1', createdBy: adminUser._id },
+        { tableNumber: 2, name: 'Tavolo 2', createdBy: adminUser._id }
+      ]);
+    });
+
+    test('Should stream a ZIP with one PNG per table', async () => {
+      const response = await request(app)
+        .get('/api/tables/qr-sheet.zip')
+        .set('Authorization', `Bearer ${adminToken}`)
+        .buffer(true)
+        .parse(binary)
+        .expect('Content-Type', /application\/zip/)
+        .expect(200);
+
+      expect(response.body.readUInt32LE(0)).toBe(0x04034b50);
+      expect(response.body.includes('table-1.png')).toBe(true);
+      expect(response.body.includes('table-2.png')).toBe(true);
+    });
+
+    test('Should stream a printable PDF sheet', async () => {
+      const response = await request(app)
+        .get('/api/tables/qr-sheet.pdf')
+        .set('Authorization', `Bearer ${adminToken}`)
+        .buffer(true)
+        .parse(binary)
+        .expect('Content-Type', /application\/pdf/)
+        .expect(200);
+
+      expect(response.body.toString('latin1', 0, 8)).toBe('%PDF-1.4');
+      expect(response.body.toString('latin1').trimEnd().endsWith('%%EOF')).toBe(true);
+    });
+
+    test('Should not allow cashiers', async () => {
+      await request(app)
+        .get('/api/tables/qr-sheet.zip')
+        .set('Authorization', `Bearer ${cashierToken}`)
+        .expect(403);
+    });
+  });
+
+  describe('GET /api/tables/:id/qr.(png|svg)', () => {
+    let table;
+
+    beforeEach(async () => {
+      table = await Table.create({ tableNumber: 7, name: 'Tavolo 7', createdBy: adminUser._id });
+    });
+
+    test('Should serve an immutable PNG and answer 304 without rendering', async () => {
+      const response = await request(app)
+        .get(`/api/tables/${table._id}/qr.png`)
+        .expect('Content-Type', /image\/png/)
+        .expect(200);
+
+      expect(response.headers['cache-control']).toMatch(/immutable/);
+      expect(response.headers.etag).toBeDefined();
+
+      const qrAssets = require('../src/utils/qrAssets');
+      const renders = qrAssets.stats.renders;
+
+      await request(app)
+        .get(`/api/tables/${table._id}/qr.png`)
+        .set('If-None-Match', response.headers.etag)
+        .expect(304);
+
+      expect(qrAssets.stats.renders).toBe(renders);
+    });
+
+    test('Should give each variant its own ETag', async () => {
+      const plain = await request(app).get(`/api/tables/${table._id}/qr.svg`).expect(200);
+      const colored = await request(app).get(`/api/tables/${table._id}/qr.svg?dark=aa0000&size=128`).expect(200);
+
+      expect(plain.headers['content-type']).toMatch(/image\/svg\+xml/);
+      expect(colored.headers.etag).not.toBe(plain.headers.etag);
+    });
+
+    test('Should reject invalid variants', async () => {
+      await request(app)
+        .get(`/api/tables/${table._id}/qr.png?dark=red`)
+        .expect(400);
+    });
+  });
+
+  describe('Multi-tenant isolation', () => {
+    let otherCashierToken;
+
+    beforeEach(async () => {
+      const otherCashier = await User.create({
+        tenant: 'trattoria',
+        username: 'cashier',
+        email: 'cashier@test.com',
+        password: 'cashier123',
+        firstName: 'Other',
+        lastName: 'Cashier',
+        role: 'cashier'
+      });
+      otherCashierToken = otherCashier.getSignedJwtToken();
+
+      // Stesso numero di tavolo in due ristoranti diversi
+      await Table.create([
+        { tableNumber: 1, name: 'Default 1', points: 10, createdBy: adminUser._id },
+        { tenant: 'trattoria', tableNumber: 1, name: 'Trattoria 1', points: 99, createdBy: otherCashier._id }
+      ]);
+    });
+
+    test('Should scope the leaderboard by X-Tenant', async () => {
+      const response = await request(app)
+        .get('/api/tables/leaderboard')
+        .set('X-Tenant', 'trattoria')
+        .expect(200);
+
+      expect(response.body.data).toHaveLength(1);
+      expect(response.body.data[0].name).toBe('Trattoria 1');
+      expect(response.headers.vary).toMatch(/X-Tenant/i);
+
+      const fallback = await request(app).get('/api/tables/leaderboard').expect(200);
+      expect(fallback.body.data.map(table => table.name)).toEqual(['Default 1']);
+    });
+
+    test('Should not pick the public tenant from the Bearer token', async () => {
+      // Le cache condivise distinguono solo URL e X-Tenant: il token non conta
+      const response = await request(app)
+        .get('/api/tables/leaderboard')
+        .set('Authorization', `Bearer ${otherCashierToken}`)
+        .expect(200);
+
+      expect(response.headers['cache-control']).toMatch(/public/);
+      expect(response.body.data.map(table => table.name)).toEqual(['Default 1']);
+
+      const qr = await request(app)
+        .get('/api/tables/qr/TABLE_1')
+        .set('Authorization', `Bearer ${otherCashierToken}`)
+        .expect(200);
+      expect(qr.body.data.name).toBe('Default 1');
+    });
+
+    test('Should resolve the tenant from the QR prefix', async () => {
+      const response = await request(app)
+        .get('/api/tables/qr/trattoria:TABLE_1')
+        .expect(200);
+
+      expect(response.body.data.name).toBe('Trattoria 1');
+      expect(response.body.data.tenant).toBe('trattoria');
+    });
+
+    test('Should not add points to another tenant\'s table', async () => {
+      await request(app)
+        .post('/api/points/add')
+        .set('Authorization', `Bearer ${otherCashierToken}`)
+        .send({ qrCode: 'default:TABLE_1', points: 5 })
+        .expect(404);
+
+      // Senza prefisso il QR appartiene al ristorante del token
+      await request(app)
+        .post('/api/points/add')
+        .set('Authorization', `Bearer ${otherCashierToken}`)
+        .send({ qrCode: 'TABLE_1', points: 5 })
+        .expect(200);
+
+      const tables = await Table.find({ tableNumber: 1 }).sort({ tenant: 1 }).lean();
+      expect(tables.map(table => table.points)).toEqual([10, 104]);
+    });
+
+    test('Should reject an invalid tenant', async () => {
+      const response = await request(app)
+        .get('/api/tables/leaderboard')
+        .set('X-Tenant', '../admin')
+        .expect(400);
+
+      expect(response.body.success).toBe(false);
+    });
+
+    test('Should not create state for an unknown tenant', async () => {
+      const leaderboard = require('../src/utils/leaderboard');
+      const tenants = leaderboard.getMetrics().tenants;
+
+      const response = await request(app)
+        .get('/api/tables/leaderboard')
+        .set('X-Tenant', 'inventato')
+        .expect(404);
+      expect(response.body.success).toBe(false);
+
+      await request(app).get('/api/tables/qr/inventato:TABLE_1').expect(404);
+      expect(leaderboard.getMetrics().tenants).toBe(tenants);
+    });
+  });
+
+  describe('Health probes', () => {
+    const healthCheck = require('../src/utils/healthCheck');
+
+    afterEach(() => {
+      healthCheck.setDraining(false);
+    });
+
+    test('Should report liveness without touching the database', async () => {
+      const response = await request(app).get('/health').expect(200);
+      expect(response.body.status).toBe('OK');
+    });
+
+    test('Should report readiness with cached checks', async () => {
+      const first = await request(app).get('/ready').expect(200);
+      const second = await request(app).get('/ready').expect(200);
+
+      expect(first.body.status).toBe('ready');
+      expect(first.body.checks.mongo.ok).toBe(true);
+      expect(first.body.checks.pool.max).toBe(config.DB_OPTIONS.maxPoolSize);
+      expect(second.body.checkedAt).toBe(first.body.checkedAt);
+    });
+
+    test('Should report not ready while draining', async () => {
+      healthCheck.setDraining();
+
+      const response = await request(app).get('/ready').expect(503);
+      expect(response.body.draining).toBe(true);
+    });
+  });
+
+  describe('Database connection', () => {
+    test('Should apply pool options from config', () => {
+      const options = connectionOptions({ maxPoolSize: 3 });
+
+      expect(options.maxPoolSize).toBe(3);
+      expect(options.serverSelectionTimeoutMS).toBe(config.DB_OPTIONS.serverSelectionTimeoutMS);
+      expect(options.useNewUrlParser).toBeUndefined();
+      expect(mongoose.connection.getClient().options.maxPoolSize).toBe(config.DB_OPTIONS.maxPoolSize);
+    });
+
+    test('Should report pool checkouts', async () => {
+      const before = getPoolMetrics().checkOuts;
+
+      await Promise.all([Table.countDocuments(), User.countDocuments()]);
+
+      const metrics = getPoolMetrics();
+      expect(metrics.checkOuts).toBeGreaterThanOrEqual(before + 2);
+      expect(metrics.open).toBeGreaterThan(0);
+      expect(metrics.waitQueueLength).toBe(0);
+    });
+
+    test('Should attach pool listeners once, from the first handshake', async () => {
+      // Metriche collegate prima della connect: il primo heartbeat è già contato
+      expect(getPoolMetrics().heartbeats).toBeGreaterThan(0);
+
+      // Una seconda connect riusa la connessione senza duplicare i listener
+      await connect(process.env.MONGODB_TEST_URI || 'mongodb://localhost:27017/qr-tavoli-test');
+      const before = getPoolMetrics().checkOuts;
+      await Table.countDocuments();
+
+      expect(getPoolMetrics().checkOuts).toBe(before + 1);
+    });
+  });
 });
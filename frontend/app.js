@@ -3,7 +3,8 @@ const CONFIG = {
     apiBaseUrl: 'https://qr-tavoli-system.onrender.com/api',
     sessionKey: 'qr-tavoli-session',
     sessionDuration: 24 * 60 * 60 * 1000, // 24 ore
-    fallbackMode: true // Enable fallback to mock data if API fails
+    fallbackMode: true, // Enable fallback to mock data if API fails
+    leaderboardLimit: 20 // Tables shown in the leaderboard (API default)
 };
 
 // Mock Data
@@ -31,6 +32,8 @@ const MOCK_DATA = {
 let currentTable = null;
 let currentSession = null;
 let operationsHistory = [];
+let leaderboardTables = [];
+let liveSource = null;
 
 // DOM Elements
 const elements = {
@@ -132,10 +135,55 @@ function clearSession() {
     currentSession = null;
 }
 
+// Idempotency keys: one per point operation, reused when the same operation
+// is retried shortly after a failure so the server applies it only once
+const pendingOperations = new Map();
+const IDEMPOTENCY_REUSE_MS = 60 * 1000;
+
+function generateIdempotencyKey() {
+    if (window.crypto?.randomUUID) {
+        return window.crypto.randomUUID();
+    }
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+function idempotencyKeyFor(operation) {
+    const pending = pendingOperations.get(operation);
+
+    if (pending && Date.now() - pending.createdAt < IDEMPOTENCY_REUSE_MS) {
+        return pending.key;
+    }
+
+    const key = generateIdempotencyKey();
+    pendingOperations.set(operation, { key, createdAt: Date.now() });
+    return key;
+}
+
+function completeOperation(operation) {
+    pendingOperations.delete(operation);
+}
+
+// Restaurant (tenant) of this page: ?tenant=, the prefix of a ?table=tenant:TABLE_N code,
+// or the restaurant of the logged-in cashier. Authenticated calls are scoped by the token;
+// public reads (leaderboard, QR, stream) ignore it and need the header.
+function currentTenant() {
+    const urlParams = new URLSearchParams(window.location.search);
+    const tableCode = urlParams.get('table') || '';
+    return urlParams.get('tenant') ||
+        (tableCode.includes(':') ? tableCode.split(':')[0] : null) ||
+        currentSession?.user?.tenant ||
+        null;
+}
+
 // API Functions
 async function apiCall(endpoint, options = {}) {
     try {
         const url = `${CONFIG.apiBaseUrl}${endpoint}`;
+        const tenant = currentTenant();
+
+        if (tenant) {
+            options.headers = { ...options.headers, 'X-Tenant': tenant };
+        }
         
         // Add auth header if session exists
         if (currentSession?.token) {
@@ -145,13 +193,22 @@ async function apiCall(endpoint, options = {}) {
             };
         }
 
-        const response = await fetch(url, {
+        const request = {
+            ...options,
             headers: {
                 'Content-Type': 'application/json',
                 ...options.headers
-            },
-            ...options
-        });
+            }
+        };
+
+        let response;
+        try {
+            response = await fetch(url, request);
+        } catch (networkError) {
+            // Requests carrying an Idempotency-Key are safe to resend once
+            if (!request.headers['Idempotency-Key']) throw networkError;
+            response = await fetch(url, request);
+        }
         
         if (!response.ok) {
             throw new Error(`HTTP ${response.status}`);
@@ -201,7 +258,7 @@ function handleMockApiCall(endpoint, options) {
     
     // Mock get specific table
     if (endpoint.startsWith('/tables/qr/')) {
-        const qrCode = endpoint.split('/').pop();
+        const qrCode = decodeURIComponent(endpoint.split('/').pop()).split(':').pop();
         const table = MOCK_DATA.tables.find(t => t.qrCode === qrCode);
         if (table) {
             return { success: true, table };
@@ -285,6 +342,7 @@ function updateLeaderboard(tables) {
     
     // Sort tables by points (descending)
     const sortedTables = [...tables].sort((a, b) => b.points - a.points);
+    leaderboardTables = sortedTables;
     
     elements.leaderboard.innerHTML = '';
     
@@ -345,6 +403,88 @@ function updateOperationsHistory() {
     });
 }
 
+// Live Updates (Server-Sent Events)
+function connectLiveUpdates() {
+    if (!window.EventSource || liveSource) return;
+    
+    let connectedOnce = false;
+    // EventSource cannot send headers: the tenant travels in the query string
+    const tenant = currentTenant();
+    liveSource = new EventSource(`${CONFIG.apiBaseUrl}/tables/stream${tenant ? `?tenant=${encodeURIComponent(tenant)}` : ''}`);
+    
+    liveSource.addEventListener('ready', () => {
+        // After a reconnection, missed events are recovered via REST
+        if (connectedOnce) {
+            refreshFromServer();
+        }
+        connectedOnce = true;
+    });
+    
+    liveSource.addEventListener('tables', (event) => {
+        applyTableDeltas(JSON.parse(event.data));
+    });
+    
+    liveSource.addEventListener('resync', () => {
+        refreshFromServer();
+    });
+}
+
+function isLiveConnected() {
+    return liveSource !== null && liveSource.readyState === EventSource.OPEN;
+}
+
+async function refreshFromServer() {
+    await loadLeaderboard();
+    if (currentTable?.qrCode) {
+        await loadTableData(currentTable.qrCode);
+    }
+}
+
+function applyCurrentTableDelta(delta) {
+    currentTable = { ...currentTable, name: delta.name, points: delta.points };
+    
+    // Keep the name input untouched while the user is typing
+    elements.currentTableName.textContent = delta.name;
+    elements.tablePoints.textContent = `${delta.points} punti`;
+    elements.cashierTableName.textContent = delta.name;
+    elements.cashierTablePoints.textContent = `${delta.points} punti`;
+}
+
+function applyTableDeltas(deltas) {
+    const tables = [...leaderboardTables];
+    const isFull = tables.length >= CONFIG.leaderboardLimit;
+    let leftGap = false;
+    
+    deltas.forEach(delta => {
+        const index = tables.findIndex(t => String(t.id) === delta.id);
+        
+        if (currentTable && String(currentTable.id) === delta.id && !delta.removed) {
+            applyCurrentTableDelta(delta);
+        }
+        
+        if (delta.removed) {
+            if (index >= 0) {
+                tables.splice(index, 1);
+                leftGap = true;
+            }
+        } else if (index >= 0) {
+            leftGap = leftGap || delta.points < tables[index].points;
+            tables[index] = { ...tables[index], ...delta };
+        } else {
+            tables.push(delta);
+        }
+    });
+    
+    // A table that left the top (or lost points) may be replaced by one we don't have
+    if (isFull && leftGap) {
+        loadLeaderboard();
+        return;
+    }
+    
+    tables.sort((a, b) => b.points - a.points);
+    updateLeaderboard(tables.slice(0, CONFIG.leaderboardLimit));
+}
+
 // Main App Logic
 async function loadTableData(qrCode) {
     try {
@@ -416,9 +556,12 @@ async function handleLogin(username, password) {
 async function handleAddPoints(points) {
     if (!currentTable || !currentSession) return;
     
+    const operation = `add:${currentTable.id}:${points}`;
+
     try {
         const response = await apiCall('/points/add', {
             method: 'POST',
+            headers: { 'Idempotency-Key': idempotencyKeyFor(operation) },
             body: JSON.stringify({
                 tableId: currentTable.id,
                 points: parseInt(points)
@@ -426,14 +569,17 @@ async function handleAddPoints(points) {
         });
         
         if (response.success) {
+            completeOperation(operation);
             currentTable.points = response.newPoints;
             elements.cashierTablePoints.textContent = `${response.newPoints} punti`;
             
             showToast(`Aggiunti ${points} punti!`, 'success');
             updateOperationsHistory();
             
-            // Reload leaderboard to reflect changes
-            await loadLeaderboard();
+            // Reload leaderboard only if live updates are not available
+            if (!isLiveConnected()) {
+                await loadLeaderboard();
+            }
         }
     } catch (error) {
         showToast('Errore nell\'aggiunta punti', 'error');
@@ -454,8 +600,10 @@ async function handleChangeTableName(newName) {
             updateTableInfo(response.table);
             showToast('Nome tavolo aggiornato!', 'success');
             
-            // Reload leaderboard to reflect changes
-            await loadLeaderboard();
+            // Reload leaderboard only if live updates are not available
+            if (!isLiveConnected()) {
+                await loadLeaderboard();
+            }
         }
     } catch (error) {
         showToast('Errore nell\'aggiornamento nome', 'error');  
@@ -497,8 +645,9 @@ async function initializeApp() {
         showToast('Demo: simulazione scansione Tavolo 1', 'info');
     }
     
-    // Always load leaderboard
+    // Always load leaderboard, then keep it current with pushed deltas
     await loadLeaderboard();
+    connectLiveUpdates();
     
     hideLoading();
 }